@@ -1,14 +1,146 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from app.models.chat_models import ChatRequest, ChatResponse, AIResponseData
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.background import BackgroundTask
+from app.models.chat_models import (
+    AIResponseData, BatchChatRequest, BatchChatResponse, BatchItemError, BatchItemResult,
+    ChatRequest, ChatResponse, ConversationSummaryResponse, ResponseMetadata, SummarizeRequest, SummaryJobResponse
+)
 from app.core.security import verify_firebase_token
-from app.core.llm_manager import LLMManager
-import os
+from app.core.llm_manager import Admit, get_llm_manager
+from app.core.config import settings
+from app.core.admission import (
+    AdmissionController, AdmissionRejected, AdmissionTicket, PRIORITY_BACKGROUND, PRIORITY_BATCH, PRIORITY_INTERACTIVE,
+    parse_model_limits
+)
+from app.core.deadlines import ClientDisconnected, Deadline, DeadlineExceeded, request_deadline, until_disconnected
+from app.core.http_pool import host_samples
+from app.core.metrics import REQUESTS_CANCELLED, registry
+from app.core.serialization import FastJSONResponse, dumps, loads
+from app.core.tracing import observe_request_validation, observe_stage
+from app.core.websocket_hub import CLOSE_FORBIDDEN, CLOSE_SERVICE_RESTART, CLOSE_UNAUTHORIZED, SocketConnection, SocketHub
+from app.services.conversation_store import ConversationConflictError, StoredConversation, build_conversation_store, call_store
+from app.services.summary_jobs import SQLiteSummaryQueue, SummaryJob, SummaryWorkerPool
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+import asyncio
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
-llm_manager = LLMManager()
+conversation_store = build_conversation_store(
+    backend=settings.CONVERSATION_STORE_BACKEND,
+    max_conversations=settings.CONVERSATION_STORE_MAX_CONVERSATIONS,
+    idle_ttl_seconds=settings.CONVERSATION_STORE_IDLE_TTL_SECONDS,
+    sqlite_path=settings.CONVERSATION_STORE_SQLITE_PATH
+)
+admission = AdmissionController(
+    default_concurrency=settings.ADMISSION_MAX_CONCURRENCY,
+    model_concurrency=parse_model_limits(settings.ADMISSION_MODEL_CONCURRENCY),
+    max_queue_size=settings.ADMISSION_MAX_QUEUE_SIZE,
+    queue_timeout_seconds=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    user_rate_per_second=settings.ADMISSION_USER_RATE_PER_SECOND,
+    user_burst=settings.ADMISSION_USER_BURST
+)
+
+async def _summarize_in_background(summary: str, new_messages: List[Dict[str, Any]]) -> str:
+    async def admit(model: str) -> AdmissionTicket:
+        # Background jobs queue behind interactive and batch requests for the summary model's slots
+        return await admission.acquire(None, model, priority=PRIORITY_BACKGROUND, apply_rate_limit=False)
+
+    return await get_llm_manager().summarize_conversation(summary, new_messages, admit=admit)
+
+# Open chat WebSockets of this worker; closed by the app lifespan on shutdown
+socket_hub = SocketHub(
+    heartbeat_seconds=settings.WS_HEARTBEAT_SECONDS,
+    heartbeat_timeout_seconds=settings.WS_HEARTBEAT_TIMEOUT_SECONDS,
+    max_streams_per_connection=settings.WS_MAX_STREAMS_PER_CONNECTION
+)
 
-# Check if we're in development mode
-DEV_MODE = os.environ.get("DEV_MODE", "false").lower() == "true"
+# Background conversation summaries; the workers are started by the app lifespan
+summary_workers: Optional[SummaryWorkerPool] = None
+if settings.SUMMARY_JOBS_ENABLED:
+    summary_workers = SummaryWorkerPool(
+        SQLiteSummaryQueue(settings.SUMMARY_QUEUE_PATH),
+        conversation_store,
+        _summarize_in_background,
+        workers=settings.SUMMARY_WORKERS,
+        keep_recent=settings.CONTEXT_RECENT_MESSAGES,
+        trigger_turns=settings.SUMMARY_TRIGGER_TURNS,
+        trigger_tokens=settings.SUMMARY_TRIGGER_TOKENS,
+        chunk_tokens=settings.SUMMARY_CHUNK_TOKENS,
+        max_attempts=settings.SUMMARY_MAX_ATTEMPTS,
+        retry_backoff_seconds=settings.SUMMARY_RETRY_BACKOFF_SECONDS,
+        job_timeout_seconds=settings.SUMMARY_JOB_TIMEOUT_SECONDS,
+        poll_interval_seconds=settings.SUMMARY_POLL_INTERVAL_SECONDS,
+        token_model=settings.LLM_DEFAULT_MODEL
+    )
+
+def _admission_samples(key: str):
+    for model, gate in admission.stats()["models"].items():
+        yield {"model": model}, gate[key]
+
+def _http_pool_connections():
+    pool = get_llm_manager().http_pool
+    if pool is None:
+        return []
+    stats = pool.stats()
+    return [({"state": "idle"}, stats["idle_connections"]), ({"state": "active"}, stats["active_connections"])]
+
+# Scrape-time views of the pipeline components' counters
+registry.collector("empathy_single_flight_calls_total", "counter", "LLM calls entering the single-flight layer.",
+                   lambda: [({}, get_llm_manager().single_flight.stats()["calls"])])
+registry.collector("empathy_single_flight_upstream_calls_total", "counter", "Upstream LLM calls after coalescing.",
+                   lambda: [({}, get_llm_manager().single_flight.stats()["upstream_calls"])])
+registry.collector("empathy_single_flight_in_flight", "gauge", "Distinct upstream calls currently in flight.",
+                   lambda: [({}, get_llm_manager().single_flight.stats()["in_flight"])])
+registry.collector("empathy_response_cache_hits_total", "counter", "Response cache hits.",
+                   lambda: [({}, get_llm_manager().response_cache.hits)] if get_llm_manager().response_cache else [])
+registry.collector("empathy_response_cache_misses_total", "counter", "Response cache misses.",
+                   lambda: [({}, get_llm_manager().response_cache.misses)] if get_llm_manager().response_cache else [])
+registry.collector("empathy_admission_active", "gauge", "Admission slots in use per model.",
+                   lambda: _admission_samples("active"))
+registry.collector("empathy_admission_queued", "gauge", "Requests waiting for an admission slot per model.",
+                   lambda: _admission_samples("queued"))
+registry.collector("empathy_admission_rejected_total", "counter", "Requests rejected because the queue was full.",
+                   lambda: _admission_samples("rejected"))
+registry.collector("empathy_admission_timed_out_total", "counter", "Requests whose queue deadline passed.",
+                   lambda: _admission_samples("timed_out"))
+registry.collector("empathy_admission_rate_limited_total", "counter", "Requests rejected by per-user rate limits.",
+                   lambda: [({}, admission.rate_limited)])
+registry.collector("empathy_llm_http_requests_total", "counter", "Requests sent through the provider connection pool per host.",
+                   lambda: host_samples(get_llm_manager().http_pool, "requests"))
+registry.collector("empathy_llm_http_connections_opened_total", "counter", "Connections opened to provider hosts.",
+                   lambda: host_samples(get_llm_manager().http_pool, "connections_opened"))
+registry.collector("empathy_llm_http_tls_handshakes_total", "counter", "TLS handshakes with provider hosts.",
+                   lambda: host_samples(get_llm_manager().http_pool, "tls_handshakes"))
+registry.collector("empathy_llm_http_in_flight", "gauge", "Provider requests in flight per host.",
+                   lambda: host_samples(get_llm_manager().http_pool, "in_flight"))
+registry.collector("empathy_llm_http_connections", "gauge", "Open provider connections by state.",
+                   _http_pool_connections)
+registry.collector("empathy_summary_jobs", "gauge", "Background summary jobs per state.",
+                   lambda: [({"status": state}, count) for state, count in summary_workers.queue.counts().items()]
+                   if summary_workers else [])
+registry.collector("empathy_summary_llm_calls_total", "counter", "LLM calls made by summary jobs.",
+                   lambda: [({}, summary_workers.llm_calls)] if summary_workers else [])
+registry.collector("empathy_summary_retries_total", "counter", "Summary job attempts that failed and were retried.",
+                   lambda: [({}, summary_workers.retried)] if summary_workers else [])
+registry.collector("empathy_ws_connections", "gauge", "Open chat WebSocket connections.",
+                   lambda: [({}, len(socket_hub.connections))])
+registry.collector("empathy_ws_streams", "gauge", "Chat streams in flight over WebSockets.",
+                   lambda: [({}, socket_hub.stats()["streams"])])
+registry.collector("empathy_ws_frames_received_total", "counter", "Frames received from chat WebSocket clients.",
+                   lambda: [({}, socket_hub.frames_received)])
+registry.collector("empathy_ws_streams_cancelled_total", "counter", "WebSocket chat streams cancelled, by who cancelled them.",
+                   lambda: [({"by": "client"}, socket_hub.cancelled_by_client), ({"by": "server"}, socket_hub.cancelled_by_server)])
+registry.collector("empathy_prompt_cache_handles", "gauge", "Live provider prompt cache handles (Gemini cachedContents).",
+                   lambda: [({}, get_llm_manager().prompt_cache.stats()["live_handles"])] if get_llm_manager().prompt_cache else [])
+registry.collector("empathy_llm_hedge_delay_seconds", "gauge", "Time without a first token after which calls are hedged, per model and call type.",
+                   lambda: [({"model": key.rsplit(":", 1)[0], "call": key.rsplit(":", 1)[1]}, delay)
+                            for key, delay in get_llm_manager().hedging.stats()["delay_seconds"].items()]
+                   if get_llm_manager().hedging else [])
 
 # Add an explicit OPTIONS handler for preflight requests
 @router.options("/send")
@@ -18,28 +150,60 @@ async def options_send():
 @router.post("/send", response_model=ChatResponse)
 async def send_message(
     request_data: ChatRequest,
+    request: Request,
     user_data: dict = Depends(verify_firebase_token)
 ):
     """
     Endpoint to send a message to the LLM and get a response.
     Requires Firebase authentication (or mock auth in dev mode).
+    The request is given up with a 504 once its deadline (timeoutMs, or REQUEST_TIMEOUT_SECONDS)
+    passes, and the upstream call is cancelled if the client disconnects first.
     """
+    observe_request_validation()
+    try:
+        return FastJSONResponse(await until_disconnected(
+            request.receive, _process_chat_request(request_data, user_data, deadline=_deadline(request_data))
+        ))
+    except ClientDisconnected:
+        REQUESTS_CANCELLED.labels("client_disconnect").inc()
+        # Never delivered; 499 is what proxies log for requests their client closed
+        return Response(status_code=499)
+
+async def _process_chat_request(
+    request_data: ChatRequest,
+    user_data: dict,
+    priority: int = PRIORITY_INTERACTIVE,
+    apply_rate_limit: bool = True,
+    deadline: Optional[Deadline] = None
+) -> ChatResponse:
+    """
+    Run one chat request through admission control and the LLM, and persist the turn.
+    Without a deadline, the request's own (timeoutMs or the default) starts now. Callers that
+    already charged the user's rate limit (e.g. once for a whole batch) pass apply_rate_limit=False.
+    """
+    deadline = deadline or _deadline(request_data)
     # Validate user ID (skip strict validation in dev mode)
-    if not DEV_MODE and request_data.userId != user_data.get("uid"):
+    if not settings.DEV_MODE and request_data.userId != user_data.get("uid"):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User ID in request does not match authenticated user"
         )
     
+    if apply_rate_limit:
+        _check_rate_limit(user_data)
+    conversation_history, conversation = await _load_history(request_data, user_data)
+
     try:
-        # Convert Pydantic models to dictionaries for the LLM manager
-        conversation_history = [msg.dict() for msg in request_data.conversationHistory]
-        
         # Get response from LLM
-        main_response, justification = await llm_manager.get_llm_response(
+        response_metadata = {}
+        main_response, justification = await deadline.wait(get_llm_manager().get_llm_response(
             conversation_history=conversation_history,
-            user_message=request_data.message
-        )
+            user_message=request_data.message,
+            use_cache=not request_data.bypassCache,
+            response_metadata=response_metadata,
+            conversation_id=request_data.conversationId,
+            admit=_admission(user_data, priority, deadline)
+        ))
         
         # Construct the response
         ai_response = AIResponseData(
@@ -47,11 +211,588 @@ async def send_message(
             justification=justification
         )
         
-        return ChatResponse(aiResponse=ai_response)
+        version = await _save_turn(request_data, user_data, conversation, main_response, justification)
         
+        return ChatResponse(
+            aiResponse=ai_response,
+            conversationId=request_data.conversationId,
+            version=version,
+            metadata=ResponseMetadata(**response_metadata)
+        )
+        
+    except HTTPException:
+        raise
+    except DeadlineExceeded as e:
+        raise _gateway_timeout(e)
     except Exception as e:
         # Catch any unexpected errors
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An error occurred: {str(e)}"
-        ) 
\ No newline at end of file
+        ) 
+
+@router.options("/batch")
+async def options_batch():
+    return Response(status_code=200)
+
+@router.post("/batch", response_model=BatchChatResponse)
+async def batch_messages(
+    batch: BatchChatRequest,
+    request: Request,
+    user_data: dict = Depends(verify_firebase_token)
+):
+    """
+    Endpoint to process many chat requests with one authenticated call, for offline jobs.
+    Items run concurrently (up to the requested concurrency, capped by BATCH_MAX_CONCURRENCY)
+    at batch priority, so interactive requests are admitted ahead of them. A failing item
+    is reported in its result instead of failing the batch. Results are returned in request
+    order, or with `stream: true` written as NDJSON lines as each item finishes. Items still
+    running are cancelled if the client disconnects.
+    """
+    observe_request_validation()
+    if len(batch.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch may contain at most {settings.BATCH_MAX_ITEMS} items."
+        )
+
+    # The batch counts as a single request against the user's rate limit
+    _check_rate_limit(user_data)
+
+    concurrency = min(max(1, batch.concurrency or settings.BATCH_MAX_CONCURRENCY), settings.BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(index: int, item: ChatRequest) -> BatchItemResult:
+        async with semaphore:
+            try:
+                response = await _process_chat_request(item, user_data, PRIORITY_BATCH, apply_rate_limit=False)
+                return BatchItemResult(index=index, response=response)
+            except HTTPException as e:
+                return BatchItemResult(index=index, error=BatchItemError(statusCode=e.status_code, detail=str(e.detail)))
+
+    if batch.stream:
+        async def result_lines() -> AsyncIterator[str]:
+            tasks = [asyncio.ensure_future(run_item(index, item)) for index, item in enumerate(batch.items)]
+            try:
+                for next_result in asyncio.as_completed(tasks):
+                    result = await next_result
+                    yield result.model_dump_json() + "\n"
+            finally:
+                # Stop outstanding items if the client goes away
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+    async def run_items() -> List[BatchItemResult]:
+        return await asyncio.gather(*(run_item(index, item) for index, item in enumerate(batch.items)))
+
+    try:
+        results = await until_disconnected(request.receive, run_items())
+    except ClientDisconnected:
+        REQUESTS_CANCELLED.labels("client_disconnect").inc()
+        return Response(status_code=499)
+    failed = sum(1 for result in results if result.error is not None)
+    return FastJSONResponse(BatchChatResponse(results=results, succeeded=len(results) - failed, failed=failed))
+
+@router.options("/stream")
+async def options_stream():
+    return Response(status_code=200)
+
+@router.post("/stream")
+async def stream_message(
+    request_data: ChatRequest,
+    user_data: dict = Depends(verify_firebase_token)
+):
+    """
+    Endpoint to stream the LLM response as Server-Sent Events.
+    Emits `content` and `justification` events as tokens arrive, followed by a final
+    `done` event carrying the complete response (or an `error` event on failure).
+    Requires Firebase authentication (or mock auth in dev mode).
+    """
+    observe_request_validation()
+    if not settings.DEV_MODE and request_data.userId != user_data.get("uid"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User ID in request does not match authenticated user"
+        )
+
+    _check_rate_limit(user_data)
+    deadline = _deadline(request_data)
+    conversation_history, conversation = await _load_history(request_data, user_data)
+    admitted = asyncio.Event()
+    events = _stream_events(request_data, user_data, conversation_history, conversation,
+                            _admission(user_data, deadline=deadline, admitted=admitted), deadline)
+    # Hold the response until the request is admitted (or answered without generating), so a
+    # rejection from the admission queue can still be sent as a 429
+    first = await _until_admitted(events, admitted)
+    if first.done() and not admitted.is_set():
+        event = first.result()
+        if event is not None and event["type"] == "error" and "status" in event:
+            await events.aclose()
+            headers = {"Retry-After": str(event["retryAfter"])} if "retryAfter" in event else None
+            raise HTTPException(status_code=event["status"], detail=event["detail"], headers=headers)
+
+    async def event_stream() -> AsyncIterator[bytes]:
+        finished = False
+        try:
+            event = await first
+            if event is not None:
+                yield _format_sse(event)
+                async for event in events:
+                    yield _format_sse(event)
+            finished = True
+        finally:
+            # Starlette cancels the stream when the client disconnects, which cancels the upstream call
+            if not finished:
+                REQUESTS_CANCELLED.labels("client_disconnect").inc()
+
+    async def close_events() -> None:
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Stop reverse proxies from buffering the stream
+        },
+        # Releases the admission slot of clients that disconnect before the stream starts
+        background=BackgroundTask(close_events)
+    )
+
+async def _stream_events(
+    request_data: ChatRequest,
+    user_data: dict,
+    conversation_history: List[Dict[str, Any]],
+    conversation: Optional[StoredConversation],
+    admit: Admit,
+    deadline: Deadline
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    A request's stream events (as LLMManager.stream_llm_response), saving the turn on `done`.
+    A rejection by admission control ends the stream with an `error` event with its status, and
+    a stream still running at the deadline with an `error` event with status 504.
+    """
+    events = deadline.iterate(get_llm_manager().stream_llm_response(
+        conversation_history=conversation_history,
+        user_message=request_data.message,
+        use_cache=not request_data.bypassCache,
+        conversation_id=request_data.conversationId,
+        admit=admit
+    ))
+    try:
+        async for event in events:
+            if event["type"] == "done" and request_data.conversationId:
+                try:
+                    event["version"] = await _save_turn(
+                        request_data, user_data, conversation, event["content"], event["justification"]
+                    )
+                    event["conversationId"] = request_data.conversationId
+                except HTTPException as e:
+                    yield {"type": "error", "detail": e.detail}
+                    return
+            yield event
+    except HTTPException as e:
+        yield _error_event(e)
+    except DeadlineExceeded as e:
+        yield _error_event(_gateway_timeout(e))
+    finally:
+        await events.aclose()
+
+@router.websocket("/ws")
+async def chat_socket(websocket: WebSocket, token: Optional[str] = None):
+    """
+    Chat over one long-lived WebSocket: authenticated once per connection, with any number of
+    requests (up to WS_MAX_STREAMS_PER_CONNECTION at a time, across conversations) streamed
+    over it, each tagged with the client's requestId. See the README for the frame protocol.
+    The ID token comes from the Authorization header, the `token` query parameter or a first
+    `{"type": "auth", "token": ...}` frame.
+    """
+    await websocket.accept()
+    user_data = await _authenticate_socket(websocket, token)
+    if user_data is None:
+        return
+    connection = socket_hub.register(websocket, user_data, user_data.get("exp"))
+    close_code = None
+    try:
+        await connection.send({
+            "type": "ready",
+            "userId": user_data.get("uid"),
+            "heartbeatSeconds": socket_hub.heartbeat_seconds,
+            "maxStreams": socket_hub.max_streams_per_connection,
+        })
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                close_code = message.get("code")
+                break
+            connection.last_seen = time.monotonic()
+            socket_hub.frames_received += 1
+            await _handle_socket_frame(connection, message.get("text") or message.get("bytes") or "")
+    except WebSocketDisconnect as e:
+        close_code = e.code
+    finally:
+        # uvicorn closes open sockets with 1012 when it shuts down, before the lifespan's close_all runs
+        await socket_hub.unregister(connection, server_closed=close_code == CLOSE_SERVICE_RESTART)
+
+async def _authenticate_socket(websocket: WebSocket, token: Optional[str]) -> Optional[dict]:
+    """Verify the connection's ID token; returns the user, or None once the socket is closed."""
+    authorization = websocket.headers.get("authorization", "")
+    if token is None and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    # Without a token in the handshake, the first frame must carry one (DEV_MODE connects as the mock user)
+    if token is None and not settings.DEV_MODE:
+        try:
+            message = await asyncio.wait_for(websocket.receive(), settings.WS_AUTH_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            await websocket.close(code=CLOSE_UNAUTHORIZED, reason="Authentication timed out")
+            return None
+        if message["type"] == "websocket.disconnect":
+            return None
+        try:
+            frame = loads(message.get("text") or message.get("bytes") or "")
+        except ValueError:
+            frame = None
+        if isinstance(frame, dict) and frame.get("type") == "auth":
+            token = frame.get("token")
+    try:
+        return await verify_firebase_token(token)
+    except HTTPException as e:
+        await websocket.close(code=CLOSE_UNAUTHORIZED, reason=str(e.detail))
+        return None
+
+async def _handle_socket_frame(connection: SocketConnection, raw: Union[str, bytes]) -> None:
+    """Act on one client frame: chat, cancel, ping, pong or auth (a fresh token for the connection)."""
+    try:
+        frame = loads(raw)
+    except ValueError:
+        frame = None
+    if not isinstance(frame, dict):
+        await connection.send({"type": "error", "status": 400, "detail": "Frames must be JSON objects."})
+        return
+    kind = frame.get("type")
+    request_id = frame.get("requestId")
+
+    if kind == "chat":
+        await _start_socket_chat(connection, frame)
+    elif kind == "cancel":
+        if connection.cancel_stream(request_id, "client"):
+            socket_hub.cancelled_by_client += 1
+        else:
+            await connection.send({"type": "error", "requestId": request_id, "status": 404,
+                                   "detail": "No request with this requestId is in flight."})
+    elif kind == "ping":
+        await connection.send({"type": "pong", "ts": frame.get("ts")})
+    elif kind == "pong":
+        pass
+    elif kind == "auth":
+        try:
+            user_data = await verify_firebase_token(frame.get("token"))
+        except HTTPException as e:
+            await connection.send({"type": "error", "status": e.status_code, "detail": e.detail})
+            return
+        if user_data.get("uid") != connection.user.get("uid"):
+            await connection.cancel_all("reauthenticated_as_another_user")
+            await connection.close(CLOSE_FORBIDDEN, "A connection can't switch users")
+            return
+        connection.user, connection.expires_at = user_data, user_data.get("exp")
+        await connection.send({"type": "authenticated", "expiresAt": connection.expires_at})
+    else:
+        await connection.send({"type": "error", "requestId": request_id, "status": 400,
+                               "detail": f"Unknown frame type: {kind!r}"})
+
+async def _start_socket_chat(connection: SocketConnection, frame: Dict[str, Any]) -> None:
+    request_id = frame.get("requestId")
+    error = None
+    if not isinstance(request_id, str) or not request_id:
+        error = (status.HTTP_400_BAD_REQUEST, "Chat frames need a requestId.")
+    elif request_id in connection.streams:
+        error = (status.HTTP_409_CONFLICT, "A request with this requestId is already in flight.")
+    elif len(connection.streams) >= socket_hub.max_streams_per_connection:
+        error = (status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests in flight on this connection.")
+    elif connection.auth_expired:
+        error = (status.HTTP_401_UNAUTHORIZED, "Token expired. Send an auth frame with a fresh token.")
+    if error is not None:
+        await connection.send({"type": "error", "requestId": request_id, "status": error[0], "detail": error[1]})
+        return
+
+    frame.setdefault("userId", connection.user.get("uid"))
+    try:
+        request_data = ChatRequest.model_validate(frame)
+    except ValidationError as e:
+        await connection.send({"type": "error", "requestId": request_id, "status": 422,
+                               "detail": e.errors(include_url=False, include_context=False)})
+        return
+    socket_hub.streams_started += 1
+    connection.start_stream(request_id, _socket_chat_events(request_data, connection.user))
+
+async def _socket_chat_events(request_data: ChatRequest, user_data: dict) -> AsyncIterator[Dict[str, Any]]:
+    """The stream events for one chat frame; rejections become `error` events with a status."""
+    try:
+        if not settings.DEV_MODE and request_data.userId != user_data.get("uid"):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="User ID in request does not match authenticated user"
+            )
+        _check_rate_limit(user_data)
+        deadline = _deadline(request_data)
+        conversation_history, conversation = await _load_history(request_data, user_data)
+    except HTTPException as e:
+        yield _error_event(e)
+        return
+    admit = _admission(user_data, deadline=deadline)
+    async for event in _stream_events(request_data, user_data, conversation_history, conversation, admit, deadline):
+        yield event
+
+def _check_rate_limit(user_data: dict) -> None:
+    """Charge one request to the user's rate limit; raises a 429 with Retry-After when they are over it."""
+    try:
+        admission.check_rate_limit(user_data.get("uid"))
+    except AdmissionRejected as e:
+        raise _too_many_requests(e)
+
+def _admission(
+    user_data: dict,
+    priority: int = PRIORITY_INTERACTIVE,
+    deadline: Optional[Deadline] = None,
+    admitted: Optional[asyncio.Event] = None
+) -> Admit:
+    """
+    The `admit` callback of one request for LLMManager, called once the model is chosen and only
+    when a response is generated. It takes an admission slot for that model, waiting in the queue
+    if needed (never past the request's deadline), and sets `admitted` once it has. Raises a 429
+    with Retry-After when the queue is full, and a 504 when the deadline passes while queued.
+    """
+    async def admit(model: str) -> AdmissionTicket:
+        started = time.perf_counter()
+        queue_deadline = time.monotonic() + settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+        if deadline is not None:
+            queue_deadline = min(queue_deadline, deadline.expires_at)
+        try:
+            ticket = await admission.acquire(
+                user_data.get("uid"), model, priority=priority, deadline=queue_deadline, apply_rate_limit=False
+            )
+        except AdmissionRejected as e:
+            if e.reason == "queue_timeout" and deadline is not None and deadline.expired:
+                raise _gateway_timeout(DeadlineExceeded(deadline.budget))
+            raise _too_many_requests(e)
+        finally:
+            observe_stage("queue_wait", time.perf_counter() - started)
+        if admitted is not None:
+            admitted.set()
+        return ticket
+
+    return admit
+
+async def _until_admitted(events: AsyncIterator[Dict[str, Any]], admitted: asyncio.Event) -> "asyncio.Future":
+    """
+    Start a stream and wait until its request is admitted or its first event is in (a canned reply,
+    a cache hit or a rejection). Returns the task fetching the first event (None for an empty stream).
+    """
+    async def first_event() -> Optional[Dict[str, Any]]:
+        async for event in events:
+            return event
+        return None
+
+    first = asyncio.ensure_future(first_event())
+    waiting = asyncio.ensure_future(admitted.wait())
+    try:
+        await asyncio.wait({first, waiting}, return_when=asyncio.FIRST_COMPLETED)
+    except BaseException:
+        first.cancel()
+        raise
+    finally:
+        waiting.cancel()
+    return first
+
+def _error_event(error: HTTPException) -> Dict[str, Any]:
+    """A stream `error` event for an HTTP error, with `retryAfter` when it has Retry-After."""
+    event = {"type": "error", "status": error.status_code, "detail": error.detail}
+    if error.headers and "Retry-After" in error.headers:
+        event["retryAfter"] = int(error.headers["Retry-After"])
+    return event
+
+def _deadline(request_data: ChatRequest) -> Deadline:
+    return request_deadline(request_data.timeoutMs, settings.REQUEST_TIMEOUT_SECONDS, settings.REQUEST_TIMEOUT_MAX_SECONDS)
+
+def _gateway_timeout(exceeded: DeadlineExceeded) -> HTTPException:
+    REQUESTS_CANCELLED.labels("deadline").inc()
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail=f"The request did not complete within its {exceeded.budget:.1f}s deadline."
+    )
+
+def _too_many_requests(rejection: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"Too many requests ({rejection.reason}). Please retry shortly.",
+        headers={"Retry-After": str(max(1, math.ceil(rejection.retry_after)))}
+    )
+
+def _format_sse(event: Dict[str, Any]) -> bytes:
+    """Format an LLMManager stream event as a Server-Sent Events frame."""
+    payload = {key: value for key, value in event.items() if key != "type"}
+    return b"event: " + event["type"].encode() + b"\ndata: " + dumps(payload) + b"\n\n"
+
+@router.get("/stats", response_class=FastJSONResponse)
+async def get_stats(user_data: dict = Depends(verify_firebase_token)):
+    """
+    Returns runtime counters for the chat pipeline: response cache hits, upstream
+    LLM calls saved by coalescing identical in-flight requests, admission
+    queue depth and wait-time histograms, provider connection pool usage,
+    provider prompt caching (cache handles, cached vs. uncached input tokens),
+    background summary jobs, chat WebSockets, hedged LLM calls, LLM traffic recording,
+    the semantic memory of older turns, and the safety screen.
+    """
+    llm_manager = get_llm_manager()
+    return {
+        "responseCache": llm_manager.response_cache.stats() if llm_manager.response_cache else None,
+        "singleFlight": llm_manager.single_flight.stats(),
+        "admission": admission.stats(),
+        "httpPool": llm_manager.http_pool.stats() if llm_manager.http_pool else None,
+        "promptCache": llm_manager.prompt_cache.stats() if llm_manager.prompt_cache else None,
+        "summaryJobs": summary_workers.stats() if summary_workers else None,
+        "webSocket": socket_hub.stats(),
+        "hedging": llm_manager.hedging.stats() if llm_manager.hedging else None,
+        "recording": llm_manager.recorder.stats() if llm_manager.recorder else None,
+        "semanticMemory": llm_manager.semantic_memory.stats() if llm_manager.semantic_memory else None,
+        "safety": llm_manager.safety_screen.stats() if llm_manager.safety_screen else None,
+    }
+
+async def _load_history(request_data: ChatRequest, user_data: dict) -> Tuple[List[Dict[str, Any]], Optional[StoredConversation]]:
+    """
+    Resolve the conversation history for a request.
+    With a conversationId, the history comes from the conversation store and the client's
+    version is checked against the stored one; otherwise the full uploaded history is used.
+    Older turns of a stored conversation are replaced by its background summary, once there is one.
+    """
+    if not request_data.conversationId:
+        # Messages are validated as plain dicts, so the history is used as it is
+        return request_data.conversationHistory, None
+
+    conversation = await call_store(conversation_store.get, request_data.conversationId)
+    if conversation is None:
+        if request_data.version:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Conversation not found. Resend the full conversationHistory to restore it."
+            )
+        # A new conversation may be seeded with client-side history
+        return request_data.conversationHistory, None
+
+    if conversation.user_id != user_data.get("uid"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found.")
+    if request_data.version is not None and request_data.version != conversation.version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Conversation version conflict: server is at version {conversation.version}."
+        )
+    if summary_workers is not None:
+        return summary_workers.summarized_history(conversation.conversation_id, conversation.messages), conversation
+    return conversation.messages, conversation
+
+async def _save_turn(request_data: ChatRequest, user_data: dict, conversation: Optional[StoredConversation],
+               main_response: str, justification: str) -> Optional[int]:
+    """Append the new exchange to the conversation store and return the new version."""
+    if not request_data.conversationId:
+        return None
+
+    new_messages = [{"role": "user", "content": request_data.message, "justification": None}]
+    if conversation is None:
+        # First turn for this conversation: persist any seeded history along with it
+        new_messages = request_data.conversationHistory + new_messages
+    new_messages.append({"role": "assistant", "content": main_response, "justification": justification})
+
+    try:
+        version = await call_store(
+            conversation_store.append,
+            request_data.conversationId,
+            user_data.get("uid"),
+            expected_version=conversation.version if conversation else 0,
+            new_messages=new_messages
+        )
+    except ConversationConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Conversation version conflict: server is at version {e.current_version}."
+        )
+
+    if summary_workers is not None:
+        try:
+            summary_workers.maybe_enqueue(
+                request_data.conversationId, user_data.get("uid"),
+                (conversation.messages if conversation else []) + new_messages
+            )
+        except Exception as e:
+            # The turn is saved; summarizing can catch up after the next one
+            logger.warning("Could not queue a summary job for conversation %s: %s", request_data.conversationId, e)
+    return version
+
+@router.options("/summarize")
+async def options_summarize():
+    return Response(status_code=200)
+
+@router.post("/summarize", response_model=SummaryJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def summarize_conversation(
+    request_data: SummarizeRequest,
+    user_data: dict = Depends(verify_firebase_token)
+):
+    """
+    Queue a background job that brings a stored conversation's summary up to its latest message.
+    Only the turns the summary doesn't cover yet are sent to the model. Idempotent: asking again
+    before the conversation changes returns the same job. Poll GET /summarize/jobs/{jobId}.
+    """
+    if not settings.DEV_MODE and request_data.userId != user_data.get("uid"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User ID in request does not match authenticated user"
+        )
+    workers = _require_summary_workers()
+    conversation = await call_store(conversation_store.get, request_data.conversationId)
+    if conversation is None or conversation.user_id != user_data.get("uid"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found.")
+    job = workers.enqueue(conversation.conversation_id, conversation.user_id, len(conversation.messages))
+    return FastJSONResponse(_job_response(job), status_code=status.HTTP_202_ACCEPTED)
+
+@router.get("/summarize/jobs/{job_id}", response_model=SummaryJobResponse)
+async def get_summary_job(job_id: str, user_data: dict = Depends(verify_firebase_token)):
+    """Status of a summary job: queued, running, succeeded or failed (with the last error)."""
+    job = _require_summary_workers().queue.get(job_id)
+    if job is None or job.user_id != user_data.get("uid"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Summary job not found.")
+    return FastJSONResponse(_job_response(job))
+
+@router.get("/summarize/{conversation_id}", response_model=ConversationSummaryResponse)
+async def get_conversation_summary(conversation_id: str, user_data: dict = Depends(verify_firebase_token)):
+    """The conversation's current summary and how many of its messages it covers."""
+    summary = _require_summary_workers().queue.get_summary(conversation_id)
+    if summary is None or summary.user_id != user_data.get("uid"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No summary for this conversation yet.")
+    return FastJSONResponse(ConversationSummaryResponse(
+        conversationId=summary.conversation_id,
+        summary=summary.summary,
+        coveredMessages=summary.covered_messages,
+        updatedAt=summary.updated_at
+    ))
+
+def _require_summary_workers() -> SummaryWorkerPool:
+    if summary_workers is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Conversation summaries are disabled.")
+    return summary_workers
+
+def _job_response(job: SummaryJob) -> SummaryJobResponse:
+    return SummaryJobResponse(
+        jobId=job.job_id,
+        conversationId=job.conversation_id,
+        status=job.status,
+        targetMessages=job.target_messages,
+        attempts=job.attempts,
+        maxAttempts=job.max_attempts,
+        error=job.error,
+        runAfter=job.run_after,
+        createdAt=job.created_at,
+        updatedAt=job.updated_at
+    )
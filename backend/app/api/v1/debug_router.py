@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from app.core.security import verify_firebase_token
+from app.core.config import settings
+from app.core.log_config import hot_path_logging_enabled, set_hot_path_logging, set_log_level
+from app.core.profiler import profiler
+from app.core.tracing import set_trace_ids, trace_ids_enabled
+from typing import Optional, Set
+import asyncio
+import logging
+
+router = APIRouter()
+
+def _debug_admin_uids() -> Set[str]:
+    return {uid.strip() for uid in settings.DEBUG_ADMIN_UIDS.split(",") if uid.strip()}
+
+async def require_debug_access(user_data: dict = Depends(verify_firebase_token)) -> dict:
+    """
+    Debug endpoints only exist when DEBUG_ENDPOINTS_ENABLED is set, and are limited to admins:
+    the UIDs in DEBUG_ADMIN_UIDS and users with the DEBUG_ADMIN_CLAIM custom claim.
+    """
+    if not settings.DEBUG_ENDPOINTS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    claim = settings.DEBUG_ADMIN_CLAIM
+    if user_data.get("uid") not in _debug_admin_uids() and not (claim and user_data.get(claim) is True):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Debug endpoints are limited to admins")
+    return user_data
+
+@router.post("/profiler/start")
+async def start_profiler(interval_ms: float = 5.0, user_data: dict = Depends(require_debug_access)):
+    """
+    Starts the sampling profiler on the event loop thread.
+    Sampling every `interval_ms` milliseconds until /profiler/stop is called.
+    """
+    if not profiler.start(interval_seconds=max(0.001, interval_ms / 1000)):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Profiler is already running")
+    return {"running": True, "interval_ms": profiler.interval_seconds * 1000}
+
+@router.post("/profiler/stop")
+async def stop_profiler(format: str = "collapsed", user_data: dict = Depends(require_debug_access)):
+    """
+    Stops the sampling profiler and returns the profile: collapsed stacks as plain text
+    (for flamegraph.pl or speedscope), or `format=json` for the summary and stacks as JSON.
+    """
+    if not profiler.running:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Profiler is not running")
+    # Joins the sampling thread; keep that wait off the event loop
+    result = await asyncio.to_thread(profiler.stop)
+    if format == "json":
+        return result
+    return PlainTextResponse(result["collapsed"] + "\n")
+
+@router.get("/observability")
+async def get_observability(user_data: dict = Depends(require_debug_access)):
+    """Returns the current runtime observability switches."""
+    return {
+        "logLevel": logging.getLevelName(logging.getLogger("app").level),
+        "hotPathLogging": hot_path_logging_enabled(),
+        "traceIds": trace_ids_enabled(),
+        "profilerRunning": profiler.running,
+    }
+
+@router.put("/observability")
+async def update_observability(
+    log_level: Optional[str] = None,
+    hot_path_logging: Optional[bool] = None,
+    trace_ids: Optional[bool] = None,
+    user_data: dict = Depends(require_debug_access)
+):
+    """Changes the log level, per-request logging and trace IDs without a restart."""
+    if log_level is not None:
+        if log_level.upper() not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown log level: {log_level}")
+        set_log_level(log_level)
+    if hot_path_logging is not None:
+        set_hot_path_logging(hot_path_logging)
+    if trace_ids is not None:
+        set_trace_ids(trace_ids)
+    return await get_observability(user_data)
@@ -0,0 +1,232 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from ..core.metrics import registry
+
+# Lower values are admitted first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+PRIORITY_BACKGROUND = 20  # Server-side jobs such as conversation summaries
+
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+QUEUE_DEPTH = registry.histogram(
+    "empathy_admission_queue_depth", "Requests waiting for a slot, observed at admission.", ("model",),
+    buckets=QUEUE_DEPTH_BUCKETS
+)
+WAIT_SECONDS = registry.histogram(
+    "empathy_admission_wait_seconds", "Time spent waiting for an admission slot.", ("model",)
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted; retry_after is a hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second refill up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def try_take(self, amount: float = 1.0) -> Tuple[bool, float]:
+        """Take tokens if available. Returns (taken, seconds until enough tokens would be available)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True, 0.0
+        return False, (amount - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+
+class _ModelGate:
+    """Concurrency slots for one model plus the priority queue of requests waiting for one."""
+
+    def __init__(self, model: str, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.queue: List[Tuple[int, int, "asyncio.Future[None]"]] = []
+        self.queue_depth = QUEUE_DEPTH.labels(model)
+        self.wait_time = WAIT_SECONDS.labels(model)
+        self.rejected = 0
+        self.timed_out = 0
+        # Moving average of how long a slot is held, used to estimate Retry-After
+        self.average_hold_seconds = 1.0
+
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self.queue if not future.done())
+
+
+class AdmissionTicket:
+    """A held concurrency slot. Releasing is idempotent."""
+
+    def __init__(self, controller: "AdmissionController", model: str):
+        self._controller = controller
+        self._model = model
+        self._acquired_at = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release(self._model, time.monotonic() - self._acquired_at)
+
+    async def __aenter__(self) -> "AdmissionTicket":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+
+class AdmissionController:
+    """
+    Admission control in front of the LLM provider.
+
+    Each user has a token bucket (requests per second with a burst allowance), and each model
+    has a cap on concurrent upstream calls. Requests over the cap wait in a bounded priority
+    queue until a slot frees up or their deadline passes; when the queue is full they are
+    rejected immediately so the API can answer with a fast 429.
+    """
+
+    def __init__(self, default_concurrency: int, model_concurrency: Dict[str, int], max_queue_size: int,
+                 queue_timeout_seconds: float, user_rate_per_second: float, user_burst: float,
+                 max_tracked_users: int = 100000):
+        self.default_concurrency = default_concurrency
+        self.model_concurrency = model_concurrency
+        self.max_queue_size = max_queue_size
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.user_rate_per_second = user_rate_per_second
+        self.user_burst = user_burst
+        self.max_tracked_users = max_tracked_users
+        self._gates: Dict[str, _ModelGate] = {}
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._sequence = itertools.count()
+        self.rate_limited = 0
+
+    def _gate(self, model: str) -> _ModelGate:
+        gate = self._gates.get(model)
+        if gate is None:
+            gate = _ModelGate(model, self.model_concurrency.get(model, self.default_concurrency))
+            self._gates[model] = gate
+        return gate
+
+    def check_rate_limit(self, user_id: str) -> None:
+        """Take one token from the user's bucket or raise AdmissionRejected."""
+        if self.user_rate_per_second <= 0:
+            return
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate_per_second, self.user_burst)
+            self._buckets[user_id] = bucket
+            while len(self._buckets) > self.max_tracked_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        taken, retry_after = bucket.try_take()
+        if not taken:
+            self.rate_limited += 1
+            raise AdmissionRejected("rate_limited", retry_after)
+
+    async def acquire(self, user_id: str, model: str, priority: int = PRIORITY_INTERACTIVE,
+                      deadline: Optional[float] = None, apply_rate_limit: bool = True) -> AdmissionTicket:
+        """
+        Admit a request: apply the user's rate limit, then take a concurrency slot for the model,
+        queueing by priority if none is free. `deadline` is a time.monotonic() timestamp; it
+        defaults to now + queue_timeout_seconds. Callers that already charged the user's bucket
+        (e.g. once for a whole batch) pass apply_rate_limit=False.
+        """
+        if apply_rate_limit:
+            self.check_rate_limit(user_id)
+
+        gate = self._gate(model)
+        if gate.active < gate.limit and not gate.waiting():
+            gate.active += 1
+            gate.queue_depth.observe(0)
+            gate.wait_time.observe(0.0)
+            return AdmissionTicket(self, model)
+
+        depth = gate.waiting()
+        if depth >= self.max_queue_size:
+            gate.rejected += 1
+            raise AdmissionRejected("queue_full", self._estimate_wait(gate, depth))
+
+        gate.queue_depth.observe(depth + 1)
+        future: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        heapq.heappush(gate.queue, (priority, next(self._sequence), future))
+        enqueued_at = time.monotonic()
+        if deadline is None:
+            deadline = enqueued_at + self.queue_timeout_seconds
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=max(0.0, deadline - enqueued_at))
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the deadline passed: give it back
+                self._release(model, 0.0)
+            future.cancel()
+            gate.timed_out += 1
+            raise AdmissionRejected("queue_timeout", self._estimate_wait(gate, gate.waiting()))
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(model, 0.0)
+            future.cancel()
+            raise
+
+        gate.wait_time.observe(time.monotonic() - enqueued_at)
+        return AdmissionTicket(self, model)
+
+    def _release(self, model: str, held_seconds: float) -> None:
+        gate = self._gates[model]
+        if held_seconds > 0:
+            gate.average_hold_seconds = 0.9 * gate.average_hold_seconds + 0.1 * held_seconds
+        # Hand the slot directly to the highest-priority request that is still waiting
+        while gate.queue:
+            _, _, future = heapq.heappop(gate.queue)
+            if not future.done():
+                future.set_result(None)
+                return
+        gate.active -= 1
+
+    def _estimate_wait(self, gate: _ModelGate, depth: int) -> float:
+        return max(1.0, gate.average_hold_seconds * (depth + 1) / max(1, gate.limit))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "rate_limited": self.rate_limited,
+            "models": {
+                model: {
+                    "limit": gate.limit,
+                    "active": gate.active,
+                    "queued": gate.waiting(),
+                    "rejected": gate.rejected,
+                    "timed_out": gate.timed_out,
+                    "queue_depth": gate.queue_depth.snapshot(),
+                    "wait_seconds": gate.wait_time.snapshot(),
+                }
+                for model, gate in self._gates.items()
+            },
+        }
+
+
+def parse_model_limits(spec: str) -> Dict[str, int]:
+    """Parse "model=limit,model=limit" into a dict."""
+    limits = {}
+    for item in spec.split(","):
+        if "=" in item:
+            model, limit = item.split("=", 1)
+            limits[model.strip()] = int(limit)
+    return limits
@@ -1,11 +1,159 @@
-from pydantic_settings import BaseSettings
-from dotenv import load_dotenv
+from pydantic_settings import BaseSettings, SettingsConfigDict
 import os
 
-load_dotenv()  # Load .env file
+# Settings fields are read from this file as well as the environment; the app lifespan loads it
+# into the environment for the provider SDKs (API keys) that read os.environ directly
+ENV_FILE = ".env"
 
 class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=ENV_FILE, extra="ignore")
+
+    # For BETA TESTING and PRODUCTION, ensure DEV_MODE is NOT 'true' in your environment.
+    # DEV_MODE mocks authentication and LLM responses; USE_REAL_API_IN_DEV keeps the real LLM calls.
+    DEV_MODE: bool = os.getenv("DEV_MODE", "false").lower() == "true"
+    USE_REAL_API_IN_DEV: bool = os.getenv("USE_REAL_API_IN_DEV", "false").lower() == "true"
     FIREBASE_ADMIN_SDK_CREDENTIALS_PATH: str = os.getenv("FIREBASE_ADMIN_SDK_CREDENTIALS_PATH", "path/to/your/serviceAccountKey.json")
+    # LiteLLM router configuration and the model group used when a request doesn't name one
+    LITELLM_CONFIG_PATH: str = os.getenv("LITELLM_CONFIG_PATH", "litellm_config.yaml")
+    LLM_DEFAULT_MODEL: str = os.getenv("LLM_DEFAULT_MODEL", "flash-2.0")
+    # Model cascade: intents from INTENTS_CONFIG_PATH route simple messages to the fast model (or a
+    # canned reply) and complex or distressed ones to the strong model; empty tiers use the default
+    INTENTS_CONFIG_PATH: str = os.getenv("INTENTS_CONFIG_PATH", "intents.yaml")
+    CASCADE_ENABLED: bool = os.getenv("CASCADE_ENABLED", "true").lower() == "true"
+    LLM_FAST_MODEL: str = os.getenv("LLM_FAST_MODEL", "flash-lite")
+    LLM_STRONG_MODEL: str = os.getenv("LLM_STRONG_MODEL", "")
+    # Verified Firebase ID tokens are cached until their `exp` claim (capped at the max TTL)
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+    AUTH_TOKEN_CACHE_MAX_TTL_SECONDS: float = float(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL_SECONDS", "3600"))
+    # Tokens with an unknown key ID refetch Google's signing keys at most once per this interval;
+    # in between they are rejected without a fetch
+    AUTH_SIGNING_KEY_MIN_REFRESH_SECONDS: float = float(os.getenv("AUTH_SIGNING_KEY_MIN_REFRESH_SECONDS", "60"))
+    # LLM response cache: "memory", "sqlite" or "none"
+    RESPONSE_CACHE_BACKEND: str = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    RESPONSE_CACHE_TTL_SECONDS: float = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+    RESPONSE_CACHE_SQLITE_PATH: str = os.getenv("RESPONSE_CACHE_SQLITE_PATH", "response_cache.sqlite3")
+    # Prompt token budget; older turns are summarized and justifications dropped to stay within it
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+    CONTEXT_RECENT_MESSAGES: int = int(os.getenv("CONTEXT_RECENT_MESSAGES", "8"))
+    CONTEXT_SUMMARY_MAX_TOKENS: int = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "600"))
+    # Server-side conversation store for conversationId requests: "memory" or "sqlite"
+    CONVERSATION_STORE_BACKEND: str = os.getenv("CONVERSATION_STORE_BACKEND", "memory")
+    CONVERSATION_STORE_MAX_CONVERSATIONS: int = int(os.getenv("CONVERSATION_STORE_MAX_CONVERSATIONS", "10000"))
+    CONVERSATION_STORE_IDLE_TTL_SECONDS: float = float(os.getenv("CONVERSATION_STORE_IDLE_TTL_SECONDS", "86400"))
+    CONVERSATION_STORE_SQLITE_PATH: str = os.getenv("CONVERSATION_STORE_SQLITE_PATH", "conversations.sqlite3")
+    # Background summarization of stored conversations: jobs in a local SQLite queue, run by a pool
+    # of SUMMARY_WORKERS async workers, fold the turns before the recent window into a running
+    # summary once SUMMARY_TRIGGER_TURNS turns or SUMMARY_TRIGGER_TOKENS tokens aren't covered by it.
+    # Failed jobs are retried with exponential backoff up to SUMMARY_MAX_ATTEMPTS times
+    SUMMARY_JOBS_ENABLED: bool = os.getenv("SUMMARY_JOBS_ENABLED", "true").lower() == "true"
+    SUMMARY_QUEUE_PATH: str = os.getenv("SUMMARY_QUEUE_PATH", "summary_jobs.sqlite3")
+    SUMMARY_WORKERS: int = int(os.getenv("SUMMARY_WORKERS", "2"))
+    SUMMARY_MODEL: str = os.getenv("SUMMARY_MODEL", "")  # Empty uses LLM_FAST_MODEL
+    SUMMARY_MAX_TOKENS: int = int(os.getenv("SUMMARY_MAX_TOKENS", "400"))
+    SUMMARY_TRIGGER_TURNS: int = int(os.getenv("SUMMARY_TRIGGER_TURNS", "10"))
+    SUMMARY_TRIGGER_TOKENS: int = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "3000"))
+    SUMMARY_CHUNK_TOKENS: int = int(os.getenv("SUMMARY_CHUNK_TOKENS", "6000"))  # Turns folded per LLM call
+    SUMMARY_MAX_ATTEMPTS: int = int(os.getenv("SUMMARY_MAX_ATTEMPTS", "5"))
+    SUMMARY_RETRY_BACKOFF_SECONDS: float = float(os.getenv("SUMMARY_RETRY_BACKOFF_SECONDS", "5"))
+    SUMMARY_JOB_TIMEOUT_SECONDS: float = float(os.getenv("SUMMARY_JOB_TIMEOUT_SECONDS", "120"))
+    SUMMARY_POLL_INTERVAL_SECONDS: float = float(os.getenv("SUMMARY_POLL_INTERVAL_SECONDS", "1"))
+    # Ask providers for {"content", "justification"} JSON instead of the 'Justification:' marker
+    # (the parser accepts both either way)
+    STRUCTURED_OUTPUT: bool = os.getenv("STRUCTURED_OUTPUT", "false").lower() == "true"
+    # Token rate for the streaming mock used in DEV_MODE (0 streams as fast as possible)
+    MOCK_STREAM_TOKENS_PER_SECOND: float = float(os.getenv("MOCK_STREAM_TOKENS_PER_SECOND", "50"))
+    # Simulated latency of non-streaming mock responses, for load and throughput testing
+    MOCK_RESPONSE_LATENCY_MS: float = float(os.getenv("MOCK_RESPONSE_LATENCY_MS", "0"))
+    # Chat WebSocket (/api/v1/chat/ws): time to send the auth frame, server heartbeat interval, how
+    # long a connection may stay silent before it is closed, and concurrent streams per connection
+    WS_AUTH_TIMEOUT_SECONDS: float = float(os.getenv("WS_AUTH_TIMEOUT_SECONDS", "10"))
+    WS_HEARTBEAT_SECONDS: float = float(os.getenv("WS_HEARTBEAT_SECONDS", "25"))
+    WS_HEARTBEAT_TIMEOUT_SECONDS: float = float(os.getenv("WS_HEARTBEAT_TIMEOUT_SECONDS", "90"))
+    WS_MAX_STREAMS_PER_CONNECTION: int = int(os.getenv("WS_MAX_STREAMS_PER_CONNECTION", "8"))
+    # Record provider traffic for replay (benchmarks/replay_provider.py): LLM_RECORD_BACKEND is
+    # "jsonl" or "sqlite" ("" disables), the fraction of calls recorded, whether the (redacted)
+    # prompt text is kept, and comma-separated regexes redacted on top of the built-in secrets
+    LLM_RECORD_BACKEND: str = os.getenv("LLM_RECORD_BACKEND", "")
+    LLM_RECORD_PATH: str = os.getenv("LLM_RECORD_PATH", "llm_recordings.jsonl")
+    LLM_RECORD_SAMPLE_RATE: float = float(os.getenv("LLM_RECORD_SAMPLE_RATE", "1.0"))
+    LLM_RECORD_PROMPTS: bool = os.getenv("LLM_RECORD_PROMPTS", "false").lower() == "true"
+    LLM_RECORD_REDACT_PATTERNS: str = os.getenv("LLM_RECORD_REDACT_PATTERNS", "")
+    # Semantic memory of long conversations: older turns are embedded into a per-conversation
+    # index, and the top SEMANTIC_MEMORY_TOP_K relevant to a new message are sent verbatim next
+    # to the recent window. SEMANTIC_MEMORY_EMBEDDER is "hashing" (local, no model),
+    # "sentence-transformers:<model>" or "module:factory" ("" disables); turns scoring below
+    # SEMANTIC_MEMORY_MIN_SCORE (similarity, up to 1) are not recalled
+    SEMANTIC_MEMORY_EMBEDDER: str = os.getenv("SEMANTIC_MEMORY_EMBEDDER", "")
+    SEMANTIC_MEMORY_DIM: int = int(os.getenv("SEMANTIC_MEMORY_DIM", "256"))
+    SEMANTIC_MEMORY_TOP_K: int = int(os.getenv("SEMANTIC_MEMORY_TOP_K", "4"))
+    SEMANTIC_MEMORY_MIN_SCORE: float = float(os.getenv("SEMANTIC_MEMORY_MIN_SCORE", "0.02"))
+    SEMANTIC_MEMORY_MAX_CONVERSATIONS: int = int(os.getenv("SEMANTIC_MEMORY_MAX_CONVERSATIONS", "1000"))
+    # Safety screen: messages are checked for crisis and self-harm with the phrases in
+    # SAFETY_CONFIG_PATH ("" disables) before they reach a model and, with SAFETY_MODERATION_MODEL
+    # (a small model or router model group), by that model while the answer is generated; answers
+    # wait at most SAFETY_MODERATION_TIMEOUT_MS (from the start of the request) for its verdict
+    SAFETY_CONFIG_PATH: str = os.getenv("SAFETY_CONFIG_PATH", "safety.yaml")
+    SAFETY_MODERATION_MODEL: str = os.getenv("SAFETY_MODERATION_MODEL", "")
+    SAFETY_MODERATION_TIMEOUT_MS: float = float(os.getenv("SAFETY_MODERATION_TIMEOUT_MS", "2000"))
+    # Request deadlines: the budget of a chat request when the client sends no timeoutMs, and
+    # the most a client may ask for
+    REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "60"))
+    REQUEST_TIMEOUT_MAX_SECONDS: float = float(os.getenv("REQUEST_TIMEOUT_MAX_SECONDS", "300"))
+    # Hedged requests: a call without a first token after the HEDGE_PERCENTILE of the model's recent
+    # times to first token (clamped to the min/max delay) is duplicated to HEDGE_MODEL ("" disables
+    # hedging); at most HEDGE_BUDGET_RATIO extra calls per call over time
+    HEDGE_MODEL: str = os.getenv("HEDGE_MODEL", "")
+    HEDGE_PERCENTILE: float = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    HEDGE_MIN_DELAY_MS: float = float(os.getenv("HEDGE_MIN_DELAY_MS", "50"))
+    HEDGE_MAX_DELAY_MS: float = float(os.getenv("HEDGE_MAX_DELAY_MS", "2000"))
+    HEDGE_WINDOW: int = int(os.getenv("HEDGE_WINDOW", "500"))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    HEDGE_BUDGET_RATIO: float = float(os.getenv("HEDGE_BUDGET_RATIO", "0.1"))
+    # Batch endpoint: maximum items per request and items processed concurrently
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+    # Admission control: concurrent LLM calls per model (overrides as "model=limit,model=limit"),
+    # the bounded wait queue in front of them, and per-user token buckets (rate 0 disables them)
+    ADMISSION_MAX_CONCURRENCY: int = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "32"))
+    ADMISSION_MODEL_CONCURRENCY: str = os.getenv("ADMISSION_MODEL_CONCURRENCY", "")
+    ADMISSION_MAX_QUEUE_SIZE: int = int(os.getenv("ADMISSION_MAX_QUEUE_SIZE", "128"))
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+    ADMISSION_USER_RATE_PER_SECOND: float = float(os.getenv("ADMISSION_USER_RATE_PER_SECOND", "1"))
+    ADMISSION_USER_BURST: float = float(os.getenv("ADMISSION_USER_BURST", "5"))
+    # Logging goes through a background queue; LOG_HOT_PATH=false silences per-request messages
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_HOT_PATH: bool = os.getenv("LOG_HOT_PATH", "true").lower() == "true"
+    # Observability: Prometheus /metrics, per-request trace IDs, and runtime debug endpoints
+    # (profiler, log level and tracing toggles) under /api/v1/debug
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    TRACE_REQUESTS: bool = os.getenv("TRACE_REQUESTS", "false").lower() == "true"
+    DEBUG_ENDPOINTS_ENABLED: bool = os.getenv("DEBUG_ENDPOINTS_ENABLED", "false").lower() == "true"
+    # Who may use the debug endpoints: Firebase UIDs (comma-separated), and users whose ID token
+    # carries this custom claim set to true ("" disables the claim)
+    DEBUG_ADMIN_UIDS: str = os.getenv("DEBUG_ADMIN_UIDS", "")
+    DEBUG_ADMIN_CLAIM: str = os.getenv("DEBUG_ADMIN_CLAIM", "admin")
+    # After start-up, import LiteLLM, build the router, initialize Firebase, fetch signing keys and
+    # resolve provider hosts in the background instead of on the first requests
+    WARM_UP_ENABLED: bool = os.getenv("WARM_UP_ENABLED", "true").lower() == "true"
+    # Shared keep-alive connection pool for provider calls: total and idle connection limits, how
+    # long idle connections stay open, HTTP/2, concurrent requests per provider host (0 = no cap),
+    # connections opened per host during warm-up, and an optional CA bundle for self-hosted endpoints
+    LLM_HTTP_MAX_CONNECTIONS: int = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "true").lower() == "true"
+    LLM_HTTP_MAX_REQUESTS_PER_HOST: int = int(os.getenv("LLM_HTTP_MAX_REQUESTS_PER_HOST", "0"))
+    LLM_HTTP_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+    LLM_HTTP_PRECONNECT_PER_HOST: int = int(os.getenv("LLM_HTTP_PRECONNECT_PER_HOST", "1"))
+    LLM_HTTP_CA_BUNDLE: str = os.getenv("LLM_HTTP_CA_BUNDLE", "")
+    # Provider-side prompt caching of the system prompt and history: Anthropic cache_control
+    # breakpoints and Gemini cachedContents handles (kept per conversation for the TTL, created
+    # once at least PROMPT_CACHE_MIN_TOKENS of the prefix are uncached)
+    PROMPT_CACHE_ENABLED: bool = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+    PROMPT_CACHE_TTL_SECONDS: float = float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "300"))
+    PROMPT_CACHE_MIN_TOKENS: int = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+    PROMPT_CACHE_MAX_CONVERSATIONS: int = int(os.getenv("PROMPT_CACHE_MAX_CONVERSATIONS", "10000"))
     # Add other global settings if needed
     # LiteLLM API keys are often set as environment variables directly for LiteLLM to pick up.
     # Example: OPENAI_API_KEY: str | None = os.getenv("OPENAI_API_KEY")
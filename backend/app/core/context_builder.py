@@ -0,0 +1,274 @@
+import hashlib
+import re
+import threading
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.warmup import litellm_module
+
+# Approximate per-message overhead of the chat format (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_HEADER = "Summary of the earlier conversation (older turns, condensed):"
+CONVERSATION_SUMMARY_HEADER = "Summary of the conversation so far:"
+RECALL_HEADER = "Earlier messages relevant to the new message (verbatim, in order):"
+
+_FIRST_SENTENCE_PATTERN = re.compile(r"(.+?[.!?])(?:\s|$)", re.DOTALL)
+
+
+@lru_cache(maxsize=16384)
+def count_tokens(model: str, text: str) -> int:
+    """Count tokens for a piece of text with the model's tokenizer (memoized per model and text)."""
+    try:
+        return litellm_module.get().token_counter(model=model, text=text)
+    except Exception:
+        # Unknown tokenizer: fall back to the usual ~4 characters per token estimate
+        return max(1, len(text) // 4)
+
+
+def justification_suffix(justification: str) -> str:
+    """How an assistant message's justification is appended to it in the prompt."""
+    return f"\n[Context: My justification for the above response was: {justification}]"
+
+
+def summary_message(summary: str) -> Dict[str, str]:
+    """
+    History message standing in for the turns a stored conversation summary covers. Leading
+    system messages in the history are always sent and never folded into the rolling summary.
+    """
+    return {"role": "system", "content": f"{CONVERSATION_SUMMARY_HEADER}\n{summary}"}
+
+
+def summarize_message(msg: Dict[str, Any], max_chars: int = 200) -> str:
+    """Condense a message to a summary line: its first sentence, capped at max_chars."""
+    text = " ".join(msg["content"].split())
+    match = _FIRST_SENTENCE_PATTERN.match(text)
+    sentence = match.group(1) if match else text
+    if len(sentence) > max_chars:
+        sentence = sentence[:max_chars].rsplit(" ", 1)[0] + "..."
+    speaker = "User" if msg["role"] == "user" else "Assistant"
+    return f"- {speaker}: {sentence}"
+
+
+def trim_summary_lines(model: str, lines: List[str], max_tokens: int) -> List[str]:
+    """
+    The newest summary lines that fit max_tokens (at least the last one): the oldest points fall
+    off. Walks from the newest line back, so each line is counted once and the lines that fall
+    off aren't counted at all.
+    """
+    total = 0
+    for index in range(len(lines) - 1, -1, -1):
+        total += count_tokens(model, lines[index])
+        if total > max_tokens:
+            return lines[min(index + 1, len(lines) - 1):]
+    return lines
+
+
+@lru_cache(maxsize=16384)
+def _justification_tokens(model: str, justification: str) -> int:
+    # Keyed on the justification itself, so the suffix is only built for messages that are sent
+    return count_tokens(model, justification_suffix(justification))
+
+
+class BuiltContext:
+    """The messages to send to the provider, plus accounting for the response metadata."""
+
+    def __init__(self, messages: List[Dict[str, str]], prompt_tokens: int, token_budget: int,
+                 summarized_messages: int, dropped_justifications: int, recalled_messages: int = 0):
+        self.messages = messages
+        self.prompt_tokens = prompt_tokens
+        self.token_budget = token_budget
+        self.summarized_messages = summarized_messages
+        self.dropped_justifications = dropped_justifications
+        self.recalled_messages = recalled_messages
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "contextTokenBudget": self.token_budget,
+            "promptTokens": self.prompt_tokens,
+            "summarizedMessages": self.summarized_messages,
+            "droppedJustifications": self.dropped_justifications,
+            "recalledMessages": self.recalled_messages,
+        }
+
+
+class ContextBuilder:
+    """
+    Fits conversation history into a per-request token budget.
+
+    Reductions are applied in order until the prompt fits:
+    1. Assistant justifications are dropped, oldest first.
+    2. Older turns are folded into a rolling summary, keeping the most recent messages verbatim.
+
+    The rolling summary is built incrementally: summaries are cached per conversation prefix
+    (by a running hash of the messages in it), so each turn only folds in the messages that
+    moved out of the verbatim window since the last request.
+
+    The history is read in place: provider messages are only built for the messages that are
+    sent verbatim, so a long history costs one pass of token counts and hashing.
+
+    Leading system messages in the history (a stored conversation summary, see summary_message)
+    are kept as they are, ahead of the rolling summary.
+
+    With `recall` (older turns relevant to the new message, from SemanticMemory), everything
+    before the recent window is folded into the summary whatever the budget, and the recalled
+    turns are sent verbatim after it, best first while they fit.
+    """
+
+    def __init__(self, token_budget: int, recent_messages: int, summary_max_tokens: int,
+                 summary_cache_size: int = 2048):
+        self.token_budget = token_budget
+        self.recent_messages = recent_messages
+        self.summary_max_tokens = summary_max_tokens
+        self.summary_cache_size = summary_cache_size
+        # Prefix hash -> (prefix length, summary lines)
+        self._summaries: "OrderedDict[bytes, Tuple[int, List[str]]]" = OrderedDict()
+        # Number of cached summaries per prefix length, so prefixes are only hashed out at those lengths
+        self._lengths: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def recent_start(self, conversation_history: List[Dict[str, Any]]) -> int:
+        """Index of the first message of the recent window (never within the leading system messages)."""
+        pinned = 0
+        while pinned < len(conversation_history) and conversation_history[pinned]["role"] == "system":
+            pinned += 1
+        return max(pinned, len(conversation_history) - self.recent_messages)
+
+    def build(self, model: str, system_prompt: str, conversation_history: List[Dict[str, Any]],
+              user_message: str, recall: Optional[List[Tuple[int, int]]] = None) -> BuiltContext:
+        """
+        Args:
+            recall: (start, end) history spans of older turns to send verbatim, best first.
+                None sends older turns by the budget alone.
+        """
+        fixed_tokens = (
+            count_tokens(model, system_prompt) + count_tokens(model, user_message) + 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+
+        content_tokens = [count_tokens(model, msg["content"]) + MESSAGE_OVERHEAD_TOKENS for msg in conversation_history]
+        justification_tokens = [
+            _justification_tokens(model, msg["justification"]) if msg["role"] == "assistant" and msg.get("justification") else 0
+            for msg in conversation_history
+        ]
+
+        total = fixed_tokens + sum(content_tokens) + sum(justification_tokens)
+
+        pinned = 0
+        while pinned < len(conversation_history) and conversation_history[pinned]["role"] == "system":
+            pinned += 1
+        split = pinned
+        if recall is not None:
+            # Older turns are only sent as the summary and the recalled turns
+            split = max(pinned, len(conversation_history) - self.recent_messages)
+            total -= sum(content_tokens[pinned:split]) + sum(justification_tokens[pinned:split])
+
+        # Stage 1: drop justifications, oldest first (all of them before index keep_from)
+        dropped = 0
+        keep_from = split
+        for index in range(split, len(conversation_history)):
+            if total <= self.token_budget:
+                break
+            keep_from = index + 1
+            if justification_tokens[index]:
+                total -= justification_tokens[index]
+                dropped += 1
+
+        # Stage 2: fold the oldest messages into the rolling summary, keeping the recent window
+        summary_lines: List[str] = []
+        summary_tokens = 0
+        if recall is None and total > self.token_budget:
+            verbatim_tokens = total - fixed_tokens
+            max_split = max(pinned, len(conversation_history) - self.recent_messages)
+            while split < max_split and fixed_tokens + summary_tokens + verbatim_tokens > self.token_budget:
+                verbatim_tokens -= content_tokens[split] + justification_tokens[split] * (split >= keep_from)
+                split += 1
+                # A lower bound on the summary cost is enough to decide whether to keep folding
+                summary_tokens = min(self.summary_max_tokens, (split - pinned) * 8) + MESSAGE_OVERHEAD_TOKENS
+        if split > pinned:
+            summarized = conversation_history[pinned:] if pinned else conversation_history
+            summary_lines = self._summary_for_prefix(model, summarized, split - pinned)
+
+        messages = [{"role": "system", "content": system_prompt}]
+        messages.extend({"role": "system", "content": msg["content"]} for msg in conversation_history[:pinned])
+        if summary_lines:
+            messages.append({"role": "system", "content": "\n".join([SUMMARY_HEADER] + summary_lines)})
+        for index in range(split, len(conversation_history)):
+            msg = conversation_history[index]
+            content = msg["content"]
+            if index >= keep_from and justification_tokens[index]:
+                content += justification_suffix(msg["justification"])
+            messages.append({"role": msg["role"], "content": content})
+        messages.append({"role": "user", "content": user_message})
+
+        prompt_tokens = fixed_tokens + sum(
+            count_tokens(model, message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages[1:-1]
+        )
+        recalled = 0
+        if recall:
+            recalled_spans: List[Tuple[int, int]] = []
+            available = self.token_budget - prompt_tokens - count_tokens(model, RECALL_HEADER) - MESSAGE_OVERHEAD_TOKENS
+            for start, end in recall:
+                if start < pinned or end > split or start >= end:
+                    continue
+                tokens = sum(content_tokens[start:end])
+                if tokens <= available:
+                    available -= tokens
+                    recalled_spans.append((start, end))
+            if recalled_spans:
+                recalled_messages = [{"role": "system", "content": RECALL_HEADER}]
+                for start, end in sorted(recalled_spans):
+                    recalled_messages.extend(
+                        {"role": msg["role"], "content": msg["content"]} for msg in conversation_history[start:end]
+                    )
+                    recalled += end - start
+                position = 1 + pinned + bool(summary_lines)
+                messages[position:position] = recalled_messages
+                prompt_tokens = self.token_budget - available
+        return BuiltContext(messages, prompt_tokens, self.token_budget, split - pinned, dropped, recalled)
+
+    def _summary_for_prefix(self, model: str, conversation_history: List[Dict[str, Any]], length: int) -> List[str]:
+        """Return the summary lines for conversation_history[:length], reusing the longest cached prefix."""
+        with self._lock:
+            cached_lengths = set(self._lengths)
+        # One running hash over the prefix, read out only where a cached summary could match
+        hasher = hashlib.sha256(model.encode())
+        update = hasher.update
+        prefix_hashes: Dict[int, bytes] = {}
+        for index in range(length):
+            msg = conversation_history[index]
+            update(msg["role"].encode())
+            update(b"\0")
+            update(msg["content"].encode("utf-8"))
+            update(b"\0")
+            if index + 1 in cached_lengths:
+                prefix_hashes[index + 1] = hasher.copy().digest()
+        prefix_hashes[length] = hasher.digest()
+
+        start, lines = 0, []
+        with self._lock:
+            for prefix_length in sorted(prefix_hashes, reverse=True):
+                cached = self._summaries.get(prefix_hashes[prefix_length])
+                if cached is not None:
+                    self._summaries.move_to_end(prefix_hashes[prefix_length])
+                    start, lines = prefix_length, list(cached[1])
+                    break
+
+        for msg in conversation_history[start:length]:
+            lines.append(summarize_message(msg))
+        # Keep the summary within its budget by letting the oldest points fall off
+        lines = trim_summary_lines(model, lines, self.summary_max_tokens)
+
+        if start < length:
+            with self._lock:
+                key = prefix_hashes[length]
+                if key not in self._summaries:
+                    self._lengths[length] += 1
+                self._summaries[key] = (length, lines)
+                self._summaries.move_to_end(key)
+                while len(self._summaries) > self.summary_cache_size:
+                    _, (evicted_length, _) = self._summaries.popitem(last=False)
+                    self._lengths[evicted_length] -= 1
+                    if not self._lengths[evicted_length]:
+                        del self._lengths[evicted_length]
+        return lines
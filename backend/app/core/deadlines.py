@@ -0,0 +1,127 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """A request's time budget ran out before it finished."""
+
+    def __init__(self, budget: float):
+        super().__init__(f"Deadline of {budget:.1f}s exceeded")
+        self.budget = budget
+
+
+class ClientDisconnected(Exception):
+    """The client went away before its request finished."""
+
+
+def _uncancel(task: "asyncio.Task[Any]") -> None:
+    # Python 3.11+ counts cancellation requests; one the deadline turned into an exception is withdrawn
+    uncancel = getattr(task, "uncancel", None)
+    if uncancel is not None:
+        uncancel()
+
+
+class Deadline:
+    """
+    A request's end-to-end time budget, as a time.monotonic() timestamp. Work done for the request
+    is awaited through wait() or iterate(), which cancel it once the budget is spent, so the
+    upstream call it waits on is cancelled too (see SingleFlight).
+    """
+
+    __slots__ = ("budget", "expires_at")
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    async def wait(self, awaitable: Awaitable[T]) -> T:
+        """Await within the budget; raises DeadlineExceeded (after cancelling the awaitable) once it is spent."""
+        try:
+            return await asyncio.wait_for(awaitable, self.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(self.budget) from None
+
+    async def iterate(self, events: AsyncIterator[T]) -> AsyncIterator[T]:
+        """
+        Yield from `events` within the budget. Once it is spent, the wait for the next event is
+        cancelled, `events` is closed and DeadlineExceeded raised. Only the wait is timed, with one
+        loop timer per event rather than a task: time the consumer spends between events (sending
+        them to the client) is never interrupted.
+        """
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        expired = []
+
+        def expire() -> None:
+            expired.append(True)
+            task.cancel()
+
+        try:
+            while True:
+                timer = loop.call_later(self.remaining(), expire)
+                try:
+                    event = await events.__anext__()
+                except StopAsyncIteration:
+                    return
+                except asyncio.CancelledError:
+                    if not expired:
+                        raise
+                    _uncancel(task)
+                    raise DeadlineExceeded(self.budget) from None
+                finally:
+                    timer.cancel()
+                if expired:
+                    # The timer fired as the event arrived; take the pending cancellation here
+                    try:
+                        await asyncio.sleep(0)
+                    except asyncio.CancelledError:
+                        _uncancel(task)
+                    raise DeadlineExceeded(self.budget)
+                yield event
+        finally:
+            aclose = getattr(events, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+def request_deadline(timeout_ms: Optional[int], default_seconds: float, max_seconds: float) -> Deadline:
+    """The deadline for a request: the client's budget (timeoutMs) capped at max_seconds, or the default."""
+    seconds = default_seconds if timeout_ms is None else timeout_ms / 1000
+    return Deadline(min(max(0.0, seconds), max_seconds))
+
+
+async def until_disconnected(receive: Callable[[], Awaitable[dict]], awaitable: Awaitable[T]) -> T:
+    """
+    Await `awaitable` while watching the ASGI connection for the client going away, which
+    Starlette only does for streaming responses. On disconnect the work is cancelled and
+    ClientDisconnected raised. Call it once the request body has been read.
+    """
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await asyncio.wait((work, watcher), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not work.done():
+            work.cancel()
+            await asyncio.gather(work, return_exceptions=True)
+    if work.cancelled():
+        raise ClientDisconnected()
+    return work.result()
+
+
+async def _wait_for_disconnect(receive: Callable[[], Awaitable[dict]]) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Set, Tuple, TypeVar
+
+from ..core.metrics import LLM_HEDGES
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# Losing attempts are closed in the background; kept here so they aren't garbage collected meanwhile
+_discarding: Set["asyncio.Task[None]"] = set()
+
+
+class LatencyWindow:
+    """The last `size` times to first token of a model, for percentile lookups."""
+
+    __slots__ = ("samples", "_sorted")
+
+    def __init__(self, size: int):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self._sorted: Optional[List[float]] = None
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self._sorted = None
+
+    def percentile(self, fraction: float) -> float:
+        if self._sorted is None:
+            self._sorted = sorted(self.samples)
+        return self._sorted[min(len(self._sorted) - 1, int(len(self._sorted) * fraction))]
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+
+class HedgePolicy:
+    """
+    When to send a duplicate of a slow upstream call to the hedge model, and the counts of how
+    hedging went.
+
+    A call is hedged once it has gone without a first token for the given percentile of the
+    model's recent times to first token (clamped to [min_delay, max_delay]; max_delay until
+    min_samples are in); streams and plain calls, which answer all at once, are timed apart.
+    Hedges are paid for from a budget that every primary call adds budget_ratio to (up to
+    burst), so a provider that slows down across the board draws at most that fraction of
+    extra calls instead of doubling its load.
+    """
+
+    def __init__(self, hedge_model: str, percentile: float, min_delay_seconds: float, max_delay_seconds: float,
+                 window: int, min_samples: int, budget_ratio: float, burst: float = 10.0):
+        self.hedge_model = hedge_model
+        self.percentile = percentile
+        self.min_delay_seconds = min_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.window = window
+        self.min_samples = min_samples
+        self.budget_ratio = budget_ratio
+        self.burst = burst
+        self._budget = burst
+        self.latencies: Dict[Tuple[str, bool], LatencyWindow] = {}
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+
+    def delay(self, model: str, stream: bool) -> float:
+        """Seconds to wait for the first token of `model` before hedging."""
+        latencies = self.latencies.get((model, stream))
+        if latencies is None or len(latencies) < self.min_samples:
+            return self.max_delay_seconds
+        return min(self.max_delay_seconds, max(self.min_delay_seconds, latencies.percentile(self.percentile / 100)))
+
+    def record(self, model: str, stream: bool, seconds: float) -> None:
+        """
+        Record a call's time to first token. When the hedge answered first the primary's is unknown;
+        the time the hedge answered at is recorded as its lower bound, so slow spells still
+        show in the percentile.
+        """
+        latencies = self.latencies.get((model, stream))
+        if latencies is None:
+            latencies = self.latencies[(model, stream)] = LatencyWindow(self.window)
+        latencies.add(seconds)
+
+    def admit_call(self) -> None:
+        self.calls += 1
+        self._budget = min(self.burst, self._budget + self.budget_ratio)
+
+    def try_hedge(self, model: str) -> bool:
+        """Take a hedge from the budget; False (and counted) when it is spent."""
+        if self._budget < 1:
+            self.budget_exhausted += 1
+            LLM_HEDGES.labels(model, "budget_exhausted").inc()
+            return False
+        self._budget -= 1
+        self.hedged += 1
+        return True
+
+    def settle(self, model: str, hedge_won: bool) -> None:
+        if hedge_won:
+            self.hedge_wins += 1
+        LLM_HEDGES.labels(model, "hedge_won" if hedge_won else "primary_won").inc()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hedge_model": self.hedge_model,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "budget_exhausted": self.budget_exhausted,
+            "hedge_rate": round(self.hedged / self.calls, 4) if self.calls else 0.0,
+            "delay_seconds": {
+                f"{model}:{'stream' if stream else 'complete'}": round(self.delay(model, stream), 4)
+                for model, stream in self.latencies
+            },
+        }
+
+
+async def race_first(
+    primary: AsyncIterator[T],
+    start_hedge: Callable[[], Optional[AsyncIterator[T]]],
+    delay: float
+) -> Tuple[AsyncIterator[T], T, Optional[bool]]:
+    """
+    Wait for the first item of `primary`. If none has arrived after `delay` seconds, start_hedge()
+    starts a duplicate (or returns None to go on waiting), and whichever of the two yields first
+    without failing wins; the other is cancelled and closed in the background. A failure of the
+    primary before any hedge was started is raised as is; once both run, the primary's error is
+    raised only if both fail.
+
+    Returns the winning stream (positioned after its first item), that item, and whether the
+    hedge won (None when no hedge was started).
+    """
+    primary_next = asyncio.ensure_future(primary.__anext__())
+    try:
+        await asyncio.wait((primary_next,), timeout=delay)
+    except asyncio.CancelledError:
+        _discard(primary_next, primary)
+        raise
+    if primary_next.done():
+        return primary, primary_next.result(), None
+
+    hedge = start_hedge()
+    if hedge is None:
+        try:
+            return primary, await primary_next, None
+        except asyncio.CancelledError:
+            _discard(primary_next, primary)
+            raise
+
+    hedge_next = asyncio.ensure_future(hedge.__anext__())
+    streams = {primary_next: (primary, False), hedge_next: (hedge, True)}
+    pending = set(streams)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # The primary goes first if both finished at once
+            for attempt in sorted(done, key=lambda task: streams[task][1]):
+                if attempt.exception() is None:
+                    for other in streams:
+                        if other is not attempt:
+                            _discard(other, streams[other][0])
+                    stream, hedge_won = streams[attempt]
+                    return stream, attempt.result(), hedge_won
+    except asyncio.CancelledError:
+        for attempt, (stream, _) in streams.items():
+            _discard(attempt, stream)
+        raise
+    hedge_next.exception()  # Retrieved; the primary's error is the one reported
+    return primary, primary_next.result(), None
+
+
+def _discard(attempt: "asyncio.Future[Any]", stream: AsyncIterator[Any]) -> None:
+    """Cancel an attempt's pending item and close its stream, without waiting for either."""
+    task = asyncio.ensure_future(_close(attempt, stream))
+    _discarding.add(task)
+    task.add_done_callback(_discarding.discard)
+
+
+async def _close(attempt: "asyncio.Future[Any]", stream: AsyncIterator[Any]) -> None:
+    attempt.cancel()
+    await asyncio.gather(attempt, return_exceptions=True)
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception as e:
+            logger.debug("Closing a discarded hedge attempt failed: %s", e)
@@ -0,0 +1,328 @@
+import asyncio
+import importlib.util
+import logging
+import ssl
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import httpx
+
+from ..core.llm_router import call_provider
+
+logger = logging.getLogger(__name__)
+
+# Providers LiteLLM calls through its own HTTP handler, which takes the client to use per call.
+# OpenAI-compatible providers go through the OpenAI SDK, which uses litellm.aclient_session instead.
+HTTP_HANDLER_PROVIDERS = ("anthropic", "gemini", "vertex_ai")
+
+# LiteLLM's own default: long generations may take minutes, connecting should not
+DEFAULT_TIMEOUT = httpx.Timeout(600.0, connect=5.0)
+
+# How long closing a partly read response waits for the rest of the body before giving up the connection
+DRAIN_TIMEOUT_SECONDS = 0.05
+
+
+class _HostStats:
+    """Request and connection counters for one provider origin, plus its optional concurrency cap."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.requests = 0
+        self.http2_requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waiting = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> Optional[asyncio.Semaphore]:
+        # Created on first use so it belongs to the serving event loop
+        if self._semaphore is None and self.limit > 0:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "http2_requests": self.http2_requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "waiting": self.waiting,
+            "connections_opened": self.connections_opened,
+            "tls_handshakes": self.tls_handshakes,
+            "requests_per_connection": round(self.requests / self.connections_opened, 1) if self.connections_opened else None,
+        }
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives back its host slot once the body is closed (streams stay in flight until then)."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        self._exhausted = False
+        self._closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._stream:
+                yield chunk
+            self._exhausted = True
+        finally:
+            # Also when a reader drops the body iterator without closing the response
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if not self._exhausted:
+                # Stream readers stop at the provider's end-of-stream event, just before the end of the
+                # body; a connection closed with unread data can't be reused, so read the rest first
+                try:
+                    await asyncio.wait_for(self._drain(), DRAIN_TIMEOUT_SECONDS)
+                except Exception:
+                    pass
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+    async def _drain(self) -> None:
+        async for _ in self._stream:
+            pass
+        self._exhausted = True
+
+
+# Response bodies opened by the current call; see track_responses()
+_opened_streams: ContextVar[Optional[List[_ReleasingStream]]] = ContextVar("opened_streams", default=None)
+
+
+@contextmanager
+def track_responses() -> Iterator[List[_ReleasingStream]]:
+    """
+    Collect the pooled responses opened inside the block, for close_responses() once the caller
+    is done reading. Some of LiteLLM's stream readers (Anthropic) stop at the provider's
+    end-of-stream event without closing the HTTP response, which would otherwise hold its
+    connection and per-host slot until garbage collection.
+    """
+    opened: List[_ReleasingStream] = []
+    token = _opened_streams.set(opened)
+    try:
+        yield opened
+    finally:
+        _opened_streams.reset(token)
+
+
+async def close_responses(opened: List[_ReleasingStream]) -> None:
+    for stream in opened:
+        await stream.aclose()
+
+
+class _PooledTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps the connection-pooling transport with per-host concurrency limits and counters.
+    New connections and TLS handshakes are counted through httpcore's trace hook.
+    """
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, max_requests_per_host: int):
+        self._transport = transport
+        self._max_requests_per_host = max_requests_per_host
+        self.hosts: Dict[str, _HostStats] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        origin = f"{request.url.host}:{request.url.port or (443 if request.url.scheme == 'https' else 80)}"
+        host = self.hosts.get(origin)
+        if host is None:
+            host = self.hosts[origin] = _HostStats(self._max_requests_per_host)
+        host.requests += 1
+
+        semaphore = host.semaphore
+        if semaphore is not None:
+            host.waiting += 1
+            try:
+                await semaphore.acquire()
+            finally:
+                host.waiting -= 1
+        host.in_flight += 1
+        host.peak_in_flight = max(host.peak_in_flight, host.in_flight)
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                host.in_flight -= 1
+                if semaphore is not None:
+                    semaphore.release()
+
+        outer_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if event_name == "connection.connect_tcp.complete":
+                host.connections_opened += 1
+            elif event_name == "connection.start_tls.complete":
+                host.tls_handshakes += 1
+            if outer_trace is not None:
+                await outer_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            host.errors += 1
+            release()
+            raise
+        if response.extensions.get("http_version") == b"HTTP/2":
+            host.http2_requests += 1
+        response.stream = _ReleasingStream(response.stream, release)
+        opened = _opened_streams.get()
+        if opened is not None:
+            opened.append(response.stream)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def connections(self) -> Iterable[Any]:
+        # httpcore's connection pool; not part of httpx's public API, so read defensively
+        pool = getattr(self._transport, "_pool", None)
+        return list(getattr(pool, "connections", ()))
+
+
+_client_hook_class = None
+
+
+def _make_client_hook(handler: Any):
+    """
+    A LiteLLM callback that hands `handler` (an AsyncHTTPHandler on the shared pool) to calls for
+    HTTP_HANDLER_PROVIDERS. It runs after the router has picked a deployment, so it sees the
+    provider that is actually called, including fallbacks.
+    """
+    global _client_hook_class
+    if _client_hook_class is None:
+        # Defined on first use: CustomLogger lives in LiteLLM, which is imported lazily
+        from litellm.integrations.custom_logger import CustomLogger
+
+        class PooledClientHook(CustomLogger):
+            def __init__(self, handler: Any):
+                super().__init__()
+                self.handler = handler
+
+            async def async_pre_call_deployment_hook(self, kwargs, call_type):
+                if kwargs.get("client") is None and call_provider(kwargs) in HTTP_HANDLER_PROVIDERS:
+                    kwargs["client"] = self.handler
+                return kwargs
+
+        _client_hook_class = PooledClientHook
+    return _client_hook_class(handler)
+
+
+class HTTPPool:
+    """
+    One long-lived, keep-alive HTTP connection pool shared by every LLM provider call, so
+    requests reuse open (TLS) connections instead of each client LiteLLM creates opening its own.
+
+    `attach()` routes LiteLLM through it: the OpenAI SDK (OpenAI-compatible providers) through
+    `litellm.aclient_session`, and LiteLLM's HTTP handler (Anthropic, Gemini) through a callback
+    that passes the pooled client to each call. The pool is bound to the event loop it is used on.
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 60.0, http2: bool = True, max_requests_per_host: int = 0,
+                 connect_timeout: float = 5.0, ca_bundle: str = ""):
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested for LLM calls but the h2 package is not installed; using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections or None,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.max_requests_per_host = max_requests_per_host
+        self.timeout = httpx.Timeout(DEFAULT_TIMEOUT.read, connect=connect_timeout)
+        verify: Union[bool, ssl.SSLContext] = ssl.create_default_context(cafile=ca_bundle) if ca_bundle else True
+        self.transport = _PooledTransport(
+            httpx.AsyncHTTPTransport(verify=verify, http2=http2, limits=self.limits, retries=0),
+            max_requests_per_host
+        )
+        self.client = httpx.AsyncClient(transport=self.transport, timeout=self.timeout, follow_redirects=True)
+        self._litellm: Any = None
+        self._hook: Any = None
+
+    @property
+    def closed(self) -> bool:
+        return self.client.is_closed
+
+    def attach(self, litellm: Any) -> None:
+        """Send LiteLLM's provider calls through this pool."""
+        if self._litellm is not None:
+            return
+        from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+        handler = AsyncHTTPHandler(timeout=self.timeout, transport=self.transport, client_alias="http-pool")
+        self._hook = _make_client_hook(handler)
+        litellm.aclient_session = self.client
+        litellm.callbacks.append(self._hook)
+        self._litellm = litellm
+
+    def detach(self) -> None:
+        litellm, self._litellm = self._litellm, None
+        if litellm is None:
+            return
+        if litellm.aclient_session is self.client:
+            litellm.aclient_session = None
+        if self._hook in litellm.callbacks:
+            litellm.callbacks.remove(self._hook)
+
+    async def preconnect(self, origins: Iterable[str], connections_per_host: int = 1) -> None:
+        """
+        Open keep-alive connections (including the TLS handshake) to each origin ahead of the
+        first call, with cheap unauthenticated HEAD requests whose answers are ignored.
+        """
+        async def touch(origin: str) -> None:
+            try:
+                response = await self.client.head(origin + "/", timeout=self.timeout.connect)
+                await response.aclose()
+            except Exception as e:
+                logger.debug("Could not pre-open a connection to %s: %s", origin, e)
+
+        await asyncio.gather(*(touch(origin) for origin in origins for _ in range(connections_per_host)))
+
+    async def aclose(self) -> None:
+        self.detach()
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        connections = self.transport.connections()
+        idle = sum(1 for connection in connections if connection.is_idle())
+        hosts = {origin: host.snapshot() for origin, host in self.transport.hosts.items()}
+        requests = sum(host.requests for host in self.transport.hosts.values())
+        opened = sum(host.connections_opened for host in self.transport.hosts.values())
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "max_requests_per_host": self.max_requests_per_host,
+            "open_connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "requests": requests,
+            "connections_opened": opened,
+            "tls_handshakes": sum(host.tls_handshakes for host in self.transport.hosts.values()),
+            "requests_per_connection": round(requests / opened, 1) if opened else None,
+            "hosts": hosts,
+        }
+
+
+def host_samples(pool: Optional[HTTPPool], key: str) -> Iterable[Tuple[Dict[str, str], float]]:
+    """(labels, value) pairs of one per-host counter, for metrics collectors."""
+    if pool is None:
+        return []
+    return [({"host": origin}, host.snapshot()[key]) for origin, host in pool.transport.hosts.items()]
@@ -0,0 +1,203 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import yaml
+
+from ..core.metrics import registry
+
+ROUTES = ("strong", "fast", "canned", "default")
+
+CLARIFICATION_INTENT = "clarification"
+GENERAL_INTENT = "general"
+
+CASCADE_DECISIONS = registry.counter(
+    "empathy_cascade_decisions_total", "Model cascade decisions by intent and tier.", ("intent", "tier")
+)
+
+
+class IntentDefinition:
+    """One intent from the intents config: its keywords, the model tier it routes to and an optional canned reply."""
+
+    def __init__(self, name: str, route: str, keywords: Sequence[str] = (), max_words: Optional[int] = None,
+                 reply: Optional[str] = None, justification: Optional[str] = None):
+        if route not in ROUTES:
+            raise ValueError(f"Intent {name!r} has unknown route {route!r}")
+        if route == "canned" and not reply:
+            raise ValueError(f"Intent {name!r} routes to a canned reply but has no reply")
+        self.name = name
+        self.route = route
+        self.keywords = [keyword.lower() for keyword in keywords]
+        self.max_words = max_words
+        self.reply = reply
+        self.justification = justification
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], default_name: Optional[str] = None) -> "IntentDefinition":
+        return cls(
+            name=config.get("name", default_name),
+            route=config.get("route", "default"),
+            keywords=config.get("keywords") or (),
+            max_words=config.get("max_words"),
+            reply=config.get("reply"),
+            justification=config.get("justification"),
+        )
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """
+    Build a regex from a set of literal words by merging their common prefixes into a trie,
+    so the matcher follows one branch per character instead of trying every word in turn.
+    Longer words are preferred over their prefixes ("javascript" over "java").
+    """
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}  # End of a word
+
+    def emit(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # A word ends here, but a longer one may continue; the greedy ? tries the longer one first
+            body = "(?:" + body + ")?"
+        return body
+
+    return emit(trie)
+
+
+class IntentEngine:
+    """
+    Classifies messages into intents with a single pass over the text.
+
+    Every intent's keywords are compiled into one trie-shaped pattern matched as whole words
+    (case-insensitively). Each hit maps back to the intent that owns the keyword, and the
+    first-listed matching intent wins, subject to its word limit. A canned intent only wins
+    when the message is made of its keywords alone, so a greeting followed by anything else
+    gets an LLM answer. Messages with no hit are "clarification" when they are tiny or one of
+    the clarification phrases, else "general".
+    """
+
+    def __init__(self, intents: Sequence[IntentDefinition], clarification: Optional[IntentDefinition] = None,
+                 clarification_max_chars: int = 4, clarification_phrases: Sequence[str] = (),
+                 default_route: str = "default"):
+        self.intents = list(intents)
+        self.clarification = clarification
+        self.clarification_max_chars = clarification_max_chars
+        self.clarification_phrases = {phrase.lower() for phrase in clarification_phrases}
+        self.general = IntentDefinition(GENERAL_INTENT, default_route)
+
+        # Keyword -> index of the first intent listing it
+        self._keyword_owner: Dict[str, int] = {}
+        for index, intent in enumerate(self.intents):
+            for keyword in intent.keywords:
+                self._keyword_owner.setdefault(keyword, index)
+        self._pattern = None
+        if self._keyword_owner:
+            self._pattern = re.compile(r"(?<!\w)" + _trie_pattern(self._keyword_owner) + r"(?!\w)", re.IGNORECASE)
+        # Intent index -> pattern matching a whole message of its keywords, for canned intents
+        self._whole_message: Dict[int, Any] = {}
+        for index, intent in enumerate(self.intents):
+            if intent.route == "canned" and intent.keywords:
+                keyword = "(?:" + _trie_pattern(set(intent.keywords)) + r")(?!\w)"
+                self._whole_message[index] = re.compile(
+                    r"\W*" + keyword + r"(?:\W+" + keyword + r")*\W*", re.IGNORECASE
+                )
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "IntentEngine":
+        intents = [IntentDefinition.from_config(entry) for entry in config.get("intents") or []]
+        clarification_config = config.get("clarification")
+        clarification = None
+        max_chars, phrases = 0, ()
+        if clarification_config:
+            clarification = IntentDefinition.from_config(clarification_config, default_name=CLARIFICATION_INTENT)
+            max_chars = clarification_config.get("max_chars", 4)
+            phrases = clarification_config.get("phrases") or ()
+        return cls(intents, clarification, max_chars, phrases, config.get("default_route", "default"))
+
+    def classify(self, message: str) -> IntentDefinition:
+        best: Optional[int] = None
+        word_count: Optional[int] = None
+        if self._pattern is not None:
+            for match in self._pattern.finditer(message):
+                index = self._keyword_owner[match.group(0).lower()]
+                if best is not None and index >= best:
+                    continue
+                max_words = self.intents[index].max_words
+                if max_words is not None:
+                    if word_count is None:
+                        word_count = len(message.split())
+                    if word_count > max_words:
+                        continue
+                whole_message = self._whole_message.get(index)
+                if whole_message is not None and whole_message.fullmatch(message) is None:
+                    continue
+                best = index
+                if best == 0:
+                    break
+        if best is not None:
+            return self.intents[best]
+
+        if self.clarification is not None:
+            stripped = message.strip()
+            if len(stripped) <= self.clarification_max_chars or stripped.lower() in self.clarification_phrases:
+                return self.clarification
+        return self.general
+
+    def classify_many(self, messages: Iterable[str]) -> List[IntentDefinition]:
+        classify = self.classify
+        return [classify(message) for message in messages]
+
+
+def load_intent_engine(path: str) -> IntentEngine:
+    with open(path) as config_file:
+        return IntentEngine.from_config(yaml.safe_load(config_file) or {})
+
+
+class CascadeDecision:
+    """Which model tier (and model) serves a message, or the canned reply that answers it."""
+
+    def __init__(self, intent: IntentDefinition, tier: str, model_name: Optional[str],
+                 canned: Optional[Tuple[str, str]] = None):
+        self.intent = intent
+        self.tier = tier
+        self.model_name = model_name
+        self.canned = canned
+
+    def metadata(self) -> Dict[str, Any]:
+        return {"intent": self.intent.name, "modelTier": self.tier, "model": self.model_name}
+
+
+class ModelCascade:
+    """
+    Maps a message's intent to a model tier: canned replies and the fast model for greetings
+    and short clarifications, the strong model for distress and complex problem solving.
+    Tiers without a configured model use the default model.
+    """
+
+    def __init__(self, engine: IntentEngine, default_model: str, fast_model: Optional[str] = None,
+                 strong_model: Optional[str] = None, default_justification: str = ""):
+        self.engine = engine
+        self.models = {"default": default_model, "fast": fast_model or default_model, "strong": strong_model or default_model}
+        self.default_justification = default_justification
+
+    def decide(self, user_message: str, conversation_history: Sequence[Dict[str, Any]]) -> CascadeDecision:
+        intent = self.engine.classify(user_message)
+        tier = intent.route
+        decision = None
+        if tier == "canned":
+            if not conversation_history:
+                decision = CascadeDecision(
+                    intent, tier, None, (intent.reply, intent.justification or self.default_justification)
+                )
+            else:
+                # Mid-conversation a fixed reply would ignore the context, so use the fast model
+                tier = "fast"
+        if decision is None:
+            decision = CascadeDecision(intent, tier, self.models[tier])
+        CASCADE_DECISIONS.labels(intent.name, tier).inc()
+        return decision
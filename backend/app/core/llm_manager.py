@@ -1,26 +1,167 @@
-import litellm
-from litellm import acompletion
 from fastapi import HTTPException
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+from ..core.config import settings
+from ..core.response_cache import build_response_cache, make_cache_key
+from ..core.context_builder import BuiltContext, ContextBuilder, count_tokens, summarize_message, trim_summary_lines
+from ..core.llm_router import build_router, deployment_endpoints, deployment_models, env_value, load_litellm_config
+from ..core.single_flight import SingleFlight
+from ..core.intent_engine import IntentEngine, ModelCascade, load_intent_engine
+from ..core.response_parser import DEFAULT_JUSTIFICATION, RESPONSE_FORMAT, ResponseParser, parse_response
+from ..core.metrics import LLM_INPUT_TOKENS, LLM_REQUESTS
+from ..core.tracing import observe_stage, stage_timer
+from ..core.warmup import litellm_module
+from ..core.http_pool import HTTPPool, close_responses, track_responses
+from ..core.prompt_cache import PromptCache, PromptCacheRequest, usage_metadata
+from ..core.hedging import HedgePolicy, race_first
+from ..core.llm_recorder import LLMRecorder, build_recorder
+from ..core.semantic_memory import SemanticMemory, build_semantic_memory
+from ..core.safety_screen import CrisisDetected, SafetyScreen, build_safety_screen, moderation_messages, parse_moderation
+import asyncio
+import logging
 import re
-import os
 import json
+import time
+from urllib.parse import urlsplit
+
+T = TypeVar("T")
+# Takes an admission slot for the named model; the returned context manager holds it
+Admit = Callable[[str], Awaitable[AsyncContextManager[Any]]]
+
+logger = logging.getLogger(__name__)
+# Per-request messages; silenced together with the rest of the hot path by LOG_HOT_PATH=false
+request_log = logging.getLogger("app.request.llm")
+
+# Map model names to their provider-specific formats for LiteLLM
+# For Gemini, LiteLLM often expects "gemini/model-name"
+MODEL_MAPPING = {
+    "flash-2.0": "gemini/gemini-2.0-flash",
+    "flash-lite": "gemini/gemini-2.0-flash-lite",
+    "gemini-1.5-flash": "gemini/gemini-1.5-flash",
+    "gemini-1.5-pro": "gemini/gemini-1.5-pro",
+    "gemini-1.0-pro": "gemini/gemini-1.0-pro",
+    "claude-3-opus": "anthropic/claude-3-opus",
+    "claude-3-sonnet": "anthropic/claude-3-sonnet",
+    "claude-3-haiku": "anthropic/claude-3-haiku",
+    "gpt-4": "openai/gpt-4",
+    "gpt-4-turbo": "openai/gpt-4-turbo",
+    "gpt-3.5-turbo": "openai/gpt-3.5-turbo"
+}
+
+# Mock responses used in DEV_MODE, keyed by intent (see intents.yaml)
+MOCK_RESPONSES = {
+    "financial": (
+        "I understand you're facing financial challenges. Here are some steps that might help: \n\n"
+        "1. Consider debt consolidation through a personal loan from a reputable bank, which often has lower interest rates than informal loans.\n"
+        "2. Check if you qualify for any government assistance programs.\n"
+        "3. Create a detailed budget to track your expenses and identify areas where you can save.\n"
+        "4. Consider speaking with a financial advisor who specializes in debt management.\n"
+        "5. If possible, try to negotiate with your relatives for a lower interest rate or extended payment terms.\n\n"
+        "Would you like me to elaborate on any of these suggestions?",
+
+        "Financial stress can be overwhelming, and having a structured approach with multiple options provides a sense of control and practical next steps."
+    ),
+    "health": (
+        "I hear you're concerned about health issues. While I'm not a medical professional, I can suggest some general steps:\n\n"
+        "1. Consider scheduling an appointment with a healthcare provider for a proper diagnosis.\n"
+        "2. Keep track of your symptoms - when they occur, what makes them better or worse.\n"
+        "3. Ensure you're maintaining basic health habits: adequate sleep, hydration, and nutrition.\n"
+        "4. Be careful about self-diagnosing using internet sources.\n\n"
+        "Remember that your health is a priority, and seeking professional medical advice is important.",
+
+        "Health concerns often benefit from professional medical attention rather than self-diagnosis, and tracking symptoms provides valuable information for healthcare providers."
+    ),
+    "relationship": (
+        "Relationships can be complex, and I appreciate you sharing this with me. Here are some thoughts:\n\n"
+        "1. Open communication is key - consider expressing your feelings using 'I' statements to avoid sounding accusatory.\n"
+        "2. Active listening can help both parties feel heard and validated.\n"
+        "3. Setting healthy boundaries is important for any relationship.\n"
+        "4. Sometimes, a neutral third party like a relationship counselor can provide valuable guidance.\n\n"
+        "What aspects of the relationship are most challenging for you right now?",
+
+        "Communication and understanding are foundational to healthy relationships, and approaching issues collaboratively rather than confrontationally tends to lead to better outcomes."
+    ),
+    "career": (
+        "Career development is an important aspect of life. Based on what you've shared, here are some thoughts:\n\n"
+        "1. Consider your long-term career goals and how your current situation aligns with them.\n"
+        "2. Networking and professional development can open new opportunities.\n"
+        "3. When facing workplace challenges, documenting incidents and maintaining professionalism is advisable.\n"
+        "4. For job searches, tailoring your resume and preparation for interviews are crucial steps.\n\n"
+        "Could you tell me more about your specific career aspirations or challenges?",
+
+        "Career decisions benefit from aligning short-term actions with long-term goals, and professional development is an ongoing process that extends beyond formal education."
+    ),
+    "mental_health": (
+        "I'm sorry to hear you're struggling with these feelings. Your mental wellbeing is important, and it's brave of you to talk about it.\n\n"
+        "1. Consider speaking with a mental health professional who can provide personalized support.\n"
+        "2. Self-care routines, including physical activity and mindfulness practices, can be helpful supplements to professional care.\n"
+        "3. Setting small, achievable goals may help when feeling overwhelmed.\n"
+        "4. Remember that seeking help is a sign of strength, not weakness.\n\n"
+        "Would you like to talk more about how you've been feeling?",
+
+        "Mental health challenges benefit from professional support, and acknowledging feelings without judgment creates a safe space for discussion."
+    ),
+    "technical": (
+        "For technical challenges, a systematic approach often works best:\n\n"
+        "1. Break down the problem into smaller, manageable parts.\n"
+        "2. Check documentation and existing solutions in forums like Stack Overflow.\n"
+        "3. Use debugging tools to identify where the issue occurs.\n"
+        "4. Consider implementing automated tests to catch similar issues in the future.\n"
+        "5. Sometimes, explaining the problem to someone else (or even to yourself) can lead to insights.\n\n"
+        "Could you provide more details about the specific technical challenge you're facing?",
+
+        "Technical problems often benefit from systematic troubleshooting rather than trial-and-error approaches, and documentation and community resources are valuable tools."
+    ),
+    "problem_solving": (
+        "I understand you're looking for help with a problem or challenge. I'll do my best to assist. To get a clearer picture, could you tell me a bit more about it?\n\n"
+        "For instance:\n"
+        "1. Can you describe the main challenge or what you're trying to achieve?\n"
+        "2. Are there any specific constraints or factors I should be aware of?\n"
+        "3. Have you tried anything already, or do you have any initial thoughts on how to approach it?\n\n"
+        "The more information you can provide, the better I can help you explore solutions.",
+        "Gathering specific details about the problem upfront helps in formulating a targeted and effective response strategy."
+    ),
+    "general": (
+        "Thank you for sharing that with me. I'm here to help and would like to understand your situation better. Could you tell me more about what you're experiencing or what kind of support you're looking for?",
+
+        "Open-ended questions encourage elaboration and help gather more information to provide appropriate support."
+    ),
+}
+
+# Nothing listens here; warm-up requests fail immediately without leaving the machine
+WARM_UP_API_BASE = "http://127.0.0.1:9"
+
+# Splits mock text into word-sized "tokens", keeping the trailing whitespace with each word
+_MOCK_TOKEN_PATTERN = re.compile(r'\S+\s*|\s+')
+
+# Instructions for folding new turns into a conversation's running summary (background jobs)
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain the running summary of a supportive conversation between a user and an empathetic "
+    "AI assistant. You are given the current summary (possibly empty) and the turns that followed it. "
+    "Return the updated summary only: concise plain prose that keeps the user's situation, feelings, "
+    "the main topics discussed, advice already given and anything the user asked to remember. "
+    "Drop small talk. Write in the third person (\"The user ...\")."
+)
+
+
+class _StreamAttempt:
+    """One upstream streaming call: the model it went to, and the usage and prompt cache request it reported."""
+
+    __slots__ = ("model_name", "usage", "cache_request")
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.usage: Any = None
+        self.cache_request: Optional[PromptCacheRequest] = None
 
-# --- Configuration for Beta/Production ---
-# For BETA TESTING and PRODUCTION, ensure DEV_MODE is NOT 'true' in your environment.
-# If you are developing and want to use real APIs, set USE_REAL_API_IN_DEV to 'true'.
-DEV_MODE = os.environ.get("DEV_MODE", "false").lower() == "true"
-USE_REAL_API_IN_DEV = os.environ.get("USE_REAL_API_IN_DEV", "false").lower() == "true"
-# --- End Configuration ---
 
 class LLMManager:
     def __init__(self):
         """
         Initialize the LLM Manager.
-        In a more complex setup, you might load configurations from litellm_config.yaml here.
+        Model groups defined in litellm_config.yaml are served through a LiteLLM Router
+        (load balancing, fallbacks and cooldowns); other model names are called directly.
         """
-        print(f"DEBUG LLMManager: DEV_MODE is {DEV_MODE}") # Debug print
-        print(f"DEBUG LLMManager: USE_REAL_API_IN_DEV is {USE_REAL_API_IN_DEV}") # Debug print
+        logger.debug("DEV_MODE is %s, USE_REAL_API_IN_DEV is %s", settings.DEV_MODE, settings.USE_REAL_API_IN_DEV)
 
         # Optional: add any initialization parameters if necessary
         self.system_prompt = """You are an AI assistant designed to help users solve their problems iteratively or provide empathetic support. 
@@ -29,18 +170,254 @@ If the user seems distressed or is sharing a personal issue, respond with empath
 Avoid giving unsolicited advice unless specifically asked for problem-solving. 
 For every main suggestion or solution you provide, also give a short justification for why you are suggesting it. 
 Structure your response clearly. The main response should be distinct from the justification, which should be prefixed with 'Justification:'."""
+        if settings.STRUCTURED_OUTPUT:
+            self.system_prompt = self.system_prompt.rsplit("\n", 1)[0] + """
+Respond with a JSON object with two string fields: "content", your main response, and "justification", a short justification for your suggestions."""
 
-        # Configure LiteLLM for Gemini if GOOGLE_API_KEY is present
-        self.google_api_key = os.environ.get("GOOGLE_API_KEY")
+        # Configure LiteLLM for Gemini if GOOGLE_API_KEY (or the older GEMINI_API_KEY) is present
+        self.google_api_key = env_value("GOOGLE_API_KEY")
         self.gemini_available = self.google_api_key is not None and len(self.google_api_key) > 10
-        print(f"DEBUG LLMManager: GOOGLE_API_KEY is set: {self.google_api_key is not None and len(self.google_api_key or '') > 0}") # More robust check for print
-        print(f"DEBUG LLMManager: Gemini available (based on API key): {self.gemini_available}") # Debug print
+        logger.debug("GOOGLE_API_KEY is set: %s", bool(self.google_api_key))
+        logger.debug("Gemini available (based on API key): %s", self.gemini_available)
+
+        # Parameters sent with every completion; part of the response cache key
+        self.generation_params: Dict[str, Any] = {"max_tokens": 1024}
+        if settings.STRUCTURED_OUTPUT:
+            # Ask for {"content", "justification"} JSON instead of the 'Justification:' marker
+            self.generation_params["response_format"] = RESPONSE_FORMAT
+
+        # Cache of complete answers, keyed on the canonical request hash
+        self.response_cache = build_response_cache(
+            backend=settings.RESPONSE_CACHE_BACKEND,
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+            sqlite_path=settings.RESPONSE_CACHE_SQLITE_PATH
+        )
+
+        # Opt-in archive of provider calls and their timing, for replay in benchmarks
+        self.recorder: Optional[LLMRecorder] = build_recorder(
+            backend=settings.LLM_RECORD_BACKEND,
+            path=settings.LLM_RECORD_PATH,
+            sample_rate=settings.LLM_RECORD_SAMPLE_RATE,
+            record_prompts=settings.LLM_RECORD_PROMPTS,
+            redact_patterns=settings.LLM_RECORD_REDACT_PATTERNS
+        )
+
+        # Fits history into the prompt token budget (rolling summary for older turns)
+        self.context_builder = ContextBuilder(
+            token_budget=settings.CONTEXT_TOKEN_BUDGET,
+            recent_messages=settings.CONTEXT_RECENT_MESSAGES,
+            summary_max_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS
+        )
+
+        # Optional index of older turns, so the ones relevant to a new message go back into the prompt
+        self.semantic_memory: Optional[SemanticMemory] = build_semantic_memory(
+            embedder=settings.SEMANTIC_MEMORY_EMBEDDER,
+            dim=settings.SEMANTIC_MEMORY_DIM,
+            top_k=settings.SEMANTIC_MEMORY_TOP_K,
+            min_score=settings.SEMANTIC_MEMORY_MIN_SCORE,
+            max_conversations=settings.SEMANTIC_MEMORY_MAX_CONVERSATIONS
+        )
+
+        # Crisis and self-harm screen: a local classifier before generation, and optionally a
+        # moderation model next to it
+        try:
+            self.safety_screen: Optional[SafetyScreen] = build_safety_screen(
+                config_path=settings.SAFETY_CONFIG_PATH,
+                moderate=self._moderate if settings.SAFETY_MODERATION_MODEL else None,
+                moderation_timeout=settings.SAFETY_MODERATION_TIMEOUT_MS / 1000
+            )
+        except Exception as e:
+            logger.error("Could not load the safety screen from %s: %s", settings.SAFETY_CONFIG_PATH, e)
+            self.safety_screen = None
+
+        # Identical requests that are already in flight share one upstream call
+        self.single_flight = SingleFlight()
+
+        # Intent classification, used to pick a model tier (or a canned reply) per message
+        try:
+            self.intent_engine = load_intent_engine(settings.INTENTS_CONFIG_PATH)
+        except Exception as e:
+            logger.warning("Could not load intents from %s: %s", settings.INTENTS_CONFIG_PATH, e)
+            self.intent_engine = IntentEngine([])
+        self.cascade = None
+        if settings.CASCADE_ENABLED:
+            self.cascade = ModelCascade(
+                self.intent_engine,
+                default_model=settings.LLM_DEFAULT_MODEL,
+                fast_model=settings.LLM_FAST_MODEL,
+                strong_model=settings.LLM_STRONG_MODEL,
+                default_justification=DEFAULT_JUSTIFICATION
+            )
+
+        # Router for the model groups defined in litellm_config.yaml. It needs LiteLLM, which is
+        # slow to import, so it is built by ensure_ready() (from the warm-up or the first request)
+        self.router = None
+        self.router_models: Dict[str, str] = {}
+        self.litellm_config: Dict[str, Any] = {}
+        try:
+            self.litellm_config = load_litellm_config(settings.LITELLM_CONFIG_PATH)
+            self.router_models = deployment_models(self.litellm_config)
+            logger.debug("Router model groups: %s", sorted(self.router_models))
+        except Exception as e:
+            logger.warning("Could not load LiteLLM config from %s: %s", settings.LITELLM_CONFIG_PATH, e)
+        self._ready = False
+        self._ready_task: Optional["asyncio.Task[None]"] = None
+
+        # Shared keep-alive connection pool for provider calls, opened by the app lifespan
+        self.http_pool: Optional[HTTPPool] = None
+
+        # Provider-side caching of the stable prompt prefix (system prompt and history)
+        self.prompt_cache: Optional[PromptCache] = None
+        if settings.PROMPT_CACHE_ENABLED:
+            self.prompt_cache = PromptCache(
+                ttl_seconds=settings.PROMPT_CACHE_TTL_SECONDS,
+                min_tokens=settings.PROMPT_CACHE_MIN_TOKENS,
+                max_conversations=settings.PROMPT_CACHE_MAX_CONVERSATIONS
+            )
+
+        # Duplicates of calls that are slow to start, sent to a second model group
+        self.hedging: Optional[HedgePolicy] = None
+        if settings.HEDGE_MODEL:
+            self.hedging = HedgePolicy(
+                hedge_model=settings.HEDGE_MODEL,
+                percentile=settings.HEDGE_PERCENTILE,
+                min_delay_seconds=settings.HEDGE_MIN_DELAY_MS / 1000,
+                max_delay_seconds=settings.HEDGE_MAX_DELAY_MS / 1000,
+                window=settings.HEDGE_WINDOW,
+                min_samples=settings.HEDGE_MIN_SAMPLES,
+                budget_ratio=settings.HEDGE_BUDGET_RATIO
+            )
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def open_http_pool(self) -> HTTPPool:
+        """
+        Create the shared connection pool provider calls go through. Called from the app
+        lifespan; without it LiteLLM falls back to the clients it creates itself.
+        """
+        if self.http_pool is None or self.http_pool.closed:
+            self.http_pool = HTTPPool(
+                max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+                http2=settings.LLM_HTTP2,
+                max_requests_per_host=settings.LLM_HTTP_MAX_REQUESTS_PER_HOST,
+                connect_timeout=settings.LLM_HTTP_CONNECT_TIMEOUT_SECONDS,
+                ca_bundle=settings.LLM_HTTP_CA_BUNDLE
+            )
+            if self._ready:
+                self.http_pool.attach(litellm_module.get())
+            if self.prompt_cache is not None:
+                self.prompt_cache.client = self.http_pool.client
+        return self.http_pool
+
+    async def aclose(self) -> None:
+        """Close the shared connection pool, the prompt cache's background work and the recorder (app shutdown)."""
+        if self.prompt_cache is not None:
+            await self.prompt_cache.aclose()
+        if self.http_pool is not None:
+            await self.http_pool.aclose()
+        if self.recorder is not None:
+            await asyncio.to_thread(self.recorder.close)
+
+    async def ensure_ready(self) -> None:
+        """
+        Import LiteLLM, build the router and load the provider code paths on worker threads,
+        once, then attach the connection pool. Concurrent callers share the same preparation;
+        afterwards this is a no-op.
+        """
+        if self._ready:
+            return
+        if self._ready_task is None or (self._ready_task.done() and self._ready_task.exception() is not None):
+            self._ready_task = asyncio.get_running_loop().create_task(self._prepare())
+        # Shielded so a cancelled request doesn't cancel the preparation other requests wait for
+        await asyncio.shield(self._ready_task)
+
+    async def _prepare(self) -> None:
+        await litellm_module.load()
+        try:
+            self.router = await asyncio.to_thread(build_router, self.litellm_config)
+        except Exception as e:
+            logger.warning("Could not build LiteLLM router from %s: %s", settings.LITELLM_CONFIG_PATH, e)
+        if self.router is None:
+            self.router_models = {}
+        # On its own thread and event loop: importing the provider SDKs would stall this loop.
+        # Done before the pool is attached, since the pool belongs to this loop
+        await asyncio.to_thread(asyncio.run, self._exercise_providers())
+        if self.http_pool is not None and not self.http_pool.closed:
+            self.http_pool.attach(litellm_module.get())
+        if self.prompt_cache is not None:
+            self.prompt_cache.attach(litellm_module.get())
+        self._ready = True
+
+    async def warm_up(self) -> None:
+        """
+        Prepare everything the first request would otherwise wait for: LiteLLM, the router and
+        the provider code paths, the default model's tokenizer, and open connections to the
+        provider endpoints.
+        """
+        await self.ensure_ready()
+        litellm_model = self._resolve_model(settings.LLM_DEFAULT_MODEL)
+        await asyncio.to_thread(count_tokens, litellm_model, self.system_prompt)
+        await self._preconnect()
+
+    async def _exercise_providers(self) -> None:
+        """
+        Send one request per provider (plain and streaming) to a closed local port. They fail
+        at once, without network traffic or cost, but load the provider SDKs and LiteLLM's
+        handlers, which LiteLLM otherwise imports during the first real call.
+        """
+        litellm = litellm_module.get()
+        models = [params.get("model") for params in
+                  (deployment.get("litellm_params") or {} for deployment in self.litellm_config.get("model_list") or [])]
+        models.append(self._resolve_model(settings.LLM_DEFAULT_MODEL))
+        by_provider: Dict[str, str] = {}
+        for model in models:
+            if model:
+                by_provider.setdefault(model.split("/", 1)[0], model)
+        for model in by_provider.values():
+            for stream in (False, True):
+                try:
+                    response = await litellm.acompletion(
+                        model=model, messages=[{"role": "user", "content": "warm-up"}], stream=stream,
+                        api_base=WARM_UP_API_BASE, api_key="warm-up", max_tokens=1, timeout=2, num_retries=0
+                    )
+                    if stream:
+                        async for _ in response:
+                            pass
+                except Exception as e:
+                    logger.debug("Warm-up call for %s (stream=%s) failed as expected: %s", model, stream, type(e).__name__)
+
+    async def _preconnect(self) -> None:
+        """
+        Open pooled connections to the provider endpoints ahead of the first call, or without
+        a pool, at least resolve their host names.
+        """
+        endpoints = deployment_endpoints(self.litellm_config, (self._resolve_model(settings.LLM_DEFAULT_MODEL),))
+        if self.http_pool is not None and not self.http_pool.closed:
+            await self.http_pool.preconnect(endpoints, settings.LLM_HTTP_PRECONNECT_PER_HOST)
+            return
+        loop = asyncio.get_running_loop()
+        addresses = [(url.hostname, url.port) for url in map(urlsplit, endpoints)]
+        results = await asyncio.gather(
+            *(loop.getaddrinfo(host, port) for host, port in addresses), return_exceptions=True
+        )
+        for (host, port), result in zip(addresses, results):
+            if isinstance(result, Exception):
+                logger.debug("Could not resolve %s:%d: %s", host, port, result)
 
     async def get_llm_response(
         self, 
         conversation_history: List[Dict[str, Any]], 
         user_message: str, 
-        model_name: str = "gemini-1.5-flash"
+        model_name: Optional[str] = None,
+        use_cache: bool = True,
+        response_metadata: Optional[Dict[str, Any]] = None,
+        conversation_id: Optional[str] = None,
+        admit: Optional[Admit] = None
     ) -> Tuple[str, str]:
         """
         Get a response from the LLM based on conversation history and the new user message.
@@ -49,39 +426,68 @@ Structure your response clearly. The main response should be distinct from the j
         Args:
             conversation_history: List of previous messages in the conversation
             user_message: The new message from the user
-            model_name: Name of the LLM model to use
+            model_name: Name of the LLM model (or router model group) to use; when omitted the
+                model cascade picks one from the message's intent (or LLM_DEFAULT_MODEL without it)
+            use_cache: Set to False to bypass the response cache for this request
+            response_metadata: Optional dict that is filled with request metadata
+                (context token budget, prompt token count, cache hit, coalesced, intent and model tier,
+                and the input tokens the provider served from its prompt cache)
+            conversation_id: Server-side conversation the request belongs to, which provider
+                prompt cache handles are kept for
+            admit: Called with the chosen model before a response is generated (not for canned
+                replies or cache hits); the admission slot it returns is held until the response
+                is in, also by a request that waits for an identical one in flight
             
         Returns:
-            Tuple containing (main_response, justification)
-        """
-        # Map model names to their provider-specific formats for LiteLLM
-        # For Gemini, LiteLLM often expects "gemini/model-name"
-        model_mapping = {
-            "gemini-1.5-flash": "gemini/gemini-1.5-flash",
-            "gemini-1.5-pro": "gemini/gemini-1.5-pro",
-            "gemini-1.0-pro": "gemini/gemini-1.0-pro",
-            "claude-3-opus": "anthropic/claude-3-opus",
-            "claude-3-sonnet": "anthropic/claude-3-sonnet",
-            "claude-3-haiku": "anthropic/claude-3-haiku",
-            "gpt-4": "openai/gpt-4",
-            "gpt-4-turbo": "openai/gpt-4-turbo",
-            "gpt-3.5-turbo": "openai/gpt-3.5-turbo"
-        }
+            Tuple containing (main_response, justification); the safety screen's reply (and
+            `safety` in the metadata) when it flags the message
+        """
+        if response_metadata is None:
+            response_metadata = {}
+        screen = self.safety_screen
+        try:
+            check = screen.start(user_message) if screen is not None else None
+            response = self._get_response(conversation_history, user_message, model_name, use_cache,
+                                          response_metadata, conversation_id, admit)
+            return await (check.guard(response) if check is not None else response)
+        except CrisisDetected as e:
+            response_metadata.update(e.metadata())
+            return e.category.response()
 
-        # Use the mapped model name if available, otherwise use the original
-        litellm_model = model_mapping.get(model_name, model_name)
+    async def _get_response(
+        self,
+        conversation_history: List[Dict[str, Any]],
+        user_message: str,
+        model_name: Optional[str],
+        use_cache: bool,
+        response_metadata: Dict[str, Any],
+        conversation_id: Optional[str] = None,
+        admit: Optional[Admit] = None
+    ) -> Tuple[str, str]:
+        """Answer get_llm_response once the message has passed the local safety screen."""
+        if model_name is None and self.cascade is not None:
+            decision = self.cascade.decide(user_message, conversation_history)
+            response_metadata.update(decision.metadata())
+            if decision.canned is not None:
+                return decision.canned
+            model_name = decision.model_name
+        model_name = model_name or settings.LLM_DEFAULT_MODEL
+        await self.ensure_ready()
+        litellm_model = self._resolve_model(model_name)
         
         # Determine if we should use mock responses
         # For Beta: defaults to NOT using mock responses unless DEV_MODE is true AND USE_REAL_API_IN_DEV is false.
-        use_mock = DEV_MODE and not USE_REAL_API_IN_DEV
+        use_mock = settings.DEV_MODE and not settings.USE_REAL_API_IN_DEV
 
         if use_mock:
-            print(f"DEV MODE (mock): Using mock LLM response for message: '{user_message}'")
-            return self._get_enhanced_mock_response(user_message, conversation_history)
+            request_log.debug("DEV MODE (mock): Using mock LLM response for message: %r", user_message)
+            context = await self._build_context(litellm_model, conversation_history, user_message, conversation_id)
+            response_metadata.update(context.metadata())
+            return await self._admitted(admit, model_name, lambda: self._mock_response(user_message, conversation_history))
         
         # Check for Gemini API key if a Gemini model is selected and not in mock mode
-        if "gemini/" in litellm_model and not self.gemini_available:
-            print(f"Warning: Attempting to use Gemini model ('{litellm_model}') but GOOGLE_API_KEY is not properly set or missing.")
+        if "gemini/" in litellm_model and not self.gemini_available and model_name not in self.router_models:
+            request_log.warning("Attempting to use Gemini model (%r) but GOOGLE_API_KEY is not properly set or missing.", litellm_model)
             # Fallback strategy for Beta if primary API key (Gemini) is missing:
             # Option 1: Raise error immediately (current behavior if not DEV_MODE)
             # Option 2: Try a different model (e.g., a free tier one if configured)
@@ -91,82 +497,628 @@ Structure your response clearly. The main response should be distinct from the j
             # Consider adding a specific user-facing error message here if LiteLLM call fails due to auth.
             pass # Let LiteLLM attempt the call
             
+        request_key = self._request_key(litellm_model, conversation_history, user_message)
+        use_cache = use_cache and self.response_cache is not None
+        if use_cache:
+            cached = await self.response_cache.get(request_key)
+            if cached is not None:
+                response_metadata.update({"contextTokenBudget": self.context_builder.token_budget, "cacheHit": True})
+                return cached
+
+        # Retries and double-submits of a request that is still running wait for the same upstream
+        # call. Each caller is admitted on its own first, so one caller's queue rejection or
+        # deadline is never handed to the others
+        (result, upstream_metadata), coalesced = await self._admitted(admit, model_name, lambda: self.single_flight.do(
+            request_key,
+            lambda: self._generate(model_name, litellm_model, conversation_history, user_message,
+                                   request_key if use_cache else None, conversation_id)
+        ))
+        response_metadata.update(upstream_metadata)
+        response_metadata["coalesced"] = coalesced
+        return result
+
+    @staticmethod
+    async def _admitted(admit: Optional[Admit], model_name: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Await call() holding the admission slot admit takes for model_name (without admit, just call())."""
+        if admit is None:
+            return await call()
+        async with await admit(model_name):
+            return await call()
+
+    @staticmethod
+    async def _admitted_stream(
+        admit: Optional[Admit],
+        model_name: str,
+        events: Callable[[], AsyncIterator[T]]
+    ) -> AsyncIterator[T]:
+        """Iterate events() holding the admission slot admit takes for model_name (without admit, just events())."""
+        if admit is None:
+            async for event in events():
+                yield event
+            return
+        async with await admit(model_name):
+            async for event in events():
+                yield event
+
+    async def _mock_response(self, user_message: str, conversation_history: List[Dict[str, Any]]) -> Tuple[str, str]:
+        """The mock response of get_llm_response, after MOCK_RESPONSE_LATENCY_MS."""
+        if settings.MOCK_RESPONSE_LATENCY_MS > 0:
+            await asyncio.sleep(settings.MOCK_RESPONSE_LATENCY_MS / 1000)
+        return self._get_enhanced_mock_response(user_message, conversation_history)
+
+    async def _generate(
+        self,
+        model_name: str,
+        litellm_model: str,
+        conversation_history: List[Dict[str, Any]],
+        user_message: str,
+        cache_key: Optional[str],
+        conversation_id: Optional[str] = None
+    ) -> Tuple[Tuple[str, str], Dict[str, Any]]:
+        """Make the upstream call for get_llm_response. Returns ((main_response, justification), metadata)."""
+        response_metadata: Dict[str, Any] = {}
         try:
-            # Prepare the messages list for LiteLLM
-            messages = []
+            context = await self._build_context(litellm_model, conversation_history, user_message, conversation_id)
+            response_metadata.update(context.metadata())
             
-            # Add system prompt at the beginning
-            messages.append({"role": "system", "content": self.system_prompt})
+            request_log.debug("Sending request to %s with %d messages (%d prompt tokens)",
+                              litellm_model, len(context.messages), context.prompt_tokens)
             
-            # Add conversation history
-            for msg in conversation_history:
-                # Only include role and content for LiteLLM
-                content_to_send = msg["content"]
-                if msg["role"] == "assistant" and msg.get("justification"):
-                    content_to_send += f"\n[Context: My justification for the above response was: {msg['justification']}]"
-                
-                messages.append({
-                    "role": msg["role"],
-                    "content": content_to_send
-                })
-            
-            # Add the new user message
-            messages.append({"role": "user", "content": user_message})
-            
-            print(f"Sending request to {litellm_model} with {len(messages)} messages")
-            
-            # Prepare API key if necessary (especially for Google/Gemini)
-            kwargs_for_acompletion = {}
-            if "gemini/" in litellm_model and self.google_api_key:
-                kwargs_for_acompletion['api_key'] = self.google_api_key
-                # You might also need to set litellm.vertex_project = "your-gcp-project"
-                # and litellm.vertex_location = "your-gcp-region" if using Vertex AI
+            def open_call(hedge: bool) -> AsyncIterator[Tuple[Any, Optional[PromptCacheRequest]]]:
+                name = self.hedging.hedge_model if hedge else model_name
+                return self._completion_attempt(name, context.messages, conversation_id, conversation_history)
 
             # Make the API call to LiteLLM
-            response = await acompletion(
-                model=litellm_model,
-                messages=messages,
-                stream=False,
-                max_tokens=1024,  
-                **kwargs_for_acompletion
-            )
+            with stage_timer("generation"):
+                calls, (response, cache_request), hedged = await self._hedged_first(model_name, False, open_call)
+                await calls.aclose()
+            served_by = self.hedging.hedge_model if hedged else model_name
+            LLM_REQUESTS.labels(served_by, "ok").inc()
+            response_metadata.update(self._usage_metadata(served_by, getattr(response, "usage", None), cache_request))
+            response_metadata["hedged"] = hedged
             
             # Extract the response content
             full_response = response.choices[0].message.content.strip()
             
-            # Extract the justification from the response
-            # Looking for "Justification:" marker
-            justification = ""
-            main_response = full_response
-            
-            justification_match = re.search(r'(?:^|\n)Justification:\s*(.*?)(?:$|\n\n)', full_response, re.DOTALL)
-            if justification_match:
-                justification = justification_match.group(1).strip()
-                # Remove the justification part from the main response
-                main_response = re.sub(r'(?:^|\n)Justification:\s*.*?(?:$|\n\n)', '', full_response, flags=re.DOTALL).strip()
-            else:
-                # If no explicit justification, generate a generic one or extract the last sentence
-                sentences = full_response.split('.')
-                if len(sentences) > 1:
-                    # Use the last complete sentence as justification
-                    justification = sentences[-2].strip() + '.'
-                    # Remove it from the main response
-                    main_response = '.'.join(sentences[:-2]) + '.'
-                else:
-                    justification = "This response aims to address your specific query with relevant information."
-            
-            return main_response, justification
+            with stage_timer("parsing"):
+                result = parse_response(full_response)
+            if cache_key:
+                await self.response_cache.set(cache_key, result)
+            return result, response_metadata
             
         except Exception as e:
             # Handle LiteLLM errors
-            error_msg = f"Error communicating with LLM service: {str(e)}"
-            print(error_msg)
-            if DEV_MODE: # Only fall back to mock if in actual dev_mode with no real_api requested
-                print("DEV_MODE: Using mock response due to LLM communication error.")
-                return self._get_enhanced_mock_response(user_message, conversation_history)
+            LLM_REQUESTS.labels(model_name, "error").inc()
+            logger.error("Error communicating with LLM service: %s", e)
+            if settings.DEV_MODE: # Only fall back to mock if in actual dev_mode with no real_api requested
+                logger.info("DEV_MODE: Using mock response due to LLM communication error.")
+                return self._get_enhanced_mock_response(user_message, conversation_history), response_metadata
             # For Beta/Prod, re-raise the error so it becomes a 500 to the client
             raise HTTPException(status_code=500, detail="Error communicating with the AI service. Please try again later.")
-    
+
+    async def stream_llm_response(
+        self,
+        conversation_history: List[Dict[str, Any]],
+        user_message: str,
+        model_name: Optional[str] = None,
+        use_cache: bool = True,
+        conversation_id: Optional[str] = None,
+        admit: Optional[Admit] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a response from the LLM token by token.
+        The main content and the justification (JSON fields or the 'Justification:' section)
+        are separated on the fly.
+        
+        Args:
+            conversation_history: List of previous messages in the conversation
+            user_message: The new message from the user
+            model_name: Name of the LLM model (or router model group) to use; when omitted the
+                model cascade picks one from the message's intent (or LLM_DEFAULT_MODEL without it)
+            use_cache: Set to False to bypass the response cache for this request
+            conversation_id: Server-side conversation the request belongs to, which provider
+                prompt cache handles are kept for
+            admit: As for get_llm_response; what it raises ends the stream
+            
+        Yields:
+            Event dicts with a "type" key:
+            - {"type": "content", "delta": str} for main response text
+            - {"type": "justification", "delta": str} for justification text
+            - {"type": "done", "content": str, "justification": str, "metadata": dict} once the response is complete
+            - {"type": "error", "detail": str} if the provider call fails
+            Messages the safety screen flags get its reply as the response (and `safety` in the
+            metadata); with a moderation model, events are held until it has cleared the message.
+        """
+        screen = self.safety_screen
+        try:
+            check = screen.start(user_message) if screen is not None else None
+            events = self._stream_response(conversation_history, user_message, model_name, use_cache,
+                                           conversation_id, admit)
+            if check is not None:
+                events = check.guard_stream(events)
+            async for event in events:
+                yield event
+        except CrisisDetected as e:
+            main_response, justification = e.category.response()
+            yield {"type": "content", "delta": main_response}
+            yield {"type": "justification", "delta": justification}
+            yield {"type": "done", "content": main_response, "justification": justification, "metadata": e.metadata()}
+
+    async def _stream_response(
+        self,
+        conversation_history: List[Dict[str, Any]],
+        user_message: str,
+        model_name: Optional[str],
+        use_cache: bool,
+        conversation_id: Optional[str] = None,
+        admit: Optional[Admit] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream events for stream_llm_response once the message has passed the local safety screen."""
+        cascade_metadata: Dict[str, Any] = {}
+        if model_name is None and self.cascade is not None:
+            decision = self.cascade.decide(user_message, conversation_history)
+            cascade_metadata = decision.metadata()
+            if decision.canned is not None:
+                main_response, justification = decision.canned
+                yield {"type": "content", "delta": main_response}
+                yield {"type": "justification", "delta": justification}
+                yield {"type": "done", "content": main_response, "justification": justification, "metadata": cascade_metadata}
+                return
+            model_name = decision.model_name
+
+        async for event in self._stream_for_model(conversation_history, user_message, model_name, use_cache,
+                                                  conversation_id, admit):
+            if event["type"] == "done" and cascade_metadata:
+                event["metadata"] = {**event.get("metadata", {}), **cascade_metadata}
+            yield event
+
+    async def _stream_for_model(
+        self,
+        conversation_history: List[Dict[str, Any]],
+        user_message: str,
+        model_name: Optional[str],
+        use_cache: bool,
+        conversation_id: Optional[str] = None,
+        admit: Optional[Admit] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream events for stream_llm_response once the model has been chosen."""
+        model_name = model_name or settings.LLM_DEFAULT_MODEL
+        await self.ensure_ready()
+        litellm_model = self._resolve_model(model_name)
+        use_mock = settings.DEV_MODE and not settings.USE_REAL_API_IN_DEV
+
+        if use_mock:
+            request_log.debug("DEV MODE (mock): Streaming mock LLM response for message: %r", user_message)
+            async for event in self._admitted_stream(
+                admit, model_name, lambda: self._stream_mock_response(user_message, conversation_history, model_name)
+            ):
+                yield event
+            return
+
+        request_key = self._request_key(litellm_model, conversation_history, user_message)
+        use_cache = use_cache and self.response_cache is not None
+        if use_cache:
+            cached = await self.response_cache.get(request_key)
+            if cached is not None:
+                main_response, justification = cached
+                metadata = {"contextTokenBudget": self.context_builder.token_budget, "cacheHit": True}
+                yield {"type": "content", "delta": main_response}
+                yield {"type": "justification", "delta": justification}
+                yield {"type": "done", "content": main_response, "justification": justification, "metadata": metadata}
+                return
+
+        # Identical streams already in flight are fanned out from one upstream call, to callers
+        # admitted on their own
+        async for event in self._admitted_stream(admit, model_name, lambda: self.single_flight.subscribe(
+            request_key,
+            lambda: self._generate_stream(model_name, litellm_model, conversation_history, user_message,
+                                          request_key if use_cache else None, conversation_id)
+        )):
+            # Events are shared between subscribers, so hand each one its own copy
+            yield dict(event)
+
+    async def _generate_stream(
+        self,
+        model_name: str,
+        litellm_model: str,
+        conversation_history: List[Dict[str, Any]],
+        user_message: str,
+        cache_key: Optional[str],
+        conversation_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Make the upstream streaming call for stream_llm_response."""
+        parser = ResponseParser()
+        emitted_any = False
+        metadata: Dict[str, Any] = {}
+        try:
+            context = await self._build_context(litellm_model, conversation_history, user_message, conversation_id)
+            metadata = context.metadata()
+
+            request_log.debug("Streaming request to %s with %d messages (%d prompt tokens)",
+                              litellm_model, len(context.messages), context.prompt_tokens)
+
+            attempts: Dict[bool, _StreamAttempt] = {}
+
+            def open_stream(hedge: bool) -> AsyncIterator[str]:
+                attempt = attempts[hedge] = _StreamAttempt(self.hedging.hedge_model if hedge else model_name)
+                return self._stream_deltas(attempt, context.messages, conversation_id, conversation_history)
+
+            started = time.perf_counter()
+            deltas, delta, hedged = await self._hedged_first(model_name, True, open_stream)
+            try:
+                if delta is not None:
+                    observe_stage("provider_ttft", time.perf_counter() - started)
+                    for event in parser.feed(delta):
+                        emitted_any = True
+                        yield event
+                async for delta in deltas:
+                    for event in parser.feed(delta):
+                        emitted_any = True
+                        yield event
+            finally:
+                await deltas.aclose()
+            observe_stage("generation", time.perf_counter() - started)
+            attempt = attempts[hedged]
+            LLM_REQUESTS.labels(attempt.model_name, "ok").inc()
+            metadata.update(self._usage_metadata(attempt.model_name, attempt.usage, attempt.cache_request))
+            metadata["hedged"] = hedged
+
+        except Exception as e:
+            LLM_REQUESTS.labels(model_name, "error").inc()
+            logger.error("Error streaming from LLM service: %s", e)
+            if settings.DEV_MODE and not emitted_any:
+                logger.info("DEV_MODE: Using mock stream due to LLM communication error.")
+                async for event in self._stream_mock_response(user_message, conversation_history, model_name):
+                    yield event
+                return
+            yield {"type": "error", "detail": "Error communicating with the AI service. Please try again later."}
+            return
+
+        for event in parser.flush():
+            yield event
+        main_response, justification = parser.result()
+        if cache_key:
+            await self.response_cache.set(cache_key, (main_response, justification))
+        yield {"type": "done", "content": main_response, "justification": justification, "metadata": metadata}
+
+    async def _stream_mock_response(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, Any]],
+        model_name: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream an enhanced mock response at MOCK_STREAM_TOKENS_PER_SECOND so the
+        streaming path can be exercised offline. A rate of 0 disables the delay.
+        """
+        main_response, justification = self._get_enhanced_mock_response(user_message, conversation_history)
+        if settings.STRUCTURED_OUTPUT:
+            full_response = json.dumps({"content": main_response, "justification": justification})
+        else:
+            full_response = f"{main_response}\n\nJustification: {justification}"
+        litellm_model = self._resolve_model(model_name or settings.LLM_DEFAULT_MODEL)
+        metadata = (await self._build_context(litellm_model, conversation_history, user_message)).metadata()
+
+        rate = settings.MOCK_STREAM_TOKENS_PER_SECOND
+        delay = 1.0 / rate if rate > 0 else 0.0
+
+        parser = ResponseParser()
+        for token in _MOCK_TOKEN_PATTERN.findall(full_response):
+            if delay:
+                await asyncio.sleep(delay)
+            for event in parser.feed(token):
+                yield event
+
+        for event in parser.flush():
+            yield event
+        main_response, justification = parser.result()
+        yield {"type": "done", "content": main_response, "justification": justification, "metadata": metadata}
+
+    async def summarize_conversation(
+        self,
+        summary: str,
+        new_messages: List[Dict[str, Any]],
+        model_name: Optional[str] = None,
+        admit: Optional[Admit] = None
+    ) -> str:
+        """
+        Fold new conversation turns into a running summary (used by the background summary jobs).
+        In development mode, the summary is extractive (first sentences) unless USE_REAL_API_IN_DEV is true.
+
+        Args:
+            summary: The current summary, empty for the first call on a conversation
+            new_messages: The turns that followed what the summary covers, oldest first
+            model_name: Name of the LLM model (or router model group) to use; defaults to
+                SUMMARY_MODEL, or LLM_FAST_MODEL without it
+            admit: Called with that model before the provider is asked (not for the development
+                summary); the admission slot it returns is held for the call
+
+        Returns:
+            The updated summary
+
+        Raises:
+            Provider errors, unchanged, so the caller can retry
+        """
+        model_name = model_name or settings.SUMMARY_MODEL or settings.LLM_FAST_MODEL or settings.LLM_DEFAULT_MODEL
+        await self.ensure_ready()
+
+        if settings.DEV_MODE and not settings.USE_REAL_API_IN_DEV:
+            lines = summary.splitlines() if summary else []
+            lines.extend(summarize_message(msg) for msg in new_messages)
+            return "\n".join(trim_summary_lines(self._resolve_model(model_name), lines, settings.SUMMARY_MAX_TOKENS))
+
+        transcript = "\n\n".join(
+            f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content'].strip()}" for msg in new_messages
+        )
+        messages = [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none yet)'}\n\nNew turns:\n{transcript}"},
+        ]
+        try:
+            response = await self._admitted(admit, model_name, lambda: self._acompletion(
+                model_name, self._resolve_model(model_name), messages, False,
+                params={"max_tokens": settings.SUMMARY_MAX_TOKENS, "temperature": 0.2}
+            ))
+        except Exception:
+            LLM_REQUESTS.labels(model_name, "error").inc()
+            raise
+        LLM_REQUESTS.labels(model_name, "ok").inc()
+        self._usage_metadata(model_name, getattr(response, "usage", None), None)
+        return (response.choices[0].message.content or "").strip()
+
+    async def _moderate(self, user_message: str) -> Optional[str]:
+        """
+        Ask SAFETY_MODERATION_MODEL whether a message shows a crisis (runs next to the generation).
+
+        Returns:
+            The safety category the model named, or None when it found none (always None with
+            mock responses in DEV_MODE)
+        """
+        if settings.DEV_MODE and not settings.USE_REAL_API_IN_DEV:
+            return None
+        model_name = settings.SAFETY_MODERATION_MODEL
+        await self.ensure_ready()
+        classifier = self.safety_screen.classifier
+        try:
+            response = await self._acompletion(
+                model_name, self._resolve_model(model_name), moderation_messages(user_message, classifier), False,
+                params={"max_tokens": 8, "temperature": 0}
+            )
+        except Exception:
+            LLM_REQUESTS.labels(model_name, "error").inc()
+            raise
+        LLM_REQUESTS.labels(model_name, "ok").inc()
+        return parse_moderation(response.choices[0].message.content or "", classifier)
+
+    async def _hedged_first(
+        self,
+        model_name: str,
+        stream: bool,
+        open_attempt: Callable[[bool], AsyncIterator[T]]
+    ) -> Tuple[AsyncIterator[T], Optional[T], bool]:
+        """
+        Start an upstream call to model_name and wait for its first item: the first text delta of
+        a stream, or the whole response of a plain call. With HEDGE_MODEL set, a call that is still
+        waiting after the model's hedge delay is duplicated to the hedge model, and whichever
+        answers first is used.
+
+        Args:
+            model_name: The primary model (or router model group)
+            stream: Whether the attempts are streams (timed apart from plain calls)
+            open_attempt: Starts one call; called with True for the hedge
+
+        Returns:
+            The winning attempt (positioned after its first item), the first item (None for a
+            stream that ended without one), and whether the hedge served it
+        """
+        primary = open_attempt(False)
+        policy = self.hedging
+        try:
+            if policy is None:
+                return primary, await primary.__anext__(), False
+            policy.admit_call()
+            started = time.perf_counter()
+            delay = policy.delay(model_name, stream)
+
+            def start_hedge() -> Optional[AsyncIterator[T]]:
+                if not policy.try_hedge(model_name):
+                    return None
+                request_log.debug("No first token from %s after %.0fms; hedging to %s",
+                                  model_name, delay * 1000, policy.hedge_model)
+                return open_attempt(True)
+
+            attempt, first, hedge_won = await race_first(primary, start_hedge, delay)
+        except StopAsyncIteration:
+            return primary, None, False
+        policy.record(model_name, stream, time.perf_counter() - started)
+        if hedge_won is not None:
+            policy.settle(model_name, hedge_won)
+        return attempt, first, bool(hedge_won)
+
+    async def _completion_attempt(
+        self,
+        model_name: str,
+        messages: List[Dict[str, str]],
+        conversation_id: Optional[str],
+        conversation_history: List[Dict[str, Any]]
+    ) -> AsyncIterator[Tuple[Any, Optional[PromptCacheRequest]]]:
+        """One plain upstream call, as a one-item stream so it can be hedged like a stream."""
+        try:
+            result = await self._cached_acompletion(
+                model_name, self._resolve_model(model_name), messages, False, conversation_id, conversation_history
+            )
+        except asyncio.CancelledError:
+            LLM_REQUESTS.labels(model_name, "cancelled").inc()
+            raise
+        yield result
+
+    async def _stream_deltas(
+        self,
+        attempt: _StreamAttempt,
+        messages: List[Dict[str, str]],
+        conversation_id: Optional[str],
+        conversation_history: List[Dict[str, Any]]
+    ) -> AsyncIterator[str]:
+        """The text deltas of one upstream streaming call, recording its usage on `attempt`."""
+        finished = False
+        try:
+            with track_responses() as opened:
+                response, attempt.cache_request = await self._cached_acompletion(
+                    attempt.model_name, self._resolve_model(attempt.model_name), messages, True,
+                    conversation_id, conversation_history
+                )
+            try:
+                async for chunk in response:
+                    # Sent with the last chunk (stream_options include_usage)
+                    attempt.usage = getattr(chunk, "usage", None) or attempt.usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                finished = True
+            finally:
+                # Not every provider stream closes its HTTP response at the end; closing it hands the
+                # connection back to the pool, also when the caller stops reading early
+                if hasattr(response, "aclose"):
+                    await response.aclose()
+                await close_responses(opened)
+        except (asyncio.CancelledError, GeneratorExit):
+            if not finished:
+                LLM_REQUESTS.labels(attempt.model_name, "cancelled").inc()
+            raise
+
+    def _request_key(self, litellm_model: str, conversation_history: List[Dict[str, Any]], user_message: str) -> str:
+        """Canonical request hash, used for the response cache and for coalescing in-flight requests."""
+        return make_cache_key(litellm_model, self.system_prompt, conversation_history, user_message, self.generation_params)
+
+    async def _cached_acompletion(
+        self,
+        model_name: str,
+        litellm_model: str,
+        messages: List[Dict[str, str]],
+        stream: bool,
+        conversation_id: Optional[str],
+        conversation_history: List[Dict[str, Any]]
+    ) -> Tuple[Any, Optional[PromptCacheRequest]]:
+        """
+        _acompletion with the stable prompt prefix marked for the provider's prompt cache. A call
+        that fails while using a cache handle is retried once uncached (the handle may be gone).
+        Returns the response and the prompt cache request (None with prompt caching disabled).
+        """
+        if self.prompt_cache is None:
+            return await self._acompletion(model_name, litellm_model, messages, stream), None
+        with self.prompt_cache.request(conversation_id, conversation_history) as cache_request:
+            try:
+                return await self._acompletion(model_name, litellm_model, messages, stream), cache_request
+            except Exception:
+                if not self.prompt_cache.retry_uncached(cache_request):
+                    raise
+                return await self._acompletion(model_name, litellm_model, messages, stream), cache_request
+
+    async def _acompletion(self, model_name: str, litellm_model: str, messages: List[Dict[str, str]], stream: bool,
+                           params: Optional[Dict[str, Any]] = None):
+        """
+        Call the router for configured model groups, or LiteLLM directly for any other model.
+        `params` replaces the chat generation parameters (for calls that aren't chat replies).
+        With a recorder, sampled calls are recorded along with their timing.
+        """
+        if params is None:
+            params = self.generation_params
+        recorder = self.recorder
+        if recorder is None or not recorder.sampled():
+            return await self._provider_call(model_name, litellm_model, messages, stream, params)
+
+        record = recorder.start(model_name, litellm_model, messages, stream)
+        started = time.perf_counter()
+        try:
+            response = await self._provider_call(model_name, litellm_model, messages, stream, params)
+        except Exception as e:
+            recorder.finish(record, started, error=e)
+            raise
+        if stream:
+            return recorder.record_stream(record, started, response)
+        recorder.finish(record, started, content=response.choices[0].message.content, usage=getattr(response, "usage", None))
+        return response
+
+    async def _provider_call(self, model_name: str, litellm_model: str, messages: List[Dict[str, str]], stream: bool,
+                             params: Dict[str, Any]):
+        # Streams report token usage (including prompt cache hits) in their last chunk
+        stream_kwargs: Dict[str, Any] = {"stream_options": {"include_usage": True}} if stream else {}
+        if self.router is not None and model_name in self.router_models:
+            return await self.router.acompletion(
+                model=model_name,
+                messages=messages,
+                stream=stream,
+                **stream_kwargs,
+                **params
+            )
+        return await litellm_module.get().acompletion(
+            model=litellm_model,
+            messages=messages,
+            stream=stream,
+            **stream_kwargs,
+            **params,
+            **self._provider_kwargs(litellm_model)
+        )
+
+    def _usage_metadata(self, model_name: str, usage: Any, cache_request: Optional[PromptCacheRequest]) -> Dict[str, Any]:
+        """Response metadata for the input tokens the provider did and didn't serve from its prompt cache."""
+        metadata: Dict[str, Any] = dict(usage_metadata(usage))
+        if metadata:
+            LLM_INPUT_TOKENS.labels(model_name, "cached").inc(metadata["cachedInputTokens"])
+            LLM_INPUT_TOKENS.labels(model_name, "uncached").inc(metadata["uncachedInputTokens"])
+            LLM_INPUT_TOKENS.labels(model_name, "cache_write").inc(metadata["cacheWriteInputTokens"])
+            if self.prompt_cache is not None:
+                self.prompt_cache.record_usage(metadata)
+        if cache_request is not None and cache_request.mode:
+            metadata["promptCache"] = cache_request.mode
+        return metadata
+
+    def _resolve_model(self, model_name: str) -> str:
+        """
+        Map a model name to its provider-specific LiteLLM format.
+        For router model groups this is the first deployment's model, used for token counting and cache keys.
+        """
+        if model_name in self.router_models:
+            return self.router_models[model_name]
+        return MODEL_MAPPING.get(model_name, model_name)
+
+    def _provider_kwargs(self, litellm_model: str) -> Dict[str, Any]:
+        """Extra keyword arguments for acompletion, such as provider API keys."""
+        kwargs_for_acompletion = {}
+        if "gemini/" in litellm_model and self.google_api_key:
+            kwargs_for_acompletion['api_key'] = self.google_api_key
+            # You might also need to set litellm.vertex_project = "your-gcp-project"
+            # and litellm.vertex_location = "your-gcp-region" if using Vertex AI
+        return kwargs_for_acompletion
+
+    async def _build_context(self, litellm_model: str, conversation_history: List[Dict[str, Any]], user_message: str,
+                             conversation_id: Optional[str] = None) -> BuiltContext:
+        """Prepare the messages list for LiteLLM, fitted into the context token budget."""
+        recall = await self._recall(conversation_history, user_message, conversation_id)
+        with stage_timer("prompt_assembly"):
+            return self.context_builder.build(litellm_model, self.system_prompt, conversation_history, user_message, recall)
+
+    async def _recall(self, conversation_history: List[Dict[str, Any]], user_message: str,
+                      conversation_id: Optional[str]) -> Optional[List[Tuple[int, int]]]:
+        """
+        Older turns relevant to the new message, from the semantic memory.
+
+        Returns:
+            (start, end) history spans, best first; None without semantic memory (or when the
+            embedder fails), which leaves older turns to the token budget.
+        """
+        memory = self.semantic_memory
+        if memory is None:
+            return None
+        before = self.context_builder.recent_start(conversation_history)
+        try:
+            with stage_timer("memory_recall"):
+                if memory.offload:
+                    return await asyncio.to_thread(memory.recall, conversation_id, conversation_history, user_message, before)
+                return memory.recall(conversation_id, conversation_history, user_message, before)
+        except Exception as e:
+            logger.warning("Semantic memory recall failed, building the context without it: %s", e)
+            return None
+
     def _get_mock_response(self, user_message: str, conversation_history: List[Dict[str, Any]]) -> Tuple[str, str]:
         """
         Generate mock responses for development testing.
@@ -200,124 +1152,26 @@ Structure your response clearly. The main response should be distinct from the j
     def _get_enhanced_mock_response(self, user_message: str, conversation_history: List[Dict[str, Any]]) -> Tuple[str, str]:
         """
         Generate more comprehensive mock responses for better testing experience.
+        The response is chosen by the message's intent (see intents.yaml).
         """
-        lower_msg = user_message.lower()
-        
-        # Financial advice
-        if any(term in lower_msg for term in ["loan", "debt", "money", "financial", "bank", "interest"]):
-            return (
-                "I understand you're facing financial challenges. Here are some steps that might help: \n\n"
-                "1. Consider debt consolidation through a personal loan from a reputable bank, which often has lower interest rates than informal loans.\n"
-                "2. Check if you qualify for any government assistance programs.\n"
-                "3. Create a detailed budget to track your expenses and identify areas where you can save.\n"
-                "4. Consider speaking with a financial advisor who specializes in debt management.\n"
-                "5. If possible, try to negotiate with your relatives for a lower interest rate or extended payment terms.\n\n"
-                "Would you like me to elaborate on any of these suggestions?",
-                
-                "Financial stress can be overwhelming, and having a structured approach with multiple options provides a sense of control and practical next steps."
-            )
-        
-        # Health advice
-        elif any(term in lower_msg for term in ["health", "sick", "doctor", "pain", "disease", "symptom"]):
-            return (
-                "I hear you're concerned about health issues. While I'm not a medical professional, I can suggest some general steps:\n\n"
-                "1. Consider scheduling an appointment with a healthcare provider for a proper diagnosis.\n"
-                "2. Keep track of your symptoms - when they occur, what makes them better or worse.\n"
-                "3. Ensure you're maintaining basic health habits: adequate sleep, hydration, and nutrition.\n"
-                "4. Be careful about self-diagnosing using internet sources.\n\n"
-                "Remember that your health is a priority, and seeking professional medical advice is important.",
-                
-                "Health concerns often benefit from professional medical attention rather than self-diagnosis, and tracking symptoms provides valuable information for healthcare providers."
-            )
-        
-        # Relationship advice
-        elif any(term in lower_msg for term in ["relationship", "partner", "marriage", "divorce", "girlfriend", "boyfriend", "spouse", "love"]):
-            return (
-                "Relationships can be complex, and I appreciate you sharing this with me. Here are some thoughts:\n\n"
-                "1. Open communication is key - consider expressing your feelings using 'I' statements to avoid sounding accusatory.\n"
-                "2. Active listening can help both parties feel heard and validated.\n"
-                "3. Setting healthy boundaries is important for any relationship.\n"
-                "4. Sometimes, a neutral third party like a relationship counselor can provide valuable guidance.\n\n"
-                "What aspects of the relationship are most challenging for you right now?",
-                
-                "Communication and understanding are foundational to healthy relationships, and approaching issues collaboratively rather than confrontationally tends to lead to better outcomes."
-            )
-        
-        # Career advice
-        elif any(term in lower_msg for term in ["job", "career", "work", "boss", "colleague", "interview", "resume", "salary"]):
-            return (
-                "Career development is an important aspect of life. Based on what you've shared, here are some thoughts:\n\n"
-                "1. Consider your long-term career goals and how your current situation aligns with them.\n"
-                "2. Networking and professional development can open new opportunities.\n"
-                "3. When facing workplace challenges, documenting incidents and maintaining professionalism is advisable.\n"
-                "4. For job searches, tailoring your resume and preparation for interviews are crucial steps.\n\n"
-                "Could you tell me more about your specific career aspirations or challenges?",
-                
-                "Career decisions benefit from aligning short-term actions with long-term goals, and professional development is an ongoing process that extends beyond formal education."
-            )
-        
-        # Mental health
-        elif any(term in lower_msg for term in ["anxiety", "depression", "stress", "overwhelmed", "therapy", "counseling", "mental health"]):
-            return (
-                "I'm sorry to hear you're struggling with these feelings. Your mental wellbeing is important, and it's brave of you to talk about it.\n\n"
-                "1. Consider speaking with a mental health professional who can provide personalized support.\n"
-                "2. Self-care routines, including physical activity and mindfulness practices, can be helpful supplements to professional care.\n"
-                "3. Setting small, achievable goals may help when feeling overwhelmed.\n"
-                "4. Remember that seeking help is a sign of strength, not weakness.\n\n"
-                "Would you like to talk more about how you've been feeling?",
-                
-                "Mental health challenges benefit from professional support, and acknowledging feelings without judgment creates a safe space for discussion."
-            )
-            
-        # Technical/coding questions
-        elif any(term in lower_msg for term in ["code", "programming", "software", "developer", "bug", "error", "javascript", "python", "java"]):
-            return (
-                "For technical challenges, a systematic approach often works best:\n\n"
-                "1. Break down the problem into smaller, manageable parts.\n"
-                "2. Check documentation and existing solutions in forums like Stack Overflow.\n"
-                "3. Use debugging tools to identify where the issue occurs.\n"
-                "4. Consider implementing automated tests to catch similar issues in the future.\n"
-                "5. Sometimes, explaining the problem to someone else (or even to yourself) can lead to insights.\n\n"
-                "Could you provide more details about the specific technical challenge you're facing?",
-                
-                "Technical problems often benefit from systematic troubleshooting rather than trial-and-error approaches, and documentation and community resources are valuable tools."
-            )
-            
-        # Problem-solving/General help request
-        elif any(term in lower_msg for term in ["problem", "solve", "issue", "help me", "assist me", "challenge"]) and not any(term in lower_msg for term in ["technical", "code", "software", "financial", "health", "relationship", "career", "mental health"]): # Avoid overlap with more specific categories
-            return (
-                "I understand you're looking for help with a problem or challenge. I'll do my best to assist. To get a clearer picture, could you tell me a bit more about it?\n\n"
-                "For instance:\n"
-                "1. Can you describe the main challenge or what you're trying to achieve?\n"
-                "2. Are there any specific constraints or factors I should be aware of?\n"
-                "3. Have you tried anything already, or do you have any initial thoughts on how to approach it?\n\n"
-                "The more information you can provide, the better I can help you explore solutions.",
-                "Gathering specific details about the problem upfront helps in formulating a targeted and effective response strategy."
-            )
-            
-        # Generic greeting
-        elif any(term in lower_msg for term in ["hello", "hi", "hey", "greetings", "morning", "afternoon", "evening"]):
-            return (
-                "Hello! I'm here to help with any questions or challenges you're facing. Feel free to share what's on your mind, and I'll do my best to provide helpful information or perspectives.",
-                
-                "A warm welcome establishes rapport and encourages open communication."
-            )
-            
-        # If user message is very short or unclear
-        elif len(user_message.strip()) < 5 or user_message.strip() in ["?", "test", "ok"]:
-            return (
-                "I'm not sure I understand completely. Could you provide more details about what you'd like to discuss or what kind of help you're looking for? I'm here to assist with a variety of topics and concerns.",
-                
-                "Requesting clarification when messages are unclear helps ensure the conversation moves in a productive direction."
-            )
-        
+        intent = self.intent_engine.classify(user_message)
+        if intent.name in MOCK_RESPONSES:
+            return MOCK_RESPONSES[intent.name]
+        if intent.reply:
+            return intent.reply, intent.justification or DEFAULT_JUSTIFICATION
         # Default fallback for unrecognized topics
-        else:
-            return (
-                "Thank you for sharing that with me. I'm here to help and would like to understand your situation better. Could you tell me more about what you're experiencing or what kind of support you're looking for?",
-                
-                "Open-ended questions encourage elaboration and help gather more information to provide appropriate support."
-            )
+        return MOCK_RESPONSES["general"]
     
-    # You can add additional methods here as needed, such as for streaming responses,
-    # handling different model providers, etc. 
\ No newline at end of file
+    # You can add additional methods here as needed, such as for
+    # handling different model providers, etc.
+
+
+_llm_manager: Optional[LLMManager] = None
+
+
+def get_llm_manager() -> LLMManager:
+    """The application's shared LLMManager, created by the app lifespan (or on first use)."""
+    global _llm_manager
+    if _llm_manager is None:
+        _llm_manager = LLMManager()
+    return _llm_manager
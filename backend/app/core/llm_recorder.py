@@ -0,0 +1,265 @@
+import hashlib
+import json
+import logging
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Pattern
+
+from ..core.prompt_cache import usage_metadata
+from ..core.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Credentials that can end up in prompts or answers: provider API keys, bearer tokens, JWTs
+# (Firebase ID tokens) and AWS access keys. LLM_RECORD_REDACT_PATTERNS adds to these.
+DEFAULT_REDACT_PATTERNS = (
+    r"sk-[A-Za-z0-9_-]{16,}",
+    r"AIza[0-9A-Za-z_-]{35}",
+    r"(?i:bearer)\s+[A-Za-z0-9._~+/=-]{16,}",
+    r"eyJ[A-Za-z0-9_-]{8,}\.eyJ[A-Za-z0-9_-]{8,}\.[A-Za-z0-9_-]+",
+    r"AKIA[0-9A-Z]{16}",
+)
+REDACTED = "[REDACTED]"
+
+# SQLite files start with this header; anything else is read as JSONL
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+
+def message_text(content: Any) -> str:
+    """The text of a message's content, given as a string or a list of content blocks (prompt caching)."""
+    if isinstance(content, list):
+        return "".join(str(block.get("text", "")) for block in content if isinstance(block, dict))
+    return str(content or "")
+
+
+def request_fingerprint(messages: List[Dict[str, Any]]) -> str:
+    """
+    Hash of the roles and text of a request's messages. The replay provider computes it from the
+    messages it receives, so a replayed request finds the recording of the same prompt.
+    """
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(str(message.get("role", "")).encode() + b"\0" + message_text(message.get("content")).encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+class Redactor:
+    """Replaces anything matching the secret patterns with [REDACTED]."""
+
+    def __init__(self, extra_patterns: str = ""):
+        patterns = list(DEFAULT_REDACT_PATTERNS) + [pattern for pattern in extra_patterns.split(",") if pattern.strip()]
+        self.pattern: Pattern[str] = re.compile("|".join(f"(?:{pattern.strip()})" for pattern in patterns))
+
+    def __call__(self, text: str) -> str:
+        return self.pattern.sub(REDACTED, text)
+
+
+class JSONLArchive:
+    """Recordings as one JSON object per line, appended to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.write(b"".join(dumps(record) + b"\n" for record in records))
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SQLiteArchive:
+    """Recordings in a local SQLite file, one row per call (the record as JSON, plus lookup columns)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        if self._conn is None:
+            # Opened on the writer thread, the only one that uses it
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_recordings ("
+                " id TEXT PRIMARY KEY,"
+                " recorded_at REAL NOT NULL,"
+                " model TEXT NOT NULL,"
+                " fingerprint TEXT NOT NULL,"
+                " record TEXT NOT NULL)"
+            )
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO llm_recordings VALUES (?, ?, ?, ?, ?)",
+                [(record["id"], record["recorded_at"], record["model"], record["fingerprint"], dumps(record).decode())
+                 for record in records],
+            )
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def load_recordings(path: str) -> List[Dict[str, Any]]:
+    """All recordings in a JSONL or SQLite archive, oldest first."""
+    with open(path, "rb") as archive:
+        is_sqlite = archive.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    if is_sqlite:
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute("SELECT record FROM llm_recordings ORDER BY recorded_at").fetchall()
+        finally:
+            conn.close()
+        return [json.loads(row[0]) for row in rows]
+    with open(path, "rb") as archive:
+        return [json.loads(line) for line in archive if line.strip()]
+
+
+class LLMRecorder:
+    """
+    Records provider calls for replay: the request's fingerprint and size (and, with
+    record_prompts, its redacted messages), and the answer with its timing. Streams are kept as
+    [milliseconds since the previous chunk, text] pairs, so a replay reproduces the time to first
+    token and the token rate. Records are written by a background thread; calls never wait on
+    the disk.
+    """
+
+    def __init__(self, archive, sample_rate: float = 1.0, record_prompts: bool = False, redact_patterns: str = "",
+                 max_pending: int = 10000):
+        self.archive = archive
+        self.sample_rate = sample_rate
+        self.record_prompts = record_prompts
+        self.redact = Redactor(redact_patterns)
+        self.recorded = 0
+        self.dropped = 0
+        self._max_pending = max_pending
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="llm-recorder", daemon=True)
+        self._writer.start()
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def start(self, model_name: str, litellm_model: str, messages: List[Dict[str, Any]], stream: bool) -> Dict[str, Any]:
+        """A new record for a call about to be made."""
+        record: Dict[str, Any] = {
+            "id": uuid.uuid4().hex,
+            "recorded_at": time.time(),
+            "model": model_name,
+            "litellm_model": litellm_model,
+            "stream": stream,
+            "fingerprint": request_fingerprint(messages),
+            "prompt_messages": len(messages),
+            "prompt_chars": sum(len(message_text(message.get("content"))) for message in messages),
+        }
+        if self.record_prompts:
+            record["messages"] = [
+                {"role": message.get("role", ""), "content": self.redact(message_text(message.get("content")))}
+                for message in messages
+            ]
+        return record
+
+    def finish(self, record: Dict[str, Any], started: float, content: Optional[str] = None, usage: Any = None,
+               error: Optional[Exception] = None) -> None:
+        """Complete a record and queue it for writing."""
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if content is not None:
+            record["content"] = self.redact(content)
+        if usage is not None:
+            record["usage"] = {**usage_metadata(usage), "completionTokens": getattr(usage, "completion_tokens", None)}
+        if error is not None:
+            record["error"] = type(error).__name__
+            record["status_code"] = getattr(error, "status_code", None)
+        if self._queue.qsize() >= self._max_pending:
+            self.dropped += 1
+            return
+        self.recorded += 1
+        self._queue.put(record)
+
+    async def record_stream(self, record: Dict[str, Any], started: float, response: Any) -> AsyncIterator[Any]:
+        """Pass a provider stream through, recording the text and arrival time of each chunk."""
+        chunks: List[List[Any]] = []
+        usage = None
+        last = started
+        error: Optional[Exception] = None
+        finished = False
+        try:
+            async for chunk in response:
+                usage = getattr(chunk, "usage", None) or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    now = time.perf_counter()
+                    chunks.append([round((now - last) * 1000, 1), self.redact(chunk.choices[0].delta.content)])
+                    last = now
+                yield chunk
+            finished = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if hasattr(response, "aclose"):
+                await response.aclose()
+            record["chunks"] = chunks
+            record["tail_ms"] = round((time.perf_counter() - last) * 1000, 1)
+            if not finished and error is None:
+                # Stopped by our side (client gone, deadline, lost hedge); says nothing about the provider
+                record["cancelled"] = True
+            self.finish(record, started, usage=usage, error=error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.archive).__name__,
+            "path": self.archive.path,
+            "sample_rate": self.sample_rate,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize(),
+        }
+
+    def close(self) -> None:
+        """Write what is queued and stop the writer (app shutdown)."""
+        self._queue.put(None)
+        self._writer.join(timeout=10)
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while not self._queue.empty() and len(batch) < 500:
+                batch.append(self._queue.get())
+            records = [record for record in batch if record is not None]
+            if records:
+                try:
+                    self.archive.write(records)
+                except Exception as e:
+                    self.dropped += len(records)
+                    logger.warning("Could not write %d LLM recordings to %s: %s", len(records), self.archive.path, e)
+            if len(records) < len(batch):
+                self.archive.close()
+                return
+
+
+def build_recorder(backend: str, path: str, sample_rate: float, record_prompts: bool,
+                   redact_patterns: str) -> Optional[LLMRecorder]:
+    """Create the configured recorder, or None when recording is off."""
+    backend = backend.lower()
+    if backend in ("", "none", "off", "disabled"):
+        return None
+    if backend == "jsonl":
+        archive = JSONLArchive(path)
+    elif backend == "sqlite":
+        archive = SQLiteArchive(path)
+    else:
+        raise ValueError(f"Unknown LLM_RECORD_BACKEND '{backend}' (expected 'jsonl', 'sqlite' or 'none')")
+    logger.info("Recording LLM traffic to %s (%s, sample rate %.2f)", path, backend, sample_rate)
+    return LLMRecorder(archive, sample_rate, record_prompts, redact_patterns)
+
@@ -0,0 +1,113 @@
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# Matches ${VAR} references in config values
+_ENV_REFERENCE = re.compile(r"\$\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+# Renamed variables: a reference to the new name falls back to the old ones while deployments
+# move over (litellm_config.yaml used GEMINI_API_KEY before the backend settled on GOOGLE_API_KEY)
+ENV_ALIASES = {"GOOGLE_API_KEY": ("GEMINI_API_KEY",)}
+_warned_aliases: Set[str] = set()
+
+
+def env_value(name: str) -> Optional[str]:
+    """An environment variable, or the first set old name of a renamed one (with a warning)."""
+    value = os.environ.get(name)
+    if value is not None:
+        return value
+    for alias in ENV_ALIASES.get(name, ()):
+        value = os.environ.get(alias)
+        if value is not None:
+            if alias not in _warned_aliases:
+                _warned_aliases.add(alias)
+                logger.warning("%s is deprecated; set %s instead", alias, name)
+            return value
+    return None
+
+
+def _expand_env(value: Any) -> Any:
+    """
+    Recursively substitute ${VAR} references with environment variables.
+    A value that is only an unset reference becomes None, so LiteLLM falls back to its
+    own environment lookup instead of sending an empty credential.
+    """
+    if isinstance(value, dict):
+        expanded = {key: _expand_env(item) for key, item in value.items()}
+        return {key: item for key, item in expanded.items() if item is not None}
+    if isinstance(value, list):
+        return [_expand_env(item) for item in value]
+    if isinstance(value, str):
+        whole = _ENV_REFERENCE.fullmatch(value)
+        if whole:
+            return env_value(whole.group(1))
+        return _ENV_REFERENCE.sub(lambda match: env_value(match.group(1)) or "", value)
+    return value
+
+
+def load_litellm_config(path: str) -> Dict[str, Any]:
+    """Read litellm_config.yaml, expanding environment variable references."""
+    with open(path, "r", encoding="utf-8") as config_file:
+        return _expand_env(yaml.safe_load(config_file) or {})
+
+
+# API hosts of providers whose deployments don't set an api_base
+PROVIDER_HOSTS = {
+    "gemini": "generativelanguage.googleapis.com",
+    "anthropic": "api.anthropic.com",
+    "openai": "api.openai.com",
+}
+
+
+def call_provider(kwargs: Dict[str, Any]) -> str:
+    """The provider a LiteLLM call goes to, from the call's (deployment) keyword arguments."""
+    return kwargs.get("custom_llm_provider") or str(kwargs.get("model", "")).split("/", 1)[0]
+
+
+def build_router(config: Dict[str, Any]):
+    """
+    Build a LiteLLM Router from a loaded config.
+
+    `model_list` may contain several deployments per `model_name` (a logical model group);
+    `router_settings` is passed straight to the Router and holds the routing strategy,
+    retries, timeouts, fallbacks and cooldown policy. Returns None if no models are defined.
+    """
+    model_list: List[Dict[str, Any]] = config.get("model_list") or []
+    if not model_list:
+        return None
+    router_settings: Dict[str, Any] = dict(config.get("router_settings") or {})
+    # Imported here: LiteLLM is slow to import, and the router is built after start-up
+    from litellm import Router
+    return Router(model_list=model_list, **router_settings)
+
+
+def deployment_models(config: Dict[str, Any]) -> Dict[str, str]:
+    """Map each model group to the provider model of its first deployment (used for token counting)."""
+    models: Dict[str, str] = {}
+    for deployment in config.get("model_list") or []:
+        models.setdefault(deployment["model_name"], deployment["litellm_params"]["model"])
+    return models
+
+
+def deployment_endpoints(config: Dict[str, Any], extra_models: Tuple[str, ...] = ()) -> Set[str]:
+    """The origins ("https://host:port") the configured deployments (and any extra provider models) connect to."""
+    endpoints: Set[str] = set()
+    models = [deployment.get("litellm_params") or {} for deployment in config.get("model_list") or []]
+    models.extend({"model": model} for model in extra_models)
+    for params in models:
+        api_base = params.get("api_base")
+        if api_base:
+            url = urlsplit(api_base)
+            if url.hostname:
+                endpoints.add(f"{url.scheme}://{url.hostname}:{url.port or (443 if url.scheme == 'https' else 80)}")
+            continue
+        provider = str(params.get("model", "")).split("/", 1)[0]
+        if provider in PROVIDER_HOSTS:
+            endpoints.add(f"https://{PROVIDER_HOSTS[provider]}:443")
+    return endpoints
@@ -0,0 +1,76 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Optional
+
+from ..core.tracing import current_trace_id
+
+# Per-request messages go to this logger (or its children, e.g. "app.request.llm") so they can be
+# switched off without touching the rest
+HOT_PATH_LOGGER = "app.request"
+_HOT_PATH_OFF = logging.CRITICAL + 1
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class TraceIdFilter(logging.Filter):
+    """Stamps records with the current request's trace ID (or "-")."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id() or "-"
+        return True
+
+
+def setup_logging(level: str = "INFO", hot_path: bool = True) -> None:
+    """
+    Route the `app` loggers through a queue so request handlers only enqueue records;
+    formatting and writing to stdout happen on a background listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Filters run in the caller's thread, where the request's trace ID is still available
+    queue_handler.addFilter(TraceIdFilter())
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    app_logger = logging.getLogger("app")
+    app_logger.addHandler(queue_handler)
+    app_logger.setLevel(level.upper())
+    app_logger.propagate = False
+    set_hot_path_logging(hot_path)
+
+
+def set_log_level(level: str) -> None:
+    logging.getLogger("app").setLevel(level.upper())
+
+
+def set_hot_path_logging(enabled: bool) -> None:
+    """
+    Enable or disable per-request logging. When disabled, the level check at each call site
+    fails before the record is created, formatted or queued.
+    """
+    logging.getLogger(HOT_PATH_LOGGER).setLevel(logging.NOTSET if enabled else _HOT_PATH_OFF)
+
+
+def hot_path_logging_enabled() -> bool:
+    return logging.getLogger(HOT_PATH_LOGGER).level != _HOT_PATH_OFF
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
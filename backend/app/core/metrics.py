@@ -0,0 +1,259 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+# Default bucket upper bounds, in seconds, for latency-style histograms
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# A collected sample: (metric name, {label: value}, value)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class Histogram:
+    """A fixed-bucket histogram (cumulative counts per upper bound, plus sum and count)."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets: List[float] = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the duration of the with-block in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def snapshot(self) -> Dict[str, object]:
+        """Cumulative bucket counts keyed by upper bound, as used by Prometheus."""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative, running = {}, 0
+        for bound, bucket_count in zip(self.buckets + [float("inf")], counts):
+            running += bucket_count
+            cumulative["+Inf" if bound == float("inf") else repr(bound)] = running
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+
+class CounterValue:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class GaugeValue:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class _Family:
+    """A named metric with a fixed set of label names; one child value per label combination."""
+
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str], factory: Callable[[], object]):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """Return the child for these label values (positional, in labelnames order)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(value) for value in values), self._factory())
+        return child
+
+    def children(self) -> List[Tuple[Dict[str, str], object]]:
+        return [(dict(zip(self.labelnames, values)), child) for values, child in list(self._children.items())]
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames, CounterValue)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, child in self.children():
+            yield self.name, labels, child.value
+
+
+class Gauge(_Family):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames, GaugeValue)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, child in self.children():
+            yield self.name, labels, child.value
+
+
+class HistogramFamily(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames, lambda: Histogram(buckets))
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, child in self.children():
+            snapshot = child.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                yield self.name + "_bucket", dict(labels, le=bound), count
+            yield self.name + "_sum", labels, snapshot["sum"]
+            yield self.name + "_count", labels, snapshot["count"]
+
+
+class CollectedMetric:
+    """A metric whose samples are produced at scrape time, e.g. from a component's stats()."""
+
+    def __init__(self, name: str, kind: str, help_text: str, collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self._collect = collect
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in self._collect():
+            yield self.name, labels, value
+
+
+class MetricsRegistry:
+    """
+    Holds every metric of the process and renders them in the Prometheus text exposition format.
+    Counter names carry their `_total` suffix.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            # Modules may be reloaded (e.g. in benchmarks); keep the first registration
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> HistogramFamily:
+        return self._register(HistogramFamily(name, help_text, labelnames, buckets))
+
+    def collector(self, name: str, kind: str, help_text: str,
+                  collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]) -> None:
+        """Register a scrape-time metric; replaces an earlier collector with the same name."""
+        with self._lock:
+            self._metrics[name] = CollectedMetric(name, kind, help_text, collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, labels, value in metric.samples():
+                if labels:
+                    label_text = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+                    lines.append(f"{sample_name}{{{label_text}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{sample_name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+# Per-stage latency of the chat request path
+STAGES = ("auth", "validation", "memory_recall", "prompt_assembly", "queue_wait", "provider_ttft", "generation", "parsing")
+STAGE_SECONDS = registry.histogram(
+    "empathy_stage_seconds", "Time spent in each stage of the chat request path.", ("stage",)
+)
+HTTP_REQUESTS = registry.counter(
+    "empathy_http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "empathy_http_request_seconds", "HTTP request duration, until the response body is complete.", ("method", "route")
+)
+LLM_REQUESTS = registry.counter(
+    "empathy_llm_requests_total", "Upstream LLM calls by model and outcome.", ("model", "outcome")
+)
+LLM_INPUT_TOKENS = registry.counter(
+    "empathy_llm_input_tokens_total",
+    "Prompt tokens sent upstream by model: served from the provider's prompt cache (cached), processed "
+    "in full (uncached), and written to the cache (cache_write, part of uncached).",
+    ("model", "cache")
+)
+
+LLM_HEDGES = registry.counter(
+    "empathy_llm_hedges_total",
+    "Slow upstream calls by primary model and what hedging did: primary_won or hedge_won once a duplicate "
+    "was sent to the hedge model, budget_exhausted when none could be.",
+    ("model", "outcome")
+)
+REQUESTS_CANCELLED = registry.counter(
+    "empathy_requests_cancelled_total",
+    "Chat requests stopped before they finished, by reason (client_disconnect, deadline, safety).", ("reason",)
+)
+SAFETY_SCREENS = registry.counter(
+    "empathy_safety_screens_total",
+    "Messages screened for crisis by stage (local classifier, moderation model) and outcome "
+    "(clear, flagged, error, timeout).",
+    ("stage", "outcome")
+)
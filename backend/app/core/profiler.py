@@ -0,0 +1,91 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+# Stop recording new distinct stacks beyond this; further samples are counted as truncated
+MAX_DISTINCT_STACKS = 20000
+
+
+class SamplingProfiler:
+    """
+    A low-overhead sampling profiler that can be switched on and off at runtime.
+
+    A daemon thread periodically captures the stack of the target thread (by default the
+    thread that started it, i.e. the event loop) and counts identical stacks. The result is
+    in the "collapsed stack" format read by flamegraph.pl and speedscope. Nothing is done
+    on the profiled thread itself, so the cost to requests is limited to the sampling
+    thread's share of the GIL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._truncated = 0
+        self._started_at = 0.0
+        self.interval_seconds = 0.005
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval_seconds: float = 0.005, target_thread_id: Optional[int] = None) -> bool:
+        """Start sampling; returns False if the profiler is already running."""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self.interval_seconds = interval_seconds
+            self._stacks = Counter()
+            self._samples = 0
+            self._truncated = 0
+            self._started_at = time.monotonic()
+            # A new event per run, so a sampler that outlived stop()'s timeout can't resume
+            self._stop = threading.Event()
+            target = target_thread_id if target_thread_id is not None else threading.get_ident()
+            self._thread = threading.Thread(target=self._run, args=(target, self._stop), name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self, timeout: float = 1.0) -> Dict[str, object]:
+        """Stop sampling and return the collected profile (waiting at most `timeout` for the sampler)."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout)
+        return self.result()
+
+    def result(self) -> Dict[str, object]:
+        stacks = self._stacks.most_common()
+        return {
+            "samples": self._samples,
+            "truncated": self._truncated,
+            "interval_ms": self.interval_seconds * 1000,
+            "duration_s": round(time.monotonic() - self._started_at, 3) if self._started_at else 0.0,
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks),
+        }
+
+    def _run(self, target_thread_id: int, stop: threading.Event) -> None:
+        while not stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(target_thread_id)
+            if frame is None:
+                break
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stack = ";".join(reversed(names))
+            self._samples += 1
+            if stack in self._stacks or len(self._stacks) < MAX_DISTINCT_STACKS:
+                self._stacks[stack] += 1
+            else:
+                self._truncated += 1
+
+
+profiler = SamplingProfiler()
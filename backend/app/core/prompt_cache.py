@@ -0,0 +1,366 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import httpx
+
+from ..core.context_builder import MESSAGE_OVERHEAD_TOKENS, count_tokens
+from ..core.llm_router import call_provider
+
+logger = logging.getLogger(__name__)
+
+# Gemini (Google AI Studio) API, used for cachedContents when a deployment sets no api_base
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
+# Handles are treated as expired this long before the provider drops them
+EXPIRY_MARGIN_SECONDS = 10.0
+
+
+def usage_metadata(usage: Any) -> Dict[str, int]:
+    """
+    Cached and uncached input tokens from a LiteLLM usage object, as response metadata.
+    Providers count cached tokens as part of the prompt; empty if the provider sent no usage.
+    """
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    if prompt_tokens is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or getattr(usage, "cache_read_input_tokens", None) or 0
+    return {
+        "cachedInputTokens": cached,
+        "uncachedInputTokens": max(0, prompt_tokens - cached),
+        "cacheWriteInputTokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+    }
+
+
+def _prefix_hash(messages: List[Dict[str, Any]]) -> str:
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(message["role"].encode() + b"\0" + str(message["content"]).encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+class CacheHandle:
+    """A provider-side cache (Gemini cachedContents) holding the first `prefix_length` messages of a conversation."""
+
+    def __init__(self, name: str, api_base: str, model: str, prefix_length: int, prefix_hash: str,
+                 prefix_tokens: int, expires_at: float):
+        self.name = name
+        self.api_base = api_base
+        self.model = model
+        self.prefix_length = prefix_length
+        self.prefix_hash = prefix_hash
+        self.prefix_tokens = prefix_tokens
+        self.expires_at = expires_at
+
+    def expired(self, now: float) -> bool:
+        return now >= self.expires_at - EXPIRY_MARGIN_SECONDS
+
+    def matches(self, api_base: str, model: str, messages: List[Dict[str, Any]]) -> bool:
+        """Whether this handle holds a prefix of `messages` (leaving at least the new message uncached)."""
+        return (self.api_base == api_base and self.model == model and self.prefix_length < len(messages)
+                and _prefix_hash(messages[:self.prefix_length]) == self.prefix_hash)
+
+
+class _Conversation:
+    """Cache state of one conversation: its current handle and the prefix last tried for a new one."""
+
+    def __init__(self):
+        self.handle: Optional[CacheHandle] = None
+        self.attempted_hash: Optional[str] = None
+
+
+class PromptCacheRequest:
+    """One LLM call's prompt caching: the conversation it belongs to, and what was applied to it."""
+
+    def __init__(self, conversation_key: str):
+        self.conversation_key = conversation_key
+        # "breakpoints" (Anthropic cache_control) or "handle" (Gemini cachedContents), once applied
+        self.mode: Optional[str] = None
+        self.handle: Optional[CacheHandle] = None
+        self.disabled = False
+
+
+# The call being made on this task; see PromptCache.request()
+_current_request: ContextVar[Optional[PromptCacheRequest]] = ContextVar("prompt_cache_request", default=None)
+
+
+class PromptCache:
+    """
+    Provider-side prompt caching for the stable prefix of each request: the system prompt and the
+    conversation history, which every turn resends unchanged.
+
+    A LiteLLM callback rewrites each call once the router has picked a deployment, so only the
+    provider actually called is affected (fallbacks included):
+
+    - Anthropic: `cache_control` breakpoints on the system prompt and the last history message.
+      The provider caches the prefix up to each breakpoint for the TTL and reads it back on the
+      next turn; there is nothing to track.
+    - Gemini: the history up to the last user turn is stored as a cachedContents handle, kept per
+      conversation until it expires. Later turns send only the messages after it plus the handle.
+      Handles are created in the background once the uncached part of the prefix reaches
+      `min_tokens`, so no call waits for one.
+    - Other providers get the messages unchanged (OpenAI caches prefixes automatically).
+
+    A call that fails while using a handle is retried once without it (see `retry_uncached`).
+    """
+
+    def __init__(self, ttl_seconds: float = 300.0, min_tokens: int = 1024, max_conversations: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.max_conversations = max_conversations
+        # HTTP client for the cachedContents API; the shared pool's when there is one
+        self.client: Optional[httpx.AsyncClient] = None
+        self._own_client: Optional[httpx.AsyncClient] = None
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self._litellm: Any = None
+        self._hook: Any = None
+
+        self.breakpoint_calls = 0
+        self.handle_calls = 0
+        self.uncached_calls = 0
+        self.handles_created = 0
+        self.handles_expired = 0
+        self.handle_errors = 0
+        self.cached_input_tokens = 0
+        self.uncached_input_tokens = 0
+        self.cache_write_input_tokens = 0
+
+    @contextmanager
+    def request(self, conversation_id: Optional[str], conversation_history: List[Dict[str, Any]]) -> Iterator[PromptCacheRequest]:
+        """
+        Scope for one LLM call: calls made inside the block are prepared for the conversation.
+        Without a conversation ID, the conversation is identified by its first message.
+        """
+        key = conversation_id or (_prefix_hash(conversation_history[:1]) if conversation_history else "")
+        request = PromptCacheRequest(key)
+        token = _current_request.set(request)
+        try:
+            yield request
+        finally:
+            _current_request.reset(token)
+
+    def retry_uncached(self, request: PromptCacheRequest) -> bool:
+        """
+        After a failed call: if it used a handle (which may have been dropped by the provider),
+        forget the handle and return True so the caller retries once without caching.
+        """
+        if request.handle is None or request.disabled:
+            return False
+        logger.debug("Call with prompt cache handle %s failed; retrying uncached", request.handle.name)
+        self.handle_errors += 1
+        conversation = self._conversations.get(request.conversation_key)
+        if conversation is not None and conversation.handle is request.handle:
+            conversation.handle = None
+        request.handle, request.mode, request.disabled = None, None, True
+        return True
+
+    def attach(self, litellm: Any) -> None:
+        """Apply prompt caching to LiteLLM's calls."""
+        if self._litellm is None:
+            self._hook = _make_prompt_cache_hook(self)
+            litellm.callbacks.append(self._hook)
+            self._litellm = litellm
+
+    def detach(self) -> None:
+        litellm, self._litellm = self._litellm, None
+        if litellm is not None and self._hook in litellm.callbacks:
+            litellm.callbacks.remove(self._hook)
+
+    async def aclose(self) -> None:
+        self.detach()
+        for task in list(self._tasks):
+            task.cancel()
+        if self._own_client is not None:
+            await self._own_client.aclose()
+            self._own_client = None
+
+    async def apply(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Rewrite one LiteLLM call (deployment keyword arguments) for the provider's prompt cache."""
+        request = _current_request.get()
+        messages = kwargs.get("messages")
+        if request is None or request.disabled or not messages:
+            return kwargs
+        provider = call_provider(kwargs)
+        request.mode, request.handle = None, None
+        if provider == "anthropic":
+            kwargs["messages"] = self._with_breakpoints(messages)
+            request.mode = "breakpoints"
+            self.breakpoint_calls += 1
+        elif provider == "gemini":
+            handle = self._gemini_handle(request, kwargs, messages)
+            if handle is not None:
+                kwargs["messages"] = messages[handle.prefix_length:]
+                kwargs["cached_content"] = handle.name
+                # A handle the provider has dropped fails with 404, which the router would take as
+                # the deployment being down; the call is retried uncached instead (retry_uncached)
+                kwargs["cooldown_time"] = 0
+                request.mode, request.handle = "handle", handle
+                self.handle_calls += 1
+            else:
+                self.uncached_calls += 1
+        else:
+            self.uncached_calls += 1
+        return kwargs
+
+    def _with_breakpoints(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Copy of the messages with cache breakpoints on the system prompt and the last history message."""
+        cache_control: Dict[str, str] = {"type": "ephemeral"}
+        if self.ttl_seconds >= 3600:
+            cache_control["ttl"] = "1h"
+        marked = list(messages)
+        last_history = len(messages) - 2
+        for index in {0, last_history}:
+            message = messages[index] if index >= 0 else None
+            if message is not None and isinstance(message.get("content"), str):
+                marked[index] = dict(message, content=[
+                    {"type": "text", "text": message["content"], "cache_control": cache_control}
+                ])
+        return marked
+
+    def _gemini_handle(self, request: PromptCacheRequest, kwargs: Dict[str, Any],
+                       messages: List[Dict[str, Any]]) -> Optional[CacheHandle]:
+        """The conversation's handle if it still covers a prefix of this call; starts creating a newer one when due."""
+        api_base = (kwargs.get("api_base") or GEMINI_API_BASE).rstrip("/")
+        api_key = kwargs.get("api_key") or os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
+        model = str(kwargs.get("model", "")).split("/", 1)[-1]
+        if not api_key:
+            return None
+
+        now = time.time()
+        conversation = self._conversations.get(request.conversation_key)
+        if conversation is None:
+            conversation = self._conversations[request.conversation_key] = _Conversation()
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        else:
+            self._conversations.move_to_end(request.conversation_key)
+        handle = conversation.handle
+        if handle is not None and handle.expired(now):
+            conversation.handle = handle = None
+            self.handles_expired += 1
+        if handle is not None and not handle.matches(api_base, model, messages):
+            handle = None
+
+        # The cacheable prefix ends on a user turn (the cachedContents API rejects one ending on a
+        # model turn): normally everything up to the previous user message
+        end = len(messages) - 1
+        while end > 0 and messages[end - 1]["role"] == "assistant":
+            end -= 1
+        start = handle.prefix_length if handle is not None else 0
+        uncached = sum(count_tokens(kwargs.get("model", ""), str(message["content"])) + MESSAGE_OVERHEAD_TOKENS
+                       for message in messages[start:end])
+        if end > start and uncached >= self.min_tokens:
+            prefix = messages[:end]
+            prefix_hash = _prefix_hash(prefix)
+            if conversation.attempted_hash != prefix_hash:
+                conversation.attempted_hash = prefix_hash
+                self._spawn(self._create_handle(conversation, api_base, api_key, model, prefix, prefix_hash,
+                                                (handle.prefix_tokens if handle else 0) + uncached))
+        return handle
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _http(self) -> httpx.AsyncClient:
+        if self.client is not None and not self.client.is_closed:
+            return self.client
+        if self._own_client is None:
+            self._own_client = httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=5.0))
+        return self._own_client
+
+    async def _create_handle(self, conversation: _Conversation, api_base: str, api_key: str, model: str,
+                             prefix: List[Dict[str, Any]], prefix_hash: str, prefix_tokens: int) -> None:
+        system = [message["content"] for message in prefix if message["role"] == "system"]
+        body: Dict[str, Any] = {
+            "model": f"models/{model}",
+            "contents": [
+                {"role": "model" if message["role"] == "assistant" else "user", "parts": [{"text": message["content"]}]}
+                for message in prefix if message["role"] != "system"
+            ],
+            "ttl": f"{int(self.ttl_seconds)}s",
+        }
+        if system:
+            body["systemInstruction"] = {"parts": [{"text": "\n\n".join(system)}]}
+        started = time.time()
+        try:
+            response = await self._http().post(f"{api_base}/cachedContents", json=body,
+                                               headers={"x-goog-api-key": api_key})
+            response.raise_for_status()
+            name = response.json()["name"]
+        except Exception as e:
+            # Too short for the model's minimum, caching unsupported, quota: the conversation stays uncached
+            self.handle_errors += 1
+            logger.debug("Could not create a prompt cache for %s: %s", model, e)
+            return
+
+        previous = conversation.handle
+        conversation.handle = CacheHandle(name, api_base, model, len(prefix), prefix_hash, prefix_tokens,
+                                          started + self.ttl_seconds)
+        self.handles_created += 1
+        if previous is not None:
+            await self._delete_handle(previous, api_key)
+
+    async def _delete_handle(self, handle: CacheHandle, api_key: str) -> None:
+        # Superseded handles would expire on their own; deleting them stops the storage charges now
+        try:
+            await self._http().delete(f"{handle.api_base}/{handle.name}", headers={"x-goog-api-key": api_key})
+        except Exception as e:
+            logger.debug("Could not delete prompt cache %s: %s", handle.name, e)
+
+    def record_usage(self, metadata: Dict[str, int]) -> None:
+        """Add a call's usage_metadata() to the totals."""
+        self.cached_input_tokens += metadata.get("cachedInputTokens", 0)
+        self.uncached_input_tokens += metadata.get("uncachedInputTokens", 0)
+        self.cache_write_input_tokens += metadata.get("cacheWriteInputTokens", 0)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        handles = [conversation.handle for conversation in self._conversations.values() if conversation.handle]
+        total_input = self.cached_input_tokens + self.uncached_input_tokens
+        return {
+            "ttl_seconds": self.ttl_seconds,
+            "min_tokens": self.min_tokens,
+            "breakpoint_calls": self.breakpoint_calls,
+            "handle_calls": self.handle_calls,
+            "uncached_calls": self.uncached_calls,
+            "live_handles": sum(1 for handle in handles if not handle.expired(now)),
+            "handles_created": self.handles_created,
+            "handles_expired": self.handles_expired,
+            "handle_errors": self.handle_errors,
+            "cached_input_tokens": self.cached_input_tokens,
+            "uncached_input_tokens": self.uncached_input_tokens,
+            "cache_write_input_tokens": self.cache_write_input_tokens,
+            "cached_input_ratio": round(self.cached_input_tokens / total_input, 3) if total_input else None,
+        }
+
+
+_prompt_cache_hook_class = None
+
+
+def _make_prompt_cache_hook(cache: PromptCache):
+    """A LiteLLM callback that applies `cache` to each call after the router has picked its deployment."""
+    global _prompt_cache_hook_class
+    if _prompt_cache_hook_class is None:
+        # Defined on first use: CustomLogger lives in LiteLLM, which is imported lazily
+        from litellm.integrations.custom_logger import CustomLogger
+
+        class PromptCacheHook(CustomLogger):
+            def __init__(self, cache: PromptCache):
+                super().__init__()
+                self.cache = cache
+
+            async def async_pre_call_deployment_hook(self, kwargs, call_type):
+                return await self.cache.apply(kwargs)
+
+        _prompt_cache_hook_class = PromptCacheHook
+    return _prompt_cache_hook_class(cache)
@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.serialization import dumps
+
+# A cached answer, already split into (main_response, justification)
+CachedResponse = Tuple[str, str]
+
+
+def make_cache_key(
+    model: str,
+    system_prompt: str,
+    conversation_history: List[Dict[str, Any]],
+    user_message: str,
+    params: Dict[str, Any]
+) -> str:
+    """
+    Build a canonical hash for an LLM request.
+    History is normalized to the fields that actually reach the prompt, and whitespace
+    around message text is ignored, so retries of the same prompt map to the same key.
+    Messages are hashed one at a time (each as a self-delimiting JSON array), so a long
+    history is never copied into one large canonical string.
+    """
+    digest = hashlib.sha256(dumps([model, system_prompt, user_message.strip(), _canonical_params(params)]))
+    for msg in conversation_history:
+        digest.update(dumps([msg["role"], msg["content"].strip(), (msg.get("justification") or "").strip()]))
+    return digest.hexdigest()
+
+
+def _canonical_params(params: Dict[str, Any]) -> str:
+    return json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class InMemoryCacheBackend:
+    """Size-bounded LRU with per-entry TTL, held in process memory."""
+
+    # Dictionary operations; cheap enough to run on the event loop
+    offload = False
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, CachedResponse]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: CachedResponse) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    Size-bounded LRU with per-entry TTL, persisted to a local SQLite file so cached
+    answers survive restarts. Lookups and writes are single indexed queries on a local file.
+
+    The table is trimmed in sweeps rather than on every write: once it holds more than
+    max_entries rows, the least recently used are deleted down to 90% of the limit, and
+    expired rows are swept every `sweep_interval` writes.
+    """
+
+    # File I/O (and a busy wait on a locked database); run it in a worker thread
+    offload = True
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float, sweep_interval: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY,"
+            " main_response TEXT NOT NULL,"
+            " justification TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS response_cache_lru ON response_cache (last_access)")
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        self._writes_since_sweep = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT main_response, justification, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] <= now:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self._rows -= 1
+                return None
+            self._conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+            return row[0], row[1]
+
+    def set(self, key: str, value: CachedResponse) -> None:
+        now = time.time()
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM response_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?, ?)",
+                (key, value[0], value[1], now + self.ttl_seconds, now),
+            )
+            self._rows += exists is None
+            self._writes_since_sweep += 1
+            if self._rows > self.max_entries or self._writes_since_sweep >= self.sweep_interval:
+                self._sweep(now)
+
+    def _sweep(self, now: float) -> None:
+        """Delete expired rows and, over the limit, the least recently used down to 90% of it."""
+        self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        if self._rows > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                " SELECT key FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries * 9 // 10,),
+            )
+            self._rows = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        self._writes_since_sweep = 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._rows = 0
+
+    def __len__(self) -> int:
+        # Kept up to date by the writes, so stats don't scan the table
+        return self._rows
+
+
+class ResponseCache:
+    """
+    Response cache in front of the LLM provider, with hit/miss counters. Backends that do
+    file I/O (`offload`) are called from a worker thread, never on the event loop.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        if getattr(self.backend, "offload", False):
+            value = await asyncio.to_thread(self.backend.get, key)
+        else:
+            value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: CachedResponse) -> None:
+        if getattr(self.backend, "offload", False):
+            await asyncio.to_thread(self.backend.set, key, value)
+        else:
+            self.backend.set(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def build_response_cache(backend: str, max_entries: int, ttl_seconds: float, sqlite_path: str) -> Optional[ResponseCache]:
+    """Create the configured response cache, or None when caching is disabled."""
+    backend = backend.lower()
+    if backend in ("", "none", "off", "disabled"):
+        return None
+    if backend == "memory":
+        return ResponseCache(InMemoryCacheBackend(max_entries, ttl_seconds))
+    if backend == "sqlite":
+        return ResponseCache(SQLiteCacheBackend(sqlite_path, max_entries, ttl_seconds))
+    raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND '{backend}' (expected 'memory', 'sqlite' or 'none')")
@@ -0,0 +1,362 @@
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_JUSTIFICATION = "This response aims to address your specific query with relevant information."
+
+# Field names of the structured-output format: {"content": "...", "justification": "..."}
+CONTENT_FIELD = "content"
+JUSTIFICATION_FIELD = "justification"
+
+# JSON schema requested from providers in structured-output mode. LiteLLM passes it on as a
+# response schema (OpenAI, Gemini) or turns it into a forced tool call (Anthropic).
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        CONTENT_FIELD: {"type": "string", "description": "The main response to the user."},
+        JUSTIFICATION_FIELD: {"type": "string", "description": "A short justification for the suggestions made."},
+    },
+    "required": [CONTENT_FIELD, JUSTIFICATION_FIELD],
+    "additionalProperties": False,
+}
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "empathetic_response", "schema": RESPONSE_SCHEMA, "strict": True},
+}
+
+# Formats a response can be detected as
+FORMAT_JSON = "json"
+FORMAT_MARKER = "marker"
+
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+# A run of string characters that needs no decoding
+_STRING_RUN = re.compile(r'[^"\\]*')
+_WHITESPACE = re.compile(r"\s*")
+
+# JSON parser states
+_OBJECT_START, _KEY_OR_END, _COLON, _VALUE, _STRING, _SKIP_VALUE, _AFTER_VALUE, _DONE = range(8)
+
+
+class ResponseParser:
+    """
+    Single-pass, incremental parser that splits a response into its main content and justification.
+
+    Text can be fed in streamed chunks or all at once; every character is examined once and
+    events are emitted as soon as they are unambiguous. The format is detected from the first
+    non-blank characters:
+
+    - JSON (structured-output mode): an object with "content" and "justification" string
+      fields, optionally inside a ``` code fence. String values are decoded and emitted as they
+      arrive, so a truncated object still yields everything received. Other fields are skipped.
+    - Marker (legacy): a justification starts at a line beginning with 'Justification:' and runs
+      until a blank line or the end of the response; text after the blank line is content again.
+      Text that could still be the start of the marker is held back until the next chunk.
+
+    A response that looks like JSON but turns out not to be is parsed as marker text instead
+    (from the start, or from where the JSON broke off if fields were already emitted). A
+    response without a justification keeps all of its text as content and gets
+    DEFAULT_JUSTIFICATION.
+    """
+    MARKER = "Justification:"
+    LINE_MARKER = "\n" + MARKER
+
+    def __init__(self):
+        self.format: Optional[str] = None
+        self._pending = ""
+        # Everything fed until the first event, to re-parse from the start if "JSON" turns out not to be
+        self._raw: Optional[str] = ""
+        self._content: List[str] = []
+        self._justification: List[str] = []
+
+        # Marker format
+        self._in_justification = False
+        self._at_start = True
+        self._skip_whitespace = False
+
+        # JSON format
+        self._state = _OBJECT_START
+        self._in_key = False
+        self._key: List[str] = []
+        self._field: Optional[str] = None
+        self._skip_depth = 0
+        self._skip_in_string = False
+        self._skip_escape = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of text and return the events that are safe to emit."""
+        self._pending += text
+        if self._raw is not None:
+            self._raw += text
+        return list(self._drain(final=False))
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Emit whatever is still held back once the stream has ended."""
+        return list(self._drain(final=True))
+
+    def result(self) -> Tuple[str, str]:
+        """Return the complete (main_response, justification) seen so far."""
+        main_response = "".join(self._content).strip()
+        justification = "".join(self._justification).strip()
+        return main_response, justification or DEFAULT_JUSTIFICATION
+
+    def _drain(self, final: bool) -> Iterator[Dict[str, Any]]:
+        if self.format is None:
+            self.format = self._detect_format(final)
+            if self.format is None:
+                return
+            if self.format == FORMAT_MARKER:
+                self._raw = None
+        if self.format == FORMAT_JSON:
+            yield from self._drain_json(final)
+        else:
+            yield from self._drain_marker(final)
+
+    def _detect_format(self, final: bool) -> Optional[str]:
+        stripped = self._pending.lstrip()
+        if not stripped:
+            return FORMAT_MARKER if final else None
+        if stripped[0] == "{":
+            self._pending = stripped
+            return FORMAT_JSON
+        if stripped.startswith("```") or (not final and "```".startswith(stripped)):
+            # A code fence: JSON if the first line after it opens an object
+            newline = stripped.find("\n")
+            if newline < 0:
+                return FORMAT_MARKER if final else None
+            body = stripped[newline + 1:].lstrip()
+            if not body and not final:
+                return None
+            if body.startswith("{"):
+                self._pending = body
+                return FORMAT_JSON
+        return FORMAT_MARKER
+
+    # --- Marker format ---
+
+    def _drain_marker(self, final: bool) -> Iterator[Dict[str, Any]]:
+        while self._pending:
+            if not self._in_justification:
+                if self._at_start and self._pending.startswith(self.MARKER):
+                    marker_index, marker_length = 0, len(self.MARKER)
+                else:
+                    marker_index, marker_length = self._pending.find(self.LINE_MARKER), len(self.LINE_MARKER)
+
+                if marker_index >= 0:
+                    yield from self._emit_content(self._pending[:marker_index])
+                    self._pending = self._pending[marker_index + marker_length:]
+                    self._in_justification = True
+                    self._skip_whitespace = True
+                    self._at_start = False
+                    continue
+
+                held = 0 if final else self._partial_marker_length()
+                yield from self._emit_content(self._pending[:len(self._pending) - held])
+                self._pending = self._pending[len(self._pending) - held:]
+                if held:
+                    self._at_start = self._at_start and self.MARKER.startswith(self._pending)
+                return
+
+            if self._skip_whitespace:
+                self._pending = self._pending.lstrip()
+                if not self._pending:
+                    return
+                self._skip_whitespace = False
+
+            end_index = self._pending.find("\n\n")
+            if end_index >= 0:
+                yield from self._emit_justification(self._pending[:end_index])
+                # Any text after the blank line belongs to the main response again, still a new paragraph
+                self._pending = self._pending[end_index + (1 if self._content else 2):]
+                self._in_justification = False
+                continue
+
+            held = 1 if not final and self._pending.endswith("\n") else 0
+            yield from self._emit_justification(self._pending[:len(self._pending) - held])
+            self._pending = self._pending[len(self._pending) - held:]
+            return
+
+    def _partial_marker_length(self) -> int:
+        """Length of the pending suffix that could be the beginning of the marker."""
+        if self._at_start and self.MARKER.startswith(self._pending):
+            return len(self._pending)
+        # The line marker has a single newline, at its start, so only a suffix from the last newline can match
+        newline = self._pending.rfind("\n", max(0, len(self._pending) - len(self.LINE_MARKER) + 1))
+        if newline >= 0 and self.LINE_MARKER.startswith(self._pending[newline:]):
+            return len(self._pending) - newline
+        return 0
+
+    # --- JSON format ---
+
+    def _drain_json(self, final: bool) -> Iterator[Dict[str, Any]]:
+        text = self._pending
+        length = len(text)
+        index = 0
+        while index < length:
+            state = self._state
+            if state == _STRING:
+                run_end = _STRING_RUN.match(text, index).end()
+                if run_end > index:
+                    yield from self._emit_string(text[index:run_end])
+                    index = run_end
+                    if index == length:
+                        break
+                if text[index] == '"':
+                    index += 1
+                    self._end_string()
+                    continue
+                decoded, consumed = self._decode_escape(text, index, final)
+                if consumed == 0:
+                    break  # Incomplete escape sequence; wait for the next chunk
+                yield from self._emit_string(decoded)
+                index += consumed
+                continue
+
+            if state == _SKIP_VALUE:
+                index = self._skip_value(text, index)
+                continue
+
+            index = _WHITESPACE.match(text, index).end()
+            if index == length:
+                break
+            char = text[index]
+            if state == _OBJECT_START and char == "{":
+                self._state = _KEY_OR_END
+            elif state == _KEY_OR_END and char == '"':
+                self._in_key = True
+                self._key = []
+                self._state = _STRING
+            elif state in (_KEY_OR_END, _AFTER_VALUE) and char == "}":
+                self._state = _DONE
+            elif state == _AFTER_VALUE and char == ",":
+                self._state = _KEY_OR_END
+            elif state == _COLON and char == ":":
+                self._state = _VALUE
+            elif state == _VALUE and char == '"':
+                self._state = _STRING
+            elif state == _VALUE:
+                self._field = None
+                self._skip_depth = 0
+                self._state = _SKIP_VALUE
+                continue  # The skipper consumes this character
+            elif state == _DONE:
+                index = length  # Trailing text, such as a closing code fence, is ignored
+                break
+            else:
+                # Not JSON after all: parse it as marker text, from the start if nothing was emitted yet
+                self._pending = self._raw if self._raw is not None else text[index:]
+                self.format = FORMAT_MARKER
+                self._at_start = self._raw is not None
+                yield from self._drain_marker(final)
+                return
+            index += 1
+        self._pending = text[index:]
+
+    def _end_string(self) -> None:
+        if self._in_key:
+            self._in_key = False
+            key = "".join(self._key)
+            self._field = key if key in (CONTENT_FIELD, JUSTIFICATION_FIELD) else None
+            self._state = _COLON
+        else:
+            self._field = None
+            self._state = _AFTER_VALUE
+
+    def _emit_string(self, text: str) -> Iterator[Dict[str, Any]]:
+        if self._in_key:
+            self._key.append(text)
+        elif self._field == CONTENT_FIELD:
+            yield from self._emit_content(text)
+        elif self._field == JUSTIFICATION_FIELD:
+            yield from self._emit_justification(text)
+
+    def _decode_escape(self, text: str, index: int, final: bool) -> Tuple[str, int]:
+        """Decode the escape sequence at text[index] (a backslash). Returns (text, characters consumed)."""
+        available = len(text) - index
+        if available < 2:
+            return ("\\", available) if final else ("", 0)
+        kind = text[index + 1]
+        if kind != "u":
+            return _JSON_ESCAPES.get(kind, kind), 2
+        if available < 6:
+            return (text[index:], available) if final else ("", 0)
+        try:
+            code = int(text[index + 2:index + 6], 16)
+        except ValueError:
+            return text[index:index + 6], 6
+        if 0xD800 <= code < 0xDC00:
+            # High surrogate: combine with the low surrogate that should follow
+            if available < 12 and not final:
+                return "", 0
+            if text[index + 6:index + 8] == "\\u":
+                try:
+                    low = int(text[index + 8:index + 12], 16)
+                except ValueError:
+                    low = 0
+                if 0xDC00 <= low < 0xE000:
+                    return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), 12
+        return chr(code), 6
+
+    def _skip_value(self, text: str, index: int) -> int:
+        """Skip over a value of a field we don't use (number, literal, array or object)."""
+        length = len(text)
+        while index < length:
+            char = text[index]
+            if self._skip_in_string:
+                if self._skip_escape:
+                    self._skip_escape = False
+                elif char == "\\":
+                    self._skip_escape = True
+                elif char == '"':
+                    self._skip_in_string = False
+            elif char == '"':
+                self._skip_in_string = True
+            elif char in "{[":
+                self._skip_depth += 1
+            elif char in "}]":
+                if self._skip_depth == 0:
+                    self._state = _AFTER_VALUE
+                    return index  # The closing brace belongs to the enclosing object
+                self._skip_depth -= 1
+            elif char == "," and self._skip_depth == 0:
+                self._state = _AFTER_VALUE
+                return index
+            index += 1
+        return index
+
+    # --- Events ---
+
+    def _emit_content(self, text: str) -> Iterator[Dict[str, Any]]:
+        if text:
+            self._at_start = False
+            self._raw = None
+            self._content.append(text)
+            yield {"type": "content", "delta": text}
+
+    def _emit_justification(self, text: str) -> Iterator[Dict[str, Any]]:
+        if text:
+            self._raw = None
+            self._justification.append(text)
+            yield {"type": "justification", "delta": text}
+
+
+def parse_response(full_response: str) -> Tuple[str, str]:
+    """
+    Split a complete response into (main_response, justification).
+
+    Well-formed JSON is decoded in one call to json.loads; anything else (marker text,
+    truncated or malformed JSON) goes through a single pass of ResponseParser.
+    """
+    stripped = full_response.strip()
+    if stripped.startswith("{") and stripped.endswith("}"):
+        try:
+            parsed = json.loads(stripped)
+        except ValueError:
+            parsed = None
+        if isinstance(parsed, dict) and isinstance(parsed.get(CONTENT_FIELD), str):
+            justification = parsed.get(JUSTIFICATION_FIELD)
+            justification = justification.strip() if isinstance(justification, str) else ""
+            return parsed[CONTENT_FIELD].strip(), justification or DEFAULT_JUSTIFICATION
+    parser = ResponseParser()
+    parser.feed(full_response)
+    parser.flush()
+    return parser.result()
@@ -0,0 +1,309 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+
+import numpy as np
+import yaml
+
+from ..core.intent_engine import _trie_pattern
+from ..core.metrics import REQUESTS_CANCELLED, SAFETY_SCREENS
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# Joins the messages of a batch for one scan; phrases are words and spaces, so none can span it
+_SEPARATOR = "\n\x00\n"
+
+# Asks a small model to screen one message; it answers with one of the category names or "none"
+MODERATION_PROMPT = (
+    "You screen messages sent to an emotional support chat for people at risk. Reply with exactly "
+    "one word: {categories} if the message shows that risk, or none if it does not. Sadness, "
+    "stress and venting without a risk of harm are none."
+)
+
+
+class SafetyCategory:
+    """A crisis category from the safety config: the score that triggers it and the reply that replaces generation."""
+
+    def __init__(self, name: str, threshold: float, reply: str, justification: str):
+        self.name = name
+        self.threshold = threshold
+        self.reply = reply
+        self.justification = justification
+
+    def response(self):
+        return self.reply, self.justification
+
+
+class CrisisDetected(Exception):
+    """The safety screen flagged a message; its category's reply is sent instead of a generated one."""
+
+    def __init__(self, category: SafetyCategory, stage: str):
+        super().__init__(f"Safety screen flagged {category.name} ({stage})")
+        self.category = category
+        self.stage = stage
+
+    def metadata(self) -> Dict[str, Any]:
+        return {"safety": self.category.name}
+
+
+class SafetyClassifier:
+    """
+    A linear classifier over weighted phrases, vectorized over batches of messages.
+
+    All phrases are compiled into one trie-shaped pattern (as for intents), matched at word
+    starts case-insensitively. A batch is joined and scanned in a single pass; each match is
+    mapped back to its message by offset into a (messages x phrases) presence matrix, and one
+    product with the (phrases x categories) weight matrix gives every message's scores.
+    """
+
+    def __init__(self, categories: Sequence[SafetyCategory], weights: Dict[str, Dict[str, float]]):
+        self.categories = list(categories)
+        names = {category.name: index for index, category in enumerate(self.categories)}
+        phrases = sorted({phrase.lower() for phrase_weights in weights.values() for phrase in phrase_weights})
+        self._phrase_index = {phrase: index for index, phrase in enumerate(phrases)}
+        self._weights = np.zeros((len(phrases), len(self.categories)), dtype=np.float32)
+        for name, phrase_weights in weights.items():
+            for phrase, weight in phrase_weights.items():
+                self._weights[self._phrase_index[phrase.lower()], names[name]] = weight
+        # Float sums of fractional weights can land a hair under the threshold they add up to
+        self._thresholds = np.array([category.threshold for category in self.categories], dtype=np.float32) - 1e-6
+        self._pattern = re.compile(r"(?<!\w)" + _trie_pattern(phrases), re.IGNORECASE) if phrases else None
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "SafetyClassifier":
+        categories, weights = [], {}
+        for entry in config.get("categories") or []:
+            categories.append(SafetyCategory(entry["name"], float(entry.get("threshold", 1.0)), entry["reply"],
+                                             entry.get("justification", "")))
+            weights[entry["name"]] = {str(phrase): float(weight) for phrase, weight in (entry.get("phrases") or {}).items()}
+        return cls(categories, weights)
+
+    def category(self, name: str) -> Optional[SafetyCategory]:
+        for category in self.categories:
+            if category.name == name:
+                return category
+        return None
+
+    def scores(self, messages: Sequence[str]) -> np.ndarray:
+        """The (messages x categories) scores of a batch."""
+        hits = np.zeros((len(messages), len(self._phrase_index)), dtype=np.float32)
+        if self._pattern is not None and messages:
+            text = _SEPARATOR.join(messages).replace("\u2019", "'")
+            ends = np.cumsum([len(message) + len(_SEPARATOR) for message in messages])
+            offsets, columns = [], []
+            phrase_index = self._phrase_index
+            for match in self._pattern.finditer(text):
+                offsets.append(match.start())
+                columns.append(phrase_index[match.group(0).lower()])
+            if offsets:
+                # Presence, not counts: a phrase repeated in a message counts once
+                hits[np.searchsorted(ends, offsets, side="right"), columns] = 1.0
+        return hits @ self._weights
+
+    def screen_many(self, messages: Sequence[str]) -> List[Optional[SafetyCategory]]:
+        """The category each message triggers (the first listed when several do), or None."""
+        flags = self.scores(messages) >= self._thresholds
+        first = np.argmax(flags, axis=1)
+        return [self.categories[index] if flagged else None
+                for index, flagged in zip(first.tolist(), flags.any(axis=1).tolist())]
+
+    def screen(self, message: str) -> Optional[SafetyCategory]:
+        return self.screen_many([message])[0]
+
+
+def load_safety_classifier(path: str) -> SafetyClassifier:
+    with open(path) as config_file:
+        return SafetyClassifier.from_config(yaml.safe_load(config_file) or {})
+
+
+class SafetyCheck:
+    """
+    The screen of one message while its answer is generated: the moderation model's verdict,
+    awaited next to the generation by guard() or guard_stream().
+    """
+
+    def __init__(self, screen: "SafetyScreen", moderation: "Optional[asyncio.Task[Optional[str]]]"):
+        self.screen = screen
+        self.moderation = moderation
+        self.deadline = time.monotonic() + screen.moderation_timeout
+
+    async def verdict(self) -> None:
+        """Wait for the moderation model (until the timeout); raises CrisisDetected if it flagged the message."""
+        moderation = self.moderation
+        if moderation is None:
+            return
+        if not moderation.done():
+            await asyncio.wait((moderation,), timeout=max(0.0, self.deadline - time.monotonic()))
+        self.moderation = None
+        category = self.screen.moderation_result(moderation)
+        if category is not None:
+            raise CrisisDetected(category, "moderation")
+
+    def close(self) -> None:
+        if self.moderation is not None and not self.moderation.done():
+            self.moderation.cancel()
+
+    async def guard(self, awaitable: Awaitable[T]) -> T:
+        """
+        Await the answer and the verdict together. A flag cancels the answer if it is still
+        running; an answer that comes first waits for the verdict (up to the timeout).
+        """
+        if self.moderation is None:
+            return await awaitable
+        work = asyncio.ensure_future(awaitable)
+        try:
+            await asyncio.wait((work, self.moderation), return_when=asyncio.FIRST_COMPLETED)
+            try:
+                await self.verdict()
+            except CrisisDetected:
+                if not work.done():
+                    REQUESTS_CANCELLED.labels("safety").inc()
+                raise
+            return await work
+        finally:
+            self.close()
+            if not work.done():
+                work.cancel()
+                await asyncio.gather(work, return_exceptions=True)
+
+    async def guard_stream(self, events: AsyncIterator[T]) -> AsyncIterator[T]:
+        """
+        Yield from `events` once the verdict is in. The stream runs in the meantime and its events
+        are held back, so nothing generated reaches the client before the screen has cleared it;
+        a flag closes the stream, cancelling its upstream call.
+        """
+        if self.moderation is None:
+            async for event in events:
+                yield event
+            return
+        queue: "asyncio.Queue[Any]" = asyncio.Queue()
+        end = object()
+
+        async def pump() -> None:
+            try:
+                async for event in events:
+                    queue.put_nowait(event)
+                queue.put_nowait(end)
+            except Exception as e:
+                queue.put_nowait(e)
+            finally:
+                aclose = getattr(events, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+
+        pumping = asyncio.ensure_future(pump())
+        try:
+            try:
+                await self.verdict()
+            except CrisisDetected:
+                if not pumping.done():
+                    REQUESTS_CANCELLED.labels("safety").inc()
+                raise
+            while True:
+                item = await queue.get()
+                if item is end:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.close()
+            if not pumping.done():
+                pumping.cancel()
+                await asyncio.gather(pumping, return_exceptions=True)
+
+
+class SafetyScreen:
+    """
+    Screens each message for crisis and self-harm before and while its answer is generated.
+
+    The local classifier runs first, inline: it takes microseconds, less than handing it to
+    another task would, and a message it flags never starts a generation. With a moderation
+    model, the model is asked concurrently with the generation (see SafetyCheck), so a message
+    it clears has only waited for whichever of the two took longer. Moderation errors and
+    timeouts leave the message to the local verdict (fail open).
+    """
+
+    def __init__(self, classifier: SafetyClassifier, moderate: Optional[Callable[[str], Awaitable[Optional[str]]]] = None,
+                 moderation_timeout: float = 2.0):
+        self.classifier = classifier
+        self.moderate = moderate
+        self.moderation_timeout = moderation_timeout
+        self.screened = 0
+        self.flagged: Dict[str, int] = {"local": 0, "moderation": 0}
+        self.moderation_errors = 0
+        self.moderation_timeouts = 0
+
+    def start(self, message: str) -> SafetyCheck:
+        """Screen a message locally (raises CrisisDetected when flagged) and start the moderation model."""
+        self.screened += 1
+        category = self.classifier.screen(message)
+        if category is not None:
+            self.flagged["local"] += 1
+            SAFETY_SCREENS.labels("local", "flagged").inc()
+            raise CrisisDetected(category, "local")
+        SAFETY_SCREENS.labels("local", "clear").inc()
+        moderation = asyncio.ensure_future(self.moderate(message)) if self.moderate is not None else None
+        return SafetyCheck(self, moderation)
+
+    def moderation_result(self, moderation: "asyncio.Task[Optional[str]]") -> Optional[SafetyCategory]:
+        """The category a finished (or timed out) moderation call flagged, if any."""
+        if not moderation.done():
+            moderation.cancel()
+            self.moderation_timeouts += 1
+            SAFETY_SCREENS.labels("moderation", "timeout").inc()
+            logger.warning("Safety moderation timed out after %.1fs; using the local verdict", self.moderation_timeout)
+            return None
+        if moderation.cancelled() or moderation.exception() is not None:
+            self.moderation_errors += 1
+            SAFETY_SCREENS.labels("moderation", "error").inc()
+            logger.warning("Safety moderation failed; using the local verdict: %s",
+                           None if moderation.cancelled() else moderation.exception())
+            return None
+        category = self.classifier.category(moderation.result() or "")
+        if category is None:
+            SAFETY_SCREENS.labels("moderation", "clear").inc()
+            return None
+        self.flagged["moderation"] += 1
+        SAFETY_SCREENS.labels("moderation", "flagged").inc()
+        return category
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "screened": self.screened,
+            "flagged_local": self.flagged["local"],
+            "flagged_moderation": self.flagged["moderation"],
+            "moderation_errors": self.moderation_errors,
+            "moderation_timeouts": self.moderation_timeouts,
+        }
+
+
+def parse_moderation(answer: str, classifier: SafetyClassifier) -> Optional[str]:
+    """The category named by a moderation model's answer, or None for "none" and anything unexpected."""
+    words = re.findall(r"[a-z_]+", answer.lower())
+    if words and classifier.category(words[0]) is not None:
+        return words[0]
+    return None
+
+
+def moderation_messages(message: str, classifier: SafetyClassifier) -> List[Dict[str, str]]:
+    categories = ", ".join(category.name for category in classifier.categories)
+    return [
+        {"role": "system", "content": MODERATION_PROMPT.format(categories=categories)},
+        {"role": "user", "content": message},
+    ]
+
+
+def build_safety_screen(config_path: str, moderate: Optional[Callable[[str], Awaitable[Optional[str]]]],
+                        moderation_timeout: float) -> Optional[SafetyScreen]:
+    """Create the safety screen from its config, or None when it is off."""
+    if config_path.strip().lower() in ("", "none", "off", "disabled"):
+        return None
+    classifier = load_safety_classifier(config_path)
+    logger.info("Safety screen on (%d categories%s)", len(classifier.categories),
+                ", with a moderation model" if moderate is not None else "")
+    return SafetyScreen(classifier, moderate, moderation_timeout)
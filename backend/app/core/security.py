@@ -1,36 +1,130 @@
-import firebase_admin
-from firebase_admin import credentials, auth
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from ..core.config import settings
+from ..core.token_cache import SigningKeyCache, VerifiedTokenCache
+from ..core.tracing import stage_timer
+from typing import Optional
+import asyncio
+import logging
 import os
+import threading
 
-# Flag to determine if we're in development mode
-DEV_MODE = os.environ.get("DEV_MODE", "false").lower() == "true"
+logger = logging.getLogger(__name__)
+# Per-request messages; silenced together with the rest of the hot path by LOG_HOT_PATH=false
+request_log = logging.getLogger("app.request.auth")
 
-# Initialize Firebase Admin SDK
+# Firebase Admin SDK state, set by init_firebase() during warm-up or before the first token check
 firebase_initialized = False
-try:
-    cred = credentials.Certificate(settings.FIREBASE_ADMIN_SDK_CREDENTIALS_PATH)
-    firebase_admin.initialize_app(cred)
-    firebase_initialized = True
-    print("Firebase initialized successfully")
-except Exception as e:
-    print(f"Firebase initialization error: {e}")
-    print("Falling back to development mode authentication")
-    # We'll handle this by using mock authentication in development mode
+firebase_project_id = None
+firebase_init_attempted = False
+_firebase_init_lock = threading.Lock()
+
+def init_firebase() -> bool:
+    """
+    Initialize the Firebase Admin SDK once. Blocking (imports the SDK and loads the service
+    account), so async code should use ensure_firebase(). Returns whether Firebase is available.
+    """
+    global firebase_initialized, firebase_project_id, firebase_init_attempted
+    with _firebase_init_lock:
+        if firebase_init_attempted:
+            return firebase_initialized
+        try:
+            import firebase_admin
+            from firebase_admin import credentials
+            cred = credentials.Certificate(settings.FIREBASE_ADMIN_SDK_CREDENTIALS_PATH)
+            firebase_app = firebase_admin.initialize_app(cred)
+            firebase_project_id = firebase_app.project_id
+            firebase_initialized = True
+            logger.info("Firebase initialized successfully")
+        except Exception as e:
+            logger.warning("Firebase initialization error: %s", e)
+            logger.warning("Falling back to development mode authentication")
+            # We'll handle this by using mock authentication in development mode
+        firebase_init_attempted = True
+        return firebase_initialized
+
+async def ensure_firebase() -> bool:
+    if firebase_init_attempted:
+        return firebase_initialized
+    return await asyncio.to_thread(init_firebase)
+
+async def warm_up_auth() -> None:
+    """Initialize Firebase and fetch the token signing keys before the first request needs them."""
+    if await ensure_firebase() and firebase_project_id and not os.environ.get("FIREBASE_AUTH_EMULATOR_HOST"):
+        await asyncio.to_thread(signing_keys.get_keys)
+        signing_keys.start_background_refresh()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)  # auto_error=False allows None value
 
+ID_TOKEN_ISSUER_PREFIX = "https://securetoken.google.com/"
+
+# Verified tokens are reused until they expire, so repeat requests from a session skip crypto entirely
+token_cache = VerifiedTokenCache(
+    max_entries=settings.AUTH_TOKEN_CACHE_MAX_ENTRIES,
+    max_ttl_seconds=settings.AUTH_TOKEN_CACHE_MAX_TTL_SECONDS
+)
+signing_keys = SigningKeyCache(min_forced_refresh_seconds=settings.AUTH_SIGNING_KEY_MIN_REFRESH_SECONDS)
+
+def _verify_id_token_sync(token: str) -> dict:
+    """
+    Verify an ID token against the cached Google signing keys.
+    Blocking (crypto and, when the key cache is cold, a certificate download), so it must
+    run in a worker thread. Raises the same firebase_admin.auth errors as auth.verify_id_token.
+    """
+    import google.auth.jwt
+    from firebase_admin import auth
+
+    # The emulator issues unsigned tokens and an unknown project can't be checked locally,
+    # so hand those cases to the SDK.
+    if not firebase_project_id or os.environ.get("FIREBASE_AUTH_EMULATOR_HOST"):
+        return auth.verify_id_token(token)
+
+    try:
+        header = google.auth.jwt.decode_header(token)
+    except ValueError as e:
+        raise auth.InvalidIdTokenError(str(e), cause=e)
+    if header.get("alg") != "RS256" or not header.get("kid"):
+        raise auth.InvalidIdTokenError("Firebase ID token has an invalid algorithm or is missing a key ID.")
+
+    keys = signing_keys.get_keys()
+    if header["kid"] not in keys:
+        # Google may have rotated its keys since the last fetch (refetched at most once per AUTH_SIGNING_KEY_MIN_REFRESH_SECONDS)
+        keys = signing_keys.get_keys(force_refresh=True)
+        if header["kid"] not in keys:
+            raise auth.InvalidIdTokenError("Firebase ID token was signed with an unknown key ID.")
+
+    try:
+        claims = google.auth.jwt.decode(token, certs=keys, audience=firebase_project_id)
+    except ValueError as e:
+        if "Token expired" in str(e):
+            raise auth.ExpiredIdTokenError(str(e), cause=e)
+        raise auth.InvalidIdTokenError(str(e), cause=e)
+
+    subject = claims.get("sub")
+    if claims.get("iss") != ID_TOKEN_ISSUER_PREFIX + firebase_project_id:
+        raise auth.InvalidIdTokenError("Firebase ID token has an incorrect issuer.")
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        raise auth.InvalidIdTokenError("Firebase ID token has an invalid subject.")
+
+    claims["uid"] = subject
+    return claims
+
 async def verify_firebase_token(token: str = Depends(oauth2_scheme)) -> dict:
     """
     Verifies a Firebase ID token and returns the decoded token if valid.
     In development mode, it will return a mock user if token verification fails.
     """
+    with stage_timer("auth"):
+        return await _verify_firebase_token(token)
+
+async def _verify_firebase_token(token: Optional[str]) -> dict:
+    if not firebase_init_attempted and not (settings.DEV_MODE and (token is None or token == "dev-mode")):
+        await ensure_firebase()
+
     # For development without a valid token
-    if not firebase_initialized or DEV_MODE:
+    if not firebase_initialized or settings.DEV_MODE:
         if token is None or token == "dev-mode":
-            print("Using development mode authentication")
+            request_log.debug("Using development mode authentication")
             return {
                 "uid": "dev-user-123",
                 "email": "dev@example.com",
@@ -45,9 +139,18 @@ async def verify_firebase_token(token: str = Depends(oauth2_scheme)) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    decoded_token = token_cache.get(token)
+    if decoded_token is not None:
+        return decoded_token
+
+    from firebase_admin import auth
+
     try:
-        # Verify the ID token
-        decoded_token = auth.verify_id_token(token)
+        if firebase_project_id:
+            signing_keys.start_background_refresh()
+        # Verify the ID token off the event loop
+        decoded_token = await asyncio.to_thread(_verify_id_token_sync, token)
+        token_cache.put(token, decoded_token)
         return decoded_token
     except auth.ExpiredIdTokenError:
         raise HTTPException(
@@ -56,8 +159,8 @@ async def verify_firebase_token(token: str = Depends(oauth2_scheme)) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
     except auth.InvalidIdTokenError:
-        if DEV_MODE:
-            print("Invalid token but in DEV_MODE - using mock user")
+        if settings.DEV_MODE:
+            request_log.debug("Invalid token but in DEV_MODE - using mock user")
             return {
                 "uid": "dev-user-123",
                 "email": "dev@example.com",
@@ -69,8 +172,8 @@ async def verify_firebase_token(token: str = Depends(oauth2_scheme)) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
     except Exception as e:
-        if DEV_MODE:
-            print(f"Authentication error in DEV_MODE: {str(e)} - using mock user")
+        if settings.DEV_MODE:
+            request_log.debug("Authentication error in DEV_MODE: %s - using mock user", e)
             return {
                 "uid": "dev-user-123",
                 "email": "dev@example.com",
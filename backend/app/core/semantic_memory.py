@@ -0,0 +1,282 @@
+import hashlib
+import importlib
+import logging
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Function words and the small talk every turn of a support conversation shares; matching on
+# them would rank turns by how chatty they are rather than by what they are about
+STOPWORDS = frozenset("""
+a about after again all also am an and any are as at be because been before being but by can
+could did do does doing don't down even for from get got had has have having he her here him his
+how i i'd i'll i'm i've if in into is it it's its just know like me more most much my myself no
+not now of off on one only or other our out over really right said say says she should so some
+still such than that that's the their them then there these they thing things think this those
+through to too up us very was way we well were what when where which while who why will with
+would you you're your feel feeling feels felt lot sounds hear hard it's tell talk
+""".split())
+
+
+class HashingEmbedder:
+    """
+    A local embedder that needs no model: words and their 5-letter stems are hashed into `dim`
+    signed buckets (log-scaled counts), and rows are L2-normalized. It matches turns on the
+    words they share, so "rent" finds "the rent is late" but not "my landlord"; plug in a model
+    embedder for paraphrases.
+    """
+
+    # Cheap enough to run on the event loop
+    offload = False
+    # Each text sets a few buckets, so the index can weigh them by how rare they are
+    sparse = True
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[int] = []
+        buckets: List[int] = []
+        weights: List[float] = []
+        for row, text in enumerate(texts):
+            words = [word for word in _WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+            features = [(word, 1.0) for word in words]
+            features.extend((word[:5], 0.5) for word in words if len(word) > 5)
+            for feature, weight in features:
+                hashed = zlib.crc32(feature.encode())
+                rows.append(row)
+                buckets.append(hashed % self.dim)
+                weights.append(weight if hashed & 0x80000000 else -weight)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (rows, buckets), weights)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        return _normalize(matrix)
+
+
+class SentenceTransformerEmbedder:
+    """A local CPU model through sentence-transformers (an optional dependency)."""
+
+    # Model inference takes milliseconds per text; run it off the event loop
+    offload = True
+
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "SEMANTIC_MEMORY_EMBEDDER=sentence-transformers:... needs `pip install sentence-transformers`"
+            ) from e
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return _normalize(np.asarray(self.model.encode(list(texts), batch_size=64), dtype=np.float32))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def load_embedder(spec: str, dim: int):
+    """
+    The embedder for SEMANTIC_MEMORY_EMBEDDER: "hashing", "sentence-transformers:<model>", or
+    "package.module:factory" for a callable returning an object with `dim`, `offload` and
+    `embed(texts) -> float32 array of unit rows`.
+    """
+    if spec == "hashing":
+        return HashingEmbedder(dim)
+    kind, _, name = spec.partition(":")
+    if kind == "sentence-transformers":
+        return SentenceTransformerEmbedder(name or "all-MiniLM-L6-v2")
+    if not name:
+        raise ValueError(f"Unknown SEMANTIC_MEMORY_EMBEDDER '{spec}' (expected 'hashing', "
+                         "'sentence-transformers:<model>' or 'module:factory')")
+    return getattr(importlib.import_module(kind), name)()
+
+
+def _message_digest(message: Dict[str, Any]) -> bytes:
+    return hashlib.sha256(message["role"].encode() + b"\0" + message["content"].encode("utf-8")).digest()
+
+
+class ConversationIndex:
+    """
+    Embeddings of one conversation's turns (a user message and the replies up to the next one),
+    in a float32 matrix that grows by doubling, so appending a turn is amortized O(1). Row i is
+    the turn starting at history position starts[i].
+
+    With `idf` (sparse embeddings), the index counts the turns that set each bucket, and queries
+    weigh buckets by their inverse frequency: what the whole conversation keeps saying ("work",
+    "tired") counts for less than a detail mentioned once.
+    """
+
+    def __init__(self, dim: int, capacity: int = 16, idf: bool = False):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.starts = np.zeros(capacity, dtype=np.int32)
+        self.ends = np.zeros(capacity, dtype=np.int32)
+        self.doc_freq = np.zeros(dim, dtype=np.int32) if idf else None
+        self.count = 0
+        # History messages covered by the index, and the digest of the last one (to notice edits)
+        self.indexed = 0
+        self.last_digest = b""
+        # Held while the index is extended or searched (embedders may run on worker threads)
+        self.lock = threading.Lock()
+
+    def clear(self) -> None:
+        self.count = 0
+        self.indexed = 0
+        self.last_digest = b""
+        if self.doc_freq is not None:
+            self.doc_freq[:] = 0
+
+    def append(self, vectors: np.ndarray, spans: List[Tuple[int, int]]) -> None:
+        needed = self.count + len(spans)
+        if needed > len(self.vectors):
+            capacity = max(needed, 2 * len(self.vectors))
+            self.vectors = np.resize(self.vectors, (capacity, self.vectors.shape[1]))
+            self.starts = np.resize(self.starts, capacity)
+            self.ends = np.resize(self.ends, capacity)
+        self.vectors[self.count:needed] = vectors
+        self.starts[self.count:needed] = [start for start, _ in spans]
+        self.ends[self.count:needed] = [end for _, end in spans]
+        if self.doc_freq is not None:
+            self.doc_freq += np.count_nonzero(vectors, axis=0).astype(np.int32)
+        self.count = needed
+
+    def search(self, query: np.ndarray, before: int, k: int, min_score: float) -> List[int]:
+        """Rows of the k turns most similar to the query among those ending before position `before`."""
+        if self.doc_freq is not None:
+            query = query * np.log((self.count + 1) / (self.doc_freq + 1)).astype(np.float32)
+            norm = np.linalg.norm(query)
+            if norm == 0:
+                return []
+            query = query / norm
+        scores = self.vectors[:self.count] @ query
+        scores[self.ends[:self.count] > before] = -1.0
+        if k < self.count:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(self.count)
+        return [int(row) for row in top[np.argsort(-scores[top])] if scores[row] >= min_score]
+
+    def nbytes(self) -> int:
+        return self.vectors.nbytes + self.starts.nbytes + self.ends.nbytes + (
+            self.doc_freq.nbytes if self.doc_freq is not None else 0)
+
+
+class SemanticMemory:
+    """
+    Per-conversation indexes of older turns, for recalling the ones relevant to a new message.
+
+    A conversation is keyed on its server-side ID, or else on its first message (clients that
+    send the full history each time). Turns are embedded once, as they move out of the recent
+    window; a history that no longer matches what was indexed (edited or cut by the client)
+    is indexed again. The least recently used indexes are dropped beyond max_conversations.
+    """
+
+    def __init__(self, embedder, top_k: int, min_score: float, max_conversations: int):
+        self.embedder = embedder
+        self.top_k = top_k
+        self.min_score = min_score
+        self.max_conversations = max_conversations
+        self._indexes: "OrderedDict[str, ConversationIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.turns_embedded = 0
+        self.rebuilds = 0
+
+    @property
+    def offload(self) -> bool:
+        return getattr(self.embedder, "offload", True)
+
+    def recall(self, conversation_id: Optional[str], conversation_history: List[Dict[str, Any]],
+               user_message: str, before: int) -> List[Tuple[int, int]]:
+        """
+        (start, end) history spans of the turns most relevant to user_message among those
+        ending before position `before` (the start of the recent window), best first.
+        """
+        if before <= 0 or not conversation_history:
+            return []
+        key = conversation_id or "first:" + _message_digest(conversation_history[0]).hex()
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = ConversationIndex(self.embedder.dim, idf=getattr(self.embedder, "sparse", False))
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.max_conversations:
+                self._indexes.popitem(last=False)
+        with index.lock:
+            if not self._matches(index, conversation_history):
+                self.rebuilds += 1
+                index.clear()
+            self._extend(index, conversation_history, before)
+            if index.count == 0:
+                return []
+            self.queries += 1
+            query = self.embedder.embed([user_message])[0]
+            rows = index.search(query, before, self.top_k, self.min_score)
+            return [(int(index.starts[row]), int(index.ends[row])) for row in rows]
+
+    @staticmethod
+    def _matches(index: ConversationIndex, conversation_history: List[Dict[str, Any]]) -> bool:
+        return (index.indexed <= len(conversation_history)
+                and (index.indexed == 0 or _message_digest(conversation_history[index.indexed - 1]) == index.last_digest))
+
+    def _extend(self, index: ConversationIndex, conversation_history: List[Dict[str, Any]], before: int) -> None:
+        """Embed the complete turns between what is indexed and `before`."""
+        spans: List[Tuple[int, int]] = []
+        start = index.indexed
+        while start < before:
+            if conversation_history[start]["role"] != "user":
+                # System messages (stored summaries) and stray replies aren't turns of their own
+                start += 1
+                continue
+            end = start + 1
+            while end < len(conversation_history) and conversation_history[end]["role"] == "assistant":
+                end += 1
+            if end > before:
+                break
+            spans.append((start, end))
+            start = end
+        if start == index.indexed:
+            return
+        if spans:
+            texts = ["\n".join(message["content"] for message in conversation_history[first:last]) for first, last in spans]
+            index.append(self.embedder.embed(texts), spans)
+            self.turns_embedded += len(spans)
+        index.indexed = start
+        index.last_digest = _message_digest(conversation_history[start - 1])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            indexes = list(self._indexes.values())
+        return {
+            "embedder": type(self.embedder).__name__,
+            "dim": self.embedder.dim,
+            "conversations": len(indexes),
+            "indexed_turns": sum(index.count for index in indexes),
+            "index_bytes": sum(index.nbytes() for index in indexes),
+            "turns_embedded": self.turns_embedded,
+            "rebuilds": self.rebuilds,
+            "queries": self.queries,
+        }
+
+
+def build_semantic_memory(embedder: str, dim: int, top_k: int, min_score: float,
+                          max_conversations: int) -> Optional[SemanticMemory]:
+    """Create the configured semantic memory, or None when it is off."""
+    spec = embedder.strip()
+    if spec.lower() in ("", "none", "off", "disabled"):
+        return None
+    memory = SemanticMemory(load_embedder(spec, dim), top_k, min_score, max_conversations)
+    logger.info("Semantic memory on (%s, %d dimensions, top %d turns)", spec, memory.embedder.dim, top_k)
+    return memory
@@ -0,0 +1,41 @@
+import json
+import logging
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # orjson is in requirements.txt; fall back rather than fail
+    orjson = None
+    logger.warning("orjson is not installed; JSON responses, stream events and WebSocket frames use the standard json module")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON for plain data (dicts, lists, strings, numbers)."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON text; raises ValueError on invalid input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered straight to bytes: Pydantic models by pydantic-core, anything else
+    by orjson. Endpoints return it with a model instead of leaving the model to FastAPI, which
+    (before 0.130) converts the model to a dict with jsonable_encoder and then runs json.dumps.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(content)
+        return dumps(content)
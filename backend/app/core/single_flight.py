@@ -0,0 +1,132 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Flight:
+    """One in-flight upstream call and the number of callers waiting on it."""
+
+    def __init__(self, task: "asyncio.Task[Any]"):
+        self.task = task
+        self.waiters = 0
+
+
+class _StreamFlight:
+    """One in-flight upstream stream, buffered so subscribers that join late replay from the start."""
+
+    def __init__(self):
+        self.events: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task: Optional["asyncio.Task[None]"] = None
+
+    def notify(self) -> None:
+        # Wake everyone waiting on the current event, then start a fresh one for the next change
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight requests so they share one upstream call.
+
+    The upstream call runs as its own task and is shielded from any single caller being
+    cancelled; it is only cancelled once every caller waiting on it has gone away.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Flight] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+        self.calls = 0
+        self.upstream_calls = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Run factory() once per key at a time; concurrent callers with the same key await the same result.
+        Returns (result, shared) where shared is True if this caller joined an existing call.
+        """
+        self.calls += 1
+        flight = self._calls.get(key)
+        shared = flight is not None
+        if flight is None:
+            self.upstream_calls += 1
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._calls[key] = flight
+            flight.task.add_done_callback(lambda _task: self._forget_call(key, flight))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is waiting for this result any more
+                flight.task.cancel()
+                self._forget_call(key, flight)
+
+    async def subscribe(self, key: str, factory: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Fan one upstream stream out to every concurrent subscriber with the same key.
+        Each subscriber receives the full sequence of items; the upstream stream is cancelled
+        when the last subscriber stops listening before it has finished.
+        """
+        self.calls += 1
+        flight = self._streams.get(key)
+        if flight is None:
+            self.upstream_calls += 1
+            flight = _StreamFlight()
+            self._streams[key] = flight
+            flight.task = asyncio.ensure_future(self._pump(key, flight, factory))
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(flight.events):
+                    item = flight.events[index]
+                    index += 1
+                    yield item
+                elif flight.error is not None:
+                    raise flight.error
+                elif flight.done:
+                    return
+                else:
+                    await flight.changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.task.cancel()
+                self._forget_stream(key, flight)
+
+    async def _pump(self, key: str, flight: _StreamFlight, factory: Callable[[], AsyncIterator[T]]) -> None:
+        try:
+            async for item in factory():
+                flight.events.append(item)
+                flight.notify()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._forget_stream(key, flight)
+            flight.notify()
+
+    def _forget_call(self, key: str, flight: _Flight) -> None:
+        if self._calls.get(key) is flight:
+            del self._calls[key]
+
+    def _forget_stream(self, key: str, flight: _StreamFlight) -> None:
+        if self._streams.get(key) is flight:
+            del self._streams[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.upstream_calls,
+            "saved_upstream_calls": self.calls - self.upstream_calls,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Google publishes the public keys used to sign Firebase ID tokens at this URL
+ID_TOKEN_CERT_URI = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+_MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU cache of already-verified ID tokens.
+
+    Entries are keyed by a SHA-256 hash of the raw token (so tokens are never held in
+    memory as dictionary keys) and expire no later than the token's own `exp` claim.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.max_ttl_seconds = max_ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the cached claims for a token, or None if absent or expired."""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, claims = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        """Cache verified claims until the token's `exp` (capped at max_ttl_seconds)."""
+        now = time.time()
+        expires_at = min(float(claims.get("exp", 0)), now + self.max_ttl_seconds)
+        if expires_at <= now:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class SigningKeyCache:
+    """
+    In-process cache of Google's ID-token signing certificates.
+
+    Keys are fetched once and then refreshed by a background task shortly before the
+    `Cache-Control: max-age` advertised by Google runs out (but no more often than
+    min_forced_refresh_seconds), so request handlers never wait on a certificate download
+    once the cache is warm.
+
+    Forced refreshes (a token signed with a key ID we don't know) are throttled to one per
+    min_forced_refresh_seconds, so a stream of tokens with made-up key IDs can't turn every
+    request into a certificate download.
+    """
+
+    def __init__(self, certs_url: str = ID_TOKEN_CERT_URI, refresh_margin_seconds: float = 300.0,
+                 fetch_timeout_seconds: float = 10.0, min_forced_refresh_seconds: float = 60.0):
+        self.certs_url = certs_url
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.fetch_timeout_seconds = fetch_timeout_seconds
+        self.min_forced_refresh_seconds = min_forced_refresh_seconds
+        self._keys: Dict[str, str] = {}
+        self._expires_at = 0.0
+        # Monotonic time of the last fetch attempt, successful or not
+        self._fetched_at = float("-inf")
+        self.forced_refreshes = 0
+        self.throttled_refreshes = 0
+        self._fetch_lock = threading.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def prime(self, keys: Dict[str, str], max_age_seconds: float) -> None:
+        """Install a known set of keys, e.g. from a warm-up fetch or a test fixture."""
+        self._keys = dict(keys)
+        self._expires_at = time.time() + max_age_seconds
+
+    def get_keys(self, force_refresh: bool = False) -> Dict[str, str]:
+        """
+        Return the current keys, fetching synchronously only if the cache is cold or expired
+        (or force_refresh is set, e.g. after Google rotated keys). Call this from a worker
+        thread, never directly on the event loop.
+
+        With warm keys, force_refresh fetches at most once per min_forced_refresh_seconds and
+        never waits on a fetch already in progress; otherwise the current keys are returned.
+        """
+        keys = self._keys
+        fresh = time.time() < self._expires_at
+        if keys and not force_refresh and fresh:
+            return keys
+        if keys and fresh:
+            if time.monotonic() - self._fetched_at < self.min_forced_refresh_seconds:
+                self.throttled_refreshes += 1
+                return keys
+            if not self._fetch_lock.acquire(blocking=False):
+                self.throttled_refreshes += 1
+                return keys
+            try:
+                if self._keys is keys and time.monotonic() - self._fetched_at >= self.min_forced_refresh_seconds:
+                    self.forced_refreshes += 1
+                    self._fetch()
+            finally:
+                self._fetch_lock.release()
+            return self._keys
+        with self._fetch_lock:
+            # Another thread may have refreshed the keys while we waited for the lock
+            if self._keys is keys:
+                self._fetch()
+        return self._keys
+
+    def _fetch(self) -> None:
+        import requests  # Only needed off the request path, when (re)fetching keys
+        self._fetched_at = time.monotonic()
+        response = requests.get(self.certs_url, timeout=self.fetch_timeout_seconds)
+        response.raise_for_status()
+        max_age_match = _MAX_AGE_PATTERN.search(response.headers.get("Cache-Control", ""))
+        max_age = float(max_age_match.group(1)) if max_age_match else 3600.0
+        self.prime(response.json(), max_age)
+        logger.info("Fetched %d Firebase signing keys (max-age %ds)", len(self._keys), int(max_age))
+
+    def stats(self) -> Dict[str, int]:
+        return {"keys": len(self._keys), "forced_refreshes": self.forced_refreshes,
+                "throttled_refreshes": self.throttled_refreshes}
+
+    def start_background_refresh(self) -> None:
+        """Start the refresh task on the running event loop if it isn't already running."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            delay = self._expires_at - self.refresh_margin_seconds - time.time()
+            # A max-age within the refresh margin must not turn into back-to-back fetches, so
+            # fetches are spaced at least min_forced_refresh_seconds (and one second) apart
+            interval = max(self.min_forced_refresh_seconds, 1.0)
+            delay = max(delay, self._fetched_at + interval - time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await asyncio.to_thread(self._refresh)
+            except Exception as e:
+                logger.warning("Firebase signing key refresh failed: %s", e)
+                # Keep serving the current keys and retry shortly
+                await asyncio.sleep(min(60.0, self.refresh_margin_seconds))
+
+    def _refresh(self) -> None:
+        with self._fetch_lock:
+            self._fetch()
@@ -0,0 +1,154 @@
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from ..core.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS, STAGE_SECONDS
+
+TRACE_HEADER = "x-request-id"
+
+request_log = logging.getLogger("app.request")
+
+
+class Trace:
+    """Per-request timing context: a trace ID and the time spent in each stage."""
+
+    __slots__ = ("trace_id", "started", "stages")
+
+    def __init__(self, trace_id: Optional[str]):
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+# Whether requests get trace IDs (and a per-request stage breakdown in the log); switchable at runtime
+_trace_ids_enabled = False
+
+
+def set_trace_ids(enabled: bool) -> None:
+    global _trace_ids_enabled
+    _trace_ids_enabled = enabled
+
+
+def trace_ids_enabled() -> bool:
+    return _trace_ids_enabled
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Record a stage duration in the stage histogram and on the current request's trace."""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_stage(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def observe_request_validation() -> None:
+    """
+    Called on entry to an endpoint: everything since the request arrived that wasn't auth
+    was body parsing and validation.
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        observe_stage("validation", max(0.0, trace.elapsed() - trace.stages.get("auth", 0.0)))
+
+
+def _route_template(scope) -> str:
+    """
+    The matched route's path template, used as a label instead of the raw path to keep label
+    cardinality bounded. Routes of included routers may only carry their own part of the path,
+    so the router prefix is recovered from the request path.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None)
+    if template is None:
+        return "unmatched"
+    path = scope["path"]
+    regex = route.path_regex
+    index = 0
+    while index >= 0:
+        if regex.match(path[index:]):
+            return path[:index] + template
+        index = path.find("/", index + 1)
+    return template
+
+
+class ObservabilityMiddleware:
+    """
+    ASGI middleware that counts and times HTTP requests by route template and status, and
+    opens a Trace for each request. With trace IDs enabled, the ID is taken from an incoming
+    X-Request-ID header (or generated), echoed in the response, attached to log records and
+    logged with the stage breakdown when the request completes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = None
+        if _trace_ids_enabled:
+            for name, value in scope["headers"]:
+                if name == b"x-request-id":
+                    trace_id = value.decode("latin-1")[:128]
+                    break
+            else:
+                trace_id = uuid.uuid4().hex
+        trace = Trace(trace_id)
+        token = _current_trace.set(trace)
+        status_code = 500
+
+        async def send_with_trace(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if trace_id is not None:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (TRACE_HEADER.encode(), trace_id.encode("latin-1"))
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            elapsed = trace.elapsed()
+            route = _route_template(scope)
+            method = scope["method"]
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            HTTP_REQUEST_SECONDS.labels(method, route).observe(elapsed)
+            if trace_id is not None and request_log.isEnabledFor(logging.INFO):
+                request_log.info(
+                    "%s %s %d %.1fms stages=%s", method, route, status_code, elapsed * 1000,
+                    {stage: round(seconds * 1000, 2) for stage, seconds in trace.stages.items()}
+                )
+            _current_trace.reset(token)
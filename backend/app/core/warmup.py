@@ -0,0 +1,105 @@
+import asyncio
+import importlib
+import logging
+import threading
+import time
+from types import ModuleType
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule:
+    """
+    A heavy module imported on first use instead of at application import time.
+
+    `get()` imports it on the calling thread (blocking); `load()` does the same on a worker
+    thread so the event loop keeps serving. Concurrent callers wait for a single import.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.import_seconds: Optional[float] = None
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def get(self) -> ModuleType:
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    self._module = importlib.import_module(self.name)
+                    self.import_seconds = time.perf_counter() - started
+                    logger.info("Imported %s in %.2fs", self.name, self.import_seconds)
+                module = self._module
+        return module
+
+    async def load(self) -> ModuleType:
+        if self._module is not None:
+            return self._module
+        return await asyncio.to_thread(self.get)
+
+
+# LiteLLM takes seconds to import (it pulls in every provider SDK), so nothing imports it at module level
+litellm_module = LazyModule("litellm")
+
+
+class WarmUp:
+    """
+    Start-up work that is run in the background after the server starts listening, so the
+    port opens quickly and the first requests don't pay for it. Each step is independent:
+    a failing step is logged and the others still run. Anything not warmed up yet is done
+    lazily by the first request that needs it.
+    """
+
+    def __init__(self):
+        self._steps: List[Tuple[str, Callable[[], Awaitable[None]]]] = []
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def add_step(self, name: str, step: Callable[[], Awaitable[None]]) -> None:
+        self._steps.append((name, step))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    @property
+    def done(self) -> bool:
+        return self._task is not None and self._task.done()
+
+    async def run(self) -> None:
+        started = time.perf_counter()
+        await asyncio.gather(*(self._run_step(name, step) for name, step in self._steps))
+        logger.info("Warm-up finished in %.2fs: %s", time.perf_counter() - started,
+                    {name: round(seconds, 3) for name, seconds in self.timings.items()})
+
+    async def _run_step(self, name: str, step: Callable[[], Awaitable[None]]) -> None:
+        started = time.perf_counter()
+        try:
+            await step()
+        except Exception as e:
+            self.errors[name] = str(e)
+            logger.warning("Warm-up step %s failed: %s", name, e)
+        self.timings[name] = time.perf_counter() - started
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "done": self.done,
+            "timings": {name: round(seconds, 3) for name, seconds in self.timings.items()},
+            "errors": dict(self.errors),
+        }
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from ..core.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Close codes: 1001 (going away) on shutdown, or 1012 (service restart) when uvicorn closes the
+# sockets itself; application codes in the 4000 range otherwise
+CLOSE_GOING_AWAY = 1001
+CLOSE_SERVICE_RESTART = 1012
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_HEARTBEAT_TIMEOUT = 4408
+
+
+class SocketConnection:
+    """
+    One authenticated WebSocket and the chat streams multiplexed over it, keyed by the
+    client's requestId. Frames from concurrent streams are sent one at a time.
+    """
+
+    # Thousands of mostly idle connections are held per worker
+    __slots__ = ("websocket", "user", "expires_at", "last_seen", "streams", "closed", "_send_lock", "_cancel_reasons")
+
+    def __init__(self, websocket: Any, user: Dict[str, Any], expires_at: Optional[float]):
+        self.websocket = websocket
+        self.user = user
+        self.expires_at = expires_at  # Unix time the connection's ID token expires, if it does
+        self.last_seen = time.monotonic()
+        self.streams: Dict[str, "asyncio.Task[None]"] = {}
+        self.closed = False
+        self._send_lock = asyncio.Lock()
+        self._cancel_reasons: Dict[str, str] = {}
+
+    @property
+    def auth_expired(self) -> bool:
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    async def send(self, payload: Dict[str, Any]) -> bool:
+        """Send one JSON text frame; returns False once the socket is gone."""
+        if self.closed:
+            return False
+        text = dumps(payload).decode()
+        async with self._send_lock:
+            try:
+                await self.websocket.send_text(text)
+            except Exception:
+                self.closed = True
+                return False
+        return True
+
+    def start_stream(self, request_id: str, events: AsyncIterator[Dict[str, Any]]) -> None:
+        """Forward a stream's events to the client, each tagged with request_id."""
+        self.streams[request_id] = asyncio.get_running_loop().create_task(self._forward(request_id, events))
+
+    def cancel_stream(self, request_id: str, reason: str) -> bool:
+        """Stop a stream; the client gets a `cancelled` frame with the reason. False if it isn't running."""
+        task = self.streams.get(request_id)
+        if task is None or task.done():
+            return False
+        self._cancel_reasons[request_id] = reason
+        task.cancel()
+        return True
+
+    async def cancel_all(self, reason: str) -> None:
+        tasks = list(self.streams.values())
+        for request_id in list(self.streams):
+            self.cancel_stream(request_id, reason)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close(self, code: int, reason: str = "") -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass  # Already closed by the peer
+
+    async def _forward(self, request_id: str, events: AsyncIterator[Dict[str, Any]]) -> None:
+        cancel_reason = None
+        try:
+            async for event in events:
+                event["requestId"] = request_id
+                if not await self.send(event):
+                    break
+        except asyncio.CancelledError:
+            # Only cancel_stream cancels these tasks; the stream ends here instead of propagating
+            cancel_reason = self._cancel_reasons.pop(request_id, "cancelled")
+        except Exception as e:
+            logger.exception("WebSocket stream %s failed", request_id)
+            await self.send({"type": "error", "requestId": request_id, "status": 500, "detail": f"An error occurred: {e}"})
+        finally:
+            self.streams.pop(request_id, None)
+            # Releases what the stream holds (admission slot, upstream call) before anything else is sent
+            await events.aclose()
+        if cancel_reason is not None:
+            await self.send({"type": "cancelled", "requestId": request_id, "reason": cancel_reason})
+
+
+class SocketHub:
+    """
+    The open chat WebSockets of this worker. One background task sends heartbeat pings to
+    every connection and closes those that haven't sent anything within heartbeat_timeout_seconds,
+    so idle connections cost no task of their own.
+    """
+
+    def __init__(self, heartbeat_seconds: float, heartbeat_timeout_seconds: float, max_streams_per_connection: int):
+        self.heartbeat_seconds = heartbeat_seconds
+        self.heartbeat_timeout_seconds = heartbeat_timeout_seconds
+        self.max_streams_per_connection = max_streams_per_connection
+        self.connections: Set[SocketConnection] = set()
+        self._heartbeat_task: Optional["asyncio.Task[None]"] = None
+        self.connections_opened = 0
+        self.frames_received = 0
+        self.streams_started = 0
+        self.cancelled_by_client = 0
+        self.cancelled_by_server = 0
+        self.heartbeat_timeouts = 0
+
+    def register(self, websocket: Any, user: Dict[str, Any], expires_at: Optional[float]) -> SocketConnection:
+        connection = SocketConnection(websocket, user, expires_at)
+        self.connections.add(connection)
+        self.connections_opened += 1
+        if self.heartbeat_seconds > 0 and (self._heartbeat_task is None or self._heartbeat_task.done()):
+            self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        return connection
+
+    async def unregister(self, connection: SocketConnection, server_closed: bool = False) -> None:
+        """Drop a connection whose socket closed, stopping its streams."""
+        self.connections.discard(connection)
+        connection.closed = True
+        if server_closed:
+            self.cancelled_by_server += len(connection.streams)
+        await connection.cancel_all("server_shutdown" if server_closed else "disconnected")
+
+    async def close_all(self, reason: str = "server_shutdown") -> None:
+        """Cancel every stream (telling the clients why) and close the sockets, e.g. on shutdown."""
+        connections = list(self.connections)
+        self.cancelled_by_server += sum(len(connection.streams) for connection in connections)
+        await asyncio.gather(*(connection.cancel_all(reason) for connection in connections))
+        await asyncio.gather(*(connection.close(CLOSE_GOING_AWAY, reason) for connection in connections))
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+
+    async def _heartbeat(self) -> None:
+        while self.connections:
+            await asyncio.sleep(self.heartbeat_seconds)
+            now = time.monotonic()
+            pings = []
+            for connection in list(self.connections):
+                if now - connection.last_seen > self.heartbeat_timeout_seconds:
+                    self.heartbeat_timeouts += 1
+                    pings.append(self._drop(connection))
+                else:
+                    pings.append(self._ping(connection))
+            await asyncio.gather(*pings)
+
+    async def _ping(self, connection: SocketConnection) -> None:
+        # A client that doesn't read its socket must not hold up the pings to everyone else
+        try:
+            await asyncio.wait_for(connection.send({"type": "ping", "ts": time.time()}), self.heartbeat_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _drop(self, connection: SocketConnection) -> None:
+        self.cancelled_by_server += len(connection.streams)
+        await connection.cancel_all("heartbeat_timeout")
+        await connection.close(CLOSE_HEARTBEAT_TIMEOUT, "heartbeat timeout")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self.connections),
+            "streams": sum(len(connection.streams) for connection in self.connections),
+            "connections_opened": self.connections_opened,
+            "frames_received": self.frames_received,
+            "streams_started": self.streams_started,
+            "cancelled_by_client": self.cancelled_by_client,
+            "cancelled_by_server": self.cancelled_by_server,
+            "heartbeat_timeouts": self.heartbeat_timeouts,
+            "heartbeat_seconds": self.heartbeat_seconds,
+        }
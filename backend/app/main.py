@@ -1,17 +1,59 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.v1 import chat_router, auth_router
-import os
+from fastapi.responses import PlainTextResponse
+from app.core.config import ENV_FILE, settings
+from app.core.log_config import setup_logging
+from app.core.tracing import ObservabilityMiddleware, set_trace_ids
+import logging
 
-# Check if we're in development mode
-# DEV_MODE = os.environ.get("DEV_MODE", "false").lower() == "true"
-print(f"DEBUG: DEV_MODE environment variable is: {os.environ.get('DEV_MODE')}") # For debugging
+# Configure logging before the routers are imported so their start-up messages are captured
+setup_logging(settings.LOG_LEVEL, hot_path=settings.LOG_HOT_PATH)
+set_trace_ids(settings.TRACE_REQUESTS)
+logger = logging.getLogger(__name__)
+
+from app.api.v1 import chat_router, auth_router, debug_router
+from app.core.llm_manager import get_llm_manager
+from app.core.metrics import registry
+from app.core.security import warm_up_auth
+from app.core.warmup import WarmUp
+
+logger.debug("DEV_MODE is: %s", settings.DEV_MODE)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start-up is kept light so the port opens quickly: the LLM manager is created without
+    importing LiteLLM, and the slow parts (LiteLLM and the router, Firebase and its signing
+    keys, provider connections) are warmed up in the background. The shared provider
+    connection pool and the background summary workers live as long as the app; open chat
+    WebSockets are closed (their streams cancelled) on shutdown.
+    """
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)  # Provider SDKs read their API keys from the environment
+    llm_manager = get_llm_manager()
+    llm_manager.open_http_pool()
+    warm_up = WarmUp()
+    if settings.WARM_UP_ENABLED:
+        warm_up.add_step("llm", llm_manager.warm_up)
+        warm_up.add_step("auth", warm_up_auth)
+        warm_up.start()
+    app.state.warm_up = warm_up
+    if chat_router.summary_workers is not None:
+        chat_router.summary_workers.start()
+    yield
+    await chat_router.socket_hub.close_all()
+    if chat_router.summary_workers is not None:
+        await chat_router.summary_workers.stop()
+    await warm_up.stop()
+    await llm_manager.aclose()
 
 # Create FastAPI app
 app = FastAPI(
     title="Empathy AI API",
     description="API for GenAI SaaS application with empathetic responses",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -27,7 +69,7 @@ app = FastAPI(
 # ]
 
 # FORCED PERMISSIVE CORS FOR DEBUGGING
-print("DEBUG: Applying FORCED PERMISSIVE CORS settings for debugging.")
+logger.debug("Applying FORCED PERMISSIVE CORS settings for debugging.")
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins
@@ -58,9 +100,19 @@ app.add_middleware(
 #         max_age=600,  
 #     )
 
+# Request metrics and trace IDs; added last so it wraps CORS and sees every response
+app.add_middleware(ObservabilityMiddleware)
+
 # Include routers
 app.include_router(chat_router.router, prefix="/api/v1/chat", tags=["chat"])
 app.include_router(auth_router.router, prefix="/api/v1/auth", tags=["auth"])
+app.include_router(debug_router.router, prefix="/api/v1/debug", tags=["debug"])
+
+# Prometheus scrape endpoint
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 # Root endpoint for health check
 @app.get("/")
@@ -1,21 +1,90 @@
 from pydantic import BaseModel
 from typing import List, Optional
+# pydantic needs typing_extensions' TypedDict before Python 3.12
+from typing_extensions import NotRequired, TypedDict
 
-class ChatMessage(BaseModel):
+class ChatMessage(TypedDict):
+    # Validated straight into a plain dict, which is what the LLM manager and the conversation
+    # store work with, so long histories are not copied from models into dicts per request
     role: str  # "user" or "assistant"
     content: str
-    justification: Optional[str] = None  # For assistant messages from history
+    justification: NotRequired[Optional[str]]  # For assistant messages from history
 
 class ChatRequest(BaseModel):
     userId: str  # From Firebase decoded token
-    conversationHistory: List[ChatMessage]
+    conversationHistory: List[ChatMessage] = []  # Full history; optional when conversationId is used
     message: str  # The new user message
+    conversationId: Optional[str] = None  # Server-side conversation; the client then sends only new messages
+    version: Optional[int] = None  # Last conversation version the client saw (optimistic concurrency)
+    bypassCache: bool = False  # Skip the response cache and always call the LLM
+    timeoutMs: Optional[int] = None  # Time budget for the whole request (default REQUEST_TIMEOUT_SECONDS)
 
 class AIResponseData(BaseModel):
     role: str = "assistant"
     content: str
     justification: Optional[str] = None
 
+class ResponseMetadata(BaseModel):
+    contextTokenBudget: Optional[int] = None  # Prompt token budget the context was fitted into
+    promptTokens: Optional[int] = None  # Prompt tokens actually sent (None when served from cache)
+    summarizedMessages: int = 0  # Older messages folded into the rolling summary
+    droppedJustifications: int = 0  # Assistant justifications left out to fit the budget
+    recalledMessages: int = 0  # Older messages sent verbatim because the semantic memory found them relevant
+    safety: Optional[str] = None  # Crisis category the safety screen flagged; the reply is its safe response
+    cacheHit: bool = False
+    coalesced: bool = False  # Answer shared with an identical request that was already in flight
+    intent: Optional[str] = None  # Intent the model cascade classified the message as
+    modelTier: Optional[str] = None  # "fast", "strong", "default" or "canned" (no LLM call)
+    model: Optional[str] = None  # Model group the cascade picked
+    cachedInputTokens: Optional[int] = None  # Prompt tokens the provider read from its prompt cache
+    uncachedInputTokens: Optional[int] = None  # Prompt tokens the provider processed in full
+    cacheWriteInputTokens: Optional[int] = None  # Prompt tokens written to the provider's prompt cache
+    promptCache: Optional[str] = None  # "breakpoints" (Anthropic) or "handle" (Gemini) when caching applied
+    hedged: bool = False  # Served by a duplicate call to HEDGE_MODEL after a slow first token
+
 class ChatResponse(BaseModel):
     aiResponse: AIResponseData
-    # conversationId: Optional[str] = None  # For future use 
\ No newline at end of file
+    conversationId: Optional[str] = None
+    version: Optional[int] = None  # Conversation version after this exchange
+    metadata: Optional[ResponseMetadata] = None 
+
+class BatchChatRequest(BaseModel):
+    items: List[ChatRequest]
+    concurrency: Optional[int] = None  # Items processed at once; capped by BATCH_MAX_CONCURRENCY
+    stream: bool = False  # Stream results as NDJSON lines in completion order instead of one response
+
+class BatchItemError(BaseModel):
+    statusCode: int
+    detail: str
+
+class BatchItemResult(BaseModel):
+    index: int  # Position of the item in the request
+    response: Optional[ChatResponse] = None
+    error: Optional[BatchItemError] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchItemResult]  # In request order
+    succeeded: int
+    failed: int
+
+class SummarizeRequest(BaseModel):
+    userId: str  # From Firebase decoded token
+    conversationId: str  # Stored conversation to summarize, up to its latest message
+
+class SummaryJobResponse(BaseModel):
+    jobId: str
+    conversationId: str
+    status: str  # "queued", "running", "succeeded" or "failed"
+    targetMessages: int  # The job brings the summary up to the conversation's first targetMessages messages
+    attempts: int
+    maxAttempts: int
+    error: Optional[str] = None  # Last failure; a queued job with an error is waiting to be retried
+    runAfter: float  # When a queued job is due (Unix time)
+    createdAt: float
+    updatedAt: float
+
+class ConversationSummaryResponse(BaseModel):
+    conversationId: str
+    summary: str
+    coveredMessages: int  # The summary covers the conversation's first coveredMessages messages
+    updatedAt: float
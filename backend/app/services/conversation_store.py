@@ -0,0 +1,255 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class ConversationConflictError(Exception):
+    """Raised when a write is based on a stale conversation version."""
+
+    def __init__(self, conversation_id: str, expected_version: int, current_version: int):
+        super().__init__(
+            f"Conversation {conversation_id} is at version {current_version}, not {expected_version}"
+        )
+        self.conversation_id = conversation_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+
+class StoredConversation:
+    """A snapshot of a conversation's server-side state."""
+
+    def __init__(self, conversation_id: str, user_id: str, version: int, messages: List[Dict[str, Any]]):
+        self.conversation_id = conversation_id
+        self.user_id = user_id
+        self.version = version
+        self.messages = messages
+
+
+class InMemoryConversationStore:
+    """
+    Conversations held in process memory.
+    The least recently used conversations are evicted beyond max_conversations,
+    and conversations idle for longer than idle_ttl_seconds are dropped.
+    """
+
+    # Dictionary operations; cheap enough to run on the event loop
+    offload = False
+
+    def __init__(self, max_conversations: int, idle_ttl_seconds: float):
+        self.max_conversations = max_conversations
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._conversations: "OrderedDict[str, StoredConversation]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: str) -> Optional[StoredConversation]:
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                return None
+            if self._last_access[conversation_id] + self.idle_ttl_seconds <= time.time():
+                self._remove(conversation_id)
+                return None
+            self._touch(conversation_id)
+            # Hand out a snapshot so later appends don't change a history that is in use
+            return StoredConversation(conversation_id, conversation.user_id, conversation.version,
+                                      list(conversation.messages))
+
+    def append(self, conversation_id: str, user_id: str, expected_version: int,
+               new_messages: List[Dict[str, Any]]) -> int:
+        """Append messages if the conversation is still at expected_version; returns the new version."""
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            current_version = conversation.version if conversation else 0
+            if current_version != expected_version:
+                raise ConversationConflictError(conversation_id, expected_version, current_version)
+            if conversation is None:
+                conversation = StoredConversation(conversation_id, user_id, 0, [])
+                self._conversations[conversation_id] = conversation
+            conversation.messages.extend(new_messages)
+            conversation.version += 1
+            self._touch(conversation_id)
+            while len(self._conversations) > self.max_conversations:
+                self._remove(next(iter(self._conversations)))
+            return conversation.version
+
+    def delete(self, conversation_id: str) -> None:
+        with self._lock:
+            if conversation_id in self._conversations:
+                self._remove(conversation_id)
+
+    def _touch(self, conversation_id: str) -> None:
+        self._conversations.move_to_end(conversation_id)
+        self._last_access[conversation_id] = time.time()
+
+    def _remove(self, conversation_id: str) -> None:
+        del self._conversations[conversation_id]
+        del self._last_access[conversation_id]
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+
+class SQLiteConversationStore:
+    """
+    Conversations persisted to a local SQLite file.
+    Appends insert only the new message rows, so a turn costs O(new messages) to write.
+
+    Bounded like the in-memory store: reads and writes refresh a conversation's last access,
+    and once there are more than max_conversations, the least recently used are deleted down
+    to 90% of the limit. Conversations idle for longer than idle_ttl_seconds are dropped when
+    read, and swept every `sweep_interval` appends.
+    """
+
+    # File I/O (and a busy wait on a locked database); run it in a worker thread
+    offload = True
+
+    def __init__(self, path: str, max_conversations: int, idle_ttl_seconds: float, sweep_interval: int = 1000):
+        self.path = path
+        self.max_conversations = max_conversations
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            " id TEXT PRIMARY KEY,"
+            " user_id TEXT NOT NULL,"
+            " version INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_messages ("
+            " conversation_id TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " role TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " justification TEXT,"
+            " PRIMARY KEY (conversation_id, seq))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at)")
+        self._count = self._conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+        self._appends_since_sweep = 0
+
+    def get(self, conversation_id: str) -> Optional[StoredConversation]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id, version, updated_at FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] + self.idle_ttl_seconds <= now:
+                self._delete(conversation_id)
+                return None
+            self._conn.execute("UPDATE conversations SET updated_at = ? WHERE id = ?", (now, conversation_id))
+            messages = [
+                {"role": role, "content": content, "justification": justification}
+                for role, content, justification in self._conn.execute(
+                    "SELECT role, content, justification FROM conversation_messages"
+                    " WHERE conversation_id = ? ORDER BY seq",
+                    (conversation_id,),
+                )
+            ]
+            return StoredConversation(conversation_id, row[0], row[1], messages)
+
+    def append(self, conversation_id: str, user_id: str, expected_version: int,
+               new_messages: List[Dict[str, Any]]) -> int:
+        """Append messages if the conversation is still at expected_version; returns the new version."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT version FROM conversations WHERE id = ?", (conversation_id,)
+                ).fetchone()
+                current_version = row[0] if row else 0
+                if current_version != expected_version:
+                    raise ConversationConflictError(conversation_id, expected_version, current_version)
+                next_seq = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq) + 1, 0) FROM conversation_messages WHERE conversation_id = ?",
+                    (conversation_id,),
+                ).fetchone()[0]
+                self._conn.executemany(
+                    "INSERT INTO conversation_messages VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (conversation_id, next_seq + offset, msg["role"], msg["content"], msg.get("justification"))
+                        for offset, msg in enumerate(new_messages)
+                    ],
+                )
+                self._conn.execute(
+                    "INSERT INTO conversations VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(id) DO UPDATE SET version = excluded.version, updated_at = excluded.updated_at",
+                    (conversation_id, user_id, current_version + 1, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._count += row is None
+            self._appends_since_sweep += 1
+            if self._count > self.max_conversations or self._appends_since_sweep >= self.sweep_interval:
+                self._sweep(now)
+            return current_version + 1
+
+    def delete(self, conversation_id: str) -> None:
+        with self._lock:
+            self._delete(conversation_id)
+
+    def _delete(self, conversation_id: str) -> None:
+        if self._conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,)).rowcount:
+            self._count -= 1
+        self._conn.execute("DELETE FROM conversation_messages WHERE conversation_id = ?", (conversation_id,))
+
+    def _sweep(self, now: float) -> None:
+        """Delete idle conversations and, over the limit, the least recently used down to 90% of it."""
+        evicted = [row[0] for row in self._conn.execute(
+            "SELECT id FROM conversations WHERE updated_at <= ?", (now - self.idle_ttl_seconds,)
+        )]
+        keep = self.max_conversations * 9 // 10
+        if self._count - len(evicted) > self.max_conversations:
+            evicted.extend(row[0] for row in self._conn.execute(
+                "SELECT id FROM conversations WHERE updated_at > ? ORDER BY updated_at DESC LIMIT -1 OFFSET ?",
+                (now - self.idle_ttl_seconds, keep),
+            ))
+        if evicted:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("DELETE FROM conversation_messages WHERE conversation_id = ?",
+                                       [(conversation_id,) for conversation_id in evicted])
+                self._conn.executemany("DELETE FROM conversations WHERE id = ?",
+                                       [(conversation_id,) for conversation_id in evicted])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._count = self._conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+        self._appends_since_sweep = 0
+
+    def __len__(self) -> int:
+        # Kept up to date by the writes, so stats don't scan the table
+        return self._count
+
+
+async def call_store(method: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Call a conversation store method, in a worker thread for stores that do file I/O (`offload`)."""
+    if getattr(getattr(method, "__self__", None), "offload", False):
+        return await asyncio.to_thread(method, *args, **kwargs)
+    return method(*args, **kwargs)
+
+
+def build_conversation_store(backend: str, max_conversations: int, idle_ttl_seconds: float, sqlite_path: str):
+    """Create the configured conversation store."""
+    backend = backend.lower()
+    if backend == "memory":
+        return InMemoryConversationStore(max_conversations, idle_ttl_seconds)
+    if backend == "sqlite":
+        return SQLiteConversationStore(sqlite_path, max_conversations, idle_ttl_seconds)
+    raise ValueError(f"Unknown CONVERSATION_STORE_BACKEND '{backend}' (expected 'memory' or 'sqlite')")
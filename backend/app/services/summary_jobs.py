@@ -0,0 +1,431 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from ..core.context_builder import count_tokens, summary_message
+from ..services.conversation_store import call_store
+
+logger = logging.getLogger(__name__)
+
+# Job states: queued (waiting or backing off before a retry), running (leased by a worker),
+# succeeded, failed (out of attempts, or not retryable)
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+# A running job's lease outlives its timeout by this much; an expired lease (the worker's
+# process died) makes the job available again
+LEASE_MARGIN_SECONDS = 30.0
+
+# Longest wait between retries, however many attempts have failed
+MAX_RETRY_BACKOFF_SECONDS = 600.0
+
+_JOB_COLUMNS = ("id, conversation_id, user_id, target_messages, status, attempts, max_attempts, error,"
+                " run_after, created_at, updated_at")
+
+
+class SummaryJobError(Exception):
+    """A job that can't succeed on a retry (e.g. its conversation is gone)."""
+
+
+class SummaryJob:
+    """A request to bring a conversation's summary up to its first target_messages messages."""
+
+    def __init__(self, job_id: str, conversation_id: str, user_id: str, target_messages: int, status: str,
+                 attempts: int, max_attempts: int, error: Optional[str], run_after: float,
+                 created_at: float, updated_at: float):
+        self.job_id = job_id
+        self.conversation_id = conversation_id
+        self.user_id = user_id
+        self.target_messages = target_messages
+        self.status = status
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        self.error = error
+        self.run_after = run_after
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+
+class ConversationSummary:
+    """A conversation's running summary of its first covered_messages messages."""
+
+    def __init__(self, conversation_id: str, user_id: str, summary: str, covered_messages: int,
+                 covered_digest: str, updated_at: float):
+        self.conversation_id = conversation_id
+        self.user_id = user_id
+        self.summary = summary
+        self.covered_messages = covered_messages
+        self.covered_digest = covered_digest
+        self.updated_at = updated_at
+
+    def matches(self, messages: Sequence[Dict[str, Any]]) -> bool:
+        """Whether the summary still describes the start of `messages` (the conversation wasn't replaced)."""
+        covered = self.covered_messages
+        return 0 < covered <= len(messages) and message_digest(messages[covered - 1]) == self.covered_digest
+
+
+def message_digest(msg: Dict[str, Any]) -> str:
+    return hashlib.sha256(msg["role"].encode() + b"\0" + msg["content"].encode("utf-8")).hexdigest()[:32]
+
+
+class SQLiteSummaryQueue:
+    """
+    Summary jobs and the summaries they produce, persisted to a local SQLite file, so queued
+    work survives restarts and several processes can share one queue.
+
+    Jobs are idempotent per (conversation, target message count): enqueueing the same target
+    again returns the existing job. Workers take jobs with a lease; at most one job per
+    conversation runs at a time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summary_jobs ("
+            " id TEXT PRIMARY KEY,"
+            " conversation_id TEXT NOT NULL,"
+            " user_id TEXT NOT NULL,"
+            " target_messages INTEGER NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL,"
+            " max_attempts INTEGER NOT NULL,"
+            " error TEXT,"
+            " run_after REAL NOT NULL,"
+            " lease_expires_at REAL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " UNIQUE (conversation_id, target_messages))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS summary_jobs_ready ON summary_jobs (status, run_after)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_summaries ("
+            " conversation_id TEXT PRIMARY KEY,"
+            " user_id TEXT NOT NULL,"
+            " summary TEXT NOT NULL,"
+            " covered_messages INTEGER NOT NULL,"
+            " covered_digest TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+
+    def enqueue(self, conversation_id: str, user_id: str, target_messages: int,
+                max_attempts: int) -> Tuple[SummaryJob, bool]:
+        """
+        Queue a job unless one for the same target exists; returns the job and whether it is new.
+        A failed job for the target is queued again with fresh attempts.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT {_JOB_COLUMNS} FROM summary_jobs WHERE conversation_id = ? AND target_messages = ?",
+                    (conversation_id, target_messages),
+                ).fetchone()
+                if row is not None and row[4] != FAILED:
+                    self._conn.execute("COMMIT")
+                    return SummaryJob(*row), False
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE summary_jobs SET status = ?, attempts = 0, max_attempts = ?, error = NULL,"
+                        " run_after = ?, lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                        (QUEUED, max_attempts, now, now, row[0]),
+                    )
+                    job_id = row[0]
+                else:
+                    job_id = uuid.uuid4().hex
+                    self._conn.execute(
+                        "INSERT INTO summary_jobs VALUES (?, ?, ?, ?, ?, 0, ?, NULL, ?, NULL, ?, ?)",
+                        (job_id, conversation_id, user_id, target_messages, QUEUED, max_attempts, now, now, now),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return self._get(job_id), True
+
+    def claim(self, lease_seconds: float) -> Optional[SummaryJob]:
+        """
+        Lease the next due job (or one whose lease expired) to the caller, skipping conversations
+        that already have a job running. Counts as an attempt.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM summary_jobs"
+                    " WHERE ((status = ? AND run_after <= ?) OR (status = ? AND lease_expires_at <= ?))"
+                    " AND conversation_id NOT IN"
+                    "  (SELECT conversation_id FROM summary_jobs WHERE status = ? AND lease_expires_at > ?)"
+                    " ORDER BY run_after LIMIT 1",
+                    (QUEUED, now, RUNNING, now, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE summary_jobs SET status = ?, attempts = attempts + 1, lease_expires_at = ?,"
+                    " updated_at = ? WHERE id = ?",
+                    (RUNNING, now + lease_seconds, now, row[0]),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return self._get(row[0])
+
+    def complete(self, job_id: str) -> None:
+        self._finish(job_id, SUCCEEDED, None, time.time())
+
+    def fail(self, job_id: str, error: str, retry_at: Optional[float] = None) -> None:
+        """Record a failed attempt: queued again for retry_at, or failed for good without it."""
+        if retry_at is None:
+            self._finish(job_id, FAILED, error, time.time())
+        else:
+            self._finish(job_id, QUEUED, error, retry_at)
+
+    def release(self, job_id: str) -> None:
+        """Give back a job whose worker stopped before finishing it, without counting the attempt."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE summary_jobs SET status = ?, attempts = MAX(attempts - 1, 0), run_after = ?,"
+                " lease_expires_at = NULL, updated_at = ? WHERE id = ? AND status = ?",
+                (QUEUED, now, now, job_id, RUNNING),
+            )
+
+    def get(self, job_id: str) -> Optional[SummaryJob]:
+        with self._lock:
+            return self._get(job_id)
+
+    def has_active_job(self, conversation_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM summary_jobs WHERE conversation_id = ? AND status IN (?, ?) LIMIT 1",
+                (conversation_id, QUEUED, RUNNING),
+            ).fetchone() is not None
+
+    def get_summary(self, conversation_id: str) -> Optional[ConversationSummary]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT conversation_id, user_id, summary, covered_messages, covered_digest, updated_at"
+                " FROM conversation_summaries WHERE conversation_id = ?",
+                (conversation_id,),
+            ).fetchone()
+        return ConversationSummary(*row) if row else None
+
+    def save_summary(self, conversation_id: str, user_id: str, summary: str, covered_messages: int,
+                     covered_digest: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO conversation_summaries VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(conversation_id) DO UPDATE SET user_id = excluded.user_id, summary = excluded.summary,"
+                " covered_messages = excluded.covered_messages, covered_digest = excluded.covered_digest,"
+                " updated_at = excluded.updated_at",
+                (conversation_id, user_id, summary, covered_messages, covered_digest, time.time()),
+            )
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per state."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM summary_jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+        counts.update(rows)
+        return counts
+
+    def _get(self, job_id: str) -> Optional[SummaryJob]:
+        row = self._conn.execute(f"SELECT {_JOB_COLUMNS} FROM summary_jobs WHERE id = ?", (job_id,)).fetchone()
+        return SummaryJob(*row) if row else None
+
+    def _finish(self, job_id: str, status: str, error: Optional[str], run_after: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE summary_jobs SET status = ?, error = ?, run_after = ?, lease_expires_at = NULL,"
+                " updated_at = ? WHERE id = ?",
+                (status, error, run_after, time.time(), job_id),
+            )
+
+
+class SummaryWorkerPool:
+    """
+    Async workers that run summary jobs from the queue, folding the turns a conversation's
+    summary doesn't cover yet into it with `summarize(summary, new_messages)`. Summaries are
+    incremental: each job only sends the new turns (in chunks of about chunk_tokens) along with
+    the current summary, and saves its progress after every chunk.
+
+    Jobs are triggered after each stored turn (maybe_enqueue) once enough turns before the recent
+    window are uncovered, or requested explicitly (enqueue). Failed attempts are retried with
+    exponential backoff; jobs left running by a stopped worker are taken up again.
+    """
+
+    def __init__(self, queue: SQLiteSummaryQueue, conversation_store: Any,
+                 summarize: Callable[[str, List[Dict[str, Any]]], Awaitable[str]], workers: int = 2,
+                 keep_recent: int = 8, trigger_turns: int = 10, trigger_tokens: int = 3000,
+                 chunk_tokens: int = 6000, max_attempts: int = 5, retry_backoff_seconds: float = 5.0,
+                 job_timeout_seconds: float = 120.0, poll_interval_seconds: float = 1.0, token_model: str = ""):
+        self.queue = queue
+        self.conversation_store = conversation_store
+        self.summarize = summarize
+        self.workers = workers
+        self.keep_recent = keep_recent
+        self.trigger_turns = trigger_turns
+        self.trigger_tokens = trigger_tokens
+        self.chunk_tokens = chunk_tokens
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.job_timeout_seconds = job_timeout_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.token_model = token_model
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._wake: Optional[asyncio.Event] = None
+        self.triggered = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.llm_calls = 0
+        self.folded_messages = 0
+
+    def start(self) -> None:
+        """Start the workers on the running event loop."""
+        if self._tasks:
+            return
+        self._wake = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers; jobs they were running go back to the queue."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def enqueue(self, conversation_id: str, user_id: str, target_messages: int) -> SummaryJob:
+        """Queue a job summarizing the conversation's first target_messages messages (idempotent)."""
+        job, created = self.queue.enqueue(conversation_id, user_id, target_messages, self.max_attempts)
+        if created and self._wake is not None:
+            self._wake.set()
+        return job
+
+    def maybe_enqueue(self, conversation_id: str, user_id: str,
+                      messages: Sequence[Dict[str, Any]]) -> Optional[SummaryJob]:
+        """
+        Queue a job after a stored turn if the messages before the recent window that the summary
+        doesn't cover reach trigger_turns turns or trigger_tokens tokens.
+        """
+        target = len(messages) - self.keep_recent
+        summary = self.queue.get_summary(conversation_id)
+        covered = summary.covered_messages if summary is not None and summary.matches(messages) else 0
+        if target <= covered:
+            return None
+        if target - covered < 2 * self.trigger_turns and sum(
+            count_tokens(self.token_model, msg["content"]) for msg in messages[covered:target]
+        ) < self.trigger_tokens:
+            return None
+        if self.queue.has_active_job(conversation_id):
+            return None
+        self.triggered += 1
+        return self.enqueue(conversation_id, user_id, target)
+
+    def summarized_history(self, conversation_id: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        The history to prompt with: the stored summary in place of the messages it covers, as long
+        as the recent window stays verbatim; otherwise the messages unchanged.
+        """
+        summary = self.queue.get_summary(conversation_id)
+        if summary is None or summary.covered_messages > len(messages) - self.keep_recent or not summary.matches(messages):
+            return messages
+        return [summary_message(summary.summary)] + messages[summary.covered_messages:]
+
+    async def run_once(self) -> bool:
+        """Run the next due job, if any; returns whether there was one."""
+        job = self.queue.claim(self.job_timeout_seconds + LEASE_MARGIN_SECONDS)
+        if job is None:
+            return False
+        try:
+            await asyncio.wait_for(self._run(job), self.job_timeout_seconds)
+        except asyncio.CancelledError:
+            self.queue.release(job.job_id)
+            raise
+        except SummaryJobError as e:
+            self.failed += 1
+            self.queue.fail(job.job_id, str(e))
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if job.attempts < job.max_attempts:
+                self.retried += 1
+                backoff = min(MAX_RETRY_BACKOFF_SECONDS, self.retry_backoff_seconds * 2 ** (job.attempts - 1))
+                logger.warning("Summary job %s failed (attempt %d of %d), retrying in %.1fs: %s",
+                               job.job_id, job.attempts, job.max_attempts, backoff, error)
+                self.queue.fail(job.job_id, error, retry_at=time.time() + backoff)
+            else:
+                self.failed += 1
+                logger.error("Summary job %s failed after %d attempts: %s", job.job_id, job.attempts, error)
+                self.queue.fail(job.job_id, error)
+        else:
+            self.succeeded += 1
+            self.queue.complete(job.job_id)
+        return True
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                if await self.run_once():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Summary worker error")
+            # Woken early by new jobs; the poll interval picks up retries and other processes' jobs
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _run(self, job: SummaryJob) -> None:
+        conversation = await call_store(self.conversation_store.get, job.conversation_id)
+        if conversation is None or conversation.user_id != job.user_id:
+            raise SummaryJobError("Conversation not found")
+        messages = conversation.messages
+        target = min(job.target_messages, len(messages))
+
+        current = self.queue.get_summary(job.conversation_id)
+        if current is not None and current.matches(messages):
+            summary, covered = current.summary, current.covered_messages
+        else:
+            summary, covered = "", 0
+
+        # Only the turns after what the summary covers are sent, a chunk at a time
+        while covered < target:
+            end, tokens = covered, 0
+            while end < target and (end == covered or tokens < self.chunk_tokens):
+                tokens += count_tokens(self.token_model, messages[end]["content"])
+                end += 1
+            self.llm_calls += 1
+            summary = await self.summarize(summary, messages[covered:end])
+            if not summary:
+                raise ValueError("The model returned an empty summary")
+            self.queue.save_summary(job.conversation_id, job.user_id, summary, end, message_digest(messages[end - 1]))
+            self.folded_messages += end - covered
+            covered = end
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "jobs": self.queue.counts(),
+            "triggered": self.triggered,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "llm_calls": self.llm_calls,
+            "folded_messages": self.folded_messages,
+        }
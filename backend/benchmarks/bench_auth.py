@@ -0,0 +1,145 @@
+"""
+Benchmark: authentication overhead per request in verify_firebase_token.
+
+Compares the old behaviour (synchronous verification on the event loop for every request)
+with the cached, threaded verification. Tokens are minted locally with a throwaway RSA key,
+so no network access or Firebase project is needed.
+
+Run from the backend directory:
+    python -m benchmarks.bench_auth --requests 2000 --concurrency 100
+"""
+import argparse
+import asyncio
+import time
+
+import google.auth.crypt
+import google.auth.jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.core import security
+from app.core.config import settings
+
+PROJECT_ID = "bench-project"
+KEY_ID = "bench-key"
+
+
+def make_signing_material():
+    """Create an RSA key pair and return (signer, public key PEM)."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode()
+    return google.auth.crypt.RSASigner.from_string(private_pem, key_id=KEY_ID), public_pem
+
+
+def mint_token(signer, uid: str) -> str:
+    now = int(time.time())
+    payload = {
+        "iss": security.ID_TOKEN_ISSUER_PREFIX + PROJECT_ID,
+        "aud": PROJECT_ID,
+        "sub": uid,
+        "iat": now,
+        "exp": now + 3600,
+        "auth_time": now,
+    }
+    return google.auth.jwt.encode(signer, payload).decode()
+
+
+async def verify_inline(token: str) -> dict:
+    """The pre-cache behaviour: blocking verification directly on the event loop."""
+    return security._verify_id_token_sync(token)
+
+
+async def measure_loop_lag(stop: asyncio.Event, samples: list, interval: float = 0.001):
+    """Record how late the event loop wakes a 1 ms sleeper while requests are running."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def run_scenario(name, verify, tokens, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(token):
+        async with semaphore:
+            start = time.perf_counter()
+            await verify(token)
+            latencies.append(time.perf_counter() - start)
+
+    stop = asyncio.Event()
+    lag_samples = []
+    monitor = asyncio.create_task(measure_loop_lag(stop, lag_samples))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(token) for token in tokens))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    latencies.sort()
+    print(
+        f"{name:<34} "
+        f"{elapsed / len(tokens) * 1e6:>9.1f} us/req  "
+        f"p50 {latencies[len(latencies) // 2] * 1e3:>7.2f} ms  "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:>7.2f} ms  "
+        f"max loop lag {max(lag_samples, default=0) * 1e3:>7.2f} ms"
+    )
+
+
+async def main(args):
+    signer, public_pem = make_signing_material()
+
+    settings.DEV_MODE = False
+    security.firebase_init_attempted = True
+    security.firebase_initialized = True
+    security.firebase_project_id = PROJECT_ID
+    security.signing_keys.prime({KEY_ID: public_pem}, max_age_seconds=3600)
+    # Keep the benchmark offline: no background refresh against Google
+    security.signing_keys.start_background_refresh = lambda: None
+
+    sessions = [mint_token(signer, f"user-{i}") for i in range(args.sessions)]
+    tokens = [sessions[i % len(sessions)] for i in range(args.requests)]
+
+    print(f"{args.requests} requests, {args.sessions} sessions, concurrency {args.concurrency}\n")
+
+    await run_scenario("before: inline verify", verify_inline, tokens, args.concurrency)
+
+    async def cold(token):
+        security.token_cache.clear()
+        return await security.verify_firebase_token(token)
+
+    await run_scenario("after: threaded verify (no cache)", cold, tokens, args.concurrency)
+
+    security.token_cache.clear()
+    await run_scenario("after: cached (repeat sessions)", security.verify_firebase_token, tokens, args.concurrency)
+    print(f"\ntoken cache: {security.token_cache.stats()}")
+
+    # A slow signing-key refresh stalls every request when it happens on the event loop
+    def slow_fetch():
+        time.sleep(args.key_fetch_ms / 1000)
+        security.signing_keys.prime({KEY_ID: public_pem}, max_age_seconds=3600)
+
+    security.signing_keys._fetch = slow_fetch
+    print(f"\nwith a {args.key_fetch_ms} ms signing-key fetch on the first request:")
+    security.signing_keys.prime({}, max_age_seconds=0)
+    await run_scenario("before: inline verify", verify_inline, tokens, args.concurrency)
+    security.signing_keys.prime({}, max_age_seconds=0)
+    security.token_cache.clear()
+    await run_scenario("after: cached + threaded verify", security.verify_firebase_token, tokens, args.concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--sessions", type=int, default=50, help="distinct users/tokens")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--key-fetch-ms", type=float, default=200.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,79 @@
+"""
+Benchmark: /api/v1/chat/batch throughput against the mock LLM backend.
+
+The app runs in-process in DEV_MODE with MOCK_RESPONSE_LATENCY_MS simulating provider latency.
+One batch is sent per concurrency bound; since each item mostly waits on the (simulated)
+provider, throughput should grow roughly linearly with the bound until the admission
+control concurrency cap is reached. A sequential /send loop is included as the baseline.
+
+Run from the backend directory:
+    python -m benchmarks.bench_batch --items 64 --latency-ms 100 --concurrency 1 2 4 8 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+USER_ID = "dev-user-123"  # The mock user verify_firebase_token returns in DEV_MODE
+HEADERS = {"Authorization": "Bearer bench-token"}
+
+
+def item(index: int) -> dict:
+    # Distinct messages with bypassCache so every item reaches the (mock) LLM
+    return {"userId": USER_ID, "message": f"I feel stressed about work, item {index}", "bypassCache": True}
+
+
+async def run_sequential(client, items: int) -> float:
+    started = time.perf_counter()
+    for index in range(items):
+        response = await client.post("/api/v1/chat/send", json=item(index), headers=HEADERS)
+        response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def run_batch(client, items: int, concurrency: int, stream: bool) -> float:
+    body = {"items": [item(index) for index in range(items)], "concurrency": concurrency, "stream": stream}
+    started = time.perf_counter()
+    response = await client.post("/api/v1/chat/batch", json=body, headers=HEADERS, timeout=None)
+    response.raise_for_status()
+    if stream:
+        results = [json.loads(line) for line in response.text.splitlines() if line]
+    else:
+        results = response.json()["results"]
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for result in results if result["error"] is not None)
+    if len(results) != items or failed:
+        raise RuntimeError(f"batch returned {len(results)} results with {failed} failures")
+    return elapsed
+
+
+async def main(args):
+    # Configure the app before importing it
+    os.environ["DEV_MODE"] = "true"
+    os.environ["MOCK_RESPONSE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["BATCH_MAX_CONCURRENCY"] = str(max(args.concurrency))
+    os.environ["BATCH_MAX_ITEMS"] = str(args.items)
+    os.environ["ADMISSION_USER_RATE_PER_SECOND"] = "0"
+    import httpx
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        sequential = await run_sequential(client, args.items)
+        print(f"\n{args.items} items, mock latency {args.latency_ms:.0f} ms")
+        print(f"{'mode':<22}{'seconds':>10}{'items/s':>10}{'speedup':>10}")
+        print(f"{'sequential /send':<22}{sequential:>10.2f}{args.items / sequential:>10.1f}{1.0:>10.1f}")
+        for concurrency in args.concurrency:
+            for stream in (False, True):
+                elapsed = await run_batch(client, args.items, concurrency, stream)
+                label = f"batch c={concurrency}{' ndjson' if stream else ''}"
+                print(f"{label:<22}{elapsed:>10.2f}{args.items / elapsed:>10.1f}{sequential / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,80 @@
+"""
+Benchmark: building the prompt of a long conversation within CONTEXT_TOKEN_BUDGET.
+
+For histories of --messages messages, reported per ContextBuilder.build call (median of --runs):
+
+- cold: the first request of a conversation, with an empty summary cache and token counts not
+  yet memoized, so every older message is summarized, counted and trimmed to
+  CONTEXT_SUMMARY_MAX_TOKENS. It runs on the event loop, so nothing else is served meanwhile.
+- next turn: the following request, which reuses the cached summary and folds in one turn.
+
+Each is timed with the summary trim as it was (re-counting every line after each dropped one)
+and as it is (each line counted once, newest first).
+
+Run from the backend directory:
+    python -m benchmarks.bench_context_budget --messages 1000 4000 10000
+"""
+import argparse
+import statistics
+import time
+from typing import Dict, List
+
+from app.core import context_builder
+from app.core.context_builder import ContextBuilder, count_tokens
+
+MODEL = "gpt-3.5-turbo"
+SYSTEM_PROMPT = "You are a warm, supportive listener. Respond with empathy and care."
+
+
+def quadratic_trim(model: str, lines: List[str], max_tokens: int) -> List[str]:
+    """The previous trim: the total is re-counted after each dropped line."""
+    lines = list(lines)
+    while len(lines) > 1 and sum(count_tokens(model, line) for line in lines) > max_tokens:
+        lines.pop(0)
+    return lines
+
+
+def history(messages: int) -> List[Dict[str, str]]:
+    turns = []
+    for index in range(messages):
+        if index % 2:
+            turns.append({"role": "assistant", "content": f"That sounds hard ({index}). What helped last time?",
+                          "justification": "Validating the feeling before asking."})
+        else:
+            turns.append({"role": "user", "content": f"Message {index}: work kept me up again and I felt tense all day."})
+    return turns
+
+
+def time_builds(messages: int, runs: int) -> Dict[str, float]:
+    conversation = history(messages + 2)
+    cold, warm = [], []
+    for _ in range(runs):
+        count_tokens.cache_clear()
+        builder = ContextBuilder(token_budget=8000, recent_messages=8, summary_max_tokens=600)
+        started = time.perf_counter()
+        builder.build(MODEL, SYSTEM_PROMPT, conversation[:messages], "What should I do?")
+        cold.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        builder.build(MODEL, SYSTEM_PROMPT, conversation, "And now?")
+        warm.append(time.perf_counter() - started)
+    return {"cold": statistics.median(cold), "warm": statistics.median(warm)}
+
+
+def main(args) -> None:
+    trims = {"previous trim": quadratic_trim, "current trim": context_builder.trim_summary_lines}
+    count_tokens(MODEL, "Loads the tokenizer before anything is timed.")
+    print(f"\nContextBuilder.build ({MODEL} tokenizer, summary capped at 600 tokens, median of {args.runs})")
+    print(f"  {'messages':>8}  {'':<14}{'cold (first request)':>22}{'next turn':>12}")
+    for messages in args.messages:
+        for name, trim in trims.items():
+            context_builder.trim_summary_lines = trim
+            result = time_builds(messages, args.runs)
+            print(f"  {messages:>8}  {name:<14}{result['cold'] * 1e3:>20.1f}ms{result['warm'] * 1e3:>10.2f}ms")
+    context_builder.trim_summary_lines = trims["current trim"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, nargs="+", default=[1000, 4000, 10000])
+    parser.add_argument("--runs", type=int, default=3)
+    main(parser.parse_args())
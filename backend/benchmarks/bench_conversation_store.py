@@ -0,0 +1,97 @@
+"""
+Benchmark: request size and server CPU for full-history vs. conversationId (delta) requests.
+
+For each session length, a synthetic conversation is replayed turn by turn. Full-history mode
+uploads and validates the entire conversationHistory every turn; delta mode sends only the new
+message and a version, and the server reads history from the conversation store. The LLM call
+itself is excluded so only the request handling cost is measured.
+
+Run from the backend directory:
+    python -m benchmarks.bench_conversation_store --turns 10 100 1000 --backend memory
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from app.api.v1 import chat_router
+from app.models.chat_models import ChatRequest
+from app.services.conversation_store import build_conversation_store
+
+USER_ID = "bench-user"
+USER_DATA = {"uid": USER_ID}
+
+USER_TEXT = "I've been feeling overwhelmed at work lately and I'm not sure how to talk to my manager about it. "
+ASSISTANT_TEXT = "That sounds really stressful. It might help to write down the main points you want to raise first. "
+JUSTIFICATION_TEXT = "Preparing talking points reduces anxiety and keeps the conversation focused."
+
+
+def user_message(turn: int) -> str:
+    return f"{USER_TEXT}(turn {turn})"
+
+
+def full_history_payload(turn: int) -> bytes:
+    history = []
+    for previous in range(turn):
+        history.append({"role": "user", "content": user_message(previous)})
+        history.append({"role": "assistant", "content": ASSISTANT_TEXT, "justification": JUSTIFICATION_TEXT})
+    body = {"userId": USER_ID, "conversationHistory": history, "message": user_message(turn)}
+    return json.dumps(body).encode()
+
+
+def delta_payload(conversation_id: str, turn: int) -> bytes:
+    body = {"userId": USER_ID, "conversationId": conversation_id, "version": turn, "message": user_message(turn)}
+    return json.dumps(body).encode()
+
+
+async def handle(payload: bytes) -> list:
+    """The server-side work for one request: validation, history resolution and persisting the turn."""
+    request_data = ChatRequest.model_validate_json(payload)
+    history, conversation = await chat_router._load_history(request_data, USER_DATA)
+    await chat_router._save_turn(request_data, USER_DATA, conversation, ASSISTANT_TEXT, JUSTIFICATION_TEXT)
+    return history
+
+
+async def run_session(turns: int, mode: str, conversation_id: str):
+    total_bytes = 0
+    cpu_seconds = 0.0
+    last_bytes = 0
+    last_cpu = 0.0
+    for turn in range(turns):
+        payload = full_history_payload(turn) if mode == "full" else delta_payload(conversation_id, turn)
+        start = time.process_time()
+        history = await handle(payload)
+        elapsed = time.process_time() - start
+        assert len(history) == 2 * turn
+        total_bytes += len(payload)
+        cpu_seconds += elapsed
+        last_bytes, last_cpu = len(payload), elapsed
+    return total_bytes, cpu_seconds, last_bytes, last_cpu
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        chat_router.conversation_store = build_conversation_store(
+            backend=args.backend,
+            max_conversations=100000,
+            idle_ttl_seconds=86400,
+            sqlite_path=os.path.join(tmp, "bench_conversations.sqlite3"),
+        )
+        print(f"conversation store backend: {args.backend}\n")
+        print(f"{'turns':>6} {'mode':<6} {'last req bytes':>15} {'session bytes':>15} "
+              f"{'last req CPU ms':>16} {'session CPU s':>14}")
+        for turns in args.turns:
+            for mode in ("full", "delta"):
+                conversation_id = f"bench-{mode}-{turns}"
+                total_bytes, cpu_seconds, last_bytes, last_cpu = await run_session(turns, mode, conversation_id)
+                print(f"{turns:>6} {mode:<6} {last_bytes:>15,} {total_bytes:>15,} "
+                      f"{last_cpu * 1e3:>16.3f} {cpu_seconds:>14.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,218 @@
+"""
+Benchmark: tail latency with and without hedged requests, and what deadlines and client
+disconnects cancel upstream.
+
+Starts the fake deployments of benchmarks/litellm_config.fake.yaml in this process. Both
+`flash-2.0` deployments have a log-normal time to first token with a long tail and hang for
+--hang-seconds on a fraction of requests; `claude-3-haiku` (the hedge model) is well behaved.
+The app runs under uvicorn in a subprocess, once per phase:
+
+1. hedging off / on: --requests streaming chats over /api/v1/chat/stream from --concurrency
+   clients. Reported: time to the first content event and to `done` (p50/p95/p99/max), the
+   share of calls hedged and won by the hedge, and upstream calls per chat (the hedging cost).
+2. deadlines: /send with timeoutMs=--deadline-ms; requests stuck on a hung deployment end in a
+   504 at the deadline, and their upstream calls are abandoned.
+3. client disconnects: /send with no timeoutMs from clients that give up after --deadline-ms;
+   the server cancels their upstream calls instead of waiting the hang out.
+Upstream cancellation is checked with the fake providers' `abandoned` counters.
+
+Run from the backend directory:
+    python -m benchmarks.bench_hedging --requests 400 --concurrency 4
+
+Keep the concurrency low: every token is a chunk LiteLLM parses in the app process, and a
+CPU-bound server would measure its own queueing instead of the providers' tail.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import orjson
+
+from benchmarks.fake_provider import FakeProviderConfig, start_in_thread
+
+PORT = 9341
+FAKE_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "litellm_config.fake.yaml")
+HEADERS = {"Authorization": "Bearer dev-mode"}
+USER_ID = "dev-user-123"  # The mock user verify_firebase_token returns in DEV_MODE
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def start_server(hedge_model: str) -> subprocess.Popen:
+    env = dict(os.environ, DEV_MODE="true", USE_REAL_API_IN_DEV="true", LITELLM_CONFIG_PATH=FAKE_CONFIG_PATH,
+               CASCADE_ENABLED="false", HEDGE_MODEL=hedge_model, HEDGE_MIN_SAMPLES="20",
+               ADMISSION_USER_RATE_PER_SECOND="0", ADMISSION_MAX_CONCURRENCY="1000", SUMMARY_JOBS_ENABLED="false",
+               LOG_LEVEL="WARNING", LITELLM_LOCAL_MODEL_COST_MAP="True")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT), "--log-level", "warning"], env=env
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{PORT}/").status_code == 200:
+                return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("The server did not start")
+
+
+def stop_server(server: subprocess.Popen) -> None:
+    server.terminate()
+    server.wait(timeout=30)
+
+
+def provider_totals(providers: Dict[str, Tuple[FakeProviderConfig, int]]) -> Dict[str, Dict[str, int]]:
+    return {name: httpx.get(f"http://127.0.0.1:{port}/stats").json() for name, (_, port) in providers.items()}
+
+
+def delta(before: Dict[str, Dict[str, int]], after: Dict[str, Dict[str, int]], key: str) -> int:
+    return sum(after[name][key] - before[name][key] for name in after)
+
+
+def cancelled_total(reason: str) -> float:
+    """empathy_requests_cancelled_total{reason=...} from the server's /metrics."""
+    for line in httpx.get(f"http://127.0.0.1:{PORT}/metrics").text.splitlines():
+        if line.startswith(f'empathy_requests_cancelled_total{{reason="{reason}"}}'):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+async def stream_chat(client: httpx.AsyncClient, index: int) -> Tuple[float, float, bool]:
+    """(time to first content, time to done, hedged) for one streaming chat."""
+    started = time.perf_counter()
+    first: Optional[float] = None
+    hedged = False
+    body = {"userId": USER_ID, "message": f"I keep worrying about my exams, request {index}", "bypassCache": True}
+    async with client.stream("POST", "/api/v1/chat/stream", json=body, headers=HEADERS) as response:
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+                if first is None and event == "content":
+                    first = time.perf_counter() - started
+            elif line.startswith("data: ") and event == "done":
+                hedged = bool(orjson.loads(line[6:]).get("metadata", {}).get("hedged"))
+    total = time.perf_counter() - started
+    return first if first is not None else total, total, hedged
+
+
+async def run_streams(requests: int, concurrency: int) -> List[Tuple[float, float, bool]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=60) as client:
+        async def one(index: int):
+            async with semaphore:
+                return await stream_chat(client, index)
+
+        return await asyncio.gather(*(one(index) for index in range(requests)))
+
+
+def report_streams(name: str, results: List[Tuple[float, float, bool]], upstream_calls: int, stats: Optional[dict]) -> None:
+    ttfts = [ttft for ttft, _, _ in results]
+    totals = [total for _, total, _ in results]
+    print(f"\n{name} ({len(results)} streaming chats)")
+    for label, values in (("first token", ttfts), ("done", totals)):
+        print(f"  {label:<12} p50 {percentile(values, 0.5) * 1e3:7.0f}ms  p95 {percentile(values, 0.95) * 1e3:7.0f}ms  "
+              f"p99 {percentile(values, 0.99) * 1e3:7.0f}ms  max {max(values) * 1e3:7.0f}ms")
+    print(f"  upstream calls per chat {upstream_calls / len(results):.3f}", end="")
+    if stats:
+        print(f", hedged {stats['hedge_rate']:.1%} ({stats['hedge_wins']} won by the hedge, "
+              f"{stats['budget_exhausted']} over budget), hedge delay {stats['delay_seconds']}")
+    else:
+        print()
+
+
+async def run_sends(requests: int, concurrency: int, timeout_ms: Optional[int], client_timeout: float):
+    """Status code (or "client timeout") and latency of each /send."""
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=client_timeout) as client:
+        async def one(index: int):
+            body = {"userId": USER_ID, "message": f"I can't sleep before interviews, request {index}", "bypassCache": True}
+            if timeout_ms is not None:
+                body["timeoutMs"] = timeout_ms
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    status = (await client.post("/api/v1/chat/send", json=body, headers=HEADERS)).status_code
+                except httpx.TimeoutException:
+                    status = "client timeout"
+                return status, time.perf_counter() - started
+
+        return await asyncio.gather(*(one(index) for index in range(requests)))
+
+
+def report_sends(name: str, results, before, after, cancelled: float) -> None:
+    statuses: Dict[str, int] = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    latencies = [latency for _, latency in results]
+    print(f"\n{name} ({len(results)} /send requests)")
+    print(f"  outcomes {statuses}, p99 {percentile(latencies, 0.99) * 1e3:.0f}ms, max {max(latencies) * 1e3:.0f}ms")
+    print(f"  upstream: {delta(before, after, 'hangs')} hung, {delta(before, after, 'abandoned')} abandoned by the server; "
+          f"server counted {cancelled:.0f} cancelled")
+
+
+async def main(args) -> None:
+    primary = dict(ttft_ms=args.ttft_ms, ttft_distribution="lognormal", ttft_jitter=args.sigma,
+                   tokens_per_second=args.tokens_per_second, hang_rate=args.hang_rate, hang_seconds=args.hang_seconds)
+    providers = {
+        "flash-a": (FakeProviderConfig("flash-a", **primary), 9101),
+        "flash-b": (FakeProviderConfig("flash-b", **primary), 9102),
+        "haiku": (FakeProviderConfig("haiku", ttft_ms=args.ttft_ms, ttft_distribution="lognormal", ttft_jitter=0.2,
+                                     tokens_per_second=args.tokens_per_second), 9103),
+        "lite": (FakeProviderConfig("lite", ttft_ms=args.ttft_ms, tokens_per_second=args.tokens_per_second), 9104),
+    }
+    for config, port in providers.values():
+        start_in_thread(config, port)
+
+    for name, hedge_model in (("hedging off", ""), ("hedging on (to claude-3-haiku)", "claude-3-haiku")):
+        server = start_server(hedge_model)
+        try:
+            await run_streams(args.warm_up, args.concurrency)
+            before = provider_totals(providers)
+            results = await run_streams(args.requests, args.concurrency)
+            after = provider_totals(providers)
+            stats = httpx.get(f"http://127.0.0.1:{PORT}/api/v1/chat/stats", headers=HEADERS).json()["hedging"]
+            report_streams(name, results, delta(before, after, "requests"), stats)
+        finally:
+            stop_server(server)
+
+    sends = max(20, args.requests // 2)
+    server = start_server("")
+    try:
+        await run_sends(args.warm_up, args.concurrency, None, client_timeout=60)
+        before = provider_totals(providers)
+        results = await run_sends(sends, args.concurrency, args.deadline_ms, client_timeout=60)
+        await asyncio.sleep(args.hang_seconds + 0.5)  # Hung upstream calls notice they were abandoned
+        report_sends(f"deadline timeoutMs={args.deadline_ms}", results, before, provider_totals(providers),
+                     cancelled_total("deadline"))
+
+        before = provider_totals(providers)
+        results = await run_sends(sends, args.concurrency, None, client_timeout=args.deadline_ms / 1000)
+        await asyncio.sleep(args.hang_seconds + 0.5)
+        report_sends(f"clients giving up after {args.deadline_ms}ms", results, before, provider_totals(providers),
+                     cancelled_total("client_disconnect"))
+    finally:
+        stop_server(server)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warm-up", type=int, default=40, help="Chats before measuring (fills the hedge delay window)")
+    parser.add_argument("--ttft-ms", type=float, default=80.0, help="Median time to first token of every deployment")
+    parser.add_argument("--sigma", type=float, default=0.6, help="Log-normal shape of the primary deployments' TTFT")
+    parser.add_argument("--hang-rate", type=float, default=0.03)
+    parser.add_argument("--hang-seconds", type=float, default=3.0)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--deadline-ms", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
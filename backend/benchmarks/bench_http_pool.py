@@ -0,0 +1,180 @@
+"""
+Benchmark: connection reuse for provider calls.
+
+Starts two HTTPS fake deployments (benchmarks/fake_provider.py with a throwaway self-signed
+certificate): one answering in the OpenAI format, one in the Anthropic Messages format, which
+LiteLLM calls through two different HTTP stacks (the OpenAI SDK and its own HTTP handler).
+It then sends the same mix of plain and streaming requests through LLMManager:
+
+1. without the shared pool, i.e. with whatever clients LiteLLM creates itself
+2. with the shared keep-alive pool (HTTP/1.1; uvicorn can't serve HTTP/2)
+3. with the pool and a per-host cap on concurrent requests
+
+and reports the TCP connections each fake deployment accepted per 1000 requests (every new
+connection is also a TLS handshake), latency, and the pool's own counters.
+
+Needs the `cryptography` package for the certificate. Run from the backend directory:
+    python -m benchmarks.bench_http_pool --requests 1000 --concurrency 32
+"""
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import os
+import ssl
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+import yaml
+
+from benchmarks.fake_provider import FakeProviderConfig, start_in_thread
+
+OPENAI_PORT = 9201
+ANTHROPIC_PORT = 9202
+
+
+def write_certificate(directory: str):
+    """A self-signed certificate for 127.0.0.1/localhost; returns (certfile, keyfile)."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))
+        ]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    with open(certfile, "wb") as cert_file:
+        cert_file.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(keyfile, "wb") as key_file:
+        key_file.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                         serialization.NoEncryption()))
+    return certfile, keyfile
+
+
+def write_config(directory: str) -> str:
+    config = {
+        "model_list": [
+            {"model_name": "pool-openai", "litellm_params": {
+                "model": "openai/fake-flash", "api_base": f"https://127.0.0.1:{OPENAI_PORT}/v1", "api_key": "fake-key"}},
+            {"model_name": "pool-anthropic", "litellm_params": {
+                "model": "anthropic/claude-fake", "api_base": f"https://127.0.0.1:{ANTHROPIC_PORT}", "api_key": "fake-key"}},
+        ],
+        "router_settings": {"num_retries": 0, "timeout": 30},
+    }
+    path = os.path.join(directory, "litellm_config.yaml")
+    with open(path, "w") as config_file:
+        yaml.safe_dump(config, config_file)
+    return path
+
+
+async def server_connections(certfile: str) -> Dict[str, int]:
+    async with httpx.AsyncClient(verify=ssl.create_default_context(cafile=certfile)) as client:
+        counts = {}
+        for name, port in (("openai", OPENAI_PORT), ("anthropic", ANTHROPIC_PORT)):
+            stats = (await client.get(f"https://127.0.0.1:{port}/stats")).json()
+            counts[name] = stats["connections"]
+        return counts
+
+
+async def run_phase(name: str, llm_manager, args, certfile: str) -> None:
+    before = await server_connections(certfile)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def one(index: int) -> None:
+        nonlocal failures
+        model = "pool-openai" if index % 2 else "pool-anthropic"
+        message = f"request {index}: I've been feeling overwhelmed at work"
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if index % 4 < 2:
+                    await llm_manager.get_llm_response([], message, model_name=model, use_cache=False)
+                else:
+                    async for _ in llm_manager.stream_llm_response([], message, model_name=model, use_cache=False):
+                        pass
+            except Exception as e:
+                failures += 1
+                if failures <= 3:
+                    print(f"  {model} failed: {type(e).__name__}: {e}")
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    after = await server_connections(certfile)
+    latencies.sort()
+    per_1000 = {provider: (after[provider] - before[provider]) * 1000 / (args.requests / 2) for provider in after}
+    print(f"\n{name}: {args.requests - failures}/{args.requests} ok in {elapsed:.2f} s, "
+          f"p50 {latencies[len(latencies) // 2] * 1e3:.1f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.1f} ms"
+          if latencies else f"\n{name}: every request failed")
+    print("  server connections per 1000 requests: " +
+          ", ".join(f"{provider} {count:.1f}" for provider, count in per_1000.items()))
+    if llm_manager.http_pool is not None:
+        stats = llm_manager.http_pool.stats()
+        print(f"  pool: {stats['connections_opened']} connections opened, {stats['tls_handshakes']} TLS handshakes, "
+              f"{stats['open_connections']} open, {stats['requests_per_connection']} requests per connection")
+        for origin, host in stats["hosts"].items():
+            print(f"    {origin}: peak in flight {host['peak_in_flight']}, requests {host['requests']}")
+
+
+async def main(args) -> None:
+    directory = tempfile.mkdtemp(prefix="bench_http_pool_")
+    certfile, keyfile = write_certificate(directory)
+    config = FakeProviderConfig("pool", ttft_ms=args.ttft_ms, tokens_per_second=args.tokens_per_second)
+    for port in (OPENAI_PORT, ANTHROPIC_PORT):
+        start_in_thread(config, port, ssl_certfile=certfile, ssl_keyfile=keyfile)
+
+    # LiteLLM's own clients trust the certificate through SSL_CERT_FILE, the pool through its CA bundle
+    os.environ["SSL_CERT_FILE"] = certfile
+    from app.core.config import settings
+    settings.DEV_MODE = False
+    settings.CASCADE_ENABLED = False
+    settings.LITELLM_CONFIG_PATH = write_config(directory)
+    settings.LLM_HTTP_CA_BUNDLE = certfile
+    settings.LLM_HTTP2 = False
+    from app.core.llm_manager import LLMManager
+
+    phases = [("LiteLLM's own clients", None), ("shared pool", 0),
+              (f"shared pool, {args.per_host_limit} requests per host", args.per_host_limit)]
+    for name, per_host_limit in phases:
+        llm_manager = LLMManager()
+        if per_host_limit is not None:
+            settings.LLM_HTTP_MAX_REQUESTS_PER_HOST = per_host_limit
+            llm_manager.open_http_pool()
+        await llm_manager.ensure_ready()
+        await run_phase(name, llm_manager, args, certfile)
+        await llm_manager.aclose()
+        # LiteLLM caches its OpenAI SDK clients (with whatever HTTP client they got) across calls
+        from app.core.warmup import litellm_module
+        litellm_module.get().in_memory_llm_clients_cache.flush_cache()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--per-host-limit", type=int, default=8)
+    parser.add_argument("--ttft-ms", type=float, default=20.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
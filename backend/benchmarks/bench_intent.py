@@ -0,0 +1,203 @@
+"""
+Benchmark: intent classification throughput and the latency/cost saved by the model cascade.
+
+1. Classifier: classifies a large synthetic corpus with the original chain of
+   `any(term in lower_msg for term in [...])` checks and with the compiled intent engine,
+   reporting messages per second and how often the two agree. Disagreements are expected
+   where the old substring test matched inside words ("hi" in "this", "interest" in
+   "interesting"), for greetings followed by more than a greeting (no longer canned) and for
+   the keywords and intents intents.yaml adds (gratitude, "lonely", "hopeless").
+2. Cascade: sends a mixed workload through LLMManager against fake deployments, once with
+   the cascade and once with every message on the default model. `flash-lite` (the fast
+   tier) answers quickly; `flash-2.0` (default and strong tier) is slow. Cost is estimated
+   from the prompt token counts and the per-1k-token prices given on the command line.
+
+Run from the backend directory:
+    python -m benchmarks.bench_intent classifier --messages 200000
+    python -m benchmarks.bench_intent cascade --requests 300 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import Counter
+from typing import Dict, List
+
+FAKE_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "litellm_config.fake.yaml")
+INTENTS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "intents.yaml")
+
+# Message templates by how they should be routed, with filler to vary length and wording
+TEMPLATES = {
+    "greeting": ["hi", "hello there", "hey!", "good morning", "Hi, how are you?"],
+    "clarification": ["?", "ok", "hmm", "test", "k"],
+    "gratitude": ["thanks, that helped", "thank you so much", "ok bye", "appreciate it!"],
+    "distress": [
+        "I've been so anxious lately I can't sleep",
+        "I feel hopeless and lonely since the breakup",
+        "My debt keeps growing and the bank is calling every day",
+        "My boss yelled at me again and I'm overwhelmed at work",
+        "The doctor found something and I'm scared about my health",
+    ],
+    "complex": [
+        "My python script throws an error when I parse the config file",
+        "Can you help me solve a scheduling problem for my team",
+        "How should I think about a career change into software",
+    ],
+    "general": [
+        "Tell me something interesting about octopuses",
+        "What's a good recipe for a rainy evening at home",
+        "I finished this homework early today",
+        "Do you think the weather will change soon",
+    ],
+}
+FILLER = ["", " honestly", " right now", " again", " you know", " this week", " if that makes sense"]
+
+
+def legacy_classify(user_message: str) -> str:
+    """The keyword chain the mock responses used before the intent engine (one substring scan per term)."""
+    lower_msg = user_message.lower()
+    if any(term in lower_msg for term in ["loan", "debt", "money", "financial", "bank", "interest"]):
+        return "financial"
+    elif any(term in lower_msg for term in ["health", "sick", "doctor", "pain", "disease", "symptom"]):
+        return "health"
+    elif any(term in lower_msg for term in ["relationship", "partner", "marriage", "divorce", "girlfriend", "boyfriend", "spouse", "love"]):
+        return "relationship"
+    elif any(term in lower_msg for term in ["job", "career", "work", "boss", "colleague", "interview", "resume", "salary"]):
+        return "career"
+    elif any(term in lower_msg for term in ["anxiety", "depression", "stress", "overwhelmed", "therapy", "counseling", "mental health"]):
+        return "mental_health"
+    elif any(term in lower_msg for term in ["code", "programming", "software", "developer", "bug", "error", "javascript", "python", "java"]):
+        return "technical"
+    elif any(term in lower_msg for term in ["problem", "solve", "issue", "help me", "assist me", "challenge"]) and not any(term in lower_msg for term in ["technical", "code", "software", "financial", "health", "relationship", "career", "mental health"]):
+        return "problem_solving"
+    elif any(term in lower_msg for term in ["hello", "hi", "hey", "greetings", "morning", "afternoon", "evening"]):
+        return "greeting"
+    elif len(user_message.strip()) < 5 or user_message.strip() in ["?", "test", "ok"]:
+        return "clarification"
+    return "general"
+
+
+def build_corpus(count: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    kinds = list(TEMPLATES)
+    weights = [15, 5, 10, 35, 15, 20]
+    corpus = []
+    for _ in range(count):
+        message = rng.choice(TEMPLATES[rng.choices(kinds, weights)[0]])
+        if len(message) > 4:
+            message += rng.choice(FILLER)
+        corpus.append(message)
+    return corpus
+
+
+def run_classifier(args) -> None:
+    from app.core.intent_engine import load_intent_engine
+
+    engine = load_intent_engine(INTENTS_PATH)
+    corpus = build_corpus(args.messages)
+
+    started = time.perf_counter()
+    legacy = [legacy_classify(message) for message in corpus]
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    compiled = [intent.name for intent in engine.classify_many(corpus)]
+    engine_seconds = time.perf_counter() - started
+
+    disagreements = Counter((old, new) for old, new in zip(legacy, compiled) if old != new)
+    agreed = len(corpus) - sum(disagreements.values())
+    print(f"{len(corpus)} messages")
+    print(f"  legacy keyword chain   {len(corpus) / legacy_seconds:>12,.0f} msg/s")
+    print(f"  compiled intent engine {len(corpus) / engine_seconds:>12,.0f} msg/s  ({legacy_seconds / engine_seconds:.1f}x)")
+    print(f"  agreement {agreed / len(corpus):.1%}")
+    for (old, new), count in disagreements.most_common(8):
+        print(f"    legacy {old:<16} engine {new:<16} {count}")
+    print("  intent mix: " + ", ".join(f"{name} {count}" for name, count in Counter(compiled).most_common()))
+
+
+async def run_cascade_phase(name, llm_manager, corpus, concurrency, prices) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: Dict[str, List[float]] = {}
+    cost = 0.0
+
+    async def one(message):
+        nonlocal cost
+        async with semaphore:
+            metadata: Dict[str, object] = {}
+            started = time.perf_counter()
+            main_response, justification = await llm_manager.get_llm_response([], message, use_cache=False, response_metadata=metadata)
+            elapsed = time.perf_counter() - started
+            tier = metadata.get("modelTier") or "default"
+            latencies.setdefault(tier, []).append(elapsed)
+            model = metadata.get("model") or "flash-2.0"
+            if tier != "canned":
+                input_price, output_price = prices.get(model, prices["flash-2.0"])
+                output_tokens = len(f"{main_response} {justification}".split())
+                cost += (int(metadata.get("promptTokens", 0)) * input_price + output_tokens * output_price) / 1000
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(message) for message in corpus))
+    elapsed = time.perf_counter() - started
+    every = sorted(value for values in latencies.values() for value in values)
+    print(f"\n{name}: {len(corpus) / elapsed:.1f} req/s, p50 {every[len(every) // 2] * 1e3:.0f} ms, "
+          f"p99 {every[int(len(every) * 0.99)] * 1e3:.0f} ms, estimated cost ${cost:.4f}")
+    for tier, values in sorted(latencies.items()):
+        values.sort()
+        print(f"  {tier:<8} {len(values):>5} requests, p50 {values[len(values) // 2] * 1e3:.0f} ms")
+
+
+async def run_cascade(args) -> None:
+    from benchmarks.fake_provider import FakeProviderConfig, start_in_thread
+
+    slow = FakeProviderConfig("flash", ttft_ms=args.strong_ms, tokens_per_second=0)
+    fast = FakeProviderConfig("lite", ttft_ms=args.fast_ms, tokens_per_second=0)
+    for config, port in ((slow, 9101), (slow, 9102), (slow, 9103), (fast, 9104)):
+        start_in_thread(config, port)
+
+    # Import after the environment is set so LLMManager builds its router from the fake config
+    os.environ["LITELLM_CONFIG_PATH"] = FAKE_CONFIG_PATH
+    from app.core.config import settings
+    settings.LITELLM_CONFIG_PATH = FAKE_CONFIG_PATH
+    settings.INTENTS_CONFIG_PATH = INTENTS_PATH
+    settings.LLM_FAST_MODEL = "flash-lite"
+    settings.DEV_MODE = False
+    from app.core.llm_manager import LLMManager
+    llm_manager = LLMManager()
+    await llm_manager.ensure_ready()
+
+    prices = {
+        "flash-2.0": (args.strong_input_price, args.strong_output_price),
+        "flash-lite": (args.fast_input_price, args.fast_output_price),
+    }
+    corpus = build_corpus(args.requests, seed=11)
+
+    cascade = llm_manager.cascade
+    llm_manager.cascade = None
+    await run_cascade_phase("cascade off (default model for everything)", llm_manager, corpus, args.concurrency, prices)
+    llm_manager.cascade = cascade
+    await run_cascade_phase("cascade on", llm_manager, corpus, args.concurrency, prices)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    classifier = commands.add_parser("classifier", help="Classifier throughput on a synthetic corpus")
+    classifier.add_argument("--messages", type=int, default=200000)
+
+    cascade = commands.add_parser("cascade", help="Latency and cost with and without the cascade")
+    cascade.add_argument("--requests", type=int, default=300)
+    cascade.add_argument("--concurrency", type=int, default=20)
+    cascade.add_argument("--fast-ms", type=float, default=60.0, help="TTFT of the fast tier")
+    cascade.add_argument("--strong-ms", type=float, default=400.0, help="TTFT of the default/strong tier")
+    cascade.add_argument("--fast-input-price", type=float, default=0.000075, help="USD per 1k input tokens")
+    cascade.add_argument("--fast-output-price", type=float, default=0.0003, help="USD per 1k output tokens")
+    cascade.add_argument("--strong-input-price", type=float, default=0.0001)
+    cascade.add_argument("--strong-output-price", type=float, default=0.0004)
+
+    parsed = parser.parse_args()
+    if parsed.command == "classifier":
+        run_classifier(parsed)
+    else:
+        asyncio.run(run_cascade(parsed))
@@ -0,0 +1,129 @@
+"""
+Benchmark: response parsing correctness and throughput.
+
+First checks every case in benchmarks/fixtures/response_parser_cases.json, parsing the whole
+response at once and fed in chunks of several sizes (streamed events must add up to the same
+result). Then measures throughput on long responses for:
+
+- the previous non-streaming parser: re.search + re.sub over the whole text, with the
+  split('.') fallback that cut answers without a marker in half
+- parse_response on marker text and on JSON
+- ResponseParser fed in token-sized chunks, as in streaming
+
+Run from the backend directory:
+    python -m benchmarks.bench_parser --paragraphs 50 --iterations 200
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from typing import List, Tuple
+
+from app.core.response_parser import DEFAULT_JUSTIFICATION, ResponseParser, parse_response
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "response_parser_cases.json")
+CHUNK_SIZES = (1, 2, 3, 5, 8, 13, 64)
+
+PARAGRAPH = (
+    "It sounds like the last few weeks have been really heavy, and it makes sense that you feel worn down. "
+    "One thing that might help is to pick a single, small task for tomorrow morning, such as a 10-minute walk "
+    "or writing down the 3 things that are worrying you most, so that the day starts with something you can finish."
+)
+JUSTIFICATION = "Small, concrete steps restore a sense of control when everything feels overwhelming."
+
+
+def legacy_split_justification(full_response: str) -> Tuple[str, str]:
+    """The parser LLMManager used before ResponseParser."""
+    justification = ""
+    main_response = full_response
+    justification_match = re.search(r'(?:^|\n)Justification:\s*(.*?)(?:$|\n\n)', full_response, re.DOTALL)
+    if justification_match:
+        justification = justification_match.group(1).strip()
+        main_response = re.sub(r'(?:^|\n)Justification:\s*.*?(?:$|\n\n)', '', full_response, flags=re.DOTALL).strip()
+    else:
+        sentences = full_response.split('.')
+        if len(sentences) > 1:
+            justification = sentences[-2].strip() + '.'
+            main_response = '.'.join(sentences[:-2]) + '.'
+        else:
+            justification = DEFAULT_JUSTIFICATION
+    return main_response, justification
+
+
+def parse_chunked(text: str, size: int) -> Tuple[Tuple[str, str], Tuple[str, str]]:
+    """Feed text in chunks; returns the parser's result and the result rebuilt from its events."""
+    parser = ResponseParser()
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    events.extend(parser.flush())
+    content = "".join(event["delta"] for event in events if event["type"] == "content").strip()
+    justification = "".join(event["delta"] for event in events if event["type"] == "justification").strip()
+    return parser.result(), (content, justification or DEFAULT_JUSTIFICATION)
+
+
+def check_fixtures() -> int:
+    with open(FIXTURES_PATH) as fixtures_file:
+        cases = json.load(fixtures_file)
+    failures = 0
+    for case in cases:
+        expected = (case["content"], case["justification"] or DEFAULT_JUSTIFICATION)
+        problems: List[str] = []
+        if parse_response(case["response"]) != expected:
+            problems.append(f"whole: {parse_response(case['response'])!r}")
+        for size in CHUNK_SIZES:
+            result, from_events = parse_chunked(case["response"], size)
+            if result != expected:
+                problems.append(f"chunks of {size}: {result!r}")
+            elif from_events != expected:
+                problems.append(f"events in chunks of {size}: {from_events!r}")
+        legacy_ok = "ok" if legacy_split_justification(case["response"]) == expected else "differs"
+        print(f"  {case['name']:<32} {'FAIL' if problems else 'ok':<6} (previous parser: {legacy_ok})")
+        for problem in problems[:3]:
+            print(f"      {problem}")
+        failures += bool(problems)
+    print(f"{len(cases) - failures}/{len(cases)} fixtures pass")
+    return failures
+
+
+def measure(name: str, function, text: str, iterations: int) -> None:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        function(text)
+    elapsed = time.perf_counter() - started
+    megabytes = len(text.encode()) * iterations / 1e6
+    print(f"  {name:<40} {megabytes / elapsed:>8.1f} MB/s  {elapsed / iterations * 1e6:>9.1f} us/response")
+
+
+def stream_tokens(text: str) -> None:
+    parser = ResponseParser()
+    for token in re.findall(r"\S+\s*|\s+", text):
+        parser.feed(token)
+    parser.flush()
+
+
+def main(args) -> int:
+    print("Fixtures")
+    failures = check_fixtures()
+
+    body = "\n\n".join(PARAGRAPH for _ in range(args.paragraphs))
+    marker_text = f"{body}\n\nJustification: {JUSTIFICATION}"
+    json_text = json.dumps({"content": body, "justification": JUSTIFICATION})
+    print(f"\nThroughput ({len(marker_text)} character responses, {args.iterations} iterations)")
+    measure("previous parser, marker", legacy_split_justification, marker_text, args.iterations)
+    measure("previous parser, no marker", legacy_split_justification, body, args.iterations)
+    measure("parse_response, marker", parse_response, marker_text, args.iterations)
+    measure("parse_response, no marker", parse_response, body, args.iterations)
+    measure("parse_response, JSON", parse_response, json_text, args.iterations)
+    measure("ResponseParser, marker, token chunks", stream_tokens, marker_text, max(1, args.iterations // 10))
+    measure("ResponseParser, JSON, token chunks", stream_tokens, json_text, max(1, args.iterations // 10))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=50, help="Paragraphs per synthetic response")
+    parser.add_argument("--iterations", type=int, default=200)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,156 @@
+"""
+Benchmark: provider-side prompt caching of the system prompt and conversation history.
+
+Starts three fake deployments (benchmarks/fake_provider.py) answering in the OpenAI, Anthropic
+and Gemini formats, each simulating its provider's prompt cache, with a time to first token
+that grows with the uncached prompt tokens (--prefill-ms-per-1k). It then plays multi-turn
+conversations through LLMManager.stream_llm_response: each conversation starts from a long
+seeded history and adds --turns turns. This runs once with prompt caching off and once with it
+on (PROMPT_CACHE_ENABLED).
+
+Reported per provider: time to first token, the input tokens the provider served from its
+cache, and the estimated input cost relative to sending every token uncached, with each
+provider's cache discount: OpenAI reads at 0.5x (cached automatically, so the same with the
+setting off), Anthropic reads at 0.1x and writes at 1.25x, Gemini reads at 0.25x (cache
+storage per hour is not included).
+
+Run from the backend directory:
+    python -m benchmarks.bench_prompt_cache --conversations 20 --turns 6 --history-tokens 3000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+import yaml
+
+from benchmarks.fake_provider import FakeProviderConfig, start_in_thread
+
+PORTS = {"openai": 9311, "anthropic": 9312, "gemini": 9313}
+
+# (read, write) price multipliers for cached input tokens, relative to uncached input
+CACHE_PRICES = {"openai": (0.5, 1.0), "anthropic": (0.1, 1.25), "gemini": (0.25, 1.0)}
+
+WORDS = ("work deadline sleep family friend worried tired week manager money plan talk feel "
+         "better change time help idea try again maybe really think today call home stress").split()
+
+
+def write_config(directory: str) -> str:
+    config = {
+        "model_list": [
+            {"model_name": "cache-openai", "litellm_params": {
+                "model": "openai/fake-flash", "api_base": f"http://127.0.0.1:{PORTS['openai']}/v1", "api_key": "fake-key"}},
+            {"model_name": "cache-anthropic", "litellm_params": {
+                "model": "anthropic/claude-fake", "api_base": f"http://127.0.0.1:{PORTS['anthropic']}", "api_key": "fake-key"}},
+            {"model_name": "cache-gemini", "litellm_params": {
+                "model": "gemini/gemini-fake", "api_base": f"http://127.0.0.1:{PORTS['gemini']}/v1beta", "api_key": "fake-key"}},
+        ],
+        "router_settings": {"num_retries": 0, "timeout": 30},
+    }
+    path = os.path.join(directory, "litellm_config.yaml")
+    with open(path, "w") as config_file:
+        yaml.safe_dump(config, config_file)
+    return path
+
+
+def seed_history(rng: random.Random, tokens: int, tag: str) -> List[Dict[str, str]]:
+    """Alternating user/assistant messages of about `tokens` words in total, unique to `tag`."""
+    history: List[Dict[str, str]] = []
+    words = 0
+    while words < tokens:
+        length = rng.randint(40, 160)
+        text = f"{tag} " + " ".join(rng.choice(WORDS) for _ in range(length)) + "."
+        history.append({"role": "assistant" if len(history) % 2 else "user", "content": text})
+        words += length + 1
+    if history[-1]["role"] == "user":
+        history.append({"role": "assistant", "content": f"{tag} I hear you."})
+    return history
+
+
+async def run_phase(name: str, llm_manager, args) -> None:
+    print(f"\n{name}")
+    print(f"  {'provider':<10} {'TTFT p50':>9} {'TTFT p90':>9} {'cached':>9} {'uncached':>9} {'written':>9} {'input cost':>11}")
+    for provider in PORTS:
+        model = f"cache-{provider}"
+        ttfts: List[float] = []
+        totals = {"cachedInputTokens": 0, "uncachedInputTokens": 0, "cacheWriteInputTokens": 0}
+
+        async def conversation(index: int) -> None:
+            rng = random.Random(index)
+            # Phase and provider in every message, so no phase reads another's cached prefixes
+            tag = f"[{name} {provider} {index}]"
+            history = seed_history(rng, args.history_tokens, tag)
+            for turn in range(args.turns):
+                message = f"{tag} turn {turn}: " + " ".join(rng.choice(WORDS) for _ in range(20))
+                started = time.perf_counter()
+                first_token = None
+                async for event in llm_manager.stream_llm_response(history, message, model_name=model, use_cache=False,
+                                                                   conversation_id=f"{tag}"):
+                    if event["type"] in ("content", "justification") and first_token is None:
+                        first_token = time.perf_counter() - started
+                    elif event["type"] == "done":
+                        for key in totals:
+                            totals[key] += event["metadata"].get(key, 0)
+                        history = history + [{"role": "user", "content": message},
+                                             {"role": "assistant", "content": event["content"]}]
+                    elif event["type"] == "error":
+                        print(f"  {model} failed: {event['detail']}")
+                        return
+                if first_token is not None:
+                    ttfts.append(first_token)
+
+        await asyncio.gather(*(conversation(index) for index in range(args.conversations)))
+        if not ttfts:
+            continue
+        ttfts.sort()
+        read_price, write_price = CACHE_PRICES[provider]
+        cached, uncached, written = (totals["cachedInputTokens"], totals["uncachedInputTokens"],
+                                     totals["cacheWriteInputTokens"])
+        cost = cached * read_price + (uncached - written) + written * write_price
+        relative = cost / (cached + uncached) if cached + uncached else 0.0
+        print(f"  {provider:<10} {ttfts[len(ttfts) // 2] * 1e3:>7.0f}ms {ttfts[int(len(ttfts) * 0.9)] * 1e3:>7.0f}ms "
+              f"{cached:>9} {uncached:>9} {written:>9} {relative:>10.2f}x")
+    if llm_manager.prompt_cache is not None:
+        stats = llm_manager.prompt_cache.stats()
+        print(f"  handles created {stats['handles_created']}, calls with a handle {stats['handle_calls']}, "
+              f"with breakpoints {stats['breakpoint_calls']}, handle errors {stats['handle_errors']}")
+
+
+async def main(args) -> None:
+    config = FakeProviderConfig("cache", ttft_ms=args.ttft_ms, tokens_per_second=0,
+                                prefill_ms_per_1k_tokens=args.prefill_ms_per_1k, cache_min_tokens=args.min_tokens)
+    for port in PORTS.values():
+        start_in_thread(config, port)
+
+    from app.core.config import settings
+    settings.DEV_MODE = False
+    settings.CASCADE_ENABLED = False
+    settings.LITELLM_CONFIG_PATH = write_config(tempfile.mkdtemp(prefix="bench_prompt_cache_"))
+    settings.PROMPT_CACHE_MIN_TOKENS = args.min_tokens
+    from app.core.llm_manager import LLMManager
+
+    for name, enabled in (("prompt caching off", False), ("prompt caching on", True)):
+        settings.PROMPT_CACHE_ENABLED = enabled
+        llm_manager = LLMManager()
+        llm_manager.open_http_pool()
+        await llm_manager.ensure_ready()
+        await run_phase(name, llm_manager, args)
+        await llm_manager.aclose()
+        # LiteLLM caches its OpenAI SDK clients (with the pool's HTTP client) across calls
+        from app.core.warmup import litellm_module
+        litellm_module.get().in_memory_llm_clients_cache.flush_cache()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--history-tokens", type=int, default=3000, help="Seeded history per conversation")
+    parser.add_argument("--min-tokens", type=int, default=1024, help="Shortest prefix the providers cache")
+    parser.add_argument("--ttft-ms", type=float, default=50.0)
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=100.0,
+                        help="Time to first token added per 1000 uncached prompt tokens")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,179 @@
+"""
+Benchmark: record LLM traffic once, then replay it deterministically as a performance gate.
+
+record: runs a streaming chat workload through LLMManager with the recorder on
+    (LLM_RECORD_BACKEND), against the fake deployments of benchmarks/litellm_config.fake.yaml
+    with a log-normal time to first token. Against real providers, set LITELLM_CONFIG_PATH and
+    pass --live instead. Reports the archive size per call.
+replay: serves the archive from replay providers (benchmarks/replay_provider.py) on the fake
+    config's ports and runs the same workload --runs times. Reports time to first token and to
+    the end of the stream (p50/p99) per run next to the recorded provider timing, and the spread
+    between runs, which shows how repeatable the numbers are. With --baseline, exits non-zero
+    when p50 or p99 regressed by more than --max-regression against a saved result (--save).
+
+Run from the backend directory:
+    python -m benchmarks.bench_replay record --archive /tmp/llm_recordings.jsonl --requests 200
+    python -m benchmarks.bench_replay replay --archive /tmp/llm_recordings.jsonl --runs 3 --save /tmp/replay.json
+    python -m benchmarks.bench_replay replay --archive /tmp/llm_recordings.jsonl --baseline /tmp/replay.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks import fake_provider, replay_provider
+
+FAKE_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "litellm_config.fake.yaml")
+# Model groups of the fake config by port (flash-2.0 has two deployments)
+PORTS = {9101: "flash-2.0", 9102: "flash-2.0", 9103: "claude-3-haiku", 9104: "flash-lite"}
+MESSAGES = (
+    "I've been stressed about money and it keeps me up at night.",
+    "My sister and I had a big argument and now she won't talk to me.",
+    "I started a new job and I feel like everyone is better than me.",
+    "I can't stop worrying about my health since the doctor's appointment.",
+)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def workload(requests: int) -> List[Tuple[List[Dict[str, str]], str]]:
+    """(history, message) pairs: the same every run, so replayed prompts match their recordings."""
+    items = []
+    for index in range(requests):
+        history = []
+        for turn in range(index % 6):
+            history.append({"role": "user", "content": MESSAGES[turn % len(MESSAGES)]})
+            history.append({"role": "assistant", "content": f"That sounds hard. Tell me more about it ({turn})."})
+        items.append((history, f"{MESSAGES[index % len(MESSAGES)]} (request {index})"))
+    return items
+
+
+async def run_workload(llm_manager, requests: int, concurrency: int) -> Tuple[List[float], List[float]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    ttfts, totals = [], []
+
+    async def one(history, message):
+        async with semaphore:
+            started = time.perf_counter()
+            first = None
+            async for event in llm_manager.stream_llm_response(history, message, model_name="flash-2.0", use_cache=False):
+                if first is None and event["type"] == "content":
+                    first = time.perf_counter() - started
+                if event["type"] == "error":
+                    raise RuntimeError(event["detail"])
+            totals.append(time.perf_counter() - started)
+            ttfts.append(first if first is not None else totals[-1])
+
+    await asyncio.gather(*(one(history, message) for history, message in workload(requests)))
+    return ttfts, totals
+
+
+async def new_llm_manager(config_path: str, record_to: str = ""):
+    """An LLMManager for the router config, recording to `record_to` if given."""
+    # Import after the environment is set so LLMManager builds its router from the config
+    os.environ["LITELLM_CONFIG_PATH"] = config_path
+    from app.core.config import settings
+    settings.LITELLM_CONFIG_PATH = config_path
+    settings.DEV_MODE = False
+    settings.HEDGE_MODEL = ""
+    settings.LLM_RECORD_BACKEND = "sqlite" if record_to.endswith((".sqlite", ".sqlite3", ".db")) else "jsonl" if record_to else ""
+    settings.LLM_RECORD_PATH = record_to
+    from app.core.llm_manager import LLMManager
+    llm_manager = LLMManager()
+    await llm_manager.ensure_ready()
+    return llm_manager
+
+
+def summary(ttfts: List[float], totals: List[float]) -> Dict[str, float]:
+    return {"ttft_p50": percentile(ttfts, 0.5), "ttft_p99": percentile(ttfts, 0.99),
+            "total_p50": percentile(totals, 0.5), "total_p99": percentile(totals, 0.99)}
+
+
+def print_summary(name: str, result: Dict[str, float]) -> None:
+    print(f"  {name:<22} first token p50 {result['ttft_p50'] * 1e3:7.1f}ms  p99 {result['ttft_p99'] * 1e3:7.1f}ms   "
+          f"end p50 {result['total_p50'] * 1e3:7.1f}ms  p99 {result['total_p99'] * 1e3:7.1f}ms")
+
+
+async def record(args) -> None:
+    if os.path.exists(args.archive):
+        os.remove(args.archive)
+    if not args.live:
+        for port in PORTS:
+            fake_provider.start_in_thread(fake_provider.FakeProviderConfig(
+                f"fake-{port}", ttft_ms=args.ttft_ms, tokens_per_second=args.tokens_per_second,
+                ttft_distribution="lognormal", ttft_jitter=0.5), port)
+    llm_manager = await new_llm_manager(os.environ["LITELLM_CONFIG_PATH"] if args.live else FAKE_CONFIG_PATH, args.archive)
+    ttfts, totals = await run_workload(llm_manager, args.requests, args.concurrency)
+    stats = llm_manager.recorder.stats()
+    await llm_manager.aclose()
+    print(f"\nRecorded {stats['recorded']} calls ({stats['dropped']} dropped) to {args.archive}: "
+          f"{os.path.getsize(args.archive) / stats['recorded'] / 1024:.1f} KiB per call")
+    print_summary("while recording", summary(ttfts, totals))
+
+
+async def replay(args) -> None:
+    from app.core.llm_recorder import load_recordings
+    recordings = load_recordings(args.archive)
+    for port, model in PORTS.items():
+        try:
+            replay_provider.start_in_thread(replay_provider.ReplayConfig(recordings, f"replay-{port}", args.speed, model), port)
+        except ValueError:
+            pass  # Nothing recorded for this model group
+
+    streamed = [record for record in recordings if record.get("chunks") and not record.get("cancelled")]
+    recorded_ttfts = [record["chunks"][0][0] / 1000 for record in streamed]
+    recorded_totals = [record["duration_ms"] / 1000 for record in streamed]
+    print(f"\n{len(recordings)} recordings, replayed at speed {args.speed}")
+    if args.speed > 0:
+        print_summary("recorded (provider)", {key: value / args.speed for key, value in summary(recorded_ttfts, recorded_totals).items()})
+
+    llm_manager = await new_llm_manager(FAKE_CONFIG_PATH)
+    await run_workload(llm_manager, min(args.requests, 20), args.concurrency)  # Warm up
+    results = []
+    for run in range(args.runs):
+        result = summary(*await run_workload(llm_manager, args.requests, args.concurrency))
+        results.append(result)
+        print_summary(f"replay run {run + 1}", result)
+    await llm_manager.aclose()
+    if len(results) > 1:
+        spread = {key: (max(result[key] for result in results) - min(result[key] for result in results)) * 1e3
+                  for key in results[0]}
+        print("  spread between runs   " + "  ".join(f"{key} {value:.1f}ms" for key, value in spread.items()))
+
+    median = {key: sorted(result[key] for result in results)[len(results) // 2] for key in results[0]}
+    if args.save:
+        with open(args.save, "w") as saved:
+            json.dump(median, saved, indent=2)
+    if args.baseline:
+        with open(args.baseline) as saved:
+            baseline = json.load(saved)
+        regressions = {key: median[key] / baseline[key] - 1 for key in baseline if median[key] > baseline[key] * (1 + args.max_regression)}
+        for key, change in regressions.items():
+            print(f"  REGRESSION {key}: {baseline[key] * 1e3:.1f}ms -> {median[key] * 1e3:.1f}ms (+{change:.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"  within {args.max_regression:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("--archive", default="llm_recordings.jsonl", help="JSONL, or SQLite with a .sqlite/.sqlite3/.db name")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--live", action="store_true", help="record: use LITELLM_CONFIG_PATH's real deployments")
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="record: median time to first token of the fakes")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="record: token rate of the fakes")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay: playback speed (0 = no delays)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--save", help="replay: write the median result as a baseline")
+    parser.add_argument("--baseline", help="replay: compare against a saved result")
+    parser.add_argument("--max-regression", type=float, default=0.1)
+    args = parser.parse_args()
+    asyncio.run(record(args) if args.mode == "record" else replay(args))
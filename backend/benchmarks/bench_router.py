@@ -0,0 +1,81 @@
+"""
+Benchmark: LiteLLM Router behaviour against local fake deployments.
+
+Starts three fake providers (see benchmarks/litellm_config.fake.yaml): a fast and a slow
+deployment of `flash-2.0`, plus `claude-3-haiku` as its fallback. Then runs two phases:
+
+1. Latency-based routing: traffic should shift to the fast deployment.
+2. Outage: the fast deployment starts failing; it should be cooled down and traffic should
+   move to the slow deployment, then to the fallback group if both fail.
+
+Run from the backend directory:
+    python -m benchmarks.bench_router --requests 200 --concurrency 10
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+
+from benchmarks.fake_provider import FakeProviderConfig, start_in_thread
+
+FAKE_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "litellm_config.fake.yaml")
+
+
+async def run_phase(name, llm_manager, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    served_by = Counter()
+    latencies = []
+
+    async def one(index):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                main_response, _ = await llm_manager.get_llm_response([], f"request {index}", use_cache=False)
+                served_by[main_response.split("]", 1)[0].lstrip("[")] += 1
+            except Exception as e:
+                served_by[f"error: {type(e).__name__}"] += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(f"\n{name}: {requests / elapsed:.1f} req/s, "
+          f"p50 {latencies[len(latencies) // 2] * 1e3:.0f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.0f} ms")
+    for deployment, count in served_by.most_common():
+        print(f"  {deployment:<24} {count}")
+
+
+async def main(args):
+    fast = FakeProviderConfig("flash-fast", ttft_ms=args.fast_ms, tokens_per_second=0)
+    slow = FakeProviderConfig("flash-slow", ttft_ms=args.slow_ms, tokens_per_second=0)
+    fallback = FakeProviderConfig("haiku-fallback", ttft_ms=args.fast_ms, tokens_per_second=0)
+    for config, port in ((fast, 9101), (slow, 9102), (fallback, 9103)):
+        start_in_thread(config, port)
+
+    # Import after the environment is set so LLMManager builds its router from the fake config
+    os.environ["LITELLM_CONFIG_PATH"] = FAKE_CONFIG_PATH
+    from app.core.config import settings
+    settings.LITELLM_CONFIG_PATH = FAKE_CONFIG_PATH
+    settings.DEV_MODE = False
+    from app.core.llm_manager import LLMManager
+    llm_manager = LLMManager()
+    await llm_manager.ensure_ready()
+
+    await run_phase("latency-based routing", llm_manager, args.requests, args.concurrency)
+
+    fast.error_rate = 1.0
+    await run_phase("fast deployment failing (cooldown)", llm_manager, args.requests, args.concurrency)
+
+    slow.error_rate = 1.0
+    await run_phase("all flash-2.0 deployments failing (fallback)", llm_manager, args.requests, args.concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--fast-ms", type=float, default=20.0)
+    parser.add_argument("--slow-ms", type=float, default=200.0)
+    asyncio.run(main(parser.parse_args()))
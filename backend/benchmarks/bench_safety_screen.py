@@ -0,0 +1,218 @@
+"""
+Benchmark: the crisis and self-harm safety screen (safety.yaml, SAFETY_MODERATION_MODEL).
+
+1. classifier: messages per second of the local classifier, one message at a time (as each
+   request screens its message) and in batches through SafetyClassifier.screen_many.
+2. overhead: a streaming chat workload through LLMManager against the fake deployments of
+   benchmarks/litellm_config.fake.yaml (flash-2.0 answers, flash-lite plays the moderation
+   model), with time to first token and to the end of the stream (p50/p99) for: no screen, the
+   local classifier only, the moderation model asked before generating (sequential), and the
+   screen as it runs, with the moderation model next to the generation (concurrent).
+3. crisis: messages the local classifier flags, and messages only the moderation model flags
+   (the fake moderation model names a category for them). Reported: time until the safe reply,
+   and generation calls started and abandoned upstream (cancelled once the verdict came in).
+
+Run from the backend directory:
+    python -m benchmarks.bench_safety_screen --requests 200 --ttft-ms 300 --moderation-ms 150
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks import fake_provider
+
+FAKE_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "litellm_config.fake.yaml")
+SAFETY_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "safety.yaml")
+GENERATION_PORTS = (9101, 9102)
+MODERATION_PORT = 9104
+MESSAGES = (
+    "I've been stressed about money and it keeps me up at night.",
+    "My sister and I had a big argument and now she won't talk to me.",
+    "I started a new job and I feel like everyone is better than me.",
+    "I can't stop worrying about my health since the doctor's appointment.",
+    "Work has been killing me this week, I'm exhausted.",
+    "I feel hopeless about finding a place I can afford.",
+)
+LOCAL_CRISIS = (
+    "I don't want to live anymore, I keep thinking about ending my life.",
+    "Lately I just want to die and I don't see the point.",
+    "He hits me when he drinks and I'm afraid to go home.",
+)
+# Missed by the phrases of safety.yaml; the fake moderation model flags them
+INDIRECT_CRISIS = (
+    ("I've been giving my things away and writing letters to everyone.", "giving my things away", "self_harm"),
+    ("I stockpiled my prescription and tonight feels like the right time.", "stockpiled", "self_harm"),
+    ("Everyone would be fine if I just stopped existing.", "stopped existing", "self_harm"),
+)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def bench_classifier(classifier) -> None:
+    messages = [f"{MESSAGES[index % len(MESSAGES)]} ({index})" for index in range(10000)]
+    print(f"\nClassifier ({len(classifier.categories)} categories, {len(classifier._phrase_index)} phrases)")
+    started = time.perf_counter()
+    for message in messages:
+        classifier.screen(message)
+    seconds = time.perf_counter() - started
+    print(f"  one message at a time       {len(messages) / seconds:>10,.0f} msg/s   {seconds / len(messages) * 1e6:6.1f}us per message")
+    for batch in (100, 1000, 10000):
+        started = time.perf_counter()
+        for start in range(0, len(messages), batch):
+            classifier.screen_many(messages[start:start + batch])
+        seconds = time.perf_counter() - started
+        print(f"  batches of {batch:<6}           {len(messages) / seconds:>10,.0f} msg/s   "
+              f"{seconds / len(messages) * 1e6:6.1f}us per message")
+    flagged = sum(category is not None for category in classifier.screen_many(MESSAGES))
+    missed = sum(category is None for category in classifier.screen_many(LOCAL_CRISIS))
+    indirect = sum(category is not None for category in classifier.screen_many([message for message, _, _ in INDIRECT_CRISIS]))
+    print(f"  false positives {flagged}/{len(MESSAGES)}, crisis messages missed {missed}/{len(LOCAL_CRISIS)}, "
+          f"indirect messages flagged locally {indirect}/{len(INDIRECT_CRISIS)} (left to the moderation model)")
+
+
+async def new_llm_manager():
+    """An LLMManager for the fake config with the safety screen and flash-lite as moderation model."""
+    # Import after the environment is set so LLMManager builds its router from the config
+    os.environ["LITELLM_CONFIG_PATH"] = FAKE_CONFIG_PATH
+    from app.core.config import settings
+    settings.LITELLM_CONFIG_PATH = FAKE_CONFIG_PATH
+    settings.DEV_MODE = False
+    settings.HEDGE_MODEL = ""
+    settings.LLM_RECORD_BACKEND = ""
+    settings.SAFETY_CONFIG_PATH = SAFETY_CONFIG_PATH
+    settings.SAFETY_MODERATION_MODEL = "flash-lite"
+    from app.core.llm_manager import LLMManager
+    llm_manager = LLMManager()
+    await llm_manager.ensure_ready()
+    return llm_manager
+
+
+async def stream_once(llm_manager, message: str, sequential: bool) -> Tuple[float, float, Dict]:
+    """Time to first content and to the end of one streamed answer, and the final metadata."""
+    started = time.perf_counter()
+    first, metadata = None, {}
+    if sequential:
+        # Ask the moderation model and wait for its verdict before generating
+        from app.core.safety_screen import CrisisDetected
+        try:
+            await llm_manager.safety_screen.start(message).verdict()
+            events = llm_manager._stream_response([], message, "flash-2.0", False)
+        except CrisisDetected as e:
+            first = time.perf_counter() - started
+            return first, first, e.metadata()
+    else:
+        events = llm_manager.stream_llm_response([], message, model_name="flash-2.0", use_cache=False)
+    async for event in events:
+        if first is None and event["type"] == "content":
+            first = time.perf_counter() - started
+        if event["type"] == "error":
+            raise RuntimeError(event["detail"])
+        if event["type"] == "done":
+            metadata = event["metadata"]
+    total = time.perf_counter() - started
+    return first if first is not None else total, total, metadata
+
+
+async def run_workload(llm_manager, messages: List[str], concurrency: int, sequential: bool = False):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(message):
+        async with semaphore:
+            return await stream_once(llm_manager, message, sequential)
+
+    return await asyncio.gather(*(one(message) for message in messages))
+
+
+def upstream_stats() -> Dict[str, int]:
+    totals = {"requests": 0, "abandoned": 0}
+    for port in GENERATION_PORTS:
+        stats = httpx.get(f"http://127.0.0.1:{port}/stats").json()
+        for key in totals:
+            totals[key] += stats[key]
+    return totals
+
+
+def print_timing(name: str, results, baseline=None) -> None:
+    ttfts = [ttft for ttft, _, _ in results]
+    totals = [total for _, total, _ in results]
+    line = (f"  {name:<26} first token p50 {percentile(ttfts, 0.5) * 1e3:7.1f}ms  p99 {percentile(ttfts, 0.99) * 1e3:7.1f}ms   "
+            f"end p50 {percentile(totals, 0.5) * 1e3:7.1f}ms  p99 {percentile(totals, 0.99) * 1e3:7.1f}ms")
+    if baseline is not None:
+        base = [ttft for ttft, _, _ in baseline]
+        line += (f"   ({(percentile(ttfts, 0.5) - percentile(base, 0.5)) * 1e3:+.1f}ms p50, "
+                 f"{(percentile(ttfts, 0.99) - percentile(base, 0.99)) * 1e3:+.1f}ms p99)")
+    print(line)
+
+
+async def bench_overhead(llm_manager, args) -> None:
+    from app.core.safety_screen import SafetyScreen
+    screen = llm_manager.safety_screen
+    messages = [f"{MESSAGES[index % len(MESSAGES)]} (request {index})" for index in range(args.requests)]
+    await run_workload(llm_manager, messages[:20], args.concurrency)  # Warm up
+
+    print(f"\nOverhead on safe messages ({args.requests} streamed requests, concurrency {args.concurrency}, "
+          f"generation first token ~{args.ttft_ms:.0f}ms, moderation ~{args.moderation_ms:.0f}ms)")
+    llm_manager.safety_screen = None
+    baseline = await run_workload(llm_manager, messages, args.concurrency)
+    print_timing("no screen", baseline)
+    llm_manager.safety_screen = SafetyScreen(screen.classifier)
+    print_timing("local classifier", await run_workload(llm_manager, messages, args.concurrency), baseline)
+    llm_manager.safety_screen = screen
+    print_timing("moderation, sequential", await run_workload(llm_manager, messages, args.concurrency, sequential=True), baseline)
+    print_timing("moderation, concurrent", await run_workload(llm_manager, messages, args.concurrency), baseline)
+
+
+async def bench_crisis(llm_manager, args) -> None:
+    print("\nCrisis messages (concurrent screen)")
+    for name, crisis in (("flagged locally", LOCAL_CRISIS),
+                         ("flagged by moderation", [message for message, _, _ in INDIRECT_CRISIS])):
+        # Distinct messages, so identical requests in flight don't share one upstream call
+        messages = [f"{crisis[index % len(crisis)]} ({index})" for index in range(args.crisis_requests)]
+        before = upstream_stats()
+        results = await run_workload(llm_manager, messages, args.concurrency)
+        await asyncio.sleep(0.5)  # The fake providers notice closed connections when they poll
+        after = upstream_stats()
+        flagged = sum(bool(metadata.get("safety")) for _, _, metadata in results)
+        totals = [total for _, total, _ in results]
+        print(f"  {name:<22} safe reply {flagged}/{len(results)}   time to reply p50 {percentile(totals, 0.5) * 1e3:7.1f}ms  "
+              f"p99 {percentile(totals, 0.99) * 1e3:7.1f}ms   generation calls started "
+              f"{after['requests'] - before['requests']}, abandoned {after['abandoned'] - before['abandoned']}")
+    print(f"  screen stats: {llm_manager.safety_screen.stats()}")
+
+
+async def main(args) -> None:
+    from app.core.safety_screen import load_safety_classifier
+    bench_classifier(load_safety_classifier(SAFETY_CONFIG_PATH))
+
+    for port in GENERATION_PORTS:
+        fake_provider.start_in_thread(fake_provider.FakeProviderConfig(
+            f"fake-{port}", ttft_ms=args.ttft_ms, tokens_per_second=args.tokens_per_second,
+            ttft_distribution="lognormal", ttft_jitter=0.3), port)
+    fake_provider.start_in_thread(fake_provider.FakeProviderConfig(
+        "moderation", ttft_ms=args.moderation_ms, tokens_per_second=1000, response_text="none",
+        ttft_distribution="lognormal", ttft_jitter=0.3,
+        reply_rules=[(substring, category) for _, substring, category in INDIRECT_CRISIS]), MODERATION_PORT)
+    llm_manager = await new_llm_manager()
+    try:
+        await bench_overhead(llm_manager, args)
+        await bench_crisis(llm_manager, args)
+    finally:
+        await llm_manager.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--crisis-requests", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="Median time to first token of the generation")
+    parser.add_argument("--moderation-ms", type=float, default=150.0, help="Median latency of the moderation model")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    asyncio.run(main(parser.parse_args()))
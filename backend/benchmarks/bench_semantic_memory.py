@@ -0,0 +1,195 @@
+"""
+Benchmark: semantic memory of long sessions (SEMANTIC_MEMORY_EMBEDDER) on a synthetic corpus.
+
+Each session is --turns user/assistant turns of small talk about work, sleep, friends and the
+like, with key facts planted in its first fifth: a rent increase, a diagnosis, a debt, a
+brother who stopped talking. At the end of the session each fact comes back up in a new message
+that refers to it in other words (sharing a key term, e.g. "rent" or "insulin"). Reported:
+
+1. index: bytes held per 10k indexed turns, the cost of a request that indexes one new turn,
+   the query latency (p50/p99) at 1k and 10k turns, and a cold rebuild of a 10k-turn index.
+2. recall@k: how often the turn with the fact is among the recalled turns.
+3. prompts: prompt tokens and how many facts reach the model, with the full history, with the
+   token budget alone (CONTEXT_TOKEN_BUDGET: rolling summary plus as many recent messages as
+   fit), and with semantic memory (summary, recent window and the recalled turns).
+
+Run from the backend directory:
+    python -m benchmarks.bench_semantic_memory --sessions 20 --turns 100 300 1000
+
+--embedder takes the same values as SEMANTIC_MEMORY_EMBEDDER (e.g. a sentence-transformers
+model, which also recalls paraphrases with no words in common).
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+from app.core.context_builder import ContextBuilder
+from app.core.semantic_memory import ConversationIndex, SemanticMemory, load_embedder
+
+MODEL = "gpt-3.5-turbo"
+SYSTEM_PROMPT = "You are a warm, supportive listener. Respond with empathy and care."
+
+# (planted user message, assistant reply, later message about it, detail that shows the fact reached the model)
+FACTS = (
+    ("My landlord told me the rent goes up to $1,900 in March and I'm already two months behind.",
+     "That's a heavy thing to carry. Being behind and facing an increase at once is frightening.",
+     "The rent situation is getting worse, I think my landlord might start an eviction.", "$1,900"),
+    ("I was diagnosed with type 1 diabetes last year and I still mess up my insulin doses.",
+     "A diagnosis like that changes daily life a lot. It makes sense that the routine is still hard.",
+     "I skipped my insulin again yesterday because I had no energy to deal with it.", "type 1 diabetes"),
+    ("My brother Daniel stopped talking to me after our dad's funeral in October.",
+     "Losing your dad and then the closeness with your brother is a double loss.",
+     "Daniel texted me for the first time in months and I don't know what to say.", "funeral"),
+    ("I owe about $14,000 on two credit cards and the interest keeps climbing every month.",
+     "Debt that keeps growing can feel like a weight that never lifts.",
+     "Another credit card statement came and I just hid it in a drawer.", "$14,000"),
+    ("My therapist, Dr. Okafor, moved to another city and I haven't found a new one since.",
+     "Losing a therapist you trusted is a real loss, and starting over takes energy.",
+     "Do you think it's worth looking for a new therapist now?", "Okafor"),
+    ("My daughter Maya has panic attacks before school most mornings and I feel helpless.",
+     "Watching your child struggle like that is one of the hardest things for a parent.",
+     "Maya had another awful morning before school today.", "panic attacks"),
+)
+
+SUBJECTS = ("my manager", "the project deadline", "my sleep", "the commute", "my friend Jordan", "the gym",
+            "cooking dinner", "my neighbour's dog", "the weather", "my phone", "the weekend", "my coworkers",
+            "the new schedule", "my morning routine", "the group chat", "my garden", "the train delays",
+            "my running plan", "the meeting notes", "my playlist")
+FEELINGS = ("stressed", "tired", "a bit better", "annoyed", "hopeful", "restless", "calm", "overwhelmed",
+            "distracted", "proud", "anxious", "bored")
+OPENERS = ("Today", "This week", "Honestly", "Lately", "Again", "So", "Anyway", "Yesterday")
+REPLIES = ("That sounds like a lot to juggle. What part of it weighs on you most?",
+           "It makes sense to feel that way. How have you been taking care of yourself?",
+           "Thank you for sharing that. What would help even a little right now?",
+           "I hear you. Small steps still count, and you're noticing what matters.",
+           "That's understandable. Is there someone around who could lighten the load?",
+           "It sounds like you handled that with more patience than you give yourself credit for.")
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def session(turns: int, seed: int) -> Tuple[List[Dict[str, str]], List[int]]:
+    """A history of `turns` turns, and the position of each planted fact's user message."""
+    rng = random.Random(seed)
+    planted = dict(zip(rng.sample(range(1, max(len(FACTS) + 1, turns // 5)), len(FACTS)), FACTS))
+    history: List[Dict[str, str]] = []
+    positions = [0] * len(FACTS)
+    for turn in range(turns):
+        if turn in planted:
+            fact = planted[turn]
+            positions[FACTS.index(fact)] = len(history)
+            history.append({"role": "user", "content": fact[0]})
+            history.append({"role": "assistant", "content": fact[1]})
+            continue
+        subject, other = rng.sample(SUBJECTS, 2)
+        history.append({"role": "user", "content": f"{rng.choice(OPENERS)} I felt {rng.choice(FEELINGS)} about "
+                                                   f"{subject}, and {other} didn't help much either."})
+        history.append({"role": "assistant", "content": rng.choice(REPLIES)})
+    return history, positions
+
+
+def new_memory(args) -> SemanticMemory:
+    return SemanticMemory(load_embedder(args.embedder, args.dim), args.top_k, args.min_score, max_conversations=100)
+
+
+def bench_index(args) -> None:
+    memory = new_memory(args)
+    history, _ = session(10000, seed=1)
+    queries = [fact[2] for fact in FACTS]
+    print(f"\nIndex ({type(memory.embedder).__name__}, {memory.embedder.dim} dimensions)")
+
+    # Steady state: each request indexes the turn that just left the recent window, then queries
+    appends = []
+    for turns in range(args.recent // 2 + 1, 1001):
+        end = 2 * turns
+        prefix = history[:end]
+        started = time.perf_counter()
+        memory.recall("steady", prefix, queries[turns % len(queries)], end - args.recent)
+        appends.append(time.perf_counter() - started)
+    print(f"  request indexing one new turn   p50 {percentile(appends, 0.5) * 1e3:6.3f}ms  "
+          f"p99 {percentile(appends, 0.99) * 1e3:6.3f}ms")
+
+    for turns in (1000, 10000):
+        end = 2 * turns
+        prefix = history[:end]
+        started = time.perf_counter()
+        memory.recall(f"cold-{turns}", prefix, queries[0], end - args.recent)
+        cold = time.perf_counter() - started
+        latencies = []
+        for repeat in range(200):
+            started = time.perf_counter()
+            memory.recall(f"cold-{turns}", prefix, queries[repeat % len(queries)], end - args.recent)
+            latencies.append(time.perf_counter() - started)
+        print(f"  query at {turns:>5} turns           p50 {percentile(latencies, 0.5) * 1e3:6.3f}ms  "
+              f"p99 {percentile(latencies, 0.99) * 1e3:6.3f}ms   (cold index build {cold * 1e3:.0f}ms)")
+
+    index = ConversationIndex(memory.embedder.dim, idf=getattr(memory.embedder, "sparse", False))
+    for start in range(0, 10000, 100):
+        index.append(memory.embedder.embed(["turn"] * 100), [(2 * turn, 2 * turn + 2) for turn in range(start, start + 100)])
+    used = index.count * (index.vectors.shape[1] * index.vectors.itemsize + 2 * index.starts.itemsize)
+    print(f"  memory per 10k turns            {used / 2 ** 20:.1f} MiB of vectors and spans "
+          f"({index.nbytes() / 2 ** 20:.1f} MiB allocated, capacity doubles)")
+
+
+def bench_recall(args) -> None:
+    print(f"\nrecall@{args.top_k} (min score {args.min_score}, {args.sessions} sessions x {len(FACTS)} facts)")
+    for turns in args.turns:
+        memory = new_memory(args)
+        hits, recalled = 0, []
+        for seed in range(args.sessions):
+            history, positions = session(turns, seed)
+            for (_, _, query, _), position in zip(FACTS, positions):
+                spans = memory.recall(f"s{seed}", history, query, len(history) - args.recent)
+                hits += any(start == position for start, _ in spans)
+                recalled.append(len(spans))
+        print(f"  {turns:>5} turns: {hits / (args.sessions * len(FACTS)):6.1%}   "
+              f"({statistics.mean(recalled):.1f} turns recalled per message)")
+
+
+def bench_prompts(args) -> None:
+    print(f"\nPrompt tokens and facts reaching the model (budget {args.budget}, recent window {args.recent} messages)")
+    print(f"  {'turns':>5}  {'mode':<16}{'prompt tokens':>14}{'facts kept':>12}{'build ms':>10}")
+    for turns in args.turns:
+        modes = {
+            "full history": ContextBuilder(10 ** 9, args.recent, args.summary_tokens),
+            "token budget": ContextBuilder(args.budget, args.recent, args.summary_tokens),
+            "semantic memory": ContextBuilder(args.budget, args.recent, args.summary_tokens),
+        }
+        memory = new_memory(args)
+        for name, builder in modes.items():
+            tokens, kept, seconds = [], 0, []
+            for seed in range(min(args.sessions, 5)):
+                history, _ = session(turns, seed)
+                for _, _, query, detail in FACTS:
+                    started = time.perf_counter()
+                    recall = None
+                    if name == "semantic memory":
+                        recall = memory.recall(f"s{seed}", history, query, builder.recent_start(history))
+                    context = builder.build(MODEL, SYSTEM_PROMPT, history, query, recall)
+                    seconds.append(time.perf_counter() - started)
+                    tokens.append(context.prompt_tokens)
+                    kept += any(detail in message["content"] for message in context.messages)
+            print(f"  {turns:>5}  {name:<16}{statistics.mean(tokens):>14.0f}{kept / len(tokens):>12.0%}"
+                  f"{statistics.median(seconds) * 1e3:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embedder", default="hashing", help="As SEMANTIC_MEMORY_EMBEDDER")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--min-score", type=float, default=0.02)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--budget", type=int, default=8000, help="CONTEXT_TOKEN_BUDGET")
+    parser.add_argument("--recent", type=int, default=8, help="CONTEXT_RECENT_MESSAGES")
+    parser.add_argument("--summary-tokens", type=int, default=600, help="CONTEXT_SUMMARY_MAX_TOKENS")
+    args = parser.parse_args()
+    bench_index(args)
+    bench_recall(args)
+    bench_prompts(args)
@@ -0,0 +1,185 @@
+"""
+Benchmark: request and response handling cost for large chat payloads.
+
+Runs the work /send does around the LLM call for a request carrying 1k and 10k history
+messages, once the way it used to be done and once the current way:
+
+- legacy: the body validated into ChatMessage models, copied into dicts with `msg.dict()`,
+  the response cache key hashed from one canonical JSON string of the whole history, and the
+  response converted with jsonable_encoder and json.dumps (FastAPI's path before 0.130)
+- current: messages validated straight into dicts, the cache key hashed message by message,
+  and the response rendered to bytes by FastJSONResponse
+
+Both build the provider messages with the same ContextBuilder (messages are counted as
+words so the numbers don't depend on a tokenizer). Reported per request: CPU time per stage
+(median of --runs) for the first request of a conversation (cold: empty summary cache, no
+memoized counts, so every older message is summarized and counted) and for the requests after
+it (warm); for warm requests also peak traced memory (tracemalloc) and the memory blocks still
+held by the request's history once it has been loaded (what every in-flight request keeps).
+
+Run from the backend directory:
+    python -m benchmarks.bench_serialization --messages 1000 10000 --runs 20
+"""
+import argparse
+import gc
+import hashlib
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from app.core import context_builder
+from app.core.context_builder import ContextBuilder
+from app.core.response_cache import make_cache_key
+from app.core.serialization import FastJSONResponse
+from app.models.chat_models import AIResponseData, ChatRequest, ChatResponse, ResponseMetadata
+
+SYSTEM_PROMPT = "You are an empathetic assistant. " * 40
+PARAMS = {"temperature": 0.7, "max_tokens": 2048}
+STAGES = ("validate", "history", "cache_key", "context", "response")
+
+
+class LegacyChatMessage(BaseModel):
+    role: str
+    content: str
+    justification: Optional[str] = None
+
+
+class LegacyChatRequest(BaseModel):
+    userId: str
+    conversationHistory: List[LegacyChatMessage] = []
+    message: str
+    conversationId: Optional[str] = None
+    version: Optional[int] = None
+    bypassCache: bool = False
+
+
+def legacy_cache_key(model: str, system_prompt: str, conversation_history: List[Dict[str, Any]],
+                     user_message: str, params: Dict[str, Any]) -> str:
+    normalized_history = [
+        [msg["role"], msg["content"].strip(), (msg.get("justification") or "").strip()]
+        for msg in conversation_history
+    ]
+    canonical = json.dumps([model, system_prompt, normalized_history, user_message.strip(), params],
+                           sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def request_body(messages: int) -> bytes:
+    history = []
+    for index in range(messages):
+        if index % 2:
+            history.append({"role": "assistant", "content": f"Reply {index}. " + "That sounds really hard, and it makes sense. " * 4,
+                            "justification": "Validating the feeling before suggesting anything."})
+        else:
+            history.append({"role": "user", "content": f"Message {index}. " + "I have been feeling stressed about work. " * 3})
+    return json.dumps({"userId": "bench-user", "conversationHistory": history, "message": "What should I do next?"}).encode()
+
+
+def response_model() -> ChatResponse:
+    return ChatResponse(
+        aiResponse=AIResponseData(content="It sounds like a lot. " * 30, justification="Acknowledging first."),
+        metadata=ResponseMetadata(contextTokenBudget=8000, promptTokens=7950, summarizedMessages=9990)
+    )
+
+
+def run_request(body: bytes, legacy: bool, builder: ContextBuilder, timings: Optional[Dict[str, float]] = None,
+                hold: Optional[List[Any]] = None) -> bytes:
+    """One request's handling; fills `timings` with CPU seconds per stage and appends the loaded history to `hold`."""
+    def stage(name: str, function: Callable[[], Any]) -> Any:
+        started = time.process_time()
+        result = function()
+        if timings is not None:
+            timings[name] = time.process_time() - started
+        return result
+
+    request_class = LegacyChatRequest if legacy else ChatRequest
+    request = stage("validate", lambda: request_class.model_validate(json.loads(body)))
+    if legacy:
+        history = stage("history", lambda: [msg.dict() for msg in request.conversationHistory])
+    else:
+        history = stage("history", lambda: request.conversationHistory)
+    if hold is not None:
+        hold.append((request, history))
+    key_function = legacy_cache_key if legacy else make_cache_key
+    stage("cache_key", lambda: key_function("bench-model", SYSTEM_PROMPT, history, request.message, PARAMS))
+    stage("context", lambda: builder.build("bench-model", SYSTEM_PROMPT, history, request.message))
+    response = response_model()
+    if legacy:
+        return stage("response", lambda: json.dumps(jsonable_encoder(response), ensure_ascii=False,
+                                                    separators=(",", ":")).encode("utf-8"))
+    return stage("response", lambda: FastJSONResponse(response).body)
+
+
+def new_builder() -> ContextBuilder:
+    return ContextBuilder(token_budget=8000, recent_messages=8, summary_max_tokens=600)
+
+
+def measure_cold(body: bytes, legacy: bool, runs: int) -> Dict[str, float]:
+    """CPU time per stage of a conversation's first request, with nothing cached yet."""
+    timings: List[Dict[str, float]] = []
+    for _ in range(runs):
+        context_builder.count_tokens.cache_clear()
+        stages: Dict[str, float] = {}
+        run_request(body, legacy, new_builder(), stages)
+        timings.append(stages)
+    return {name: statistics.median(run[name] for run in timings) for name in STAGES}
+
+
+def measure(body: bytes, legacy: bool, runs: int) -> Dict[str, float]:
+    builder = new_builder()
+    run_request(body, legacy, builder)  # fills the summary cache, as an ongoing conversation would have
+
+    timings: List[Dict[str, float]] = []
+    for _ in range(runs):
+        stages: Dict[str, float] = {}
+        run_request(body, legacy, builder, stages)
+        timings.append(stages)
+    result = {name: statistics.median(run[name] for run in timings) for name in STAGES}
+
+    gc.collect()
+    tracemalloc.start()
+    run_request(body, legacy, builder)
+    result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    gc.collect()
+    held: List[Any] = []
+    blocks_before = sys.getallocatedblocks()
+    run_request(body, legacy, builder, hold=held)
+    gc.collect()
+    result["held_blocks"] = sys.getallocatedblocks() - blocks_before
+    return result
+
+
+def main(args) -> None:
+    warnings.simplefilter("ignore", DeprecationWarning)  # msg.dict() warns on every call
+    # Memoized word counts instead of a tokenizer, as count_tokens memoizes the tokenizer's counts
+    context_builder.count_tokens = lru_cache(maxsize=16384)(lambda model, text: max(1, len(text.split())))
+
+    for messages in args.messages:
+        body = request_body(messages)
+        print(f"\n{messages} history messages ({len(body) / 1024:.0f} KiB request body)")
+        print(f"  {'':<16}" + "".join(f"{name:>11}" for name in STAGES) + f"{'total':>11}{'peak':>11}{'held':>13}")
+        for name, legacy in (("legacy", True), ("current", False)):
+            cold = measure_cold(body, legacy, args.runs)
+            print(f"  {name + ' cold':<16}" + "".join(f"{cold[stage] * 1e3:>9.2f}ms" for stage in STAGES)
+                  + f"{sum(cold[stage] for stage in STAGES) * 1e3:>9.2f}ms")
+            result = measure(body, legacy, args.runs)
+            total = sum(result[stage] for stage in STAGES)
+            print(f"  {name + ' warm':<16}" + "".join(f"{result[stage] * 1e3:>9.2f}ms" for stage in STAGES)
+                  + f"{total * 1e3:>9.2f}ms{result['peak_bytes'] / 2 ** 20:>8.1f}MiB{result['held_blocks']:>8} blocks")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--runs", type=int, default=20)
+    main(parser.parse_args())
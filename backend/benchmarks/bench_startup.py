@@ -0,0 +1,127 @@
+"""
+Benchmark: cold start.
+
+1. Import time: `import app.main` in a fresh interpreter, median over several runs. This is
+   what a worker pays before it can open its port.
+2. Time to first response: starts `uvicorn app.main:app` as a subprocess against fake
+   deployments (benchmarks/fake_provider.py, started in this process) and measures when the
+   port accepts connections and the latency of the first and second /api/v1/chat/send.
+   Runs once with WARM_UP_ENABLED=false (everything is loaded by the first request) and once
+   with it on, optionally waiting --delay seconds before the first request to let the
+   background warm-up finish.
+
+The server runs in DEV_MODE with USE_REAL_API_IN_DEV so the "dev-mode" token is accepted
+without Firebase while the messages still go to the (fake) providers.
+
+Run from the backend directory:
+    python -m benchmarks.bench_startup --runs 5 --delay 0 3
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.fake_provider import FakeProviderConfig, start_in_thread
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_CONFIG_PATH = os.path.join(BACKEND_DIR, "benchmarks", "litellm_config.fake.yaml")
+FAKE_PORTS = (9101, 9102, 9103, 9104)
+HEADERS = {"Authorization": "Bearer dev-mode"}
+
+
+def child_environment(warm_up: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": BACKEND_DIR,
+        "DEV_MODE": "true",
+        "USE_REAL_API_IN_DEV": "true",
+        "LITELLM_CONFIG_PATH": FAKE_CONFIG_PATH,
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+        "WARM_UP_ENABLED": "true" if warm_up else "false",
+    })
+    return env
+
+
+def measure_import(runs: int) -> List[float]:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=child_environment(False),
+                                capture_output=True, text=True, check=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def wait_for_port(port: int, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.05):
+                return True
+        except OSError:
+            time.sleep(0.005)
+    return False
+
+
+def send(client: httpx.Client, port: int, message: str) -> float:
+    started = time.perf_counter()
+    response = client.post(f"http://127.0.0.1:{port}/api/v1/chat/send", headers=HEADERS,
+                           json={"userId": "dev-user-123", "conversationHistory": [], "message": message})
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+def measure_first_response(port: int, warm_up: bool, delay: float) -> Optional[Dict[str, float]]:
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=child_environment(warm_up),
+    )
+    try:
+        if not wait_for_port(port, timeout=60):
+            print("  server did not start")
+            return None
+        listening = time.perf_counter() - started
+        time.sleep(delay)
+        with httpx.Client(timeout=60) as client:
+            first = send(client, port, "I've been feeling overwhelmed at work lately")
+            second = send(client, port, "My boss keeps adding deadlines")
+        return {"listening": listening, "first": first, "second": second,
+                "ready": listening + delay + first}
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main(args) -> None:
+    config = FakeProviderConfig("startup", ttft_ms=args.ttft_ms, tokens_per_second=0)
+    for port in FAKE_PORTS:
+        start_in_thread(config, port)
+
+    timings = measure_import(args.runs)
+    print(f"import app.main: median {statistics.median(timings) * 1e3:.0f} ms "
+          f"(min {min(timings) * 1e3:.0f}, max {max(timings) * 1e3:.0f}, {args.runs} runs)")
+
+    print(f"\n{'':<28} {'listening':>10} {'1st send':>10} {'2nd send':>10} {'1st reply':>10}  (ms, from spawn)")
+    phases = [("warm-up off", False, 0.0)] + [(f"warm-up on, delay {delay:g}s", True, delay) for delay in args.delay]
+    for name, warm_up, delay in phases:
+        result = measure_first_response(args.port, warm_up, delay)
+        if result is not None:
+            print(f"{name:<28} {result['listening'] * 1e3:>10.0f} {result['first'] * 1e3:>10.0f} "
+                  f"{result['second'] * 1e3:>10.0f} {result['ready'] * 1e3:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Interpreter starts for the import measurement")
+    parser.add_argument("--delay", type=float, nargs="+", default=[0.0, 3.0],
+                        help="Seconds to wait after the port opens before the first request (warm-up on)")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--ttft-ms", type=float, default=50.0)
+    main(parser.parse_args())
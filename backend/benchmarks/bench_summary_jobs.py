@@ -0,0 +1,170 @@
+"""
+Benchmark: prompt size of long sessions with and without background conversation summaries.
+
+Starts two fake OpenAI-format deployments (benchmarks/fake_provider.py), one for chat replies
+and one for summaries, so their input tokens are counted apart. It then plays --conversations
+sessions of --turns turns each through LLMManager.get_llm_response with stored conversations,
+twice:
+
+- extractive: summary jobs off; once the history outgrows CONTEXT_TOKEN_BUDGET, the context
+  builder folds older turns into its first-sentence rolling summary
+- background summaries: after each turn the summary workers are triggered (SUMMARY_TRIGGER_*),
+  and prompts carry the stored summary in place of the turns it covers. --summary-error-rate
+  makes that fraction of summary calls fail, to exercise the retries
+
+Reported: chat prompt tokens per turn (mean, p95, and over the last 10 turns), provider input
+tokens for chat and for summaries, summary jobs by outcome, retries, and how long jobs took
+from being queued to succeeding.
+
+Run from the backend directory:
+    python -m benchmarks.bench_summary_jobs --conversations 10 --turns 60
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+import yaml
+
+from benchmarks.fake_provider import FakeProviderConfig, start_in_thread
+
+PORTS = {"chat": 9321, "summary": 9322}
+
+WORDS = ("work deadline sleep family friend worried tired week manager money plan talk feel "
+         "better change time help idea try again maybe really think today call home stress").split()
+
+
+def write_config(directory: str) -> str:
+    config = {
+        "model_list": [
+            {"model_name": f"bench-{name}", "litellm_params": {
+                "model": "openai/fake-flash", "api_base": f"http://127.0.0.1:{port}/v1", "api_key": "fake-key"}}
+            for name, port in PORTS.items()
+        ],
+        "router_settings": {"num_retries": 0, "timeout": 30},
+    }
+    path = os.path.join(directory, "litellm_config.yaml")
+    with open(path, "w") as config_file:
+        yaml.safe_dump(config, config_file)
+    return path
+
+
+async def provider_input_tokens(port: int) -> int:
+    async with httpx.AsyncClient() as client:
+        stats = (await client.get(f"http://127.0.0.1:{port}/stats")).json()
+    return stats["cached_prompt_tokens"] + stats["uncached_prompt_tokens"]
+
+
+async def run_phase(name: str, summaries: bool, directory: str, args) -> None:
+    from app.core.llm_manager import LLMManager
+    from app.services.conversation_store import InMemoryConversationStore
+    from app.services.summary_jobs import SQLiteSummaryQueue, SummaryWorkerPool
+    from app.core.config import settings
+
+    llm_manager = LLMManager()
+    llm_manager.open_http_pool()
+    await llm_manager.ensure_ready()
+    store = InMemoryConversationStore(max_conversations=10000, idle_ttl_seconds=3600)
+    rng = random.Random(0)
+
+    async def summarize(summary: str, new_messages: List[Dict[str, str]]) -> str:
+        if rng.random() < args.summary_error_rate:
+            raise RuntimeError("injected summary failure")
+        return await llm_manager.summarize_conversation(summary, new_messages, model_name="bench-summary")
+
+    queue = SQLiteSummaryQueue(os.path.join(directory, f"summary_jobs_{summaries}.sqlite3"))
+    workers = SummaryWorkerPool(
+        queue, store, summarize, workers=args.workers, keep_recent=settings.CONTEXT_RECENT_MESSAGES,
+        trigger_turns=settings.SUMMARY_TRIGGER_TURNS, trigger_tokens=settings.SUMMARY_TRIGGER_TOKENS,
+        chunk_tokens=settings.SUMMARY_CHUNK_TOKENS, max_attempts=settings.SUMMARY_MAX_ATTEMPTS,
+        retry_backoff_seconds=0.05, poll_interval_seconds=0.05, token_model="bench-chat"
+    )
+    if summaries:
+        workers.start()
+    chat_before = await provider_input_tokens(PORTS["chat"])
+    summary_before = await provider_input_tokens(PORTS["summary"])
+    prompt_tokens: List[int] = []
+    last_turns: List[int] = []
+
+    async def conversation(index: int) -> None:
+        conversation_rng = random.Random(index)
+        conversation_id = f"{name}-{index}"
+        for turn in range(args.turns):
+            stored = store.get(conversation_id)
+            messages = stored.messages if stored else []
+            history = workers.summarized_history(conversation_id, messages) if summaries else messages
+            message = f"Turn {turn}. " + " ".join(conversation_rng.choice(WORDS) for _ in range(args.message_words)) + "."
+            metadata: Dict[str, int] = {}
+            reply, justification = await llm_manager.get_llm_response(
+                history, message, model_name="bench-chat", use_cache=False, response_metadata=metadata,
+                conversation_id=conversation_id
+            )
+            prompt_tokens.append(metadata["promptTokens"])
+            if turn >= args.turns - 10:
+                last_turns.append(metadata["promptTokens"])
+            new_messages = [{"role": "user", "content": message, "justification": None},
+                            {"role": "assistant", "content": reply, "justification": justification}]
+            store.append(conversation_id, "bench-user", stored.version if stored else 0, new_messages)
+            if summaries:
+                workers.maybe_enqueue(conversation_id, "bench-user", messages + new_messages)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(conversation(index) for index in range(args.conversations)))
+    if summaries:
+        # Let the workers finish what the last turns queued
+        while queue.counts()["queued"] or queue.counts()["running"]:
+            await asyncio.sleep(0.05)
+        await workers.stop()
+    elapsed = time.perf_counter() - started
+
+    chat_tokens = await provider_input_tokens(PORTS["chat"]) - chat_before
+    summary_tokens = await provider_input_tokens(PORTS["summary"]) - summary_before
+    prompt_tokens.sort()
+    print(f"\n{name} ({elapsed:.1f}s)")
+    print(f"  chat prompt tokens per turn: mean {statistics.mean(prompt_tokens):.0f}, "
+          f"p95 {prompt_tokens[int(len(prompt_tokens) * 0.95)]}, last 10 turns {statistics.mean(last_turns):.0f}")
+    print(f"  provider input tokens: chat {chat_tokens}, summaries {summary_tokens}, total {chat_tokens + summary_tokens}")
+    if summaries:
+        stats = workers.stats()
+        rows = queue._conn.execute("SELECT updated_at - created_at FROM summary_jobs WHERE status = 'succeeded'").fetchall()
+        lags = sorted(row[0] for row in rows)
+        print(f"  summary jobs: {stats['jobs']}, LLM calls {stats['llm_calls']}, retried {stats['retried']}, "
+              f"messages folded {stats['folded_messages']}")
+        if lags:
+            print(f"  queued to succeeded: p50 {lags[len(lags) // 2] * 1e3:.0f}ms, max {lags[-1] * 1e3:.0f}ms")
+    await llm_manager.aclose()
+    # LiteLLM caches its OpenAI SDK clients (with the pool's HTTP client) across calls
+    from app.core.warmup import litellm_module
+    litellm_module.get().in_memory_llm_clients_cache.flush_cache()
+
+
+async def main(args) -> None:
+    config = FakeProviderConfig("bench", ttft_ms=args.ttft_ms, tokens_per_second=0)
+    for port in PORTS.values():
+        start_in_thread(config, port)
+
+    from app.core.config import settings
+    directory = tempfile.mkdtemp(prefix="bench_summary_jobs_")
+    settings.DEV_MODE = False
+    settings.CASCADE_ENABLED = False
+    settings.PROMPT_CACHE_ENABLED = False
+    settings.LITELLM_CONFIG_PATH = write_config(directory)
+
+    await run_phase("extractive", False, directory, args)
+    await run_phase("background summaries", True, directory, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--message-words", type=int, default=80, help="Words per user message")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--summary-error-rate", type=float, default=0.1)
+    parser.add_argument("--ttft-ms", type=float, default=20.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,184 @@
+"""
+Load test: chat over /api/v1/chat/ws vs. one HTTP request per message, with thousands of open connections.
+
+Starts the app under uvicorn in a subprocess (DEV_MODE, mock streaming responses, so the LLM is
+not part of the numbers) and measures the server process only:
+
+1. idle: opens --idle WebSocket connections that authenticate and then stay silent, and reports
+   the server's resident memory per connection (RSS growth / connections). uvicorn runs with
+   --ws-per-message-deflate false, as in the Dockerfile, unless --per-message-deflate is given.
+2. active: while those stay open, --active clients each send --messages chat messages one after
+   another, first over their own WebSocket, then the way the web client does today: a CORS
+   preflight (OPTIONS) and a POST to /stream per message on a keep-alive HTTP connection.
+   Reported per mode: time to the first content token and to the `done` event (p50/p99), and
+   server CPU time per message.
+
+Authentication is the DEV_MODE mock, so per-request token verification is cheaper here than with
+Firebase (where the verified-token cache still costs a lookup per request).
+
+Run from the backend directory (raise the open file limit for large --idle values):
+    python -m benchmarks.bench_websocket --idle 2000 --active 50 --messages 20
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+import httpx
+import orjson
+from websockets.asyncio.client import connect
+
+PORT = 9331
+MESSAGE = "I've been stressed about money and it keeps me up at night."
+
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def start_server(args) -> subprocess.Popen:
+    env = dict(os.environ, DEV_MODE="true", MOCK_STREAM_TOKENS_PER_SECOND=str(args.tokens_per_second),
+               ADMISSION_USER_RATE_PER_SECOND="0", ADMISSION_MAX_CONCURRENCY="1000", ADMISSION_MAX_QUEUE_SIZE="10000",
+               SUMMARY_JOBS_ENABLED="false", WS_HEARTBEAT_TIMEOUT_SECONDS="3600", LOG_LEVEL="WARNING",
+               LITELLM_LOCAL_MODEL_COST_MAP="True")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT), "--log-level", "warning",
+         "--backlog", "4096", "--ws", args.ws, "--ws-per-message-deflate", str(args.per_message_deflate).lower()],
+        env=env
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{PORT}/").status_code == 200:
+                return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("The server did not start")
+
+
+async def open_socket(semaphore: asyncio.Semaphore):
+    async with semaphore:
+        socket = await connect(f"ws://127.0.0.1:{PORT}/api/v1/chat/ws", max_queue=None, open_timeout=60)
+        await socket.recv()  # ready
+        return socket
+
+
+async def socket_client(socket, messages: int, client: int) -> Tuple[List[float], List[float]]:
+    ttfts, totals = [], []
+    for index in range(messages):
+        request_id = f"{client}-{index}"
+        started = time.perf_counter()
+        await socket.send(orjson.dumps({"type": "chat", "requestId": request_id, "message": MESSAGE,
+                                        "bypassCache": True}).decode())
+        first = None
+        while True:
+            frame = orjson.loads(await socket.recv())
+            if frame.get("requestId") != request_id:
+                continue
+            if first is None and frame["type"] == "content":
+                first = time.perf_counter() - started
+            if frame["type"] in ("done", "error"):
+                break
+        totals.append(time.perf_counter() - started)
+        ttfts.append(first if first is not None else totals[-1])
+    return ttfts, totals
+
+
+async def http_client(messages: int) -> Tuple[List[float], List[float]]:
+    ttfts, totals = [], []
+    url = f"http://127.0.0.1:{PORT}/api/v1/chat/stream"
+    async with httpx.AsyncClient(timeout=60) as client:
+        for _ in range(messages):
+            started = time.perf_counter()
+            # What a browser sends first for a cross-origin JSON POST with an Authorization header
+            await client.options(url, headers={"Origin": "http://localhost:9002",
+                                               "Access-Control-Request-Method": "POST",
+                                               "Access-Control-Request-Headers": "authorization,content-type"})
+            first = None
+            async with client.stream("POST", url, json={"userId": "dev-user-123", "message": MESSAGE, "bypassCache": True},
+                                     headers={"Authorization": "Bearer dev-mode", "Origin": "http://localhost:9002"}) as response:
+                async for line in response.aiter_lines():
+                    if first is None and line == "event: content":
+                        first = time.perf_counter() - started
+                    if line in ("event: done", "event: error"):
+                        break
+            totals.append(time.perf_counter() - started)
+            ttfts.append(first if first is not None else totals[-1])
+    return ttfts, totals
+
+
+def report(name: str, results: List[Tuple[List[float], List[float]]], cpu: float) -> None:
+    ttfts = [value for client_ttfts, _ in results for value in client_ttfts]
+    totals = [value for _, client_totals in results for value in client_totals]
+    print(f"  {name:<10} TTFT p50 {percentile(ttfts, 0.5) * 1e3:6.1f}ms  p99 {percentile(ttfts, 0.99) * 1e3:6.1f}ms   "
+          f"done p50 {percentile(totals, 0.5) * 1e3:6.1f}ms  p99 {percentile(totals, 0.99) * 1e3:6.1f}ms   "
+          f"server CPU {cpu / len(totals) * 1e3:.2f}ms/message")
+
+
+async def main(args) -> None:
+    server = start_server(args)
+    try:
+        # Warm up both paths before the baseline
+        warm_up = await open_socket(asyncio.Semaphore(1))
+        await socket_client(warm_up, 3, -1)
+        await http_client(3)
+
+        baseline = rss_bytes(server.pid)
+        semaphore = asyncio.Semaphore(200)
+        started = time.perf_counter()
+        idle = await asyncio.gather(*(open_socket(semaphore) for _ in range(args.idle)))
+        await asyncio.sleep(1)
+        grown = rss_bytes(server.pid) - baseline
+        print(f"\n{args.idle} idle connections opened in {time.perf_counter() - started:.1f}s")
+        print(f"  server RSS {baseline / 2 ** 20:.0f} MiB -> {(baseline + grown) / 2 ** 20:.0f} MiB, "
+              f"{grown / max(1, args.idle) / 1024:.1f} KiB per connection")
+
+        print(f"\n{args.active} active clients x {args.messages} messages (with the idle connections open)")
+        sockets = await asyncio.gather(*(open_socket(semaphore) for _ in range(args.active)))
+        cpu = cpu_seconds(server.pid)
+        results = await asyncio.gather(*(socket_client(socket, args.messages, index) for index, socket in enumerate(sockets)))
+        report("websocket", results, cpu_seconds(server.pid) - cpu)
+
+        cpu = cpu_seconds(server.pid)
+        results = await asyncio.gather(*(http_client(args.messages) for _ in range(args.active)))
+        report("http", results, cpu_seconds(server.pid) - cpu)
+
+        stats = httpx.get(f"http://127.0.0.1:{PORT}/api/v1/chat/stats", headers={"Authorization": "Bearer dev-mode"}).json()
+        print(f"\n  server: {stats['webSocket']['connections']} connections open, "
+              f"{stats['webSocket']['frames_received']} frames received")
+        for socket in idle + sockets + [warm_up]:
+            await socket.close()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--idle", type=int, default=2000)
+    parser.add_argument("--active", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--ws", default="auto", help="uvicorn's WebSocket implementation (--ws)")
+    parser.add_argument("--per-message-deflate", action="store_true",
+                        help="Leave uvicorn's permessage-deflate on (its zlib state is most of an idle connection's memory)")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Mock stream rate (0 = as fast as possible)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,526 @@
+"""
+A local, OpenAI-compatible fake LLM provider for router and load tests.
+
+It serves POST /v1/chat/completions (streaming and non-streaming) with a configurable
+time-to-first-token, token rate and error rate, so LiteLLM deployments can point at it
+through `api_base` with no network access or API keys. POST /v1/messages answers in the
+Anthropic Messages format for `anthropic/` deployments, and /v1beta/models/{model}:generateContent
+(plus /v1beta/cachedContents) in the Gemini format for `gemini/` deployments with
+`api_base: http://host:port/v1beta`. It can serve HTTPS (pass a certificate and key) and counts
+the client connections it accepts, for connection reuse tests.
+
+Prompt caching is simulated per API: OpenAI-style prefixes are cached automatically at message
+boundaries, Anthropic prefixes up to `cache_control` breakpoints, and Gemini cachedContents
+handles hold what they were created with, each for the configured TTL. Cached tokens are
+reported in the usage the way each provider does, and with `prefill_ms_per_1k_tokens` only the
+uncached prompt tokens add to the time to first token. Tokens are counted as words.
+
+Latency is realistic rather than constant: TTFT can be fixed, uniformly jittered or
+log-normally distributed (long right tail, like real providers), and faults can be injected
+as 503 errors, hung requests and streams that break off midway. Requests the client gives up on
+(closing the connection before or during the answer) are counted as abandoned, which is how
+cancellation tests check that upstream calls are really stopped.
+
+Run standalone from the backend directory:
+    python -m benchmarks.fake_provider --name fast --port 9101 --ttft-ms 80 --ttft-distribution lognormal
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+RESPONSE_TEXT = (
+    "I hear you, and it makes sense that this feels like a lot right now. "
+    "One small step could be to write down what is weighing on you most, then pick a single item to start with. "
+    "Would you like to talk through which one feels most urgent?\n\n"
+    "Justification: Breaking an overwhelming situation into smaller parts restores a sense of control."
+)
+
+
+TTFT_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+
+class FakeProviderConfig:
+    """
+    Behaviour of a fake deployment. Attributes can be changed while it is serving.
+
+    ttft_distribution: "fixed" uses ttft_ms as is; "uniform" draws from ttft_ms +/- ttft_jitter
+        (a fraction of ttft_ms); "lognormal" has median ttft_ms and shape ttft_jitter (sigma).
+    error_rate: fraction of requests answered with a 503.
+    hang_rate: fraction of requests that stall for hang_seconds before answering (timeouts).
+    disconnect_rate: fraction of streams that break off after roughly half the tokens.
+    prefill_ms_per_1k_tokens: time to first token added per 1000 uncached prompt tokens.
+    cache_ttl_seconds, cache_min_tokens: lifetime of cached prefixes (from their last use) and the
+        shortest prefix that is cached.
+    reply_rules: (substring, text) pairs; a chat request whose last message contains the
+        substring (case-insensitively) is answered with exactly that text, for classifier models.
+    """
+
+    def __init__(self, name: str = "fake", ttft_ms: float = 100.0, tokens_per_second: float = 200.0,
+                 error_rate: float = 0.0, response_text: str = RESPONSE_TEXT,
+                 ttft_distribution: str = "fixed", ttft_jitter: float = 0.0, hang_rate: float = 0.0,
+                 hang_seconds: float = 30.0, disconnect_rate: float = 0.0, prefill_ms_per_1k_tokens: float = 0.0,
+                 cache_ttl_seconds: float = 300.0, cache_min_tokens: int = 0,
+                 reply_rules: Sequence[Tuple[str, str]] = ()):
+        if ttft_distribution not in TTFT_DISTRIBUTIONS:
+            raise ValueError(f"Unknown TTFT distribution: {ttft_distribution}")
+        self.name = name
+        self.ttft_ms = ttft_ms
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.response_text = response_text
+        self.ttft_distribution = ttft_distribution
+        self.ttft_jitter = ttft_jitter
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.disconnect_rate = disconnect_rate
+        self.prefill_ms_per_1k_tokens = prefill_ms_per_1k_tokens
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cache_min_tokens = cache_min_tokens
+        self.reply_rules = [(substring.lower(), text) for substring, text in reply_rules]
+
+    def sample_ttft_seconds(self, uncached_prompt_tokens: int = 0) -> float:
+        if self.ttft_distribution == "uniform":
+            spread = self.ttft_ms * self.ttft_jitter
+            ttft_ms = random.uniform(self.ttft_ms - spread, self.ttft_ms + spread)
+        elif self.ttft_distribution == "lognormal":
+            ttft_ms = self.ttft_ms * math.exp(random.gauss(0.0, self.ttft_jitter))
+        else:
+            ttft_ms = self.ttft_ms
+        return (max(0.0, ttft_ms) + self.prefill_ms_per_1k_tokens * uncached_prompt_tokens / 1000) / 1000
+
+
+def _tokens(text: str):
+    # Word-sized tokens with their trailing whitespace
+    words = text.split(" ")
+    return [word + " " for word in words[:-1]] + [words[-1]]
+
+
+def _word_count(content) -> int:
+    """Rough token count of a message's content, given as a string or a list of content blocks."""
+    if isinstance(content, list):
+        return sum(len(str(block.get("text", "")).split()) for block in content if isinstance(block, dict))
+    return len(str(content or "").split())
+
+
+def _block_texts(content) -> List[Tuple[str, bool]]:
+    """(text, has cache_control) for each content block of a message or system prompt."""
+    if isinstance(content, list):
+        return [(str(block.get("text", "")), bool(block.get("cache_control")))
+                for block in content if isinstance(block, dict)]
+    return [(str(content or ""), False)]
+
+
+class PromptCacheSimulator:
+    """
+    Prompt prefixes a fake provider has cached, by the hash of everything up to a block boundary.
+    An entry lives for cache_ttl_seconds from its last use; prefixes under cache_min_tokens are not cached.
+    """
+
+    def __init__(self, config: FakeProviderConfig):
+        self.config = config
+        self._prefixes: Dict[str, float] = {}
+        # Gemini cachedContents: name -> (tokens, expires at)
+        self.contents: Dict[str, Tuple[int, float]] = {}
+
+    @staticmethod
+    def boundaries(blocks: List[Tuple[str, str]]) -> List[Tuple[str, int]]:
+        """(prefix hash, prefix tokens) after each (role, text) block."""
+        digest, tokens, result = hashlib.sha256(), 0, []
+        for role, text in blocks:
+            digest.update(role.encode() + b"\0" + text.encode("utf-8") + b"\0")
+            tokens += len(text.split())
+            result.append((digest.hexdigest(), tokens))
+        return result
+
+    def read(self, boundaries: List[Tuple[str, int]]) -> int:
+        """Tokens of the longest cached prefix among the boundaries, refreshing its lifetime."""
+        now = time.time()
+        for prefix_hash, tokens in reversed(boundaries):
+            expires_at = self._prefixes.get(prefix_hash)
+            if expires_at is not None and expires_at > now:
+                self._prefixes[prefix_hash] = now + self.config.cache_ttl_seconds
+                return tokens
+        return 0
+
+    def write(self, prefix_hash: str, tokens: int) -> bool:
+        if tokens < max(1, self.config.cache_min_tokens):
+            return False
+        self._prefixes[prefix_hash] = time.time() + self.config.cache_ttl_seconds
+        return True
+
+
+def create_app(config: FakeProviderConfig) -> FastAPI:
+    app = FastAPI(title=f"Fake LLM provider ({config.name})")
+    app.state.config = config
+    app.state.requests = 0
+    app.state.errors = 0
+    app.state.hangs = 0
+    app.state.disconnects = 0
+    app.state.abandoned = 0
+    # Client (host, port) pairs seen; each is a separate TCP connection
+    app.state.connections = set()
+    app.state.cached_tokens = 0
+    app.state.uncached_tokens = 0
+    prompt_cache = PromptCacheSimulator(config)
+
+    async def begin(request: Request):
+        """Count the request; returns an error response to send instead, if one is injected."""
+        app.state.requests += 1
+        app.state.connections.add(tuple(request.scope.get("client") or ()))
+        if random.random() < config.error_rate:
+            app.state.errors += 1
+            return JSONResponse(status_code=503, content={"error": {"message": f"{config.name} overloaded"}})
+        if random.random() < config.hang_rate:
+            app.state.hangs += 1
+            await asyncio.sleep(config.hang_seconds)
+        return None
+
+    async def wait_first_token(request: Request, seconds: float) -> bool:
+        """Sleep until the first token is due; False (counted as abandoned) if the client has gone by then."""
+        await asyncio.sleep(seconds)
+        if await request.is_disconnected():
+            app.state.abandoned += 1
+            return False
+        return True
+
+    async def watched(events):
+        """A response stream, counted as abandoned if it does not run to the end."""
+        # Starlette cancels a streaming response when its client disconnects
+        try:
+            async for event in events:
+                yield event
+        except (asyncio.CancelledError, GeneratorExit):
+            app.state.abandoned += 1
+            raise
+
+    def count_prompt(cached: int, total: int) -> int:
+        """Record a request's prompt tokens; returns the uncached ones."""
+        app.state.cached_tokens += cached
+        app.state.uncached_tokens += total - cached
+        return total - cached
+
+    def answer_text(body) -> str:
+        if config.reply_rules and body.get("messages"):
+            last = " ".join(text for text, _ in _block_texts(body["messages"][-1].get("content"))).lower()
+            for substring, rule_text in config.reply_rules:
+                if substring in last:
+                    return rule_text
+        text = f"[{config.name}] {config.response_text}"
+        generation_config = body.get("generationConfig") or {}
+        if body.get("response_format") or generation_config.get("response_mime_type") == "application/json":
+            # Structured-output mode: the same answer as {"content", "justification"} JSON
+            content, _, justification = text.partition("\n\nJustification: ")
+            text = json.dumps({"content": content, "justification": justification})
+        return text
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        error = await begin(request)
+        if error is not None:
+            return error
+
+        text = answer_text(body)
+        tokens = _tokens(text)
+        messages = body.get("messages", [])
+        # Automatic prefix caching at message boundaries, as OpenAI does
+        boundaries = prompt_cache.boundaries([
+            (message.get("role", ""), " ".join(text for text, _ in _block_texts(message.get("content"))))
+            for message in messages
+        ])
+        prompt_tokens = boundaries[-1][1] if boundaries else 0
+        cached_tokens = prompt_cache.read(boundaries[:-1])
+        for prefix_hash, prefix_tokens in boundaries[:-1]:
+            prompt_cache.write(prefix_hash, prefix_tokens)
+        uncached_tokens = count_prompt(cached_tokens, prompt_tokens)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", config.name)
+        token_delay = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+        if not await wait_first_token(request, config.sample_ttft_seconds(uncached_tokens)):
+            return JSONResponse(status_code=499, content={})
+
+        if not body.get("stream"):
+            await asyncio.sleep(token_delay * len(tokens))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        # Index of the token after which this stream breaks off, if any
+        cut_at = len(tokens) // 2 if random.random() < config.disconnect_rate else None
+
+        async def stream():
+            for index, token in enumerate(tokens):
+                if index and token_delay:
+                    await asyncio.sleep(token_delay)
+                if index == cut_at:
+                    app.state.disconnects += 1
+                    raise ConnectionResetError(f"{config.name} dropped the stream")
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                usage_chunk = dict(final, choices=[], usage=usage)
+                yield f"data: {json.dumps(usage_chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(watched(stream()), media_type="text/event-stream")
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        """The same behaviour in the Anthropic Messages API format."""
+        body = await request.json()
+        error = await begin(request)
+        if error is not None:
+            return error
+
+        tokens = _tokens(answer_text(body))
+        # Cached up to cache_control breakpoints: the longest prefix cached before (at any block
+        # boundary up to the last breakpoint) is read, the prefix at each breakpoint is written
+        blocks = [("system", text, marked) for text, marked in _block_texts(body.get("system"))]
+        for entry in body.get("messages", []):
+            blocks.extend((entry.get("role", ""), text, marked) for text, marked in _block_texts(entry.get("content")))
+        boundaries = prompt_cache.boundaries([(role, text) for role, text, _ in blocks])
+        breakpoints = [index for index, (_, _, marked) in enumerate(blocks) if marked]
+        total_tokens = boundaries[-1][1] if boundaries else 0
+        cache_read = prompt_cache.read(boundaries[:breakpoints[-1] + 1]) if breakpoints else 0
+        cache_write = 0
+        for index in breakpoints:
+            prefix_hash, prefix_tokens = boundaries[index]
+            if prefix_tokens > cache_read and prompt_cache.write(prefix_hash, prefix_tokens):
+                cache_write = prefix_tokens - cache_read
+        uncached_tokens = count_prompt(cache_read, total_tokens)
+        message = {
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", config.name),
+            "content": [],
+            "stop_reason": None,
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": total_tokens - cache_read - cache_write,
+                "cache_read_input_tokens": cache_read,
+                "cache_creation_input_tokens": cache_write,
+                "output_tokens": 0,
+            },
+        }
+        token_delay = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+        if not await wait_first_token(request, config.sample_ttft_seconds(uncached_tokens)):
+            return JSONResponse(status_code=499, content={})
+
+        if not body.get("stream"):
+            await asyncio.sleep(token_delay * len(tokens))
+            message["content"] = [{"type": "text", "text": "".join(tokens)}]
+            message["stop_reason"] = "end_turn"
+            message["usage"]["output_tokens"] = len(tokens)
+            return message
+
+        cut_at = len(tokens) // 2 if random.random() < config.disconnect_rate else None
+
+        def event(name: str, data) -> str:
+            return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+        async def stream():
+            yield event("message_start", {"type": "message_start", "message": message})
+            yield event("content_block_start", {"type": "content_block_start", "index": 0,
+                                                "content_block": {"type": "text", "text": ""}})
+            for index, token in enumerate(tokens):
+                if index and token_delay:
+                    await asyncio.sleep(token_delay)
+                if index == cut_at:
+                    app.state.disconnects += 1
+                    raise ConnectionResetError(f"{config.name} dropped the stream")
+                yield event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                    "delta": {"type": "text_delta", "text": token}})
+            yield event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield event("message_delta", {"type": "message_delta",
+                                          "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                          "usage": {"output_tokens": len(tokens)}})
+            yield event("message_stop", {"type": "message_stop"})
+
+        return StreamingResponse(watched(stream()), media_type="text/event-stream")
+
+    def gemini_error(status: int, message: str, reason: str) -> JSONResponse:
+        return JSONResponse(status_code=status, content={"error": {"code": status, "message": message, "status": reason}})
+
+    def gemini_texts(body) -> List[str]:
+        system = body.get("systemInstruction") or body.get("system_instruction") or {}
+        texts = [str(part.get("text", "")) for part in system.get("parts", [])]
+        for content in body.get("contents", []):
+            texts.extend(str(part.get("text", "")) for part in content.get("parts", []))
+        return texts
+
+    @app.post("/v1beta/cachedContents")
+    async def create_cached_content(request: Request):
+        """Gemini context caching: store a prompt prefix under a handle for its TTL."""
+        body = await request.json()
+        tokens = sum(len(text.split()) for text in gemini_texts(body))
+        if tokens < config.cache_min_tokens:
+            return gemini_error(400, f"Cached content is too small: {tokens} tokens, minimum {config.cache_min_tokens}",
+                                "INVALID_ARGUMENT")
+        ttl = float(str(body.get("ttl") or f"{config.cache_ttl_seconds}s").rstrip("s"))
+        name = f"cachedContents/{uuid.uuid4().hex[:16]}"
+        prompt_cache.contents[name] = (tokens, time.time() + ttl)
+        return {"name": name, "model": body.get("model"), "usageMetadata": {"totalTokenCount": tokens},
+                "expireTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + ttl))}
+
+    @app.delete("/v1beta/cachedContents/{cache_id}")
+    async def delete_cached_content(cache_id: str):
+        if prompt_cache.contents.pop(f"cachedContents/{cache_id}", None) is None:
+            return gemini_error(404, "Cached content not found", "NOT_FOUND")
+        return {}
+
+    @app.post("/v1beta/models/{model_action}")
+    async def generate_content(model_action: str, request: Request):
+        """The same behaviour in the Gemini generateContent / streamGenerateContent format."""
+        body = await request.json()
+        model, _, action = model_action.partition(":")
+        error = await begin(request)
+        if error is not None:
+            return error
+
+        cached_tokens = 0
+        if body.get("cachedContent"):
+            cached = prompt_cache.contents.get(body["cachedContent"])
+            if cached is None or cached[1] <= time.time():
+                return gemini_error(404, f"CachedContent not found (or expired): {body['cachedContent']}", "NOT_FOUND")
+            cached_tokens = cached[0]
+        prompt_tokens = cached_tokens + sum(len(text.split()) for text in gemini_texts(body))
+        uncached_tokens = count_prompt(cached_tokens, prompt_tokens)
+        tokens = _tokens(answer_text(body))
+        usage = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": len(tokens),
+                 "totalTokenCount": prompt_tokens + len(tokens)}
+        if cached_tokens:
+            usage["cachedContentTokenCount"] = cached_tokens
+        token_delay = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+        if not await wait_first_token(request, config.sample_ttft_seconds(uncached_tokens)):
+            return JSONResponse(status_code=499, content={})
+
+        def candidate(text: str, finished: bool):
+            entry = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+            if finished:
+                entry["finishReason"] = "STOP"
+            return entry
+
+        if action != "streamGenerateContent":
+            await asyncio.sleep(token_delay * len(tokens))
+            return {"candidates": [candidate("".join(tokens), True)], "usageMetadata": usage, "modelVersion": model}
+
+        cut_at = len(tokens) // 2 if random.random() < config.disconnect_rate else None
+
+        async def stream():
+            for index, token in enumerate(tokens):
+                if index and token_delay:
+                    await asyncio.sleep(token_delay)
+                if index == cut_at:
+                    app.state.disconnects += 1
+                    raise ConnectionResetError(f"{config.name} dropped the stream")
+                chunk = {"candidates": [candidate(token, index == len(tokens) - 1)], "modelVersion": model}
+                if index == len(tokens) - 1:
+                    chunk["usageMetadata"] = usage
+                yield f"data: {json.dumps(chunk)}\r\n\r\n"
+
+        return StreamingResponse(watched(stream()), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            "name": config.name,
+            "requests": app.state.requests,
+            "connections": len(app.state.connections),
+            "errors": app.state.errors,
+            "hangs": app.state.hangs,
+            "disconnects": app.state.disconnects,
+            "abandoned": app.state.abandoned,
+            "cached_prompt_tokens": app.state.cached_tokens,
+            "uncached_prompt_tokens": app.state.uncached_tokens,
+        }
+
+    return app
+
+
+def start_in_thread(config: FakeProviderConfig, port: int, host: str = "127.0.0.1",
+                    ssl_certfile: Optional[str] = None, ssl_keyfile: Optional[str] = None) -> uvicorn.Server:
+    """Start a fake provider on a background thread and wait until it accepts connections (HTTPS with a certificate)."""
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host=host, port=port, log_level="warning",
+                                           ssl_certfile=ssl_certfile, ssl_keyfile=ssl_keyfile))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--name", default="fake")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--ttft-ms", type=float, default=100.0)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--ttft-distribution", choices=TTFT_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--ttft-jitter", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=0.0)
+    parser.add_argument("--cache-ttl-seconds", type=float, default=300.0)
+    parser.add_argument("--cache-min-tokens", type=int, default=0)
+    parser.add_argument("--ssl-certfile", help="Serve HTTPS with this certificate")
+    parser.add_argument("--ssl-keyfile")
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(FakeProviderConfig(
+            args.name, args.ttft_ms, args.tokens_per_second, args.error_rate,
+            ttft_distribution=args.ttft_distribution, ttft_jitter=args.ttft_jitter, hang_rate=args.hang_rate,
+            hang_seconds=args.hang_seconds, disconnect_rate=args.disconnect_rate,
+            prefill_ms_per_1k_tokens=args.prefill_ms_per_1k_tokens, cache_ttl_seconds=args.cache_ttl_seconds,
+            cache_min_tokens=args.cache_min_tokens
+        )),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+        ssl_certfile=args.ssl_certfile,
+        ssl_keyfile=args.ssl_keyfile,
+    )
@@ -0,0 +1,428 @@
+"""
+Load test: the real FastAPI app under concurrent synthetic chat sessions against fake LLM deployments.
+
+The app runs either in-process through httpx's ASGI transport (`--target inproc`, no sockets,
+but responses are buffered so TTFT equals total latency) or under uvicorn on a background
+thread with its own event loop (`--target uvicorn`, real HTTP and real streaming). LLM calls
+go through the LiteLLM router to the fake providers in benchmarks/fake_provider.py, configured
+with a TTFT distribution, token rate and injected faults.
+
+Each session seeds a conversation with a history length drawn from `--history`, then sends
+`--turns` messages, uploading the growing history each time. A `--stream-ratio` share of the
+turns use /stream. Results: p50/p95/p99 latency and TTFT (overall and per history length),
+throughput, error counts, event-loop lag of the serving loop and memory per request.
+
+Run from the backend directory:
+    python -m benchmarks.loadtest run --sessions 50 --turns 5 --history 0 20 200 --output results/before.json
+    python -m benchmarks.loadtest run --target uvicorn --ttft-distribution lognormal --ttft-jitter 0.5 \\
+        --error-rate 0.02 --output results/after.json
+    python -m benchmarks.loadtest diff results/before.json results/after.json --threshold 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from benchmarks.fake_provider import TTFT_DISTRIBUTIONS, FakeProviderConfig, start_in_thread
+
+FAKE_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "litellm_config.fake.yaml")
+FAKE_PORTS = (9101, 9102, 9103, 9104)
+HEADERS = {"Authorization": "Bearer loadtest"}  # Authentication is overridden with a fixed user in load_app()
+USER_ID = "dev-user-123"
+
+USER_TEXT = "Lately I've been anxious about money and it's starting to affect my sleep and my relationships"
+ASSISTANT_TEXT = "That sounds exhausting. Money worries have a way of spilling into everything else."
+JUSTIFICATION_TEXT = "Validating the spillover effect helps the user feel understood before problem solving."
+
+# Metrics where a larger value is an improvement; everything else is treated as lower-is-better
+HIGHER_IS_BETTER = ("throughput_rps", "requests_ok")
+
+
+class LagMonitor:
+    """Measures event-loop lag: how late a periodic timer fires compared to when it was due."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            due = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - due))
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def latency_summary(values: List[float]) -> Dict[str, Optional[float]]:
+    values = sorted(values)
+    to_ms = lambda value: None if value is None else round(value * 1000, 2)
+    return {
+        "p50_ms": to_ms(percentile(values, 0.50)),
+        "p95_ms": to_ms(percentile(values, 0.95)),
+        "p99_ms": to_ms(percentile(values, 0.99)),
+        "max_ms": to_ms(values[-1] if values else None),
+    }
+
+
+def synthetic_history(length: int) -> List[Dict[str, Any]]:
+    history = []
+    for index in range(length):
+        if index % 2 == 0:
+            history.append({"role": "user", "content": f"{USER_TEXT} ({index})"})
+        else:
+            history.append({"role": "assistant", "content": ASSISTANT_TEXT, "justification": JUSTIFICATION_TEXT})
+    return history
+
+
+async def send_turn(client, history: List[Dict[str, Any]], message: str, stream: bool) -> Dict[str, Any]:
+    """Send one turn; returns its timing and outcome, and the assistant reply on success."""
+    body = {"userId": USER_ID, "conversationHistory": history, "message": message}
+    started = time.perf_counter()
+    record: Dict[str, Any] = {"stream": stream, "history": len(history), "ok": False, "ttft": None}
+    try:
+        if stream:
+            async with client.stream("POST", "/api/v1/chat/stream", json=body, headers=HEADERS) as response:
+                record["status"] = response.status_code
+                event_type, done = None, None
+                async for line in response.aiter_lines():
+                    if line.startswith("event: "):
+                        event_type = line[7:]
+                        if event_type == "content" and record["ttft"] is None:
+                            record["ttft"] = time.perf_counter() - started
+                    elif line.startswith("data: ") and event_type in ("done", "error"):
+                        done = (event_type, json.loads(line[6:]))
+                if done and done[0] == "done":
+                    record["ok"] = True
+                    record["reply"] = (done[1]["content"], done[1]["justification"])
+        else:
+            response = await client.post("/api/v1/chat/send", json=body, headers=HEADERS)
+            record["status"] = response.status_code
+            if response.status_code == 200:
+                ai_response = response.json()["aiResponse"]
+                record["ok"] = True
+                record["reply"] = (ai_response["content"], ai_response["justification"])
+    except Exception as e:
+        record["status"] = type(e).__name__
+    record["latency"] = time.perf_counter() - started
+    if record["ttft"] is None and record["ok"]:
+        record["ttft"] = record["latency"]
+    return record
+
+
+async def run_session(client, session_id: int, history_length: int, turns: int, stream_ratio: float,
+                      start_delay: float, records: List[Dict[str, Any]], rng: random.Random) -> None:
+    await asyncio.sleep(start_delay)
+    history = synthetic_history(history_length)
+    for turn in range(turns):
+        message = f"Session {session_id} turn {turn}: {USER_TEXT}"
+        record = await send_turn(client, history, message, stream=rng.random() < stream_ratio)
+        record["history_bucket"] = history_length
+        reply = record.pop("reply", None)
+        records.append(record)
+        history.append({"role": "user", "content": message})
+        if reply:
+            history.append({"role": "assistant", "content": reply[0], "justification": reply[1]})
+
+
+def configure_environment(args) -> None:
+    """Point the app at the fake deployments before it is imported."""
+    os.environ["DEV_MODE"] = "false"  # Call the (fake) providers instead of the canned mock
+    os.environ["LITELLM_CONFIG_PATH"] = FAKE_CONFIG_PATH
+    os.environ["LITELLM_LOCAL_MODEL_COST_MAP"] = "True"
+    os.environ["ADMISSION_USER_RATE_PER_SECOND"] = "0"  # Every session shares the mock user
+    os.environ.setdefault("ADMISSION_MAX_QUEUE_SIZE", str(max(128, args.sessions)))
+
+
+def start_fake_providers(args) -> FakeProviderConfig:
+    config = FakeProviderConfig(
+        "loadtest",
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        ttft_distribution=args.ttft_distribution,
+        ttft_jitter=args.ttft_jitter,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        disconnect_rate=args.disconnect_rate,
+    )
+    for port in FAKE_PORTS:
+        start_in_thread(config, port)
+    return config
+
+
+async def mock_user() -> Dict[str, Any]:
+    return {"uid": USER_ID, "email": "loadtest@example.com", "name": "Load Test"}
+
+
+def load_app():
+    from app.core.security import verify_firebase_token
+    from app.main import app
+    app.dependency_overrides[verify_firebase_token] = mock_user
+    return app
+
+
+def start_uvicorn(app, port: int, lag: LagMonitor):
+    """Serve the app on a background thread with its own event loop, monitoring that loop's lag."""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.call_soon(lag.start)
+        loop.run_until_complete(server.serve())
+
+    threading.Thread(target=serve, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(records: List[Dict[str, Any]], elapsed: float, lag_samples: List[float],
+              rss_before: int, rss_after: int, traced_peak: Optional[int], sessions: int) -> Dict[str, Any]:
+    ok = [record for record in records if record["ok"]]
+    errors: Dict[str, int] = {}
+    for record in records:
+        if not record["ok"]:
+            errors[str(record.get("status"))] = errors.get(str(record.get("status")), 0) + 1
+
+    per_history = {}
+    for bucket in sorted({record["history_bucket"] for record in records}):
+        bucket_ok = [record for record in ok if record["history_bucket"] == bucket]
+        per_history[str(bucket)] = {
+            "requests_ok": len(bucket_ok),
+            "latency": latency_summary([record["latency"] for record in bucket_ok]),
+        }
+
+    lag_ms = sorted(sample * 1000 for sample in lag_samples)
+    summary = {
+        "requests": len(records),
+        "requests_ok": len(ok),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else None,
+        "latency": latency_summary([record["latency"] for record in ok]),
+        "ttft": latency_summary([record["ttft"] for record in ok if record["stream"]]),
+        "per_history": per_history,
+        "event_loop_lag": {
+            "p50_ms": round(percentile(lag_ms, 0.50) or 0.0, 2),
+            "p99_ms": round(percentile(lag_ms, 0.99) or 0.0, 2),
+            "max_ms": round(lag_ms[-1] if lag_ms else 0.0, 2),
+        },
+        "memory": {
+            "rss_before_mb": round(rss_before / 2**20, 1),
+            "rss_after_mb": round(rss_after / 2**20, 1),
+            "rss_growth_per_request_kb": round((rss_after - rss_before) / 1024 / max(1, len(records)), 2),
+        },
+    }
+    if traced_peak is not None:
+        summary["memory"]["traced_peak_per_session_kb"] = round(traced_peak / 1024 / max(1, sessions), 2)
+    return summary
+
+
+async def run(args) -> Dict[str, Any]:
+    configure_environment(args)
+    fake_config = start_fake_providers(args)
+    app = load_app()
+    import httpx
+
+    lag = LagMonitor()
+    server = None
+    if args.target == "uvicorn":
+        server = start_uvicorn(app, args.port, lag)
+        client = httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.port}",
+            limits=httpx.Limits(max_connections=args.sessions, max_keepalive_connections=args.sessions),
+            timeout=args.request_timeout,
+        )
+    else:
+        # The app shares this event loop with the load generator
+        lag.start()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=args.request_timeout
+        )
+
+    # Measure the steady state, after the start-up warm-up (which uvicorn runs in the app lifespan)
+    if server is None:
+        from app.core.llm_manager import get_llm_manager
+        llm_manager = get_llm_manager()
+        llm_manager.open_http_pool()
+        await llm_manager.warm_up()
+    else:
+        from app.core.config import settings
+        while settings.WARM_UP_ENABLED and not (hasattr(app.state, "warm_up") and app.state.warm_up.done):
+            await asyncio.sleep(0.05)
+    lag.samples.clear()
+
+    rng = random.Random(args.seed)
+    records: List[Dict[str, Any]] = []
+    sessions = [
+        run_session(
+            client, session_id, rng.choice(args.history), args.turns, args.stream_ratio,
+            rng.uniform(0, args.ramp_seconds), records, random.Random(rng.random())
+        )
+        for session_id in range(args.sessions)
+    ]
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    async with client:
+        await asyncio.gather(*sessions)
+    elapsed = time.perf_counter() - started
+    rss_after = rss_bytes()
+    traced_peak = None
+    if args.tracemalloc:
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    lag.stop()
+    if server is not None:
+        server.should_exit = True
+
+    config = {key: value for key, value in vars(args).items() if key not in ("func", "output")}
+    return {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_commit": git_commit(), "config": config,
+                 "fake_provider": {"ttft_ms": fake_config.ttft_ms, "distribution": fake_config.ttft_distribution}},
+        "summary": summarize(records, elapsed, lag.samples, rss_before, rss_after, traced_peak, args.sessions),
+    }
+
+
+def print_summary(result: Dict[str, Any]) -> None:
+    summary = result["summary"]
+    print(f"\n{summary['requests_ok']}/{summary['requests']} ok in {summary['elapsed_s']} s "
+          f"({summary['throughput_rps']} req/s), errors: {summary['errors'] or 'none'}")
+    print(f"{'':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = [("latency", summary["latency"]), ("ttft (stream)", summary["ttft"])]
+    rows += [(f"latency, history {bucket}", values["latency"]) for bucket, values in summary["per_history"].items()]
+    for label, values in rows:
+        print(f"{label:<22}" + "".join(f"{str(values[key]):>10}" for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms")))
+    lag = summary["event_loop_lag"]
+    print(f"event-loop lag: p50 {lag['p50_ms']} ms, p99 {lag['p99_ms']} ms, max {lag['max_ms']} ms")
+    print("memory: " + ", ".join(f"{key} {value}" for key, value in summary["memory"].items()))
+
+
+def flatten(values: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in values.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def diff(args) -> int:
+    """Compare two result files; returns 1 if any metric regressed by more than the threshold."""
+    with open(args.before) as before_file, open(args.after) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+    print(f"before: {before['meta'].get('git_commit')} {before['meta']['timestamp']}")
+    print(f"after:  {after['meta'].get('git_commit')} {after['meta']['timestamp']}\n")
+    old, new = flatten(before["summary"]), flatten(after["summary"])
+    regressions = 0
+    print(f"{'metric':<44}{'before':>12}{'after':>12}{'change':>10}")
+    for key in sorted(set(old) | set(new)):
+        old_value, new_value = old.get(key), new.get(key)
+        change, marker = "", ""
+        if old_value is not None and new_value is not None and old_value != 0:
+            percent = (new_value - old_value) / abs(old_value) * 100
+            change = f"{percent:+.1f}%"
+            worse = -percent if key.split(".")[-1] in HIGHER_IS_BETTER else percent
+            if worse > args.threshold and key.split(".")[0] not in ("elapsed_s", "requests", "memory"):
+                marker = "  REGRESSION"
+                regressions += 1
+        print(f"{key:<44}{str(old_value):>12}{str(new_value):>12}{change:>10}{marker}")
+    print(f"\n{regressions} regression(s) above {args.threshold}%")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run a load test")
+    run_parser.add_argument("--target", choices=("inproc", "uvicorn"), default="inproc")
+    run_parser.add_argument("--port", type=int, default=8765)
+    run_parser.add_argument("--sessions", type=int, default=50, help="Concurrent synthetic sessions")
+    run_parser.add_argument("--turns", type=int, default=5, help="Messages sent per session")
+    run_parser.add_argument("--history", type=int, nargs="+", default=[0, 20, 200],
+                            help="Seeded history lengths, one drawn per session")
+    run_parser.add_argument("--stream-ratio", type=float, default=0.5, help="Share of turns sent to /stream")
+    run_parser.add_argument("--ramp-seconds", type=float, default=1.0, help="Spread session start times")
+    run_parser.add_argument("--request-timeout", type=float, default=60.0)
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--tracemalloc", action="store_true", help="Also trace Python allocations (slower)")
+    run_parser.add_argument("--ttft-ms", type=float, default=150.0)
+    run_parser.add_argument("--ttft-distribution", choices=TTFT_DISTRIBUTIONS, default="lognormal")
+    run_parser.add_argument("--ttft-jitter", type=float, default=0.4)
+    run_parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    run_parser.add_argument("--error-rate", type=float, default=0.0)
+    run_parser.add_argument("--hang-rate", type=float, default=0.0)
+    run_parser.add_argument("--hang-seconds", type=float, default=10.0)
+    run_parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    run_parser.add_argument("--output", help="Write the JSON results to this file")
+
+    diff_parser = commands.add_parser("diff", help="Compare two result files")
+    diff_parser.add_argument("before")
+    diff_parser.add_argument("after")
+    diff_parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+
+    args = parser.parse_args()
+    if args.command == "diff":
+        return diff(args)
+
+    result = asyncio.run(run(args))
+    print_summary(result)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as output:
+            json.dump(result, output, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+A local, OpenAI-compatible provider that replays recorded LLM traffic (LLM_RECORD_BACKEND).
+
+It serves POST /v1/chat/completions (streaming and non-streaming) from a JSONL or SQLite archive,
+so benchmarks and CI performance gates see real answer lengths, times to first token and token
+rates with no network access or API keys. Point `openai/` deployments at it through `api_base`,
+as with benchmarks/fake_provider.py.
+
+Each request gets the recording of the same prompt (matched on the fingerprint of its messages,
+cycling through repeated recordings), or else the next recording in archive order, so a
+different workload still replays the recorded traffic's shape. Replays are deterministic: each
+chunk is sent at its recorded offset from the start of the request, divided by --speed (2 plays
+twice as fast, 0 sends everything at once). Recorded provider errors are replayed with their
+status code; calls our side cancelled are skipped.
+
+Run standalone from the backend directory:
+    python -m benchmarks.replay_provider --archive llm_recordings.jsonl --port 9101 --model flash-2.0
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import uuid
+from itertools import cycle
+from typing import Any, Dict, Iterator, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.core.llm_recorder import load_recordings, request_fingerprint
+
+
+def recorded_chunks(record: Dict[str, Any]) -> List[List[Any]]:
+    """
+    A recording as [milliseconds since the previous chunk, text] pairs. Plain (non-streamed)
+    recordings become one chunk per word, all at the end of the call.
+    """
+    if "chunks" in record:
+        return record["chunks"]
+    words = (record.get("content") or "").split(" ")
+    return [[record.get("duration_ms", 0.0) if index == 0 else 0.0, word if index == len(words) - 1 else word + " "]
+            for index, word in enumerate(words)]
+
+
+class ReplayConfig:
+    """
+    Recordings to replay and how fast. Attributes can be changed while it is serving.
+
+    model: only replay recordings of this model group (all of them when None).
+    speed: playback speed; 1 reproduces the recorded timing, 0 sends answers without delay.
+    """
+
+    def __init__(self, recordings: List[Dict[str, Any]], name: str = "replay", speed: float = 1.0,
+                 model: Optional[str] = None):
+        self.name = name
+        self.speed = speed
+        self.recordings = [record for record in recordings
+                           if not record.get("cancelled") and (model is None or record["model"] == model)]
+        if not self.recordings:
+            raise ValueError(f"No recordings to replay{f' for {model}' if model else ''}")
+        by_fingerprint: Dict[str, List[Dict[str, Any]]] = {}
+        for record in self.recordings:
+            by_fingerprint.setdefault(record["fingerprint"], []).append(record)
+        self._by_fingerprint: Dict[str, Iterator[Dict[str, Any]]] = {
+            fingerprint: cycle(records) for fingerprint, records in by_fingerprint.items()
+        }
+        self._in_order = cycle(self.recordings)
+        self._lock = threading.Lock()
+
+    def pick(self, messages: List[Dict[str, Any]]):
+        """(recording, matched): the recording of this prompt, or the next one in order."""
+        with self._lock:
+            same_prompt = self._by_fingerprint.get(request_fingerprint(messages))
+            if same_prompt is not None:
+                return next(same_prompt), True
+            return next(self._in_order), False
+
+    def scaled(self, milliseconds: float) -> float:
+        """Seconds to wait for a recorded interval at the configured speed."""
+        return milliseconds / 1000 / self.speed if self.speed > 0 else 0.0
+
+
+def _usage(record: Dict[str, Any], chunks: List[List[Any]]) -> Dict[str, Any]:
+    usage = record.get("usage") or {}
+    cached = usage.get("cachedInputTokens") or 0
+    # Recordings without usage get the usual ~4 characters per token
+    prompt_tokens = cached + usage.get("uncachedInputTokens", record.get("prompt_chars", 0) // 4)
+    completion_tokens = usage.get("completionTokens") or len(chunks)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached},
+    }
+
+
+def create_app(config: ReplayConfig) -> FastAPI:
+    app = FastAPI(title=f"Replay LLM provider ({config.name})")
+    app.state.config = config
+    app.state.requests = 0
+    app.state.matched = 0
+    app.state.errors = 0
+    app.state.abandoned = 0
+
+    async def until(started: float, offset_ms: float) -> None:
+        # Offsets from the start of the request, so waits don't add up their overshoot
+        delay = started + config.scaled(offset_ms) - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        started = time.perf_counter()
+        body = await request.json()
+        record, matched = config.pick(body.get("messages", []))
+        app.state.requests += 1
+        app.state.matched += matched
+
+        if record.get("error"):
+            app.state.errors += 1
+            await until(started, record.get("duration_ms", 0.0))
+            return JSONResponse(status_code=record.get("status_code") or 503,
+                                content={"error": {"message": f"Replayed {record['error']}"}})
+
+        chunks = recorded_chunks(record)
+        usage = _usage(record, chunks)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", config.name)
+
+        if not body.get("stream"):
+            await until(started, record.get("duration_ms", 0.0))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(text for _, text in chunks)},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def stream():
+            offset = 0.0
+            try:
+                for gap, text in chunks:
+                    offset += gap
+                    await until(started, offset)
+                    yield chunk({"content": text})
+                await until(started, offset + record.get("tail_ms", 0.0))
+                yield chunk({}, "stop")
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    usage_chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                                   "model": model, "choices": [], "usage": usage}
+                    yield f"data: {json.dumps(usage_chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            except (asyncio.CancelledError, GeneratorExit):
+                app.state.abandoned += 1
+                raise
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            "name": config.name,
+            "recordings": len(config.recordings),
+            "requests": app.state.requests,
+            "matched": app.state.matched,
+            "errors": app.state.errors,
+            "abandoned": app.state.abandoned,
+        }
+
+    return app
+
+
+def start_in_thread(config: ReplayConfig, port: int, host: str = "127.0.0.1") -> uvicorn.Server:
+    """Start a replay provider on a background thread and wait until it accepts connections."""
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive", required=True, help="JSONL or SQLite archive written by the recorder")
+    parser.add_argument("--name", default="replay")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--model", help="Only replay recordings of this model group")
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(ReplayConfig(load_recordings(args.archive), args.name, args.speed, args.model)),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from app.core.intent_engine import ModelCascade, load_intent_engine
+
+INTENTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "intents.yaml")
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return load_intent_engine(INTENTS_PATH)
+
+
+@pytest.fixture(scope="module")
+def cascade(engine):
+    return ModelCascade(engine, default_model="flash-2.0", fast_model="flash-lite", strong_model="claude-3-sonnet")
+
+
+@pytest.mark.parametrize("message", ["hi", "Hello!", "hey!!", "Good morning :)", "Hi, hello."])
+def test_greeting_alone_gets_the_canned_reply(cascade, message):
+    decision = cascade.decide(message, [])
+    assert decision.intent.name == "greeting"
+    assert decision.canned is not None
+
+
+@pytest.mark.parametrize("message", [
+    "Hey, my dad passed away yesterday",
+    "Hi I got fired today",
+    "Hi, I feel so alone tonight",
+    "Hello? I don't know who else to talk to",
+])
+def test_greeting_followed_by_more_is_answered_by_a_model(cascade, message):
+    decision = cascade.decide(message, [])
+    assert decision.canned is None
+    assert decision.intent.name != "greeting"
+    assert decision.model_name is not None
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("his car broke down", "general"),
+    ("I aimed too high", "general"),
+    ("it was a heyday", "general"),
+    ("I skipped my workout", "general"),
+    ("I am stressed", "mental_health"),
+    ("my boss shouted", "career"),
+])
+def test_keywords_match_whole_words_only(engine, message, intent):
+    assert engine.classify(message).name == intent
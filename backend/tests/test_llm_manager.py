@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.deadlines import Deadline, DeadlineExceeded
+from app.core.llm_manager import LLMManager
+
+
+class Slot:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return None
+
+
+@pytest.fixture
+def llm_manager(monkeypatch):
+    monkeypatch.setattr(settings, "DEV_MODE", False)
+    llm_manager = LLMManager()
+    llm_manager._ready = True
+    llm_manager.safety_screen = None
+    llm_manager.calls = 0
+
+    async def generate(*args, **kwargs):
+        llm_manager.calls += 1
+        await asyncio.sleep(0.3)
+        return ("Reply", "Why"), {}
+
+    monkeypatch.setattr(llm_manager, "_generate", generate)
+    return llm_manager
+
+
+def ask(llm_manager, admit, deadline):
+    return deadline.wait(llm_manager.get_llm_response([], "The same message", model_name="flash-2.0",
+                                                      use_cache=False, admit=admit))
+
+
+def test_follower_outlives_leader_stuck_in_admission_queue(llm_manager):
+    async def queued(model):
+        await asyncio.sleep(10)  # Never admitted within the leader's deadline
+
+    async def admitted(model):
+        return Slot()
+
+    async def run():
+        leader = asyncio.ensure_future(ask(llm_manager, queued, Deadline(0.1)))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(ask(llm_manager, admitted, Deadline(2.0)))
+        with pytest.raises(DeadlineExceeded):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == ("Reply", "Why")
+    assert llm_manager.calls == 1
+
+
+def test_follower_outlives_leader_that_hits_its_deadline(llm_manager):
+    admissions = []
+
+    async def admit(model):
+        admissions.append(model)
+        return Slot()
+
+    async def run():
+        leader = asyncio.ensure_future(ask(llm_manager, admit, Deadline(0.1)))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(ask(llm_manager, admit, Deadline(2.0)))
+        with pytest.raises(DeadlineExceeded):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == ("Reply", "Why")
+    # One upstream call, but each caller held its own admission slot
+    assert llm_manager.calls == 1
+    assert admissions == ["flash-2.0", "flash-2.0"]
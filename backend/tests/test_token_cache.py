@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from app.core.token_cache import SigningKeyCache
+
+
+class CountingKeyCache(SigningKeyCache):
+    """Serves a fixed key with a given max-age instead of downloading Google's certificates."""
+
+    def __init__(self, max_age_seconds: float, **kwargs):
+        super().__init__(**kwargs)
+        self.max_age_seconds = max_age_seconds
+        self.fetches = 0
+
+    def _fetch(self) -> None:
+        self._fetched_at = time.monotonic()
+        self.fetches += 1
+        self.prime({"kid": "certificate"}, self.max_age_seconds)
+
+
+def run_refresh_loop(cache: SigningKeyCache, seconds: float) -> None:
+    async def run():
+        cache.start_background_refresh()
+        await asyncio.sleep(seconds)
+        cache._refresh_task.cancel()
+
+    asyncio.run(run())
+
+
+def test_short_max_age_does_not_refetch_back_to_back():
+    # max-age below the refresh margin: the keys are always due for a refresh
+    cache = CountingKeyCache(max_age_seconds=10, refresh_margin_seconds=300, min_forced_refresh_seconds=1.0)
+    cache.get_keys()
+    run_refresh_loop(cache, 0.5)
+    assert cache.fetches == 1
+
+
+def test_cold_cache_is_fetched_without_waiting():
+    cache = CountingKeyCache(max_age_seconds=3600, min_forced_refresh_seconds=60)
+    run_refresh_loop(cache, 0.2)
+    assert cache.fetches == 1
+    assert cache.get_keys() == {"kid": "certificate"}
@@ -2,6 +2,8 @@ import type { Message } from '@/types';
 
 // API configuration
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:8000';
+// Time budget of a chat request; the backend gives up at the same deadline (timeoutMs)
+const CHAT_TIMEOUT_MS = Number(process.env.NEXT_PUBLIC_CHAT_TIMEOUT_MS) || 60000;
 
 // Simplified message format for API requests
 export interface ApiMessage {
@@ -14,6 +16,7 @@ export interface ChatRequest {
   userId: string;
   conversationHistory: ApiMessage[];
   message: string;
+  timeoutMs?: number;
 }
 
 export interface ChatResponse {
@@ -25,23 +28,44 @@ export interface ChatResponse {
 }
 
 /**
- * Send a message to the AI through our backend API
+ * Send a message to the AI through our backend API.
+ * The request is aborted after CHAT_TIMEOUT_MS or when `signal` aborts; either closes the
+ * connection, which cancels the backend's upstream LLM call.
  */
-export async function sendMessage(request: ChatRequest, idToken: string | null): Promise<ChatResponse> {
+export async function sendMessage(request: ChatRequest, idToken: string | null, signal?: AbortSignal): Promise<ChatResponse> {
   if (!idToken) {
     // This case should ideally be handled before calling sendMessage,
     // e.g., by redirecting to login if no user/token is available.
     throw new Error("Authentication token not available. Please log in.");
   }
 
-  const response = await fetch(`${API_BASE_URL}/api/v1/chat/send`, {
-    method: 'POST',
-    headers: {
-      'Content-Type': 'application/json',
-      'Authorization': `Bearer ${idToken}` // Use the real ID token
-    },
-    body: JSON.stringify(request)
-  });
+  const timeoutMs = request.timeoutMs ?? CHAT_TIMEOUT_MS;
+  const controller = new AbortController();
+  const abort = () => controller.abort();
+  signal?.addEventListener('abort', abort);
+  // A little longer than the backend's deadline, so its 504 arrives before we give up
+  const timer = setTimeout(abort, timeoutMs + 1000);
+
+  let response: Response;
+  try {
+    response = await fetch(`${API_BASE_URL}/api/v1/chat/send`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${idToken}` // Use the real ID token
+      },
+      body: JSON.stringify({ ...request, timeoutMs }),
+      signal: controller.signal
+    });
+  } catch (error) {
+    if (controller.signal.aborted && !signal?.aborted) {
+      throw new Error("The AI service took too long to respond. Please try again.");
+    }
+    throw error;
+  } finally {
+    clearTimeout(timer);
+    signal?.removeEventListener('abort', abort);
+  }
 
   if (!response.ok) {
     const errorData = await response.json().catch(() => ({ message: "An unexpected API error occurred." }));